@@ -0,0 +1,357 @@
+import os
+import streamlit as st
+import pandas as pd
+import numpy as np
+from sqlalchemy import text
+
+from services.consultor_indices import ESTILO_NOMEADO, registrar_consulta
+
+# Agregações do Dashboard calculadas no banco: os filtros da sidebar viram WHERE
+# e cada gráfico recebe apenas a série já agregada (nunca as linhas dos microdados).
+#
+# Filtros: dicionário com as chaves abaixo (None ou ausente = "Todos"):
+#   'ano_inicio', 'ano_fim' (int), 'uf' (sigla), 'municipio' (NO_MUNICIPIO_PROVA),
+#   'sexo' ('F'/'M'), 'faixa' (código TP_FAIXA_ETARIA), 'conclusao' (código TP_ST_CONCLUSAO)
+#
+# Quando o cubo materializado pela FASE 6 do ETL (scripts/table_script/pos_carga.py) existe,
+# as agregações somam as células do cubo em vez de varrer os microdados. O município não é
+# dimensão do cubo: com esse filtro a consulta volta para a tabela de microdados.
+
+COLUNAS_NOTAS = ['NU_NOTA_CN', 'NU_NOTA_CH', 'NU_NOTA_LC', 'NU_NOTA_MT', 'NU_NOTA_REDACAO']
+
+# Colunas aceitas em contagem_por_coluna (nome vai direto para o SQL)
+COLUNAS_CATEGORICAS = ['TP_SEXO', 'TP_ST_CONCLUSAO', 'TP_COR_RACA', 'IN_TREINEIRO', 'TP_FAIXA_ETARIA', 'Q001', 'Q002', 'Q006']
+
+TABELA_CUBO = 'cubo_dashboard'
+TABELA_CUBO_CATEGORIAS = 'cubo_dashboard_categorias'
+DIMENSOES_CUBO = ['NU_ANO', 'SG_UF_PROVA', 'TP_SEXO', 'TP_FAIXA_ETARIA', 'TP_ST_CONCLUSAO']
+LARGURA_FAIXA_CUBO = 20
+
+AUSENTE = 'Ausente em um ou mais dias'
+PRESENTE = 'Presente'
+
+
+def montar_clausula_where(filtros):
+    """Converte o dicionário de filtros em (cláusula WHERE, parâmetros) no estilo :nome do text()."""
+    condicoes = []
+    params = {}
+    filtros = filtros or {}
+    if filtros.get('ano_inicio') is not None:
+        condicoes.append('"NU_ANO" >= :ano_inicio'); params['ano_inicio'] = int(filtros['ano_inicio'])
+    if filtros.get('ano_fim') is not None:
+        condicoes.append('"NU_ANO" <= :ano_fim'); params['ano_fim'] = int(filtros['ano_fim'])
+    if filtros.get('uf'):
+        condicoes.append('"SG_UF_PROVA" = :uf'); params['uf'] = filtros['uf']
+    if filtros.get('municipio'):
+        condicoes.append('"NO_MUNICIPIO_PROVA" = :municipio'); params['municipio'] = filtros['municipio']
+    if filtros.get('sexo'):
+        condicoes.append('"TP_SEXO" = :sexo'); params['sexo'] = filtros['sexo']
+    if filtros.get('faixa') is not None:
+        condicoes.append('"TP_FAIXA_ETARIA" = :faixa'); params['faixa'] = int(filtros['faixa'])
+    if filtros.get('conclusao') is not None:
+        condicoes.append('"TP_ST_CONCLUSAO" = :conclusao'); params['conclusao'] = int(filtros['conclusao'])
+    where = ('WHERE ' + ' AND '.join(condicoes)) if condicoes else ''
+    return where, params
+
+
+def _consultar(_engine, sql, params):
+    # Consultas fora do cubo (TABELA_CUBO e TABELA_CUBO_CATEGORIAS) vão aos microdados: entram no registro do consultor de índices
+    if TABELA_CUBO not in sql:
+        registrar_consulta('dashboards', os.getenv('NOME_TABELA'), sql, params, ESTILO_NOMEADO)
+    with _engine.connect() as connection:
+        return pd.read_sql(text(sql), connection, params=params)
+
+
+def _adicionar_condicao(where, condicao):
+    return f'{where} AND {condicao}' if where else f'WHERE {condicao}'
+
+
+def _soma(expressao, alias):
+    # SUM de inteiros vira NUMERIC no PostgreSQL; o cast mantém as contagens como int no pandas
+    return f'CAST(SUM({expressao}) AS BIGINT) AS {alias}'
+
+
+def _media(coluna_cubo, alias):
+    return f'SUM(soma_{coluna_cubo}) / NULLIF(SUM(n_{coluna_cubo}), 0) AS {alias}'
+
+
+@st.cache_data(ttl=600, show_spinner=False)
+def cubo_disponivel(_engine):
+    """Indica se as tabelas do cubo já foram criadas pelo ETL (revalidado a cada 10 minutos)."""
+    try:
+        with _engine.connect() as connection:
+            connection.execute(text(f'SELECT 1 FROM "{TABELA_CUBO}" LIMIT 1'))
+            connection.execute(text(f'SELECT 1 FROM "{TABELA_CUBO_CATEGORIAS}" LIMIT 1'))
+        return True
+    except Exception:
+        return False
+
+
+def _usar_cubo(filtros, _engine):
+    return not (filtros or {}).get('municipio') and cubo_disponivel(_engine)
+
+
+@st.cache_data(show_spinner=False)
+def resumo_kpis(filtros, _engine):
+    """
+    KPIs gerais em uma única linha: total, confirmados, presentes, ausentes,
+    média geral, média da redação e contagens de inglês/espanhol.
+    """
+    tabela = os.getenv('NOME_TABELA')
+    where, params = montar_clausula_where(filtros)
+    if _usar_cubo(filtros, _engine):
+        sql = f'''
+            SELECT
+                {_soma('n', 'total')}, {_soma('confirmados', 'confirmados')},
+                {_soma('presentes', 'presentes')}, {_soma('ausentes', 'ausentes')},
+                {_media('media_geral', 'media_geral')}, {_media('nu_nota_redacao', 'media_redacao')},
+                {_soma('ingles', 'ingles')}, {_soma('espanhol', 'espanhol')}
+            FROM "{TABELA_CUBO}"
+            {where}
+        '''
+    else:
+        sql = f'''
+            SELECT
+                COUNT(*) AS total,
+                SUM(CASE WHEN "INDICADOR_ABSENTEISMO" IS DISTINCT FROM '{AUSENTE}' THEN 1 ELSE 0 END) AS confirmados,
+                SUM(CASE WHEN "INDICADOR_ABSENTEISMO" = '{PRESENTE}' THEN 1 ELSE 0 END) AS presentes,
+                SUM(CASE WHEN "INDICADOR_ABSENTEISMO" = '{AUSENTE}' THEN 1 ELSE 0 END) AS ausentes,
+                AVG("MEDIA_GERAL") AS media_geral,
+                AVG("NU_NOTA_REDACAO") AS media_redacao,
+                SUM(CASE WHEN "TP_LINGUA" = 0 THEN 1 ELSE 0 END) AS ingles,
+                SUM(CASE WHEN "TP_LINGUA" = 1 THEN 1 ELSE 0 END) AS espanhol
+            FROM "{tabela}"
+            {where}
+        '''
+    try:
+        df = _consultar(_engine, sql, params)
+        resumo = df.iloc[0].to_dict()
+        for chave in ['total', 'confirmados', 'presentes', 'ausentes', 'ingles', 'espanhol']:
+            resumo[chave] = int(resumo[chave]) if pd.notna(resumo[chave]) else 0
+        for chave in ['media_geral', 'media_redacao']:
+            resumo[chave] = float(resumo[chave]) if pd.notna(resumo[chave]) else np.nan
+        return resumo
+    except Exception as e:
+        st.error(f"Erro ao calcular os indicadores: {e}")
+        return {'total': 0, 'confirmados': 0, 'presentes': 0, 'ausentes': 0, 'media_geral': np.nan,
+                'media_redacao': np.nan, 'ingles': 0, 'espanhol': 0}
+
+
+@st.cache_data(show_spinner=False)
+def resumo_por_ano(filtros, _engine):
+    """Inscritos, confirmados, presentes e ausentes por NU_ANO (tabela anual)."""
+    tabela = os.getenv('NOME_TABELA')
+    where, params = montar_clausula_where(filtros)
+    where = _adicionar_condicao(where, '"NU_ANO" IS NOT NULL')
+    if _usar_cubo(filtros, _engine):
+        sql = f'''
+            SELECT
+                "NU_ANO", {_soma('n', 'total_inscritos')}, {_soma('confirmados', 'total_confirmados')},
+                {_soma('presentes', 'total_presentes')}, {_soma('ausentes', 'total_ausentes_dia')}
+            FROM "{TABELA_CUBO}"
+            {where}
+            GROUP BY "NU_ANO"
+        '''
+    else:
+        sql = f'''
+            SELECT
+                "NU_ANO",
+                COUNT(*) AS total_inscritos,
+                SUM(CASE WHEN "INDICADOR_ABSENTEISMO" IS DISTINCT FROM '{AUSENTE}' THEN 1 ELSE 0 END) AS total_confirmados,
+                SUM(CASE WHEN "INDICADOR_ABSENTEISMO" = '{PRESENTE}' THEN 1 ELSE 0 END) AS total_presentes,
+                SUM(CASE WHEN "INDICADOR_ABSENTEISMO" = '{AUSENTE}' THEN 1 ELSE 0 END) AS total_ausentes_dia
+            FROM "{tabela}"
+            {where}
+            GROUP BY "NU_ANO"
+        '''
+    try:
+        return _consultar(_engine, sql, params)
+    except Exception as e:
+        st.error(f"Erro ao calcular o resumo anual: {e}")
+        return pd.DataFrame()
+
+
+@st.cache_data(show_spinner=False)
+def contagem_por_uf(filtros, _engine):
+    """Inscritos por SG_UF_PROVA (mapa)."""
+    tabela = os.getenv('NOME_TABELA')
+    where, params = montar_clausula_where(filtros)
+    where = _adicionar_condicao(where, '"SG_UF_PROVA" IS NOT NULL')
+    if _usar_cubo(filtros, _engine):
+        sql = f'SELECT "SG_UF_PROVA", {_soma("n", "contagem_inscritos")} FROM "{TABELA_CUBO}" {where} GROUP BY "SG_UF_PROVA"'
+    else:
+        sql = f'''
+            SELECT "SG_UF_PROVA", COUNT(*) AS contagem_inscritos
+            FROM "{tabela}"
+            {where}
+            GROUP BY "SG_UF_PROVA"
+        '''
+    try:
+        return _consultar(_engine, sql, params)
+    except Exception as e:
+        st.error(f"Erro ao contar inscritos por UF: {e}")
+        return pd.DataFrame()
+
+
+@st.cache_data(show_spinner=False)
+def medias_por_area(filtros, _engine):
+    """Média de cada área (CN, CH, LC, MT, Redação): colunas Area_Code e Media."""
+    tabela = os.getenv('NOME_TABELA')
+    where, params = montar_clausula_where(filtros)
+    if _usar_cubo(filtros, _engine):
+        colunas_avg = ", ".join(_media(col.lower(), f'"{col}"') for col in COLUNAS_NOTAS)
+        sql = f'SELECT {colunas_avg} FROM "{TABELA_CUBO}" {where}'
+    else:
+        colunas_avg = ", ".join(f'AVG("{col}") AS "{col}"' for col in COLUNAS_NOTAS)
+        sql = f'SELECT {colunas_avg} FROM "{tabela}" {where}'
+    try:
+        df = _consultar(_engine, sql, params)
+        medias = df.iloc[0].astype('float64').reset_index()
+        medias.columns = ['Area_Code', 'Media']
+        return medias
+    except Exception as e:
+        st.error(f"Erro ao calcular as médias por área: {e}")
+        return pd.DataFrame()
+
+
+@st.cache_data(show_spinner=False)
+def histograma_redacao(filtros, _engine, largura_faixa=20):
+    """
+    Contagem de notas de redação por faixa [inicio_faixa, inicio_faixa + largura_faixa).
+    As notas de redação são múltiplos de 20, então a largura padrão dá uma barra por nota possível.
+    """
+    tabela = os.getenv('NOME_TABELA')
+    where, params = montar_clausula_where(filtros)
+    if largura_faixa == LARGURA_FAIXA_CUBO and _usar_cubo(filtros, _engine):
+        where = _adicionar_condicao(where, "coluna = 'FAIXA_REDACAO' AND valor IS NOT NULL")
+        sql = f'''
+            SELECT CAST(valor AS INTEGER) AS inicio_faixa, {_soma('n', 'contagem')}
+            FROM "{TABELA_CUBO_CATEGORIAS}"
+            {where}
+            GROUP BY 1
+            ORDER BY 1
+        '''
+    else:
+        where = _adicionar_condicao(where, '"NU_NOTA_REDACAO" IS NOT NULL')
+        params = {**params, 'largura_faixa': largura_faixa}
+        sql = f'''
+            SELECT FLOOR("NU_NOTA_REDACAO" / :largura_faixa) * :largura_faixa AS inicio_faixa, COUNT(*) AS contagem
+            FROM "{tabela}"
+            {where}
+            GROUP BY 1
+            ORDER BY 1
+        '''
+    try:
+        df = _consultar(_engine, sql, params)
+        df['inicio_faixa'] = df['inicio_faixa'].astype('float64')
+        return df
+    except Exception as e:
+        st.error(f"Erro ao calcular o histograma da redação: {e}")
+        return pd.DataFrame()
+
+
+@st.cache_data(show_spinner=False)
+def estatisticas_correlacao(filtros, _engine):
+    """
+    Estatísticas suficientes para a correlação entre as 5 notas, só com linhas sem nulos:
+    n, somas (vetor de 5) e somas dos produtos cruzados (matriz 5x5).
+    """
+    tabela = os.getenv('NOME_TABELA')
+    where, params = montar_clausula_where(filtros)
+    k = len(COLUNAS_NOTAS)
+    pares = [(i, j) for i in range(k) for j in range(i, k)]
+    if _usar_cubo(filtros, _engine):
+        # O cubo guarda as mesmas somas (s_i, p_i_j) por célula, já restritas às linhas com as 5 notas
+        expr_somas = [f'SUM(s_{i}) AS s_{i}' for i in range(k)]
+        expr_produtos = [f'SUM(p_{i}_{j}) AS p_{i}_{j}' for i, j in pares]
+        sql = f'SELECT {_soma("n_completas", "n")}, {", ".join(expr_somas + expr_produtos)} FROM "{TABELA_CUBO}" {where}'
+    else:
+        expr_somas = [f'SUM("{col}") AS s_{i}' for i, col in enumerate(COLUNAS_NOTAS)]
+        expr_produtos = [f'SUM("{COLUNAS_NOTAS[i]}" * "{COLUNAS_NOTAS[j]}") AS p_{i}_{j}' for i, j in pares]
+        where = _adicionar_condicao(where, " AND ".join(f'"{col}" IS NOT NULL' for col in COLUNAS_NOTAS))
+        sql = f'''
+            SELECT COUNT(*) AS n, {", ".join(expr_somas + expr_produtos)}
+            FROM "{tabela}"
+            {where}
+        '''
+    try:
+        linha = _consultar(_engine, sql, params).iloc[0]
+        n = int(linha['n']) if pd.notna(linha['n']) else 0
+        if n == 0:
+            return 0, np.zeros(k), np.zeros((k, k))
+        somas = np.array([float(linha[f's_{i}']) for i in range(k)])
+        produtos = np.zeros((k, k))
+        for i, j in pares:
+            produtos[i, j] = produtos[j, i] = float(linha[f'p_{i}_{j}'])
+        return n, somas, produtos
+    except Exception as e:
+        st.error(f"Erro ao calcular as estatísticas de correlação: {e}")
+        return 0, np.zeros(k), np.zeros((k, k))
+
+
+def correlacao_de_estatisticas(n, somas, produtos):
+    """Matriz de correlação de Pearson (DataFrame 5x5, colunas = COLUNAS_NOTAS) a partir de n, somas e produtos."""
+    if n < 2:
+        return None
+    covariancia = (produtos - np.outer(somas, somas) / n) / (n - 1)
+    desvios = np.sqrt(np.clip(np.diag(covariancia), 0, None))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = covariancia / np.outer(desvios, desvios)
+    return pd.DataFrame(np.clip(corr, -1.0, 1.0), index=COLUNAS_NOTAS, columns=COLUNAS_NOTAS)
+
+
+@st.cache_data(show_spinner=False)
+def contagem_por_coluna(coluna, filtros, _engine, incluir_nulos=False):
+    """Contagem de inscritos por valor de uma coluna categórica: colunas Codigo e Count."""
+    if coluna not in COLUNAS_CATEGORICAS:
+        raise ValueError(f"Coluna não permitida para contagem: {coluna}")
+    tabela = os.getenv('NOME_TABELA')
+    where, params = montar_clausula_where(filtros)
+    soma_count = _soma('n', '"Count"')
+    if _usar_cubo(filtros, _engine) and coluna in DIMENSOES_CUBO:
+        if not incluir_nulos:
+            where = _adicionar_condicao(where, f'"{coluna}" IS NOT NULL')
+        sql = f'SELECT "{coluna}" AS "Codigo", {soma_count} FROM "{TABELA_CUBO}" {where} GROUP BY "{coluna}"'
+    elif _usar_cubo(filtros, _engine):
+        where = _adicionar_condicao(where, 'coluna = :coluna_cubo' + ('' if incluir_nulos else ' AND valor IS NOT NULL'))
+        params = {**params, 'coluna_cubo': coluna}
+        sql = f'SELECT valor AS "Codigo", {soma_count} FROM "{TABELA_CUBO_CATEGORIAS}" {where} GROUP BY valor'
+    else:
+        if not incluir_nulos:
+            where = _adicionar_condicao(where, f'"{coluna}" IS NOT NULL')
+        sql = f'SELECT "{coluna}" AS "Codigo", COUNT(*) AS "Count" FROM "{tabela}" {where} GROUP BY "{coluna}"'
+    try:
+        return _consultar(_engine, sql, params)
+    except Exception as e:
+        st.error(f"Erro ao contar inscritos por {coluna}: {e}")
+        return pd.DataFrame(columns=['Codigo', 'Count'])
+
+
+@st.cache_data(show_spinner=False)
+def media_geral_por_renda(filtros, _engine):
+    """MEDIA_GERAL média por faixa de renda (Q006)."""
+    tabela = os.getenv('NOME_TABELA')
+    where, params = montar_clausula_where(filtros)
+    if _usar_cubo(filtros, _engine):
+        where = _adicionar_condicao(where, "coluna = 'Q006' AND valor IS NOT NULL AND n_media_geral > 0")
+        sql = f'''
+            SELECT valor AS "Q_RENDA", {_media('media_geral', '"MEDIA_GERAL"')}
+            FROM "{TABELA_CUBO_CATEGORIAS}"
+            {where}
+            GROUP BY valor
+        '''
+    else:
+        where = _adicionar_condicao(where, '"Q006" IS NOT NULL AND "MEDIA_GERAL" IS NOT NULL')
+        sql = f'''
+            SELECT "Q006" AS "Q_RENDA", AVG("MEDIA_GERAL") AS "MEDIA_GERAL"
+            FROM "{tabela}"
+            {where}
+            GROUP BY "Q006"
+        '''
+    try:
+        df = _consultar(_engine, sql, params)
+        df['MEDIA_GERAL'] = df['MEDIA_GERAL'].astype('float64')
+        return df
+    except Exception as e:
+        st.error(f"Erro ao calcular a média por renda: {e}")
+        return pd.DataFrame()
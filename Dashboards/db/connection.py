@@ -1,23 +1,24 @@
-import os
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 from sqlalchemy.engine import Engine
 import streamlit as st
 
+from config.conexao import obter_engine
+
 _engine: Engine | None = None
 
 def get_engine() -> Engine:
-    """Retorna o engine do SQLAlchemy. Cria apenas uma vez."""
+    """Retorna o engine compartilhado do processo (config/conexao.py), com o rótulo do Dashboard. Testa a conexão uma vez."""
     global _engine
     if _engine is None:
         try:
-            database_url = f"postgresql+psycopg2://{os.getenv('DB_USER')}:{os.getenv('DB_PASS')}@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}?client_encoding=utf8"
-            _engine = create_engine(database_url)
+            engine = obter_engine(rotulo='dashboards')
             # Teste de conexão
-            with _engine.connect() as conn:
+            with engine.connect() as conn:
                 conn.execute(text("SELECT 1"))
+            _engine = engine
             st.success("Conexão com PostgreSQL estabelecida com sucesso!")
         except Exception as e:
             st.error(f"Falha ao criar 'engine' ou conectar ao SQLAlchemy: {e}")
-            st.info("Verifique a string de conexão, usuário, senha, host, porta e se o serviço PostgreSQL está ativo.")
+            st.info("Verifique as variáveis DB_HOST, DB_PORT, DB_NAME, DB_USER e DB_PASSWORD e se o serviço PostgreSQL está ativo.")
             st.stop()
-    return _engine
\ No newline at end of file
+    return _engine
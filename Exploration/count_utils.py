@@ -0,0 +1,190 @@
+# Exploration/count_utils.py
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as TempoEsgotado
+
+import streamlit as st
+
+from .db_utils import get_engine, ler_sql, DB_BACKEND
+
+
+# ===================================================================
+# CONTAGEM DE LINHAS FILTRADAS: ESTIMATIVA IMEDIATA + EXATA EM 2º PLANO
+# ===================================================================
+# A contagem exata (COUNT(*) sobre a visão com os JOINs) é uma varredura completa.
+# Enquanto ela roda em uma thread, a página mostra "≈ N" com a estimativa do
+# planejador do PostgreSQL (EXPLAIN). O resultado exato fica memorizado para todas
+# as sessões, pela assinatura normalizada do filtro.
+
+TTL_CONTAGEM = 3600  # segundos (mesmo ttl dos demais caches da página)
+TTL_FALHA_CONTAGEM = 60  # segundos até tentar de novo uma contagem que falhou
+TAMANHO_MAXIMO_CONTAGENS = 1000  # assinaturas memorizadas (LRU)
+TIMEOUT_CONTAGEM = 120  # segundos de espera pela contagem exata quando não há estimativa (DuckDB)
+
+_PARAM_IN = re.compile(r"^(p_val_.+)_(\d+)$")
+
+
+def assinatura_filtro(count_query, params):
+    """
+    Assinatura normalizada de (query de contagem, parâmetros): espaços colapsados e
+    valores de filtros IN (p_val_<coluna>_<i>) ordenados, para que a mesma seleção
+    em outra ordem reaproveite a contagem.
+    """
+    query_normalizada = " ".join(count_query.split())
+    valores_in = {}
+    demais = {}
+    for nome, valor in (params or {}).items():
+        m = _PARAM_IN.match(nome)
+        if m:
+            valores_in.setdefault(m.group(1), []).append(str(valor))
+        else:
+            demais[nome] = str(valor)
+    normalizado = {
+        'query': query_normalizada,
+        'params': sorted(demais.items()),
+        'in': sorted((col, sorted(vals)) for col, vals in valores_in.items()),
+    }
+    return hashlib.sha1(json.dumps(normalizado).encode('utf-8')).hexdigest()
+
+
+class FalhaContagem:
+    """Resultado memorizado de um COUNT(*) que falhou (vale por TTL_FALHA_CONTAGEM segundos)."""
+
+    def __init__(self, mensagem):
+        self.mensagem = mensagem
+
+
+class ServicoContagem:
+    """Contagens exatas memorizadas (compartilhadas entre sessões) e executadas em segundo plano."""
+
+    def __init__(self, max_workers=2, tamanho_maximo=TAMANHO_MAXIMO_CONTAGENS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="contagem")
+        self._lock = threading.Lock()
+        self.tamanho_maximo = tamanho_maximo
+        self._exatas = OrderedDict()  # assinatura -> (contagem ou FalhaContagem, instante), em ordem LRU
+        self._em_andamento = {}       # assinatura -> Future
+
+    def _resultado(self, assinatura):
+        """Contagem ou FalhaContagem ainda válida (chamar com o lock)."""
+        item = self._exatas.get(assinatura)
+        if item is None:
+            return None
+        resultado, instante = item
+        ttl = TTL_FALHA_CONTAGEM if isinstance(resultado, FalhaContagem) else TTL_CONTAGEM
+        if time.time() - instante >= ttl:
+            del self._exatas[assinatura]
+            return None
+        self._exatas.move_to_end(assinatura)
+        return resultado
+
+    def _guardar(self, assinatura, resultado):
+        with self._lock:
+            self._exatas[assinatura] = (resultado, time.time())
+            self._exatas.move_to_end(assinatura)
+            while len(self._exatas) > self.tamanho_maximo:
+                self._exatas.popitem(last=False)
+
+    def exata(self, assinatura):
+        """Contagem exata memorizada (ou None)."""
+        with self._lock:
+            resultado = self._resultado(assinatura)
+            return None if isinstance(resultado, FalhaContagem) else resultado
+
+    def falha(self, assinatura):
+        """Mensagem de erro da última contagem da assinatura, se ela falhou há menos de TTL_FALHA_CONTAGEM segundos."""
+        with self._lock:
+            resultado = self._resultado(assinatura)
+            return resultado.mensagem if isinstance(resultado, FalhaContagem) else None
+
+    def iniciar(self, assinatura, count_query, params, engine):
+        """Dispara o COUNT(*) exato em segundo plano (uma única vez por assinatura)."""
+        with self._lock:
+            futuro = self._em_andamento.get(assinatura)
+            if futuro is None:
+                futuro = self._executor.submit(self._contar, assinatura, count_query, params, engine)
+                self._em_andamento[assinatura] = futuro
+            return futuro
+
+    def _contar(self, assinatura, count_query, params, engine):
+        try:
+            total = int(ler_sql(count_query, params or None, engine=engine).iloc[0, 0])
+            self._guardar(assinatura, total)
+            return total
+        except Exception as e:
+            # Memorizada para a página parar de esperar (e não disparar o mesmo COUNT(*) a cada rerun)
+            self._guardar(assinatura, FalhaContagem(str(e)))
+            raise
+        finally:
+            with self._lock:
+                self._em_andamento.pop(assinatura, None)
+
+    def em_andamento(self, assinatura):
+        with self._lock:
+            return assinatura in self._em_andamento
+
+
+@st.cache_resource
+def get_servico_contagem():
+    """Instância única por processo (compartilhada por todas as sessões do Streamlit)."""
+    return ServicoContagem()
+
+
+def estimar_contagem(count_query, params, engine=None):
+    """
+    Estimativa do planejador do PostgreSQL para as linhas da query (EXPLAIN, sem executá-la).
+    Retorna None quando não há estimativa (backend DuckDB ou erro).
+    """
+    if DB_BACKEND == 'duckdb':
+        return None
+    query_linhas = count_query.replace('SELECT COUNT(*)', 'SELECT 1', 1)
+    try:
+        plano = ler_sql(f"EXPLAIN (FORMAT JSON) {query_linhas}", params or None, engine=engine).iloc[0, 0]
+        if isinstance(plano, str):
+            plano = json.loads(plano)
+        return int(plano[0]['Plan']['Plan Rows'])
+    except Exception:
+        return None
+
+
+def obter_contagem(count_query, params):
+    """
+    Contagem para o rodapé da paginação.
+
+    Returns:
+        (contagem, exata, assinatura): 'exata' é False quando 'contagem' é a estimativa
+        do planejador e o COUNT(*) ainda está rodando em segundo plano.
+    """
+    servico = get_servico_contagem()
+    assinatura = assinatura_filtro(count_query, params)
+    total = servico.exata(assinatura)
+    if total is not None:
+        return total, True, assinatura
+    erro = servico.falha(assinatura)
+    if erro is not None:
+        raise RuntimeError(f"A contagem exata falhou: {erro}")
+
+    engine = get_engine()
+    futuro = servico.iniciar(assinatura, count_query, params, engine)
+    estimativa = estimar_contagem(count_query, params, engine=engine)
+    if estimativa is None:
+        # Sem estimativa disponível: espera a contagem exata (que continua em segundo plano após o timeout)
+        try:
+            return futuro.result(timeout=TIMEOUT_CONTAGEM), True, assinatura
+        except TempoEsgotado:
+            raise TimeoutError(f"A contagem exata não terminou em {TIMEOUT_CONTAGEM}s.") from None
+    return estimativa, False, assinatura
+
+
+def contagem_pendente(assinatura):
+    """True enquanto o COUNT(*) exato da assinatura não terminou (com ou sem erro)."""
+    servico = get_servico_contagem()
+    return servico.exata(assinatura) is None and servico.falha(assinatura) is None and servico.em_andamento(assinatura)
+
+
+def formatar_contagem(contagem, exata):
+    """'1,234' ou '≈ 1,234' (estimativa)."""
+    return f"{contagem:,}" if exata else f"≈ {contagem:,}"
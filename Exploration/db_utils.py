@@ -1,37 +1,66 @@
 # Exploration/db_utils.py
 import os
-from sqlalchemy import create_engine
+import pandas as pd
 import streamlit as st
+from sqlalchemy.exc import DBAPIError
 
-# Config de conexão
-DB_HOST = os.environ.get('DB_HOST', '127.0.0.1')
-DB_PORT = os.environ.get('DB_PORT', '5432')
-DB_NAME = os.environ.get('DB_NAME', 'microdados')
-DB_USER = os.environ.get('DB_USER', 'postgres')
-DB_PASS = os.environ.get('DB_PASS', '123')
+from config.conexao import obter_engine
+
+# Conexão: variáveis de ambiente DB_* lidas por config/db_config.py (pool compartilhado em config/conexao.py)
+# 'postgres' (padrão) ou 'duckdb' (embarcado, sobre os arquivos Parquet do ETL)
+DB_BACKEND = os.environ.get('DB_BACKEND', 'postgres').lower()
 
 TABLE_NAME = "dados_enem_consolidado"
+ERRO_TABELA_INEXISTENTE = '42P01'  # SQLSTATE undefined_table do PostgreSQL
 
 
 @st.cache_resource
 def get_engine():
-    """Cria e cacheia o engine do SQLAlchemy."""
+    """
+    Retorna o engine do backend configurado em DB_BACKEND: o engine compartilhado do
+    SQLAlchemy (PostgreSQL, rótulo 'exploration') ou DuckDBBackend (DuckDB embarcado).
+    """
     try:
-        return create_engine(
-            f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-        )
+        if DB_BACKEND == 'duckdb':
+            from services.duckdb_backend import obter_backend_duckdb
+            return obter_backend_duckdb()
+        return obter_engine(rotulo='exploration')
     except Exception as e:
         st.error(f"Erro ao conectar ao banco de dados: {e}")
         return None
 
 
+def ler_sql(query, params=None, engine=None):
+    """
+    Executa a query no backend configurado e retorna um DataFrame.
+    Parâmetros no estilo %(nome)s, como os gerados por build_query_and_params.
+    'engine' permite chamar fora da thread do Streamlit (ex.: contagens em segundo plano).
+    """
+    engine = engine if engine is not None else get_engine()
+    if DB_BACKEND == 'duckdb':
+        return engine.execute_query(query, params)
+    try:
+        return pd.read_sql(query, engine, params=params)
+    except DBAPIError as e:
+        # TABELA_ENRIQUECIDA removida pelo ETL (recriada ou descartada) antes de o cache de
+        # tabela_enriquecida_disponivel expirar: revalida e refaz a consulta com os JOINs
+        codigo = getattr(e.orig, 'pgcode', None) or getattr(e.orig, 'sqlstate', None)
+        if codigo != ERRO_TABELA_INEXISTENTE or BASE_FROM_VIEW not in query:
+            raise
+        tabela_enriquecida_disponivel.clear()
+        return pd.read_sql(query.replace(BASE_FROM_VIEW, BASE_FROM_JOIN), engine, params=params)
+
+
 # ==========================================================
-#  BASE QUERY COM JOIN NA TABELA RELATORIO_MUNICIPIOS
+#  BASE QUERY: MICRODADOS + NOMES DO RELATORIO_MUNICIPIOS
 #  (Substitui os nomes de município pelos do relatório,
 #   mas mantém os MESMOS nomes de coluna: NO_MUNICIPIO_PROVA / ESC)
 # ==========================================================
 
-# Subquery que enriquece os microdados com o nome oficial do município
+# Tabela materializada pelo ETL (scripts/table_script/pos_carga.py, FASE 6F) com os nomes já resolvidos
+TABELA_ENRIQUECIDA = "dados_enem_enriquecido"
+
+# Mesmo conteúdo calculado na consulta: usado enquanto a tabela não existe (e no DuckDB, que não a exporta)
 BASE_SUBQUERY = f'''
     SELECT
         t1.*,
@@ -43,10 +72,37 @@ BASE_SUBQUERY = f'''
     LEFT JOIN "RELATORIO_MUNICIPIOS" AS mun_esc
         ON t1."CO_MUNICIPIO_ESC" = mun_esc."CO_MUNICIPIO"
 '''
+BASE_FROM_JOIN = f'FROM (\n{BASE_SUBQUERY}\n) AS base_enem'
 
 # FROM comum para todos os lugares que precisarem consultar os dados enriquecidos
-BASE_FROM_VIEW = f'FROM (\n{BASE_SUBQUERY}\n) AS base_enem'
+BASE_FROM_VIEW = f'FROM "{TABELA_ENRIQUECIDA}" AS base_enem'
 
 # Usados pela parte de filtros / paginação / gráficos
 BASE_QUERY = f'SELECT * {BASE_FROM_VIEW}'
 BASE_COUNT_QUERY = f'SELECT COUNT(*) {BASE_FROM_VIEW}'
+
+
+@st.cache_data(ttl=600)
+def tabela_enriquecida_disponivel():
+    """True se o ETL já materializou TABELA_ENRIQUECIDA (conferido a cada 10 minutos)."""
+    try:
+        df = ler_sql(
+            "SELECT table_name FROM information_schema.tables WHERE table_name = %(nome)s",
+            {"nome": TABELA_ENRIQUECIDA},
+        )
+        return not df.empty
+    except Exception:
+        return False
+
+
+def obter_base_from_view():
+    """BASE_FROM_VIEW se a tabela materializada existe; senão, o FROM com os JOINs (BASE_FROM_JOIN)."""
+    return BASE_FROM_VIEW if tabela_enriquecida_disponivel() else BASE_FROM_JOIN
+
+
+def obter_base_query():
+    return f'SELECT * {obter_base_from_view()}'
+
+
+def obter_base_count_query():
+    return f'SELECT COUNT(*) {obter_base_from_view()}'
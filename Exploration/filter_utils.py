@@ -6,23 +6,103 @@ import numpy as np
 from . import column_config as cc
 from .db_utils import (
     get_engine,
+    ler_sql,
     TABLE_NAME,
-    BASE_FROM_VIEW,   # <-- novo
-    BASE_QUERY,       # <-- novo
-    BASE_COUNT_QUERY  # <-- novo
+    TABELA_ENRIQUECIDA,
+    DB_BACKEND,
+    tabela_enriquecida_disponivel,
+    obter_base_from_view,
+    obter_base_query,
+    obter_base_count_query,
 )
 from .filter_config import TYPE_OVERRIDES
+from services.consultor_indices import registrar_consulta
 
 
 # ===================================================================
 # METADADOS DOS FILTROS
 # ===================================================================
 
+# Catálogo gerado pelo ETL (scripts/table_script/pos_carga.py, FASE 6B): resumo e valores distintos por ano e coluna
+TABELA_CATALOGO_FILTROS = "filter_metadata"
+LIMITE_OPCOES = 1000
+
+
+def _opcoes_do_catalogo(valores, tipo):
+    """Valores distintos de todos os anos, ordenados e limitados como no antigo 'ORDER BY ... LIMIT 1000'."""
+    if tipo in ('inteiro', 'decimal'):
+        opcoes = np.sort(valores['valor_num'].dropna().unique())[:LIMITE_OPCOES]
+        return opcoes.astype('int64') if tipo == 'inteiro' else opcoes
+    return np.sort(valores['valor_txt'].dropna().unique())[:LIMITE_OPCOES]
+
+
+def _metadata_do_catalogo(reverse_mapping, columns_to_ignore):
+    """
+    Monta os metadados a partir do catálogo 'filter_metadata' (uma única consulta).
+    Retorna None se o catálogo não existir ou estiver vazio (a página cai na varredura por coluna).
+    """
+    try:
+        catalogo = ler_sql(f'SELECT * FROM "{TABELA_CATALOGO_FILTROS}"')
+    except Exception:
+        return None
+    if catalogo.empty:
+        return None
+
+    resumo = catalogo[catalogo['registro'] == 'resumo']
+    valores_por_coluna = dict(tuple(catalogo[catalogo['registro'] == 'valor'].groupby('coluna')))
+    colunas = resumo.groupby('coluna').agg(
+        posicao=('posicao', 'min'), tipo=('tipo', 'first'), n_nulos=('n_nulos', 'sum'),
+        minimo=('minimo', 'min'), maximo=('maximo', 'max'),
+        minimo_txt=('minimo_txt', 'min'), maximo_txt=('maximo_txt', 'max'),
+    ).sort_values('posicao')
+
+    metadata = {}
+    all_mapped_columns = []
+    for coluna, info in colunas.iterrows():
+        original_col = str(coluna).upper()
+        mapped_column = cc.COLUMN_MAPPING.get(original_col, original_col)
+        if reverse_mapping.get(mapped_column) in columns_to_ignore:
+            continue
+        all_mapped_columns.append(mapped_column)
+
+        if reverse_mapping.get(mapped_column) is None:
+            metadata[mapped_column] = {'type': 'unsupported'}
+            continue
+
+        valores = valores_por_coluna.get(coluna, catalogo.iloc[0:0])
+        col_info = {'nulls': int(info['n_nulos'])}
+        if mapped_column.upper().startswith("CÓD."):
+            col_info['type'] = 'code'
+            col_info['options'] = sorted(int(v) for v in valores['valor_num'].dropna().unique())[:LIMITE_OPCOES]
+        elif info['tipo'] in ('inteiro', 'decimal'):
+            col_info['type'] = 'numeric'
+            col_info['min'] = int(np.floor(info['minimo'])) if pd.notnull(info['minimo']) else 0
+            col_info['max'] = int(np.ceil(info['maximo'])) if pd.notnull(info['maximo']) else 0
+        elif info['tipo'] == 'data':
+            col_info['type'] = 'datetime'
+            col_info['min'] = pd.to_datetime(info['minimo_txt'])
+            col_info['max'] = pd.to_datetime(info['maximo_txt'])
+        else:
+            col_info['type'] = 'categorical'
+            col_info['options'] = _opcoes_do_catalogo(valores, info['tipo'])
+
+        if TYPE_OVERRIDES.get(mapped_column) == "categorical" and col_info['type'] != "categorical":
+            col_info['type'] = "categorical"
+            col_info['options'] = _opcoes_do_catalogo(valores, info['tipo'])
+
+        metadata[mapped_column] = col_info
+
+    return metadata, all_mapped_columns, reverse_mapping
+
+
 @st.cache_data(ttl=3600)
 def get_filter_metadata():
     """
     Carrega metadados a partir da visão enriquecida (BASE_QUERY),
     já considerando os nomes vindos do RELATORIO_MUNICIPIOS.
+
+    Usa o catálogo 'filter_metadata' do ETL quando ele existe; senão, consulta
+    DISTINCT / MIN / MAX coluna a coluna (lento: uma varredura da visão por coluna).
     """
 
     engine = get_engine()
@@ -38,9 +118,14 @@ def get_filter_metadata():
     # Mapeamento label bonitinho → nome original da coluna
     reverse_mapping = {v: k for k, v in cc.COLUMN_MAPPING.items()}
 
-    # Carrega amostra já com JOIN enriquecido
+    resultado_catalogo = _metadata_do_catalogo(reverse_mapping, COLUMNS_TO_IGNORE)
+    if resultado_catalogo is not None:
+        return resultado_catalogo
+
+    # Carrega amostra já enriquecida (tabela materializada ou JOIN)
+    visao = obter_base_from_view()
     try:
-        df_sample_orig = pd.read_sql(f'{BASE_QUERY} LIMIT 5', engine)
+        df_sample_orig = ler_sql(f'SELECT * {visao} LIMIT 5')
     except Exception as e:
         st.error(
             f"Não foi possível carregar o schema da visão enriquecida "
@@ -94,11 +179,11 @@ def get_filter_metadata():
                 if mapped_column.upper().startswith("CÓD."):
                     sql = (
                         f'SELECT DISTINCT "{original_col}" '
-                        f'{BASE_FROM_VIEW} '
+                        f'{visao} '
                         f'WHERE "{original_col}" IS NOT NULL '
                         f'ORDER BY "{original_col}" ASC LIMIT 1000'
                     )
-                    unique_vals_df = pd.read_sql(sql, engine)
+                    unique_vals_df = ler_sql(sql)
 
                     col_info['type'] = 'code'
                     values = []
@@ -115,9 +200,9 @@ def get_filter_metadata():
                 elif pd.api.types.is_numeric_dtype(dtype):
                     sql = (
                         f'SELECT MIN("{original_col}"), MAX("{original_col}") '
-                        f'{BASE_FROM_VIEW}'
+                        f'{visao}'
                     )
-                    min_max_df = pd.read_sql(sql, engine)
+                    min_max_df = ler_sql(sql)
 
                     col_info['type'] = 'numeric'
                     col_info['min'] = (
@@ -137,10 +222,10 @@ def get_filter_metadata():
                 elif pd.api.types.is_datetime64_any_dtype(dtype):
                     sql = (
                         f'SELECT MIN("{original_col}"), MAX("{original_col}") '
-                        f'{BASE_FROM_VIEW} '
+                        f'{visao} '
                         f'WHERE "{original_col}" IS NOT NULL'
                     )
-                    min_max_df = pd.read_sql(sql, engine)
+                    min_max_df = ler_sql(sql)
 
                     col_info['type'] = 'datetime'
                     col_info['min'] = min_max_df.iloc[0, 0]
@@ -155,11 +240,11 @@ def get_filter_metadata():
                 ):
                     sql = (
                         f'SELECT DISTINCT "{original_col}" '
-                        f'{BASE_FROM_VIEW} '
+                        f'{visao} '
                         f'WHERE "{original_col}" IS NOT NULL '
                         f'ORDER BY "{original_col}" ASC LIMIT 1000'
                     )
-                    unique_vals_df = pd.read_sql(sql, engine)
+                    unique_vals_df = ler_sql(sql)
 
                     col_info['type'] = 'categorical'
                     col_info['options'] = (
@@ -178,11 +263,11 @@ def get_filter_metadata():
             if override_type == "categorical" and col_info["type"] != "categorical":
                 sql = (
                     f'SELECT DISTINCT "{original_col}" '
-                    f'{BASE_FROM_VIEW} '
+                    f'{visao} '
                     f'WHERE "{original_col}" IS NOT NULL '
                     f'ORDER BY "{original_col}" ASC LIMIT 1000'
                 )
-                unique_vals_df = pd.read_sql(sql, engine)
+                unique_vals_df = ler_sql(sql)
                 col_info["type"] = "categorical"
                 col_info["options"] = unique_vals_df.iloc[:, 0].dropna().unique()
 
@@ -357,11 +442,11 @@ def build_query_and_params(
     Constrói a query SQL (dados e contagem) e os parâmetros
     com base nos filtros ativos (usando 'unique_prefix').
 
-    Agora parte SEMPRE da visão enriquecida (BASE_QUERY / BASE_COUNT_QUERY),
-    que já faz JOIN com RELATORIO_MUNICIPIOS.
+    Agora parte SEMPRE da visão enriquecida (BASE_QUERY / BASE_COUNT_QUERY):
+    a tabela dados_enem_enriquecido do ETL ou, sem ela, o JOIN com RELATORIO_MUNICIPIOS.
     """
-    base_query = BASE_QUERY
-    count_query = BASE_COUNT_QUERY
+    base_query = obter_base_query()
+    count_query = obter_base_count_query()
 
     where_clauses = []
     params = {}
@@ -428,22 +513,146 @@ def build_query_and_params(
         where_string = " WHERE " + " AND ".join(where_clauses)
         base_query += where_string
         count_query += where_string
+        # Colunas filtradas, para o consultor de índices (scripts/consultor_indices.py)
+        if DB_BACKEND != 'duckdb':
+            tabela = TABELA_ENRIQUECIDA if tabela_enriquecida_disponivel() else TABLE_NAME
+            registrar_consulta(f'exploration:{unique_prefix}', tabela, count_query, params)
 
     if enable_pagination:
         page_size = st.session_state.get('page_size', 100)
         page = st.session_state.get('page', 1)
 
         if page_size == "Todos":
-            final_query = base_query + " ORDER BY 1;"
+            final_query = base_query + f" ORDER BY {ORDEM_PAGINACAO};"
         else:
-            offset = (page - 1) * page_size
-            final_query = (
-                base_query
-                + " ORDER BY 1 LIMIT %(limit)s OFFSET %(offset)s;"
+            final_query, params_pagina = montar_consulta_paginada(
+                base_query, bool(where_clauses), params, page, page_size, unique_prefix
             )
-            params['limit'] = page_size
-            params['offset'] = offset
+            params.update(params_pagina)
     else:
         final_query = base_query + ";"
 
     return final_query, count_query, params
+
+
+# ===================================================================
+# PAGINAÇÃO POR SEEK (KEYSET)
+# ===================================================================
+# Em vez de OFFSET (que obriga o banco a gerar e descartar todas as linhas anteriores),
+# cada página começa logo depois da última chave (NU_ANO, NU_INSCRICAO) da página anterior.
+# As chaves de início/fim das páginas já visitadas ficam no session_state; para saltos
+# para páginas nunca visitadas usa-se um índice esparso com a chave a cada PASSO_MARCOS linhas.
+
+CHAVE_PAGINACAO = ('NU_ANO', 'NU_INSCRICAO')
+ORDEM_PAGINACAO = ", ".join(f'"{c}"' for c in CHAVE_PAGINACAO)
+PASSO_MARCOS = 5000
+
+# Parâmetros exclusivos da query paginada (não entram na query de contagem)
+PARAMETROS_PAGINACAO = ('limit', 'offset', 'cursor_ano', 'cursor_inscricao')
+
+
+def _estado_paginacao(unique_prefix, base_query, params, page_size):
+    """
+    Chaves de início ('primeira') e fim ('ultima') das páginas já carregadas.
+    O estado é descartado quando os filtros ou o tamanho de página mudam.
+    """
+    assinatura = (base_query, tuple(sorted(params.items())), page_size)
+    state_key = f"{unique_prefix}_paginacao"
+    estado = st.session_state.get(state_key)
+    if estado is None or estado['assinatura'] != assinatura:
+        estado = {'assinatura': assinatura, 'primeira': {}, 'ultima': {}}
+        st.session_state[state_key] = estado
+    return estado
+
+
+@st.cache_data(ttl=3600)
+def carregar_marcos_paginacao(base_query, params_tuple, passo=PASSO_MARCOS):
+    """
+    Índice esparso das fronteiras: chave da linha passo, 2*passo, 3*passo... na ordem da paginação.
+    Uma única varredura, feita só no primeiro salto para uma página não visitada.
+    """
+    query_chaves = base_query.replace('SELECT *', f'SELECT {ORDEM_PAGINACAO}', 1)
+    query = f'''
+        SELECT {ORDEM_PAGINACAO} FROM (
+            SELECT {ORDEM_PAGINACAO}, ROW_NUMBER() OVER (ORDER BY {ORDEM_PAGINACAO}) AS rn
+            FROM ({query_chaves}) AS filtradas
+        ) AS numeradas
+        WHERE MOD(rn, {int(passo)}) = 0
+        ORDER BY rn
+    '''
+    df = ler_sql(query, dict(params_tuple) or None)
+    return [tuple(int(v) for v in linha) for linha in df.itertuples(index=False)]
+
+
+def _ponto_de_partida(estado, base_query, params, page, page_size):
+    """Melhor (cursor, offset) para começar a página: última chave visitada antes dela ou marco do índice esparso."""
+    linha_inicial = (page - 1) * page_size
+    cursor, offset = None, linha_inicial
+
+    # Páginas visitadas antes da página pedida
+    visitadas = [p for p in estado['ultima'] if p < page]
+    if visitadas:
+        p = max(visitadas)
+        cursor, offset = estado['ultima'][p], (page - 1 - p) * page_size
+
+    # Marco do índice esparso mais próximo (só quando o salto é maior que um passo)
+    if offset >= PASSO_MARCOS:
+        marcos = carregar_marcos_paginacao(base_query, tuple(sorted(params.items())))
+        k = min(linha_inicial // PASSO_MARCOS, len(marcos))
+        if k > 0 and linha_inicial - k * PASSO_MARCOS < offset:
+            cursor, offset = marcos[k - 1], linha_inicial - k * PASSO_MARCOS
+    return cursor, offset
+
+
+def montar_consulta_paginada(base_query, tem_where, params, page, page_size, unique_prefix="data"):
+    """
+    Monta a query da página 'page' com paginação por seek.
+
+    - página seguinte a uma já carregada: começa depois da última chave dela (custo constante);
+    - página anterior a uma já carregada: lê para trás a partir da primeira chave dela;
+    - salto: parte do marco do índice esparso mais próximo, com OFFSET menor que PASSO_MARCOS.
+
+    Returns:
+        (query, parâmetros da paginação)
+    """
+    estado = _estado_paginacao(unique_prefix, base_query, params, page_size)
+    conector = " AND " if tem_where else " WHERE "
+    condicao_depois = f'({ORDEM_PAGINACAO}) > (%(cursor_ano)s, %(cursor_inscricao)s)'
+    params_pagina = {'limit': page_size}
+
+    if page > 1 and (page + 1) in estado['primeira'] and (page - 1) not in estado['ultima']:
+        cursor = estado['primeira'][page + 1]
+        params_pagina.update({'cursor_ano': cursor[0], 'cursor_inscricao': cursor[1]})
+        ordem_inversa = ", ".join(f'"{c}" DESC' for c in CHAVE_PAGINACAO)
+        query = (
+            f"SELECT * FROM ({base_query}{conector}({ORDEM_PAGINACAO}) < (%(cursor_ano)s, %(cursor_inscricao)s) "
+            f"ORDER BY {ordem_inversa} LIMIT %(limit)s) AS pagina ORDER BY {ORDEM_PAGINACAO};"
+        )
+        return query, params_pagina
+
+    if page <= 1:
+        cursor, offset = None, 0
+    elif (page - 1) in estado['ultima']:
+        cursor, offset = estado['ultima'][page - 1], 0
+    else:
+        cursor, offset = _ponto_de_partida(estado, base_query, params, page, page_size)
+
+    query = base_query
+    if cursor is not None:
+        query += conector + condicao_depois
+        params_pagina.update({'cursor_ano': cursor[0], 'cursor_inscricao': cursor[1]})
+    query += f" ORDER BY {ORDEM_PAGINACAO} LIMIT %(limit)s"
+    if offset:
+        query += " OFFSET %(offset)s"
+        params_pagina['offset'] = offset
+    return query + ";", params_pagina
+
+
+def registrar_pagina_carregada(unique_prefix, page, df):
+    """Guarda as chaves da primeira e da última linha da página (colunas originais, antes do rename)."""
+    estado = st.session_state.get(f"{unique_prefix}_paginacao")
+    if estado is None or df.empty or not all(c in df.columns for c in CHAVE_PAGINACAO):
+        return
+    chaves = df[list(CHAVE_PAGINACAO)]
+    estado['primeira'][page] = tuple(int(v) for v in chaves.iloc[0])
+    estado['ultima'][page] = tuple(int(v) for v in chaves.iloc[-1])
@@ -2,5 +2,6 @@
 Módulo de configuração do projeto.
 """
 from .db_config import DatabaseConfig
+from .conexao import obter_engine
 
-__all__ = ['DatabaseConfig']
+__all__ = ['DatabaseConfig', 'obter_engine']
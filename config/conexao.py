@@ -0,0 +1,114 @@
+"""
+Conexões com o PostgreSQL compartilhadas pelo processo.
+
+Um único engine do SQLAlchemy (e portanto um único pool) por banco, usado por todas as páginas
+e sessões do Streamlit, pelo DatabaseManager e pelo módulo de predição: o processo abre no
+máximo pool_size + max_overflow conexões (DatabaseConfig), por mais usuários que haja.
+
+Cada página pede o engine com o seu rótulo (obter_engine(rotulo='dashboards')). O rótulo
+vira o application_name da conexão enquanto a página a usa ('enem-app:dashboards'), para
+identificar as consultas em pg_stat_activity e nos logs do Postgres.
+"""
+import threading
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+
+from .db_config import DatabaseConfig
+
+OPCAO_ROTULO = 'rotulo_consulta'  # execution option com o application_name da página
+
+_engines: Dict[Tuple, Engine] = {}
+_engines_rotulados: Dict[Tuple, Engine] = {}
+_lock_engines = threading.Lock()
+
+
+def _chave(config: DatabaseConfig) -> Tuple:
+    return (
+        config.get_connection_string(), config.pool_size, config.max_overflow, config.pool_timeout,
+        config.pool_recycle, config.pool_pre_ping, config.statement_timeout_ms, config.application_name,
+    )
+
+
+def _argumentos_conexao(config: DatabaseConfig) -> Dict[str, str]:
+    argumentos = {'application_name': config.application_name, 'client_encoding': 'utf8'}
+    if config.statement_timeout_ms > 0:
+        argumentos['options'] = f'-c statement_timeout={int(config.statement_timeout_ms)}'
+    return argumentos
+
+
+def _registrar_rotulos(engine: Engine, nome_padrao: str) -> None:
+    """Troca o application_name da conexão para o rótulo de quem a pediu, só quando ele muda."""
+
+    @event.listens_for(engine.pool, 'connect')
+    def _ao_conectar(dbapi_connection, connection_record):
+        connection_record.info['application_name'] = nome_padrao
+
+    @event.listens_for(engine, 'engine_connect')
+    def _ao_usar(connection):
+        rotulo = connection.get_execution_options().get(OPCAO_ROTULO, nome_padrao)
+        info = connection.connection.info
+        if info.get('application_name') == rotulo:
+            return
+        # Direto no DBAPI e com commit: um SET dentro de uma transação desfeita (rollback
+        # ao devolver a conexão ao pool) voltaria ao valor anterior
+        dbapi_connection = connection.connection.dbapi_connection
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute("SELECT set_config('application_name', %s, false)", (rotulo,))
+        finally:
+            cursor.close()
+        dbapi_connection.commit()
+        info['application_name'] = rotulo
+
+
+def _criar_engine(config: DatabaseConfig) -> Engine:
+    engine = create_engine(
+        config.get_connection_string(),
+        pool_size=config.pool_size,
+        max_overflow=config.max_overflow,
+        pool_timeout=config.pool_timeout,
+        pool_recycle=config.pool_recycle,
+        pool_pre_ping=config.pool_pre_ping,
+        connect_args=_argumentos_conexao(config),
+    )
+    _registrar_rotulos(engine, config.application_name)
+    return engine
+
+
+def obter_engine(config: Optional[DatabaseConfig] = None, rotulo: Optional[str] = None) -> Engine:
+    """
+    Engine compartilhado do banco de 'config' (padrão: DatabaseConfig() das variáveis de ambiente).
+    Com 'rotulo', devolve uma visão do mesmo engine (mesmo pool) cujas conexões usam
+    application_name '<DB_APPLICATION_NAME>:<rotulo>'.
+    """
+    config = config or DatabaseConfig()
+    chave = _chave(config)
+    with _lock_engines:
+        engine = _engines.get(chave)
+        if engine is None:
+            engine = _engines[chave] = _criar_engine(config)
+        if not rotulo:
+            return engine
+        chave_rotulo = chave + (rotulo,)
+        rotulado = _engines_rotulados.get(chave_rotulo)
+        if rotulado is None:
+            rotulado = engine.execution_options(**{OPCAO_ROTULO: f'{config.application_name}:{rotulo}'})
+            _engines_rotulados[chave_rotulo] = rotulado
+        return rotulado
+
+
+def status_pools() -> Dict[str, str]:
+    """Estado de cada pool do processo (conexões em uso, livres e em overflow), para diagnóstico."""
+    with _lock_engines:
+        return {engine.url.render_as_string(hide_password=True): engine.pool.status() for engine in _engines.values()}
+
+
+def descartar_engines() -> None:
+    """Fecha todos os pools do processo (ex.: ao fim de um script ou nos testes)."""
+    with _lock_engines:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+        _engines_rotulados.clear()
@@ -1,23 +1,67 @@
 """
 Configuração centralizada do banco de dados.
+
+Sem argumentos, tudo vem das variáveis de ambiente (mesmos nomes em todo o projeto):
+    DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD (DB_PASS é aceito como nome antigo),
+    DB_BACKEND ('postgres' ou 'duckdb') e DB_DRIVER (driver do SQLAlchemy, padrão 'postgresql' = psycopg2).
+Pool de conexões (config/conexao.py, um por processo):
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING,
+    DB_STATEMENT_TIMEOUT_MS (0 = sem limite) e DB_APPLICATION_NAME.
+Os padrões são os do docker-compose.yml.
 """
+import os
+
+
+def _env_int(nome, padrao):
+    valor = os.getenv(nome)
+    return int(valor) if valor not in (None, '') else padrao
+
+
+def _env_bool(nome, padrao):
+    valor = os.getenv(nome)
+    if valor in (None, ''):
+        return padrao
+    return valor.strip().lower() not in ('0', 'false', 'nao', 'não', 'no', 'off')
+
+
+def senha_do_ambiente(padrao='aluno'):
+    """DB_PASSWORD; DB_PASS (nome usado pelas versões antigas do Dashboard, da Exploration e do ETL) se ausente."""
+    return os.getenv('DB_PASSWORD') or os.getenv('DB_PASS') or padrao
+
 
 class DatabaseConfig:
     """Classe para armazenar configurações do banco de dados."""
 
-    def __init__(self, user='postgres', password='postgres', host='localhost',
-                 database='microdados', port=5432):
-        self.user = user
-        self.password = password
-        self.host = host
-        self.database = database
-        self.port = port
+    def __init__(self, user=None, password=None, host=None,
+                 database=None, port=None, backend=None, driver=None):
+        self.user = user or os.getenv('DB_USER', 'postgres')
+        self.password = password or senha_do_ambiente()
+        self.host = host or os.getenv('DB_HOST', 'localhost')
+        self.database = database or os.getenv('DB_NAME', 'microdados')
+        self.port = port or _env_int('DB_PORT', 5432)
+        self.driver = driver or os.getenv('DB_DRIVER', 'postgresql')
         self.table_name = 'dados_enem_consolidado'
+        # 'postgres' (padrão) ou 'duckdb' (embarcado, sobre os arquivos Parquet do ETL)
+        self.backend = (backend or os.getenv('DB_BACKEND', 'postgres')).lower()
 
-    def get_connection_string(self, driver='postgresql'):
-        """Retorna a string de conexão para SQLAlchemy."""
+        # Pool compartilhado pelo processo: no máximo pool_size + max_overflow conexões
+        self.pool_size = _env_int('DB_POOL_SIZE', 5)
+        self.max_overflow = _env_int('DB_MAX_OVERFLOW', 10)
+        self.pool_timeout = _env_int('DB_POOL_TIMEOUT', 30)  # segundos esperando uma conexão livre
+        self.pool_recycle = _env_int('DB_POOL_RECYCLE', 1800)  # segundos até reabrir uma conexão
+        self.pool_pre_ping = _env_bool('DB_POOL_PRE_PING', True)
+        self.statement_timeout_ms = _env_int('DB_STATEMENT_TIMEOUT_MS', 0)
+        self.application_name = os.getenv('DB_APPLICATION_NAME', 'enem-app')
+
+    def get_connection_string(self, driver=None):
+        """Retorna a string de conexão para SQLAlchemy (driver padrão: self.driver)."""
+        driver = driver or self.driver
         return f"{driver}://{self.user}:{self.password}@{self.host}:{self.port}/{self.database}"
 
+    def sqlalchemy_url(self):
+        """String de conexão com o driver psycopg2 explícito."""
+        return self.get_connection_string('postgresql+psycopg2')
+
     def get_psycopg2_params(self):
         """Retorna dicionário com parâmetros para psycopg2."""
         return {
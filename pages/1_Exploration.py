@@ -1,20 +1,22 @@
 import streamlit as st
 import pandas as pd
-from sqlalchemy import create_engine
 import numpy as np
 import altair as alt
 
 # Importa os módulos refatorados
 try:
     from Exploration import column_config as cc
-    from Exploration.db_utils import get_engine, TABLE_NAME
+    from Exploration.db_utils import ler_sql, TABLE_NAME
     from Exploration.filter_utils import (
         get_filter_metadata, 
         render_filter_widgets, 
-        build_query_and_params
+        build_query_and_params,
+        registrar_pagina_carregada,
+        PARAMETROS_PAGINACAO
     )
     from Exploration import graph_utils as gu
     from Exploration.pdf_utils import dataframe_to_pdf_bytes
+    from Exploration.count_utils import obter_contagem, contagem_pendente, formatar_contagem
 
 except ImportError:
     st.error("Erro ao carregar módulos. Verifique a estrutura de pastas 'Exploration'.")
@@ -60,27 +62,34 @@ def load_cached_metadata():
 
 @st.cache_data(ttl=3600)
 def load_paginated_data(query, params_tuple):
-    engine = get_engine()
     params = dict(params_tuple)
     try:
-        return pd.read_sql(query, engine, params=params)
+        return ler_sql(query, params)
     except Exception as e:
         st.error(f"Erro ao executar a query de dados: {e}")
         return pd.DataFrame()
 
-@st.cache_data(ttl=3600)
 def get_filtered_row_count(count_query, params_tuple):
-    engine = get_engine()
+    """
+    Retorna (total, exata, assinatura). Sem cache_data: enquanto o COUNT(*) roda em
+    segundo plano o total é a estimativa do planejador (exata=False); o valor exato
+    fica memorizado em count_utils, compartilhado entre as sessões.
+    """
     params = dict(params_tuple)
     try:
-        return pd.read_sql(count_query, engine, params=params).iloc[0, 0]
+        return obter_contagem(count_query, params)
     except Exception as e:
         st.error(f"Erro ao executar a query de contagem: {e}")
-        return 0
+        return 0, True, None
+
+@st.fragment(run_every=1)
+def aguardar_contagem_exata(assinatura):
+    """Verifica a cada segundo se a contagem exata terminou e, então, redesenha a página."""
+    if not contagem_pendente(assinatura):
+        st.rerun()
 
 @st.cache_data(ttl=3600)
 def load_graph_data(columns: list, query_tuple: tuple, params_tuple: tuple, reverse_mapping: dict):
-    engine = get_engine()
     base_query = query_tuple[0]
     params = dict(params_tuple)
     db_cols = []
@@ -102,7 +111,7 @@ def load_graph_data(columns: list, query_tuple: tuple, params_tuple: tuple, reve
     query = base_query.replace('SELECT *', f'SELECT {", ".join(db_cols)}')
     
     try:
-        df = pd.read_sql_query(query, engine, params=params)
+        df = ler_sql(query, params)
         # Aumentei um pouco o limite de warning aqui também, caso precise
         if len(df) > 100000:
             st.info(f"Dados filtrados ({len(df):,} linhas) são muito grandes. Exibindo amostra de 100.000 linhas.")
@@ -146,17 +155,21 @@ try:
             unique_prefix="data"  # Usa o prefixo 'data'
         )
 
-        count_params_tuple = tuple(sorted(p for p in params_paginados.items() if p[0] not in ('limit', 'offset')))
+        count_params_tuple = tuple(sorted(p for p in params_paginados.items() if p[0] not in PARAMETROS_PAGINACAO))
         data_params_tuple = tuple(sorted(params_paginados.items()))
 
         # 5a. Executar a query de contagem
         with st.spinner("Carregando total de registros..."):
-            total_rows = get_filtered_row_count(count_query, count_params_tuple)
+            total_rows, contagem_exata, assinatura_contagem = get_filtered_row_count(count_query, count_params_tuple)
             st.session_state.total_rows = total_rows
+        if not contagem_exata:
+            aguardar_contagem_exata(assinatura_contagem)
 
         # 6a. Executar a query de dados
         with st.spinner(f"Carregando página {st.session_state.page}..."):
             df = load_paginated_data(query_paginada, data_params_tuple)
+            # Guarda as chaves da página para a paginação por seek (próxima/anterior sem OFFSET)
+            registrar_pagina_carregada("data", st.session_state.page, df)
 
         # 7a. Renomear colunas
         if not df.empty:
@@ -196,7 +209,7 @@ try:
             
             if show_pagination_controls:
                     st.markdown(
-                    f"<p style='text-align: center; margin-bottom: 2px;'>Página <b>{st.session_state.page}</b> de <b>{total_pages if total_pages > 0 else 1}</b> | Total de <b>{st.session_state.total_rows:,}</b> linhas filtradas</p>",
+                    f"<p style='text-align: center; margin-bottom: 2px;'>Página <b>{st.session_state.page}</b> de <b>{total_pages if total_pages > 0 else 1}</b> | Total de <b>{formatar_contagem(st.session_state.total_rows, contagem_exata)}</b> linhas filtradas</p>",
                     unsafe_allow_html=True
                 )
             else:
@@ -254,7 +267,13 @@ try:
                     st.rerun()
 
             with col4:
-                is_last_page = (st.session_state.page >= total_pages)
+                if not show_pagination_controls:
+                    is_last_page = True  # "Todos": page_size é texto e não há próxima página
+                elif contagem_exata:
+                    is_last_page = (st.session_state.page >= total_pages)
+                else:
+                    # Total ainda estimado: a página incompleta é que indica o fim
+                    is_last_page = len(df) < st.session_state.page_size
                 
                 if st.button("Próximo ➡", disabled=(is_last_page or not show_pagination_controls), use_container_width=True):
                     change_page(1)
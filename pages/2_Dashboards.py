@@ -12,7 +12,11 @@ import numpy as np
 
 from Dashboards.db.connection import get_engine
 
-from Dashboards.db.queries import carregar_dados_db, buscar_municipios_por_estado
+from Dashboards.db.queries import carregar_opcoes_filtros, buscar_municipios_por_estado
+from Dashboards.db.agregacoes import (
+    resumo_kpis, resumo_por_ano, contagem_por_uf, medias_por_area, histograma_redacao,
+    estatisticas_correlacao, correlacao_de_estatisticas, contagem_por_coluna, media_geral_por_renda
+)
 
 # --- Configuração da Página ---
 st.set_page_config(page_title="Dashboard ENEM", layout="wide")
@@ -28,9 +32,9 @@ tabela = os.getenv('NOME_TABELA')
 # --- Conexão e Carga de Dados ---
 engine = get_engine()
     
-df_principal, anos_disponiveis_db, faixas_disponiveis_num_db, conclusoes_disponiveis_num_db, geojson_brasil = carregar_dados_db(engine)
+anos_disponiveis_db, faixas_disponiveis_num_db, conclusoes_disponiveis_num_db, geojson_brasil = carregar_opcoes_filtros(engine)
 
-if df_principal.empty:
+if not anos_disponiveis_db:
     st.error("Nenhum dado foi carregado do banco de dados. Verifique o SCRIPT.py e a conexão.")
     st.stop()
 
@@ -252,27 +256,18 @@ def criar_kpi_lingua(titulo, val_ing, val_esp, perc_ing, perc_esp, formato_num="
     except Exception as e: pass
     return f"<div class='kpi-container'><div class='kpi-title'>{titulo}</div><div class='lang-kpi-content'><div><div class='lang-row'><span class='lang-title'>Inglês</span><span class='lang-value'>{val_ing_fmt}</span></div><div class='progress-bar-container'><div class='progress-bar-fill' style='width: {barra_ing}%;'></div></div></div><div><div class='lang-row'><span class='lang-title'>Espanhol</span><span class='lang-value'>{val_esp_fmt}</span></div><div class='progress-bar-container'><div class='progress-bar-fill' style='width: {barra_esp}%;'></div></div></div></div></div>"
 
-def criar_tabela_anual(df_filtrado):
-    if df_filtrado.empty or 'NU_ANO' not in df_filtrado.columns: return pd.DataFrame(columns=['Ano', 'Total Inscritos', 'Total Confirmados', '% Presentes', '% Ausentes'])
-    df_agrupar = df_filtrado.dropna(subset=['NU_ANO']); df_agrupar = df_agrupar[pd.to_numeric(df_agrupar['NU_ANO'], errors='coerce').notna()]
-    if df_agrupar.empty: return pd.DataFrame(columns=['Ano', 'Total Inscritos', 'Total Confirmados', '% Presentes', '% Ausentes'])
-    df_agrupar['NU_ANO'] = df_agrupar['NU_ANO'].astype(int)
-    df_anual = df_agrupar.groupby('NU_ANO').agg(total_inscritos=pd.NamedAgg(column='NU_INSCRICAO', aggfunc='count'), total_presentes=pd.NamedAgg(column='INDICADOR_ABSENTEISMO', aggfunc=lambda x: (x == 'Presente').sum()), total_ausentes_dia=pd.NamedAgg(column='INDICADOR_ABSENTEISMO', aggfunc=lambda x: (x == 'Ausente em um ou mais dias').sum())).reset_index()
-    confirmados_mask = df_agrupar['INDICADOR_ABSENTEISMO'] != 'Ausente em um ou mais dias'
-    if confirmados_mask.any(): df_confirmados_ano = df_agrupar[confirmados_mask].groupby('NU_ANO').size().rename('total_confirmados'); df_anual = pd.merge(df_anual, df_confirmados_ano, on='NU_ANO', how='left').fillna({'total_confirmados': 0})
-    else: df_anual['total_confirmados'] = 0
-    df_anual['total_confirmados'] = df_anual['total_confirmados'].astype(int)
+def criar_tabela_anual(df_anual):
+    if df_anual.empty or 'NU_ANO' not in df_anual.columns: return pd.DataFrame(columns=['Ano', 'Total Inscritos', 'Total Confirmados', '% Presentes', '% Ausentes'])
+    df_anual = df_anual.copy(); df_anual['NU_ANO'] = df_anual['NU_ANO'].astype(int)
+    for col in ['total_inscritos', 'total_confirmados', 'total_presentes', 'total_ausentes_dia']: df_anual[col] = df_anual[col].astype(int)
     df_anual['perc_presentes'] = (df_anual['total_presentes'] / df_anual['total_inscritos']).replace([np.inf, -np.inf, np.nan], 0)
     df_anual['perc_ausentes'] = (df_anual['total_ausentes_dia'] / df_anual['total_inscritos']).replace([np.inf, -np.inf, np.nan], 0)
     df_anual.rename(columns={'NU_ANO': 'Ano', 'total_inscritos': 'Total Inscritos', 'total_confirmados': 'Total Confirmados', 'perc_presentes': '% Presentes', 'perc_ausentes': '% Ausentes'}, inplace=True)
     return df_anual[['Ano', 'Total Inscritos', 'Total Confirmados', '% Presentes', '% Ausentes']].sort_values(by='Ano', ascending=False)
 
-def criar_donut_genero(df_filtrado):
-    if df_filtrado.empty or 'TP_SEXO' not in df_filtrado.columns or df_filtrado['TP_SEXO'].isnull().all(): return None
-    df_genero_data = df_filtrado.dropna(subset=['TP_SEXO']); 
-    if df_genero_data.empty: return None
-    df_genero = df_genero_data['TP_SEXO'].astype(str).value_counts().reset_index(); 
-    if df_genero.empty: return None
+def criar_donut_genero(df_contagem):
+    if df_contagem.empty: return None
+    df_genero = df_contagem.sort_values('Count', ascending=False).reset_index(drop=True)
     df_genero.columns = ['Genero_Code', 'Count']; df_genero['Genero'] = df_genero['Genero_Code'].map({'F': 'Feminino', 'M': 'Masculino'}).fillna('Não declarado')
     if df_genero.empty: return None
     try:
@@ -284,13 +279,9 @@ def criar_donut_genero(df_filtrado):
 
 BR_CENTER = {"lat": -14.2350, "lon": -51.9253}; BR_ZOOM = 3
 
-def criar_mapa_brasil(df_para_contagem, geojson_data):
+def criar_mapa_brasil(df_mapa, geojson_data):
     if geojson_data is None: return None
-    if df_para_contagem.empty or 'SG_UF_PROVA' not in df_para_contagem.columns: return None
-    df_mapa_data = df_para_contagem.dropna(subset=['SG_UF_PROVA']); 
-    if df_mapa_data.empty: return None
-    df_mapa = df_mapa_data.groupby('SG_UF_PROVA').agg(contagem_inscritos = pd.NamedAgg(column='NU_INSCRICAO', aggfunc='count')).reset_index()
-    if df_mapa.empty: return None
+    if df_mapa.empty or 'SG_UF_PROVA' not in df_mapa.columns: return None
     
     map_zoom = BR_ZOOM
     map_center = BR_CENTER
@@ -313,10 +304,9 @@ def placeholder_mapa():
     map_icon_svg = """<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 24 24" fill="currentColor" class="w-6 h-6"><path fill-rule="evenodd" d="M8.161 2.58a1.875 1.875 0 0 1 1.678 0l4.993 2.498c.106.052.23.052.336 0l4.993-2.498a1.875 1.875 0 0 1 2.349 1.678V15.36a1.875 1.875 0 0 1-1.678 1.846l-4.993 1.248a1.875 1.875 0 0 1-.336 0l-4.993-1.248a1.875 1.875 0 0 0-1.678 0l-4.993 1.248A1.875 1.875 0 0 1 .75 15.36V4.258c0-.751.43-1.43.912-1.745l4.993-2.498a1.875 1.875 0 0 1 1.506.567zM10.5 6a.75.75 0 0 1 .75.75v6.563l2.25-1.125a.75.75 0 0 1 1.002 1.002l-3.75 3.75a.75.75 0 0 1-1.002 0L6.75 13.19l1.002-1.002a.75.75 0 0 1 1.002 0l1 .5V6.75A.75.75 0 0 1 10.5 6z" clip-rule="evenodd" /><path d="M11.96 18.937a1.875 1.875 0 0 1-1.678 0l-4.993-1.248a1.875 1.875 0 0 1-1.506-.567V19.5c0 .933.743 1.705 1.678 1.846l4.993 1.248c.106.026.23.026.336 0l4.993-1.248A1.875 1.875 0 0 0 18.75 19.5v-2.375a1.875 1.875 0 0 1-1.506.567L11.96 18.937z" /></svg>"""
     return f"""<div class='map-placeholder'>{map_icon_svg}<p>Mapa Interativo do Brasil<br><small>(Falha ao carregar ou sem dados)</small></p></div>"""
 
-def criar_barras_medias(df_filtrado):
-    cols_notas = ['NU_NOTA_CN', 'NU_NOTA_CH', 'NU_NOTA_LC', 'NU_NOTA_MT', 'NU_NOTA_REDACAO']
-    if df_filtrado.empty or not all(col in df_filtrado.columns for col in cols_notas): return None
-    medias = df_filtrado[cols_notas].mean().reset_index(); medias.columns = ['Area_Code', 'Media']
+def criar_barras_medias(medias):
+    if medias.empty or medias['Media'].isna().all(): return None
+    medias = medias.copy()
     map_areas = {'NU_NOTA_CN': 'Ciências Nat.', 'NU_NOTA_CH': 'Ciências Hum.', 'NU_NOTA_LC': 'Linguagens', 'NU_NOTA_MT': 'Matemática', 'NU_NOTA_REDACAO': 'Redação'}
     medias['Area'] = medias['Area_Code'].map(map_areas)
     try:
@@ -326,23 +316,20 @@ def criar_barras_medias(df_filtrado):
         return fig
     except Exception as e: return None
 
-def criar_histograma_redacao(df_filtrado):
-    if df_filtrado.empty or 'NU_NOTA_REDACAO' not in df_filtrado.columns: return None
-    df_redacao = df_filtrado.dropna(subset=['NU_NOTA_REDACAO']); 
-    if df_redacao.empty: return None
+def criar_histograma_redacao(df_faixas, largura_faixa=20):
+    if df_faixas.empty: return None
     try:
-        fig = px.histogram(df_redacao, x='NU_NOTA_REDACAO', title="Dispersão das Notas de Redação", color_discrete_sequence=['#a95aed'])
-        fig.update_traces(hovertemplate='Nota: %{x}<br>Contagem: %{y}<extra></extra>')
+        # Faixas já contadas no banco: barras centradas em cada faixa, com a largura da faixa
+        fig = px.bar(df_faixas, x=df_faixas['inicio_faixa'] + largura_faixa / 2, y='contagem', title="Dispersão das Notas de Redação", color_discrete_sequence=['#a95aed'], custom_data=['inicio_faixa'])
+        fig.update_traces(width=largura_faixa, hovertemplate='Nota: %{customdata[0]}<br>Contagem: %{y}<extra></extra>')
         fig.update_layout(showlegend=False, margin=dict(t=50, b=10, l=10, r=10), paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color='var(--text)', size=11), title_font_size=16, title_x=0.05, title_y=0.95, yaxis_title="Contagem", xaxis_title="Nota da Redação", bargap=0.1, height=320)
         return fig
     except Exception as e: return None
 
-def criar_heatmap_correlacao(df_filtrado):
-    cols_notas = ['NU_NOTA_CN', 'NU_NOTA_CH', 'NU_NOTA_LC', 'NU_NOTA_MT', 'NU_NOTA_REDACAO']
-    if df_filtrado.empty or not all(col in df_filtrado.columns for col in cols_notas): return None
-    df_corr = df_filtrado[cols_notas].dropna(); 
-    if len(df_corr) < 2: return None 
-    corr = df_corr.corr()
+def criar_heatmap_correlacao(estatisticas):
+    # estatisticas = (n, somas, produtos cruzados) calculados no banco
+    corr = correlacao_de_estatisticas(*estatisticas)
+    if corr is None: return None
     cols_notas_map = {'NU_NOTA_CN': 'Ciências Nat.', 'NU_NOTA_CH': 'Ciências Hum.', 'NU_NOTA_LC': 'Linguagens', 'NU_NOTA_MT': 'Matemática', 'NU_NOTA_REDACAO': 'Redação'}
     corr.columns = [cols_notas_map.get(c, c) for c in corr.columns]; corr.index = [cols_notas_map.get(i, i) for i in corr.index]
     try:
@@ -363,11 +350,9 @@ def criar_heatmap_correlacao(df_filtrado):
         return fig
     except Exception as e: return None
 
-def criar_barras_conclusao(df_filtrado):
-    if df_filtrado.empty or 'TP_ST_CONCLUSAO' not in df_filtrado.columns: return None
-    df_data = df_filtrado.dropna(subset=['TP_ST_CONCLUSAO']); 
-    if df_data.empty: return None
-    df_grouped = df_data['TP_ST_CONCLUSAO'].value_counts().reset_index(); df_grouped.columns = ['Codigo', 'Count']; df_grouped['Percentual'] = (df_grouped['Count'] / df_grouped['Count'].sum()) * 100; df_grouped['Label'] = df_grouped['Codigo'].map(map_conclusao)
+def criar_barras_conclusao(df_contagem):
+    if df_contagem.empty: return None
+    df_grouped = df_contagem.copy(); df_grouped['Codigo'] = df_grouped['Codigo'].astype(int); df_grouped['Percentual'] = (df_grouped['Count'] / df_grouped['Count'].sum()) * 100; df_grouped['Label'] = df_grouped['Codigo'].map(map_conclusao)
     df_grouped = df_grouped.sort_values(by='Codigo')
     try:
         fig = px.bar(df_grouped, x='Label', y='Percentual', title="Percentagem de Nível de Escolaridade", color_discrete_sequence=['#a95aed'])
@@ -376,11 +361,9 @@ def criar_barras_conclusao(df_filtrado):
         return fig
     except Exception as e: return None
 
-def criar_donut_raca(df_filtrado):
-    if df_filtrado.empty or 'TP_COR_RACA' not in df_filtrado.columns: return None
-    df_data = df_filtrado.dropna(subset=['TP_COR_RACA']); 
-    if df_data.empty: return None
-    df_grouped = df_data['TP_COR_RACA'].value_counts().reset_index(); df_grouped.columns = ['Codigo', 'Count']; df_grouped['Label'] = df_grouped['Codigo'].map(map_raca)
+def criar_donut_raca(df_contagem):
+    if df_contagem.empty: return None
+    df_grouped = df_contagem.sort_values('Count', ascending=False).reset_index(drop=True); df_grouped['Codigo'] = df_grouped['Codigo'].astype(int); df_grouped['Label'] = df_grouped['Codigo'].map(map_raca)
     colors_raca = {'Preta': '#e76f51', 'Branca': '#4a5b96', 'Parda': '#a95aed', 'Amarela': '#2a9d8f', 'Indígena': '#f4a261', 'Não declarado': '#777'}
     try:
         fig = px.pie(df_grouped, names='Label', values='Count', hole=0.6, title="Percentual de raça", color='Label', color_discrete_map=colors_raca)
@@ -389,11 +372,9 @@ def criar_donut_raca(df_filtrado):
         return fig
     except Exception as e: return None
 
-def criar_donut_treineiro(df_filtrado):
-    if df_filtrado.empty or 'IN_TREINEIRO' not in df_filtrado.columns: return None
-    df_data = df_filtrado.dropna(subset=['IN_TREINEIRO']); 
-    if df_data.empty: return None
-    df_grouped = df_data['IN_TREINEIRO'].value_counts().reset_index(); df_grouped.columns = ['Codigo', 'Count']; df_grouped['Label'] = df_grouped['Codigo'].map(map_treineiro)
+def criar_donut_treineiro(df_contagem):
+    if df_contagem.empty: return None
+    df_grouped = df_contagem.sort_values('Count', ascending=False).reset_index(drop=True); df_grouped['Codigo'] = df_grouped['Codigo'].astype(int); df_grouped['Label'] = df_grouped['Codigo'].map(map_treineiro)
     colors_treineiro = {'Não (Oficial)': '#5bc0de', 'Sim (Treineiro)': '#f4a261'}
     try:
         fig = px.pie(df_grouped, names='Label', values='Count', hole=0.6, title="Indicador de treineiro", color='Label', color_discrete_map=colors_treineiro)
@@ -402,17 +383,16 @@ def criar_donut_treineiro(df_filtrado):
         return fig
     except Exception as e: return None
 
-def criar_barras_faixa_etaria_agrupada(df_filtrado):
-    if df_filtrado.empty or 'TP_FAIXA_ETARIA' not in df_filtrado.columns: return None
-    df_data = df_filtrado.dropna(subset=['TP_FAIXA_ETARIA']); 
-    if df_data.empty: return None
+def criar_barras_faixa_etaria_agrupada(df_contagem):
+    if df_contagem.empty: return None
+    df_data = df_contagem.copy()
     def agrupar_faixa(codigo):
         if codigo <= 2: return 'Menos de 18 anos'; 
         if codigo <= 8: return 'Entre 18 e 23 anos'; 
         if codigo <= 11: return 'Entre 24 e 30 anos'; 
         return 'Mais de 30 anos'
-    df_data['Faixa_Agrupada'] = df_data['TP_FAIXA_ETARIA'].apply(agrupar_faixa)
-    df_grouped = df_data['Faixa_Agrupada'].value_counts().reset_index(); df_grouped.columns = ['Label', 'Count']; df_grouped['Percentual'] = (df_grouped['Count'] / df_grouped['Count'].sum()) * 100
+    df_data['Faixa_Agrupada'] = df_data['Codigo'].astype(int).apply(agrupar_faixa)
+    df_grouped = df_data.groupby('Faixa_Agrupada')['Count'].sum().sort_values(ascending=False).reset_index(); df_grouped.columns = ['Label', 'Count']; df_grouped['Percentual'] = (df_grouped['Count'] / df_grouped['Count'].sum()) * 100
     order = ['Menos de 18 anos', 'Entre 18 e 23 anos', 'Entre 24 e 30 anos', 'Mais de 30 anos']
     try:
         fig = px.bar(df_grouped, x='Label', y='Percentual', title="Percentual Faixa Etária", color_discrete_sequence=['#a95aed'], category_orders={'Label': order})
@@ -421,10 +401,9 @@ def criar_barras_faixa_etaria_agrupada(df_filtrado):
         return fig
     except Exception as e: return None
 
-def criar_donut_renda_familiar(df_filtrado):
-    if df_filtrado.empty or 'Q_RENDA' not in df_filtrado.columns: return None
-    df_data = df_filtrado.dropna(subset=['Q_RENDA']); 
-    if df_data.empty: return None
+def criar_donut_renda_familiar(df_contagem):
+    if df_contagem.empty: return None
+    df_data = df_contagem.copy()
     def agrupar_renda_prototipo(codigo):
         if pd.isna(codigo): return 'Não informado'; 
         if codigo in ['A', 'nan', 'N/A', '<NA>', 'None']: return 'Não informado'; 
@@ -433,8 +412,8 @@ def criar_donut_renda_familiar(df_filtrado):
         if codigo in ['G', 'H', 'I']: return 'Entre 3 e 6 salários'; 
         if codigo in ['J','K','L','M','N','O','P','Q']: return 'Acima de 6 salários'; 
         return 'Não informado'
-    df_data['Renda_Agrupada'] = df_data['Q_RENDA'].apply(agrupar_renda_prototipo)
-    df_grouped = df_data['Renda_Agrupada'].value_counts().reset_index(); df_grouped.columns = ['Label', 'Count']
+    df_data['Renda_Agrupada'] = df_data['Codigo'].apply(agrupar_renda_prototipo)
+    df_grouped = df_data.groupby('Renda_Agrupada')['Count'].sum().reset_index(); df_grouped.columns = ['Label', 'Count']
     colors_renda = {'Até 1 salário mínimo': '#4a5b96', 'Entre 1 e 3 salários': '#e76f51', 'Entre 3 e 6 salários': '#a95aed', 'Acima de 6 salários': '#2a9d8f', 'Não informado': '#f4a261'}
     order = ['Até 1 salário mínimo', 'Entre 1 e 3 salários', 'Entre 3 e 6 salários', 'Acima de 6 salários', 'Não informado']
     df_grouped['Label'] = pd.Categorical(df_grouped['Label'], categories=order, ordered=True); df_grouped = df_grouped.sort_values('Label')
@@ -445,10 +424,9 @@ def criar_donut_renda_familiar(df_filtrado):
         return fig
     except Exception as e: return None
 
-def criar_scatter_renda_media(df_filtrado):
-    if df_filtrado.empty or 'Q_RENDA' not in df_filtrado.columns or 'MEDIA_GERAL' not in df_filtrado.columns: return None
-    df_data = df_filtrado.dropna(subset=['Q_RENDA', 'MEDIA_GERAL']); 
-    if df_data.empty: return None
+def criar_scatter_renda_media(df_medias_renda):
+    if df_medias_renda.empty: return None
+    df_data = df_medias_renda.copy()
     df_data['Renda_Num'] = df_data['Q_RENDA'].map(map_renda_numerico)
     df_agg = df_data.groupby('Renda_Num')['MEDIA_GERAL'].mean().reset_index()
     df_agg.rename(columns={'Renda_Num': 'Faixa de Renda (Salários Mínimos)', 'MEDIA_GERAL': 'Nota Média'}, inplace=True)
@@ -459,10 +437,9 @@ def criar_scatter_renda_media(df_filtrado):
         return fig
     except Exception as e: return None
 
-def criar_barras_escolaridade_pais(df_filtrado, coluna, titulo):
-    if df_filtrado.empty or coluna not in df_filtrado.columns: return None
-    df_data = df_filtrado.dropna(subset=[coluna]); 
-    if df_data.empty: return None
+def criar_barras_escolaridade_pais(df_contagem, titulo):
+    if df_contagem.empty: return None
+    df_data = df_contagem.copy()
     def agrupar_escolaridade_prototipo(codigo):
         if pd.isna(codigo): return 'Não Informado'; 
         if codigo in ['H', 'I', 'nan', 'N/A', '<NA>', 'None']: return 'Não Informado'; 
@@ -472,8 +449,8 @@ def criar_barras_escolaridade_pais(df_filtrado, coluna, titulo):
         if codigo == 'F': return 'Superior Completo'; 
         if codigo == 'G': return 'Pós-graduação'; 
         return 'Não Informado'
-    df_data['Escolaridade_Agrupada'] = df_data[coluna].apply(agrupar_escolaridade_prototipo)
-    df_grouped = df_data['Escolaridade_Agrupada'].value_counts().reset_index(); df_grouped.columns = ['Label', 'Count']; df_grouped['Percentual'] = (df_grouped['Count'] / df_grouped['Count'].sum()) * 100
+    df_data['Escolaridade_Agrupada'] = df_data['Codigo'].apply(agrupar_escolaridade_prototipo)
+    df_grouped = df_data.groupby('Escolaridade_Agrupada')['Count'].sum().reset_index(); df_grouped.columns = ['Label', 'Count']; df_grouped['Percentual'] = (df_grouped['Count'] / df_grouped['Count'].sum()) * 100
     order = ['Não Informado', 'Fundamental Incompleto', 'Fundamental Completo', 'Médio Completo', 'Superior Completo', 'Pós-graduação']
     try:
         fig = px.bar(df_grouped, x='Label', y='Percentual', title=titulo, color_discrete_sequence=['#a95aed'], category_orders={'Label': order})
@@ -484,76 +461,47 @@ def criar_barras_escolaridade_pais(df_filtrado, coluna, titulo):
 
 
 # --- Lógica Principal de Filtros do Dashboard Geral ---
+# Os filtros da sidebar são enviados ao banco (WHERE); os gráficos recebem apenas as séries agregadas.
 
-df_filtrado = df_principal.copy() 
-
-try:
-    ano_inicio_sel = st.session_state.get('sel_ano_inicio'); ano_fim_sel = st.session_state.get('sel_ano_fim')
-    if ano_inicio_sel and ano_fim_sel and 'NU_ANO' in df_filtrado.columns:
-        ano_inicio_int = int(ano_inicio_sel); ano_fim_int = int(ano_fim_sel)
-        if ano_inicio_int > ano_fim_int: ano_inicio_int, ano_fim_int = ano_fim_int, ano_inicio_int
-        df_filtrado['NU_ANO'] = pd.to_numeric(df_filtrado['NU_ANO'], errors='coerce')
-        df_filtrado = df_filtrado[df_filtrado['NU_ANO'].notna() & (df_filtrado['NU_ANO'] >= ano_inicio_int) & (df_filtrado['NU_ANO'] <= ano_fim_int)]
-except ValueError: pass
-except Exception as e: pass
-
-try:
-    estado_sidebar = st.session_state.get('sel_estado', "Todos")
-    if estado_sidebar != "Todos" and 'SG_UF_PROVA' in df_filtrado.columns:
-        df_filtrado = df_filtrado[df_filtrado['SG_UF_PROVA'] == estado_sidebar]
-except Exception as e: pass
-
-try:
-    municipio_sidebar = st.session_state.get('sel_municipio', "Todos")
-    if municipio_sidebar != "Todos" and 'NO_MUNICIPIO_PROVA' in df_filtrado.columns:
-        df_filtrado = df_filtrado[df_filtrado['NO_MUNICIPIO_PROVA'] == municipio_sidebar]
-except Exception as e: pass
-
-try:
-    genero_sidebar = st.session_state.get('sel_genero', "Todos")
-    if 'TP_SEXO' in df_filtrado.columns:
-        if genero_sidebar == "Feminino": df_filtrado = df_filtrado[df_filtrado['TP_SEXO'] == 'F']
-        elif genero_sidebar == "Masculino": df_filtrado = df_filtrado[df_filtrado['TP_SEXO'] == 'M']
-except Exception as e: pass
+def montar_filtros(ano_inicio=None, ano_fim=None, estado="Todos", municipio="Todos", genero="Todos", faixa="Todos", conclusao="Todos"):
+    """Converte as seleções (rótulos da interface) no dicionário de filtros de Dashboards.db.agregacoes."""
+    filtros = {}
+    try:
+        if ano_inicio and ano_fim:
+            ano_inicio_int = int(ano_inicio); ano_fim_int = int(ano_fim)
+            if ano_inicio_int > ano_fim_int: ano_inicio_int, ano_fim_int = ano_fim_int, ano_inicio_int
+            filtros['ano_inicio'] = ano_inicio_int; filtros['ano_fim'] = ano_fim_int
+    except ValueError: pass
+    if estado != "Todos": filtros['uf'] = estado
+    if municipio != "Todos": filtros['municipio'] = municipio
+    if genero == "Feminino": filtros['sexo'] = 'F'
+    elif genero == "Masculino": filtros['sexo'] = 'M'
+    if faixa != "Todos":
+        codigo_faixa = {v: k for k, v in map_faixa_etaria.items()}.get(faixa)
+        if codigo_faixa is not None: filtros['faixa'] = codigo_faixa
+    if conclusao != "Todos":
+        codigo_conclusao = {v: k for k, v in map_conclusao.items()}.get(conclusao)
+        if codigo_conclusao is not None: filtros['conclusao'] = codigo_conclusao
+    return filtros
 
-try:
-    faixa_sidebar = st.session_state.get('sel_faixa_etaria', "Todos")
-    if faixa_sidebar != "Todos" and 'TP_FAIXA_ETARIA' in df_filtrado.columns:
-        map_faixa_reverso = {v: k for k, v in map_faixa_etaria.items()}
-        codigo_faixa = map_faixa_reverso.get(faixa_sidebar)
-        if codigo_faixa is not None:
-            df_filtrado['TP_FAIXA_ETARIA'] = pd.to_numeric(df_filtrado['TP_FAIXA_ETARIA'], errors='coerce')
-            df_filtrado = df_filtrado[df_filtrado['TP_FAIXA_ETARIA'].notna() & (df_filtrado['TP_FAIXA_ETARIA'] == codigo_faixa)]
-except Exception as e: pass
-
-try:
-    escolaridade_sidebar = st.session_state.get('sel_escolaridade', "Todos")
-    if escolaridade_sidebar != "Todos" and 'TP_ST_CONCLUSAO' in df_filtrado.columns:
-        map_conclusao_reverso = {v: k for k, v in map_conclusao.items()}
-        codigo_conclusao = map_conclusao_reverso.get(escolaridade_sidebar)
-        if codigo_conclusao is not None:
-            df_filtrado['TP_ST_CONCLUSAO'] = pd.to_numeric(df_filtrado['TP_ST_CONCLUSAO'], errors='coerce')
-            df_filtrado = df_filtrado[df_filtrado['TP_ST_CONCLUSAO'].notna() & (df_filtrado['TP_ST_CONCLUSAO'] == codigo_conclusao)]
-except Exception as e: pass
+filtros_sidebar = montar_filtros(
+    st.session_state.get('sel_ano_inicio'), st.session_state.get('sel_ano_fim'),
+    st.session_state.get('sel_estado', "Todos"), st.session_state.get('sel_municipio', "Todos"),
+    st.session_state.get('sel_genero', "Todos"), st.session_state.get('sel_faixa_etaria', "Todos"),
+    st.session_state.get('sel_escolaridade', "Todos")
+)
 
 
 # --- Cálculo de KPIs Gerais ---
-total_inscritos = df_filtrado.shape[0] if not df_filtrado.empty else 0
-total_confirmados = 0; total_presentes = 0; total_ausentes_dia = 0
-if 'INDICADOR_ABSENTEISMO' in df_filtrado.columns and not df_filtrado.empty:
-      indicador_abs_series = df_filtrado['INDICADOR_ABSENTEISMO'].astype(str)
-      total_confirmados = (indicador_abs_series != 'Ausente em um ou mais dias').sum()
-      total_presentes = (indicador_abs_series == 'Presente').sum()
-      total_ausentes_dia = (indicador_abs_series == 'Ausente em um ou mais dias').sum()
+kpis = resumo_kpis(filtros_sidebar, engine)
+total_inscritos = kpis['total']; total_confirmados = kpis['confirmados']
+total_presentes = kpis['presentes']; total_ausentes_dia = kpis['ausentes']
 perc_presentes = (total_presentes / total_inscritos) if total_inscritos > 0 else 0.0
 perc_ausentes = (total_ausentes_dia / total_inscritos) if total_inscritos > 0 else 0.0
-media_geral = df_filtrado['MEDIA_GERAL'].mean() if 'MEDIA_GERAL' in df_filtrado.columns and not df_filtrado.empty else np.nan
-media_redacao = df_filtrado['NU_NOTA_REDACAO'].mean() if 'NU_NOTA_REDACAO' in df_filtrado.columns and not df_filtrado.empty else np.nan
-total_lingua = 0; cont_ingles = 0; cont_espanhol = 0
-if 'TP_LINGUA' in df_filtrado.columns and not df_filtrado.empty:
-    lingua_series = df_filtrado['TP_LINGUA'].dropna()
-    cont_ingles = (lingua_series == 0).sum(); cont_espanhol = (lingua_series == 1).sum()
-    total_lingua = cont_ingles + cont_espanhol
+media_geral = kpis['media_geral']
+media_redacao = kpis['media_redacao']
+cont_ingles = kpis['ingles']; cont_espanhol = kpis['espanhol']
+total_lingua = cont_ingles + cont_espanhol
 perc_ingles = (cont_ingles / total_lingua) if total_lingua > 0 else 0.0
 perc_espanhol = (cont_espanhol / total_lingua) if total_lingua > 0 else 0.0
 
@@ -580,15 +528,16 @@ with col1:
 with col2:
     placeholder_direita = st.empty()
 
-df_tabela = criar_tabela_anual(df_filtrado)
-fig_mapa = criar_mapa_brasil(df_principal, geojson_brasil) 
+df_tabela = criar_tabela_anual(resumo_por_ano(filtros_sidebar, engine))
+# O mapa mostra o país inteiro (sem filtros), como antes
+fig_mapa = criar_mapa_brasil(contagem_por_uf({}, engine), geojson_brasil)
 
 with placeholder_esquerda_sup.container():
     st.dataframe(df_tabela, use_container_width=True, hide_index=True, column_config={"Ano": st.column_config.NumberColumn(format="%d", width="small"), "Total Inscritos": st.column_config.NumberColumn(format="%,d"), "Total Confirmados": st.column_config.NumberColumn(format="%,d"), "% Presentes": st.column_config.ProgressColumn(format="%.1f%%", min_value=0, max_value=1), "% Ausentes": st.column_config.ProgressColumn(format="%.1f%%", min_value=0, max_value=1)})
 
 # --- INTERATIVIDADE: GÊNERO ---
 with placeholder_esquerda_inf.container(border=False):
-    fig_genero = criar_donut_genero(df_filtrado)
+    fig_genero = criar_donut_genero(contagem_por_coluna('TP_SEXO', filtros_sidebar, engine))
     if fig_genero:
         # Habilita seleção no gráfico, define chave única
         st.plotly_chart(fig_genero, use_container_width=True, config={"displayModeBar": False}, on_select="rerun", selection_mode="points", key="chart_genero")
@@ -603,9 +552,9 @@ with placeholder_direita.container(border=False):
         st.markdown(placeholder_mapa(), unsafe_allow_html=True)
 
 gap(18); section("Análise de Desempenho Acadêmico")
-fig_barras = criar_barras_medias(df_filtrado)
-fig_histograma = criar_histograma_redacao(df_filtrado)
-fig_heatmap = criar_heatmap_correlacao(df_filtrado)
+fig_barras = criar_barras_medias(medias_por_area(filtros_sidebar, engine))
+fig_histograma = criar_histograma_redacao(histograma_redacao(filtros_sidebar, engine))
+fig_heatmap = criar_heatmap_correlacao(estatisticas_correlacao(filtros_sidebar, engine))
 col_acad_1, col_acad_2 = st.columns([1.4, 1], gap="small")
 with col_acad_1:
     with st.empty().container(border=False):
@@ -621,10 +570,10 @@ with col_acad_2:
         else: st.markdown('<div class="chart-placeholder-box tall">Dados de Correlação indisponíveis.</div>', unsafe_allow_html=True)
 
 gap(18); section("Análise por Perfil")
-fig_conclusao = criar_barras_conclusao(df_filtrado)
-fig_raca = criar_donut_raca(df_filtrado)
-fig_treineiro = criar_donut_treineiro(df_filtrado)
-fig_faixa_agrupada = criar_barras_faixa_etaria_agrupada(df_filtrado)
+fig_conclusao = criar_barras_conclusao(contagem_por_coluna('TP_ST_CONCLUSAO', filtros_sidebar, engine))
+fig_raca = criar_donut_raca(contagem_por_coluna('TP_COR_RACA', filtros_sidebar, engine))
+fig_treineiro = criar_donut_treineiro(contagem_por_coluna('IN_TREINEIRO', filtros_sidebar, engine))
+fig_faixa_agrupada = criar_barras_faixa_etaria_agrupada(contagem_por_coluna('TP_FAIXA_ETARIA', filtros_sidebar, engine))
 
 perfil_col1, perfil_col2 = st.columns([1, 1], gap="small")
 with perfil_col1:
@@ -649,10 +598,10 @@ with perfil_col2:
         else: st.markdown('<div class="chart-placeholder-box small">Dados de Faixa Etária indisponíveis.</div>', unsafe_allow_html=True)
 
 gap(18); section("Análise Socioeconômica")
-fig_donut_renda = criar_donut_renda_familiar(df_filtrado)
-fig_scatter_renda = criar_scatter_renda_media(df_filtrado)
-fig_barras_pai = criar_barras_escolaridade_pais(df_filtrado, 'Q_ESCOLARIDADE_PAI', 'Porcentagem de escolaridade paterna')
-fig_barras_mae = criar_barras_escolaridade_pais(df_filtrado, 'Q_ESCOLARIDADE_MAE', 'Porcentagem de escolaridade materna')
+fig_donut_renda = criar_donut_renda_familiar(contagem_por_coluna('Q006', filtros_sidebar, engine, incluir_nulos=True))
+fig_scatter_renda = criar_scatter_renda_media(media_geral_por_renda(filtros_sidebar, engine))
+fig_barras_pai = criar_barras_escolaridade_pais(contagem_por_coluna('Q001', filtros_sidebar, engine, incluir_nulos=True), 'Porcentagem de escolaridade paterna')
+fig_barras_mae = criar_barras_escolaridade_pais(contagem_por_coluna('Q002', filtros_sidebar, engine, incluir_nulos=True), 'Porcentagem de escolaridade materna')
 socio_col1, socio_col2 = st.columns([1, 1], gap="small")
 with socio_col1:
     with st.empty().container(border=False):
@@ -676,70 +625,31 @@ with socio_col2:
 
 gap(18); section("Comparativo de Grupos")
 
-def filtrar_grupo(df, ano, estado, faixa, conclusao):
-    """Aplica filtros ao dataframe e retorna o subconjunto."""
-    df_temp = df.copy()
-    
-    # Filtro Ano
-    if ano:
-        df_temp = df_temp[df_temp['NU_ANO'] == int(ano)]
-        
-    # Filtro Estado
-    if estado != "Todos":
-        df_temp = df_temp[df_temp['SG_UF_PROVA'] == estado]
-        
-    # Filtro Faixa Etária
-    if faixa != "Todos":
-        map_faixa_reverso = {v: k for k, v in map_faixa_etaria.items()}
-        cod = map_faixa_reverso.get(faixa)
-        if cod:
-            df_temp = df_temp[df_temp['TP_FAIXA_ETARIA'] == cod]
-            
-    # Filtro Conclusão (Escolaridade)
-    if conclusao != "Todos":
-        map_conclusao_reverso = {v: k for k, v in map_conclusao.items()}
-        cod = map_conclusao_reverso.get(conclusao)
-        if cod:
-            df_temp = df_temp[df_temp['TP_ST_CONCLUSAO'] == cod]
-            
-    return df_temp
-
-def calcular_kpis_grupo(df_grupo):
-    """Calcula métricas para o card do grupo."""
-    if df_grupo.empty:
+def filtrar_grupo(ano, estado, faixa, conclusao):
+    """Monta os filtros do grupo (ano único, estado, faixa etária e status de conclusão)."""
+    return montar_filtros(ano_inicio=ano, ano_fim=ano, estado=estado, faixa=faixa, conclusao=conclusao)
+
+def calcular_kpis_grupo(filtros_grupo):
+    """Calcula métricas para o card do grupo (agregadas no banco)."""
+    kpis_grupo = resumo_kpis(filtros_grupo, engine)
+    total = kpis_grupo['total']
+    if total == 0:
         return 0, 0, 0.0, 0.0, 0.0, 0.0, 0, 0, 0.0, 0.0
-        
-    total = len(df_grupo)
-    
-    # Confirmados vs Ausentes
-    if 'INDICADOR_ABSENTEISMO' in df_grupo.columns:
-        confirmados = (df_grupo['INDICADOR_ABSENTEISMO'] != 'Ausente em um ou mais dias').sum()
-        presentes = (df_grupo['INDICADOR_ABSENTEISMO'] == 'Presente').sum()
-        ausentes = (df_grupo['INDICADOR_ABSENTEISMO'] == 'Ausente em um ou mais dias').sum()
-    else:
-        confirmados = 0; presentes = 0; ausentes = 0
 
-    perc_pres = presentes / total if total > 0 else 0.0
-    perc_aus = ausentes / total if total > 0 else 0.0
-    
-    # Médias (Tratamento para NaN)
-    media_geral = df_grupo['MEDIA_GERAL'].mean() if 'MEDIA_GERAL' in df_grupo.columns else 0.0
-    if pd.isna(media_geral): media_geral = 0.0
+    perc_pres = kpis_grupo['presentes'] / total
+    perc_aus = kpis_grupo['ausentes'] / total
 
-    media_redacao = df_grupo['NU_NOTA_REDACAO'].mean() if 'NU_NOTA_REDACAO' in df_grupo.columns else 0.0
-    if pd.isna(media_redacao): media_redacao = 0.0
+    # Médias (Tratamento para NaN)
+    media_geral = kpis_grupo['media_geral'] if pd.notna(kpis_grupo['media_geral']) else 0.0
+    media_redacao = kpis_grupo['media_redacao'] if pd.notna(kpis_grupo['media_redacao']) else 0.0
 
     # Linguagem
-    cont_ingles = 0; cont_espanhol = 0
-    if 'TP_LINGUA' in df_grupo.columns:
-        cont_ingles = (df_grupo['TP_LINGUA'] == 0).sum()
-        cont_espanhol = (df_grupo['TP_LINGUA'] == 1).sum()
-
+    cont_ingles = kpis_grupo['ingles']; cont_espanhol = kpis_grupo['espanhol']
     total_lingua = cont_ingles + cont_espanhol
     perc_ing = cont_ingles / total_lingua if total_lingua > 0 else 0.0
     perc_esp = cont_espanhol / total_lingua if total_lingua > 0 else 0.0
-        
-    return total, confirmados, perc_pres, perc_aus, media_geral, media_redacao, cont_ingles, cont_espanhol, perc_ing, perc_esp
+
+    return total, kpis_grupo['confirmados'], perc_pres, perc_aus, media_geral, media_redacao, cont_ingles, cont_espanhol, perc_ing, perc_esp
 
 col_g1, col_sep, col_g2 = st.columns([1, 0.1, 1])
 
@@ -759,8 +669,8 @@ with col_g1:
             st.selectbox("Status Conclusão", options=conclusoes_options, key='g1_conclusao')
 
     # Processamento
-    df_g1 = filtrar_grupo(df_principal, st.session_state.g1_ano, st.session_state.g1_estado, st.session_state.g1_faixa, st.session_state.g1_conclusao)
-    total_g1, conf_g1, perc_pres_g1, perc_aus_g1, med_geral_g1, med_red_g1, val_ing_g1, val_esp_g1, perc_ing_g1, perc_esp_g1 = calcular_kpis_grupo(df_g1)
+    filtros_g1 = filtrar_grupo(st.session_state.g1_ano, st.session_state.g1_estado, st.session_state.g1_faixa, st.session_state.g1_conclusao)
+    total_g1, conf_g1, perc_pres_g1, perc_aus_g1, med_geral_g1, med_red_g1, val_ing_g1, val_esp_g1, perc_ing_g1, perc_esp_g1 = calcular_kpis_grupo(filtros_g1)
 
     gap(10)
     # Grid de KPIs
@@ -806,8 +716,8 @@ with col_g2:
             st.selectbox("Status Conclusão", options=conclusoes_options, key='g2_conclusao')
 
     # Processamento
-    df_g2 = filtrar_grupo(df_principal, st.session_state.g2_ano, st.session_state.g2_estado, st.session_state.g2_faixa, st.session_state.g2_conclusao)
-    total_g2, conf_g2, perc_pres_g2, perc_aus_g2, med_geral_g2, med_red_g2, val_ing_g2, val_esp_g2, perc_ing_g2, perc_esp_g2 = calcular_kpis_grupo(df_g2)
+    filtros_g2 = filtrar_grupo(st.session_state.g2_ano, st.session_state.g2_estado, st.session_state.g2_faixa, st.session_state.g2_conclusao)
+    total_g2, conf_g2, perc_pres_g2, perc_aus_g2, med_geral_g2, med_red_g2, val_ing_g2, val_esp_g2, perc_ing_g2, perc_esp_g2 = calcular_kpis_grupo(filtros_g2)
 
     gap(10)
     # Grid de KPIs
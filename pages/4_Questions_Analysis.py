@@ -73,20 +73,25 @@ st.title("📊 Análise de Questões do ENEM")
 @st.cache_resource
 def get_services():
     config = DatabaseConfig()
-    db_manager = DatabaseManager(config)
+    db_manager = DatabaseManager(config, rotulo="questions-analysis")
     analyzer = QuestionAnalyzer(db_manager)
     return db_manager, analyzer
 
 
 db_manager, analyzer = get_services()
 
+# Com a taxa de acerto vetorizada, o custo é dominado pela leitura das respostas:
+# numa prova específica só a coluna de respostas da área é lida, então a amostra pode ser maior.
+LIMITE_PARTICIPANTES_PROVA = 200000
+LIMITE_PARTICIPANTES_ANO = 5000
+
 
 @st.cache_data(show_spinner=False)
 def load_participants_data(
     ano: int,
     sigla_area: str | None = None,
     codigo_prova: int | None = None,
-    limit: int = 5000,
+    limit: int | None = None,
 ) -> pd.DataFrame:
     base_query = """
         SELECT 
@@ -97,7 +102,7 @@ def load_participants_data(
         WHERE "NU_ANO" = :ano
     """
 
-    params = {"ano": int(ano), "limit": int(limit)}
+    params = {"ano": int(ano), "limit": int(limit or LIMITE_PARTICIPANTES_ANO)}
 
     area_to_col = {
         "CH": "CO_PROVA_CH",
@@ -109,8 +114,13 @@ def load_participants_data(
     if sigla_area and codigo_prova is not None:
         col_codigo = area_to_col.get(sigla_area)
         if col_codigo:
-            base_query += f' AND "{col_codigo}" = :codigo_prova'
+            base_query = f"""
+                SELECT "TX_RESPOSTAS_{sigla_area}", "{col_codigo}"
+                FROM dados_enem_consolidado
+                WHERE "NU_ANO" = :ano AND "{col_codigo}" = :codigo_prova
+            """
             params["codigo_prova"] = int(codigo_prova)
+            params["limit"] = int(limit or LIMITE_PARTICIPANTES_PROVA)
 
     base_query += " LIMIT :limit"
 
@@ -181,16 +191,20 @@ if area_selecionada != "Todas as áreas":
 
 st.markdown("---")
 with st.spinner("📊 Calculando taxas de acerto baseadas em participantes reais..."):
-    df_participants = load_participants_data(
-        ano=ano_selecionado,
-        sigla_area=sigla_area_atual,
-        codigo_prova=codigo_prova_atual,
-    )
-    df_filtrado_com_taxas = analyzer.calculate_real_success_rates(
-        df_filtrado, df_participants
-    )
-
-participantes_count = len(df_participants) if not df_participants.empty else 0
+    # Modo SQL: contagens por posição feitas no banco, sobre todos os participantes de cada prova
+    df_filtrado_com_taxas, participantes_count = analyzer.calculate_success_rates_in_db(df_filtrado)
+
+    if df_filtrado_com_taxas is None:
+        # Sem código de prova nas questões (ou sem respostas no banco): amostra de participantes
+        df_participants = load_participants_data(
+            ano=ano_selecionado,
+            sigla_area=sigla_area_atual,
+            codigo_prova=codigo_prova_atual,
+        )
+        df_filtrado_com_taxas = analyzer.calculate_real_success_rates(
+            df_filtrado, df_participants
+        )
+        participantes_count = len(df_participants) if not df_participants.empty else 0
 
 st.info(
     f"📋 **Prova Selecionada:** {ano_selecionado} • {area_label} | "
@@ -326,6 +340,10 @@ with tab1:
     else:
         colunas_display.insert(2, "taxa_acerto_pct")
 
+    # Estatísticas da população inteira (tabela estatisticas_itens do ETL), quando disponíveis
+    colunas_itens = ["taxa_branco", "ponto_bisserial", "pct_a", "pct_b", "pct_c", "pct_d", "pct_e"]
+    colunas_display[4:4] = [c for c in colunas_itens if c in df_filtrado_final.columns]
+
     df_display = df_filtrado_final[colunas_display].copy()
 
     df_display = df_display.rename(
@@ -334,6 +352,13 @@ with tab1:
             "taxa_acerto_real": "Taxa Acerto Real (%)",
             "taxa_acerto_pct": "Taxa Acerto (%)",
             "participantes_amostra": "Amostra",
+            "taxa_branco": "Brancos (%)",
+            "ponto_bisserial": "Ponto-Bisserial",
+            "pct_a": "A (%)",
+            "pct_b": "B (%)",
+            "pct_c": "C (%)",
+            "pct_d": "D (%)",
+            "pct_e": "E (%)",
             "parametro_a": "Discriminação",
             "parametro_b": "Dificuldade",
             "parametro_c": "Acerto Casual",
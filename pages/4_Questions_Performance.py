@@ -1,5 +1,6 @@
 # pages/4_Questions_Performance.py
 
+import io
 import sys
 import os
 
@@ -14,6 +15,9 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")
 from config.db_config import DatabaseConfig
 from services.database_manager import DatabaseManager
 from services.performance_analyzer import PerformanceAnalyzer
+from services.correcao_lote import (
+    COLUNA_RESPOSTAS, CorrecaoLote, gravar_resultados, ler_folhas_csv, normalizar_sequencia,
+)
 
 # -------------------------------------
 # Configuração básica da página
@@ -50,7 +54,7 @@ st.title("🎯 Análise de Desempenho Pessoal - ENEM")
 @st.cache_resource
 def get_services():
     cfg = DatabaseConfig()
-    db = DatabaseManager(cfg)
+    db = DatabaseManager(cfg, rotulo="questions-performance")
     analyzer = PerformanceAnalyzer(db)
     return db, analyzer
 
@@ -134,13 +138,9 @@ with col_a:
             st.error("Digite alguma coisa primeiro.")
         else:
             # normaliza: pega apenas A/B/C/D/E/- e preenche/pad
-            filtrados = [c for c in txt.upper() if c in "ABCDE-"]
-            if len(filtrados) < qtd_questoes:
-                filtrados += ["-"] * (qtd_questoes - len(filtrados))
-            elif len(filtrados) > qtd_questoes:
-                filtrados = filtrados[:qtd_questoes]
+            filtrados = normalizar_sequencia(txt, qtd_questoes)
 
-            st.session_state.input_sequencial = "".join(filtrados)
+            st.session_state.input_sequencial = filtrados
             for i in range(1, qtd_questoes + 1):
                 st.session_state.respostas[i] = filtrados[i - 1]
 
@@ -180,6 +180,45 @@ if st.button("📈 GERAR ANÁLISE", type="primary", use_container_width=True):
             except Exception as e:
                 st.error(f"Erro na análise: {e}")
 
+# -------------------------------------
+# Correção em lote (CSV com várias folhas)
+# -------------------------------------
+with st.expander("📦 Correção em lote (CSV com várias folhas de respostas)"):
+    st.caption(
+        f"Uma linha por aluno, com a coluna **{COLUNA_RESPOSTAS}** no mesmo formato do Preenchimento Rápido "
+        "e, opcionalmente, **id** e **uf** (UF para comparar com a média do estado). "
+        f"Usa o ano, a cor e a língua selecionados acima ({ano_prova}, {cor_prova}, {lingua_label})."
+    )
+    arquivo_lote = st.file_uploader("Arquivo CSV", type=["csv"], key="arquivo_lote")
+    formato_lote = st.radio("Formato do resultado", ["CSV", "Parquet"], horizontal=True, key="formato_lote")
+
+    if arquivo_lote is not None and st.button("✅ Corrigir folhas", use_container_width=True):
+        with st.spinner("Corrigindo folhas..."):
+            try:
+                correcao = CorrecaoLote(analyzer, ano_prova, cor_prova, lingua_backend)
+                if correcao.erro:
+                    st.error(correcao.erro)
+                else:
+                    buffer = io.BytesIO()
+                    total_folhas = gravar_resultados(
+                        correcao.corrigir_blocos(ler_folhas_csv(arquivo_lote)), buffer, formato_lote.lower()
+                    )
+                    st.session_state.resultado_lote = (buffer.getvalue(), formato_lote.lower(), total_folhas)
+            except Exception as e:
+                st.error(f"Erro na correção em lote: {e}")
+
+    if st.session_state.get("resultado_lote"):
+        dados_lote, extensao_lote, total_folhas = st.session_state.resultado_lote
+        st.success(f"{total_folhas} folhas corrigidas.")
+        if extensao_lote == "csv":
+            st.dataframe(pd.read_csv(io.BytesIO(dados_lote), nrows=100), use_container_width=True, hide_index=True)
+        st.download_button(
+            f"📥 Baixar resultados ({extensao_lote.upper()})",
+            data=dados_lote,
+            file_name=f"correcao_enem_{ano_prova}_{cor_prova}.{extensao_lote}",
+            mime="text/csv" if extensao_lote == "csv" else "application/octet-stream",
+        )
+
 st.markdown("---")
 
 # -------------------------------------
@@ -232,7 +271,7 @@ if resultado is not None and "erro" not in resultado:
         )
 
         with st.expander(titulo, expanded=True):
-            c1, c2, c3, c4 = st.columns(4)
+            c1, c2, c3, c4, c5 = st.columns(5)
             with c1:
                 st.metric(
                     "Acertos",
@@ -255,6 +294,14 @@ if resultado is not None and "erro" not in resultado:
                     )
                 else:
                     st.metric("Média", "—")
+            with c5:
+                # Percentil no mesmo recorte da média ao lado (estado, se houver; senão Brasil)
+                if dados_area.get("percentil_regional") is not None:
+                    st.metric("Percentil no Estado", f"{dados_area['percentil_regional']:.0f}º")
+                elif dados_area.get("percentil_nacional") is not None:
+                    st.metric("Percentil Nacional", f"{dados_area['percentil_nacional']:.0f}º")
+                else:
+                    st.metric("Percentil", "—")
 
             st.progress(dados_area["percentual"] / 100)
 
@@ -339,11 +386,40 @@ if resultado is not None and "erro" not in resultado:
                     if estado_backend
                     else None
                 ),
+                "Percentil Nacional": dados_area.get("percentil_nacional"),
+                "Percentil no Estado": dados_area.get("percentil_regional"),
             }
         )
     df_comp = pd.DataFrame(linhas_comp)
     st.dataframe(df_comp, use_container_width=True, hide_index=True)
 
+    # Distribuição das notas de quem fez a mesma prova (estatísticas materializadas)
+    linhas_dist = []
+    for area_code, dados_area in res_areas.items():
+        for escopo, chave in (("Brasil", "estatisticas_nacional"), (estado_backend, "estatisticas_regional")):
+            est = dados_area.get(chave)
+            if not est:
+                continue
+            linhas_dist.append(
+                {
+                    "Área": analyzer.areas_nomes.get(area_code, area_code),
+                    "Escopo": escopo,
+                    "Participantes": est["n"],
+                    "Média": est["media"],
+                    "Desvio Padrão": est["desvio_padrao"],
+                    "P25": est.get("p25"),
+                    "Mediana": est.get("p50"),
+                    "P75": est.get("p75"),
+                }
+            )
+    if linhas_dist:
+        st.markdown("#### Distribuição das notas na sua prova")
+        st.dataframe(
+            pd.DataFrame(linhas_dist).round(1),
+            use_container_width=True,
+            hide_index=True,
+        )
+
     # -----------------------------
     # 🔹 Gráficos adicionais
     # -----------------------------
@@ -1,14 +1,11 @@
 import os
-from sqlalchemy import create_engine
+import sys
 from dotenv import load_dotenv
 
-# Gera a conexão com o banco usando SQL Alchemy
+# Gera a conexão com o banco pelo pool compartilhado do projeto (config/conexao.py)
 load_dotenv()
 
-DB_USER = os.getenv("DB_USER")
-DB_PASS = os.getenv("DB_PASS")
-DB_HOST = os.getenv("DB_HOST", "localhost")
-DB_NAME = os.getenv("DB_NAME")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..")))
+from config.conexao import obter_engine  # noqa: E402
 
-DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}/{DB_NAME}"
-engine = create_engine(DATABASE_URL)
+engine = obter_engine(rotulo="prediction")
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Consultor de índices (services/consultor_indices.py) pela linha de comando.
+
+Lê o registro das consultas filtradas das páginas (logs/predicados.jsonl ou $ENEM_REGISTRO_PREDICADOS),
+mostra as colunas mais usadas nos predicados, recomenda índices (BRIN em NU_ANO, B-tree nas
+demais) e mede as consultas mais frequentes com EXPLAIN ANALYZE. Com --criar, cria os índices
+e mede de novo, comparando antes e depois.
+
+Uso (a partir da raiz do projeto):
+    python scripts/consultor_indices.py [--registro ARQ] [--top 20] [--criar] [--sem-explain]
+"""
+
+import argparse
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.conexao import obter_engine  # noqa: E402
+from services.consultor_indices import (  # noqa: E402
+    CAMINHO_REGISTRO, TIMEOUT_EXPLAIN_MS, USO_MINIMO, carregar_registro, consultas_mais_frequentes, criar_indices,
+    indices_existentes, medir_consultas, recomendar_indices, uso_das_colunas,
+)
+
+
+def _mostrar(titulo, df):
+    print(f"\n--- {titulo} ---")
+    print(df.to_string(index=False) if not df.empty else "(nada)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recomenda (e cria) índices a partir das consultas filtradas registradas pelas páginas.")
+    parser.add_argument('--registro', default=CAMINHO_REGISTRO, help="Arquivo JSON Lines do registro de consultas.")
+    parser.add_argument('--top', type=int, default=20, help="Consultas distintas mais frequentes medidas com EXPLAIN ANALYZE.")
+    parser.add_argument('--uso-minimo', type=float, default=USO_MINIMO,
+                        help="Fração mínima das consultas da tabela para recomendar B-tree numa coluna fora da lista padrão.")
+    parser.add_argument('--criar', action='store_true', help="Cria os índices recomendados e mede as consultas de novo.")
+    parser.add_argument('--sem-explain', action='store_true', help="Só recomenda: não executa EXPLAIN ANALYZE.")
+    parser.add_argument('--timeout-ms', type=int, default=TIMEOUT_EXPLAIN_MS, help="statement_timeout de cada EXPLAIN ANALYZE.")
+    args = parser.parse_args()
+
+    registro = carregar_registro(args.registro)
+    if registro.empty:
+        print(f"Registro vazio ou inexistente: '{args.registro}'. Use as páginas com filtros e rode de novo.")
+        sys.exit(1)
+    print(f"{len(registro)} consultas registradas ({registro['assinatura'].nunique()} distintas) em '{args.registro}'.")
+    uso = uso_das_colunas(registro)
+    _mostrar("Colunas nos predicados", uso.assign(fracao=uso['fracao'].map('{:.0%}'.format)))
+
+    engine = obter_engine(rotulo='consultor-indices')
+    with engine.connect() as connection:
+        existentes = indices_existentes(connection, registro['tabela'].dropna().unique())
+    recomendacoes = recomendar_indices(registro, existentes, args.uso_minimo)
+    _mostrar("Índices existentes (primeira coluna) e chaves de partição", existentes)
+    _mostrar("Índices recomendados", recomendacoes.assign(fracao=recomendacoes['fracao'].map('{:.0%}'.format)))
+
+    consultas = consultas_mais_frequentes(registro, args.top)
+    antes = None
+    if not args.sem_explain:
+        antes = medir_consultas(engine, consultas, args.timeout_ms)
+        _mostrar(f"EXPLAIN ANALYZE das {len(consultas)} consultas mais frequentes", antes.drop(columns='assinatura'))
+
+    if args.criar and not recomendacoes.empty:
+        print("\n--- Criando índices ---")
+        for sql in criar_indices(engine, recomendacoes):
+            print(sql)
+        if antes is not None:
+            depois = medir_consultas(engine, consultas, args.timeout_ms)
+            comparacao = antes[['assinatura', 'origem', 'colunas', 'ocorrencias', 'tempo_ms']].merge(
+                depois[['assinatura', 'tempo_ms', 'varreduras']], on='assinatura', suffixes=('_antes', '_depois'))
+            comparacao['ganho'] = comparacao['tempo_ms_antes'] / comparacao['tempo_ms_depois']
+            _mostrar("Antes x depois (ms)", comparacao.drop(columns='assinatura').round(2))
+            ponderado = (
+                (comparacao['tempo_ms_antes'] * comparacao['ocorrencias']).sum(),
+                (comparacao['tempo_ms_depois'] * comparacao['ocorrencias']).sum(),
+            )
+            if pd.notna(ponderado[1]) and ponderado[1] > 0:
+                print(f"\nCarga registrada (tempo x ocorrências): {ponderado[0]:.0f} ms -> {ponderado[1]:.0f} ms "
+                      f"({ponderado[0] / ponderado[1]:.1f}x).")
+    elif args.criar:
+        print("\nNenhum índice a criar.")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Correção em lote de folhas de respostas (services/correcao_lote.py) pela linha de comando.
+
+Entrada: CSV com uma coluna de respostas (padrão 'respostas') no formato do "Preenchimento
+Rápido" (A/B/C/D/E ou '-', questão 1 em diante) e, opcionalmente, 'id' e 'uf' (UF para a
+comparação com a média estadual). Saída: CSV ou Parquet (pela extensão), gravado em blocos.
+
+Uso (a partir da raiz do projeto):
+    python scripts/corrigir_lote.py folhas.csv resultados.parquet --ano 2022 --cor AZUL [--lingua ESPANHOL]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.db_config import DatabaseConfig  # noqa: E402
+from services.correcao_lote import (  # noqa: E402
+    COLUNA_RESPOSTAS, TAMANHO_BLOCO, CorrecaoLote, formato_do_arquivo, gravar_resultados, ler_folhas_csv,
+)
+from services.database_manager import DatabaseManager  # noqa: E402
+from services.performance_analyzer import PerformanceAnalyzer  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Corrige um CSV de folhas de respostas do ENEM (acertos e nota TRI estimada).")
+    parser.add_argument('entrada', help="CSV com as folhas de respostas.")
+    parser.add_argument('saida', help="Arquivo de resultados (.csv ou .parquet).")
+    parser.add_argument('--ano', type=int, required=True, help="Ano da prova.")
+    parser.add_argument('--cor', required=True, help="Cor do caderno (AZUL, AMARELA, ROSA, CINZA, BRANCA).")
+    parser.add_argument('--lingua', default='INGLES', choices=['INGLES', 'ESPANHOL'], help="Língua estrangeira.")
+    parser.add_argument('--metodo', default='mle', choices=['mle', 'eap'], help="Estimação TRI (padrão: mle, a mesma da página).")
+    parser.add_argument('--coluna-respostas', default=COLUNA_RESPOSTAS, help="Coluna com as sequências de respostas.")
+    parser.add_argument('--coluna-id', default=None, help="Coluna de identificação do aluno (padrão: 'id', se existir).")
+    parser.add_argument('--coluna-uf', default=None, help="Coluna com a UF de comparação (padrão: 'uf', se existir).")
+    parser.add_argument('--sep', default=',', help="Separador do CSV de entrada.")
+    parser.add_argument('--bloco', type=int, default=TAMANHO_BLOCO, help="Folhas corrigidas por bloco.")
+    args = parser.parse_args()
+
+    inicio = time.time()
+    analyzer = PerformanceAnalyzer(DatabaseManager(DatabaseConfig(), rotulo="corrigir-lote"))
+    correcao = CorrecaoLote(analyzer, args.ano, args.cor, args.lingua, metodo=args.metodo)
+    if correcao.erro:
+        print(f"ERRO: {correcao.erro}")
+        sys.exit(1)
+    print(f"Prova {args.ano} / {args.cor} / {correcao.lingua}: {len(correcao.df_gabs)} gabaritos candidatos "
+          f"(contexto carregado em {time.time() - inicio:.1f}s).")
+
+    blocos = correcao.corrigir_blocos(
+        ler_folhas_csv(args.entrada, args.bloco, sep=args.sep),
+        coluna_respostas=args.coluna_respostas, coluna_id=args.coluna_id, coluna_uf=args.coluna_uf,
+    )
+    total = gravar_resultados(blocos, args.saida, formato_do_arquivo(args.saida))
+    duracao = time.time() - inicio
+    print(f"{total} folhas corrigidas em {duracao:.1f}s ({total / max(duracao, 1e-9):,.0f} folhas/s) -> '{args.saida}'.")
+
+
+if __name__ == "__main__":
+    main()
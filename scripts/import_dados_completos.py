@@ -3,6 +3,7 @@
 import pandas as pd
 from sqlalchemy import create_engine, text, types
 import time
+import os
 
 # --- Configuração do Banco de Dados PostgreSQL ---
 DB_USER = 'postgres'
@@ -15,6 +16,8 @@ DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}/{DB_NAME}"
 ARQUIVO_CSV = 'dados_completo.csv'
 NOME_TABELA = 'questoes_enem'
 TAMANHO_CHUNK = 50000
+# Cópia em Parquet para o backend DuckDB (mesmo diretório usado pelo table_script/SCRIPT.py)
+DIRETORIO_PARQUET = os.environ.get('ENEM_PARQUET_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'table_script', 'parquet'))
 
 # --- Início da operação ---
 start_time = time.time()
@@ -172,6 +175,15 @@ try:
         df_total = pd.read_sql_query(query_total, connection)
         print(f"\nTotal geral de registros: {df_total['total'].iloc[0]}")
 
+    # FASE 5: Exportando a tabela para Parquet (backend DuckDB)
+    print("\n--- FASE 5: Exportando a tabela para Parquet... ---")
+    with engine.connect() as connection:
+        df_questoes = pd.read_sql_query(text(f'SELECT * FROM {NOME_TABELA};'), connection)
+    os.makedirs(DIRETORIO_PARQUET, exist_ok=True)
+    caminho_parquet = os.path.join(DIRETORIO_PARQUET, f'{NOME_TABELA}.parquet')
+    df_questoes.to_parquet(caminho_parquet, index=False, compression='zstd')
+    print(f"  ✓ {len(df_questoes)} registros exportados para '{caminho_parquet}'")
+
 except Exception as e:
     print(f"\nOcorreu um erro inesperado: {e}")
     import traceback
@@ -1,15 +1,33 @@
 import pandas as pd
-from sqlalchemy import create_engine, text, types
+from sqlalchemy import Column, MetaData, Table, text, types
 import unicodedata
 # --- Bloco de import do psycopg REMOVIDO ---
 # SQLAlchemy cuidará da importação do driver
 import time
 import glob
+import hashlib
+import json
 from io import StringIO
 import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+import shutil
 import os
 import traceback
 import re
+import argparse
+import sys
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pos_carga
+
+# Configuração de conexão compartilhada com o app (config/, na raiz do projeto)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from config.conexao import descartar_engines, obter_engine  # noqa: E402
+from config.db_config import DatabaseConfig  # noqa: E402
 
 # --- Adição para a FASE 4 (Leitura de .xls) ---
 try:
@@ -21,11 +39,23 @@ except ImportError:
 
 
 # --- Configuração do Banco de Dados PostgreSQL ---
-DB_USER = os.environ.get('DB_USER', 'postgres')
-DB_PASS = os.environ.get('DB_PASS', 'aluno')
-DB_HOST = os.environ.get('DB_HOST', '127.0.0.1')
-DB_NAME = os.environ.get('DB_NAME', 'microdados')
-DATABASE_URL = f"postgresql+psycopg://{DB_USER}:{DB_PASS}@{DB_HOST}:5432/{DB_NAME}"
+# Mesmas variáveis de ambiente do app (DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD, DB_POOL_*;
+# config/db_config.py). O ETL só troca o driver e o que não serve para carga em massa (obter_engine_etl).
+DRIVER_ETL = 'postgresql+psycopg'  # psycopg 3: COPY por cursor.copy (copy_expert do psycopg2 também funciona)
+CONEXOES_EXTRAS_ETL = 2  # além dos escritores COPY: DDL/troca de partições e manifesto na thread principal
+
+
+def obter_engine_etl(n_escritores=1):
+    """
+    Engine do pool compartilhado (config/conexao.py) com o rótulo 'etl' ('enem-app:etl' em pg_stat_activity).
+    Sem statement_timeout (COPY e CREATE TABLE AS de anos inteiros passam de qualquer limite pensado
+    para o app) e com pool para 'n_escritores' conexões COPY presas durante a carga, mais as extras.
+    """
+    config = DatabaseConfig(driver=os.environ.get('DB_DRIVER', DRIVER_ETL))
+    config.statement_timeout_ms = 0
+    config.pool_size = max(config.pool_size, n_escritores + CONEXOES_EXTRAS_ETL)
+    return obter_engine(config, rotulo='etl')
+
 
 # --- Configurações dos Campos e Arquivos ---
 campos_str = (
@@ -46,11 +76,15 @@ campos_desejados = campos_str.upper().split(';')
 
 # --- Configurações do Processo de Carga ---
 nome_tabela = 'dados_enem_consolidado'
+# Índice (particionado) da chave de paginação da Exploration (CHAVE_PAGINACAO em Exploration/filter_utils.py)
+indice_paginacao = f'ix_{nome_tabela}_nu_ano_nu_inscricao'
 chunk_size = 50000
-upload_chunksize = 250 # Mantido baixo para evitar erro de parâmetros
+upload_chunksize = 250 # Mantido baixo para evitar erro de parâmetros (usado apenas com --loader insert)
 
 script_dir = os.path.dirname(os.path.abspath(__file__)) if '__file__' in locals() else os.getcwd()
 diretorio_csv = script_dir
+# Dataset Parquet (staging colunar) gerado junto com a carga: <diretorio>/dados_enem_consolidado/NU_ANO=.../
+diretorio_parquet = os.environ.get('ENEM_PARQUET_DIR', os.path.join(script_dir, 'parquet'))
 
 def normalize_col_name(col):
     if not isinstance(col, str):
@@ -99,7 +133,7 @@ def aplicar_regras_de_negocio(df, ano):
 
     if 'SG_UF_PROVA' in df.columns and 'NO_MUNICIPIO_PROVA' in df.columns:
         capitais_da_uf_prova = df['SG_UF_PROVA'].map(map_capitais)
-        is_capital_mask = (df['NO_MUNICIPIO_PROVA'] == capitais_da_uf_prova) & (df['NO_MUNICIPIO_PROVA'].notna())
+        is_capital_mask = df['NO_MUNICIPIO_PROVA'].eq(capitais_da_uf_prova).fillna(False).to_numpy(dtype=bool) & df['NO_MUNICIPIO_PROVA'].notna().to_numpy()
         df['FLAG_CAPITAL'] = np.where(is_capital_mask, 'Sim', 'Não')
     else: df['FLAG_CAPITAL'] = 'Não'
 
@@ -115,7 +149,7 @@ def aplicar_regras_de_negocio(df, ano):
     cols_notas_objetivas = ['NU_NOTA_CN', 'NU_NOTA_CH', 'NU_NOTA_LC', 'NU_NOTA_MT']
     cols_notas_todas = cols_notas_objetivas + ['NU_NOTA_REDACAO']
     for col in cols_notas_todas:
-        if col in df.columns: df[col] = pd.to_numeric(df[col], errors='coerce')
+        if col in df.columns: df[col] = pd.to_numeric(df[col], errors='coerce').astype('float64') # Médias calculadas em float64 (NumPy)
 
     valid_obj_cols = [col for col in cols_notas_objetivas if col in df.columns and pd.api.types.is_numeric_dtype(df[col])]
     if len(valid_obj_cols) > 0: df['MEDIA_OBJETIVAS'] = df[valid_obj_cols].mean(axis=1).round(2)
@@ -137,7 +171,7 @@ def aplicar_regras_de_negocio(df, ano):
 
     if 'NU_NOTA_REDACAO' in df.columns and pd.api.types.is_numeric_dtype(df['NU_NOTA_REDACAO']):
         nota_red_series = df['NU_NOTA_REDACAO']
-        df['INDICADOR_REDACAO_ZERADA'] = np.select([nota_red_series == 0, nota_red_series > 0], ['Sim', 'Não'], default='N/A')
+        df['INDICADOR_REDACAO_ZERADA'] = np.select([nota_red_series.eq(0).fillna(False).to_numpy(dtype=bool), nota_red_series.gt(0).fillna(False).to_numpy(dtype=bool)], ['Sim', 'Não'], default='N/A')
     else: df['INDICADOR_REDACAO_ZERADA'] = 'N/A'
 
     if 'Q006' in df.columns: df['RENDA_FAMILIAR'] = df['Q006'].map(map_renda)
@@ -152,8 +186,9 @@ def aplicar_regras_de_negocio(df, ano):
     else: df['ESCOLARIDADE_PAIS_AGRUPADO'] = 'Não informado'
 
     if 'Q024' in df.columns and 'Q025' in df.columns:
-        q024_series = df['Q024']; q025_series = df['Q025']
-        conditions = [(q024_series == 'A') & (q025_series == 'A'), (q024_series != 'A') & (q025_series == 'A'), (q024_series == 'A') & (q025_series != 'A'), (q024_series != 'A') & (q025_series != 'A')]
+        # Máscaras booleanas sem nulos (nulo conta como "diferente de 'A'"), válidas para colunas object ou Arrow
+        q024_a = df['Q024'].eq('A').fillna(False).to_numpy(dtype=bool); q025_a = df['Q025'].eq('A').fillna(False).to_numpy(dtype=bool)
+        conditions = [q024_a & q025_a, ~q024_a & q025_a, q024_a & ~q025_a, ~q024_a & ~q025_a]
         choices = ['Nenhum acesso', 'Apenas computador', 'Apenas internet', 'Acesso completo']
         df['INDICE_ACESSO_TECNOLOGIA'] = np.select(conditions, choices, default=None)
     else: df['INDICE_ACESSO_TECNOLOGIA'] = None
@@ -173,6 +208,576 @@ def aplicar_regras_de_negocio(df, ano):
 
     return df
 
+# --- FASE 1 (ANÁLISE DOS CABEÇALHOS) ---
+
+def analisar_cabecalhos(arquivos_csv):
+    """
+    Lista mestra de colunas (campos_desejados + cabeçalhos dos arquivos + colunas derivadas) e tipo SQL de cada uma.
+    Retorna (master_columns_list, tipos_de_dados_sql, all_file_headers), com os cabeçalhos normalizados por arquivo.
+    """
+    master_columns = set(campos_desejados); all_file_headers = {}
+    for arquivo in arquivos_csv:
+        try:
+            filename = os.path.basename(arquivo); print(f"Lendo: {filename}")
+            raw_header = pd.read_csv(arquivo, encoding='latin1', sep=';', nrows=0, low_memory=False).columns
+            header = [normalize_col_name(h) for h in raw_header]
+            all_file_headers[filename] = header; master_columns.update(header)
+        except Exception as e: print(f" Aviso: Falha ao ler {filename}. Erro: {e}"); all_file_headers[filename] = []
+    if 'NU_SEQUENCIAL' in master_columns: master_columns.remove('NU_SEQUENCIAL'); master_columns.add('NU_INSCRICAO'); print(" Coluna 'NU_SEQUENCIAL' mapeada para 'NU_INSCRICAO'.")
+    extra_qs = [col for col in master_columns if col.startswith('Q') and len(col) > 1 and col[1:].isdigit() and int(col[1:]) > 25]
+    if extra_qs: print(f" Removendo Q>25: {extra_qs}"); master_columns -= set(extra_qs)
+    novos_campos = [ 'REGIAO_CANDIDATO', 'FLAG_CAPITAL', 'REGIAO_ESCOLA', 'TIPO_ESCOLA_AGRUPADO', 'MEDIA_OBJETIVAS', 'MEDIA_GERAL', 'INDICADOR_ABSENTEISMO', 'INDICADOR_REDACAO_ZERADA', 'RENDA_FAMILIAR', 'ESCOLARIDADE_PAIS_AGRUPADO', 'INDICE_ACESSO_TECNOLOGIA', 'TEMPO_FORA_ESCOLA', 'FLAG_CANDIDATO_ADULTO' ]
+    master_columns.update(novos_campos); master_columns_list = sorted(list(master_columns))
+    print(f"\nColunas finais ({len(master_columns_list)}): {master_columns_list}")
+
+    tipos_de_dados_sql = {}
+    for col in master_columns_list:
+        if col in ['NU_NOTA_CN', 'NU_NOTA_CH', 'NU_NOTA_LC', 'NU_NOTA_MT', 'NU_NOTA_COMP1', 'NU_NOTA_COMP2', 'NU_NOTA_COMP3', 'NU_NOTA_COMP4', 'NU_NOTA_COMP5', 'NU_NOTA_REDACAO', 'MEDIA_OBJETIVAS', 'MEDIA_GERAL']: tipos_de_dados_sql[col] = types.NUMERIC(10, 2)
+        elif col in ['NU_ANO', 'TEMPO_FORA_ESCOLA']: tipos_de_dados_sql[col] = types.INTEGER
+        elif col in ['NU_INSCRICAO']: tipos_de_dados_sql[col] = types.BIGINT
+        elif col.startswith('CO_') or col in ['TP_FAIXA_ETARIA', 'TP_COR_RACA', 'TP_NACIONALIDADE', 'TP_ST_CONCLUSAO', 'TP_ANO_CONCLUIU', 'TP_ESCOLA', 'TP_ENSINO', 'IN_TREINEIRO', 'TP_DEPENDENCIA_ADM_ESC', 'TP_LOCALIZACAO_ESC', 'TP_SIT_FUNC_ESC', 'TP_PRESENCA_CN', 'TP_PRESENCA_CH', 'TP_PRESENCA_LC', 'TP_PRESENCA_MT', 'TP_LINGUA', 'TP_STATUS_REDACAO', 'Q005', 'TP_ESTADO_CIVIL']: # Adicionado TP_ESTADO_CIVIL
+            tipos_de_dados_sql[col] = types.INTEGER # Mantendo INTEGER para códigos e tipos
+        else: tipos_de_dados_sql[col] = types.VARCHAR
+    return master_columns_list, tipos_de_dados_sql, all_file_headers
+
+# --- INÍCIO: FUNÇÕES DA FASE 2 (PROCESSAMENTO E CARGA) ---
+
+def extrair_ano_do_arquivo(filename):
+    match = re.search(r'(19|20)\d{2}', filename)
+    if match: return int(match.group(0))
+    raise ValueError("Ano não encontrado")
+
+def mapear_colunas_de_leitura(arquivo, file_specific_header_normalized, master_columns_list):
+    """
+    Retorna os nomes ORIGINAIS (como estão no CSV) das colunas que pertencem ao schema mestre,
+    para serem usados no 'usecols' do read_csv. Retorna None para ler todas as colunas.
+    """
+    filename = os.path.basename(arquivo)
+    if not file_specific_header_normalized:
+            print(f"  Aviso: Cabeçalho não lido na Fase 1 para {filename}. Lendo novamente.")
+            raw_header = pd.read_csv(arquivo, encoding='latin1', sep=';', nrows=0, low_memory=False).columns
+            file_specific_header_normalized = [normalize_col_name(h) for h in raw_header]
+    usecols_normalized = [col for col in file_specific_header_normalized if col in master_columns_list]
+    try: # Tenta mapear de volta, pode falhar se o cabeçalho mudou ou teve erro na Fase 1
+        raw_header_map = {normalize_col_name(h): h for h in pd.read_csv(arquivo, encoding='latin1', sep=';', nrows=0, low_memory=False).columns}
+        usecols_original = [raw_header_map[norm_col] for norm_col in usecols_normalized if norm_col in raw_header_map]
+        if not usecols_original: # Se mapeamento falhar, lê todas as colunas como fallback
+            print("   Aviso: Mapeamento de colunas falhou, lendo todas as colunas.")
+            usecols_original = None
+    except Exception as map_err:
+            print(f"   Aviso: Erro ao mapear colunas para leitura otimizada ({map_err}), lendo todas as colunas.")
+            usecols_original = None
+    return usecols_original
+
+def compilar_plano_de_colunas(master_columns_list, tipos_de_dados_sql):
+    """
+    Compila, UMA vez a partir do cabeçalho mestre, o plano de tipos usado em todos os chunks:
+    para cada coluna, o tipo Arrow correspondente ao tipo SQL (INTEGER/BIGINT -> int64,
+    NUMERIC/FLOAT -> double, VARCHAR/TEXT -> string). O mesmo plano serve para a leitura
+    tipada do CSV, para a conversão final e para a serialização do CSV enviado ao COPY.
+    """
+    dtypes = {}
+    for col in master_columns_list:
+        sql_type = tipos_de_dados_sql.get(col, types.VARCHAR)
+        classe_sql = sql_type if isinstance(sql_type, type) else type(sql_type) # Aceita tanto types.INTEGER quanto types.NUMERIC(10, 2)
+        if issubclass(classe_sql, (types.INTEGER, types.BIGINT)): dtypes[col] = pd.ArrowDtype(pa.int64())
+        elif issubclass(classe_sql, (types.NUMERIC, types.FLOAT)): dtypes[col] = pd.ArrowDtype(pa.float64())
+        else: dtypes[col] = pd.ArrowDtype(pa.string())
+    schema_arrow = pa.schema([(col, dtype.pyarrow_dtype) for col, dtype in dtypes.items()])
+    return {'colunas': list(master_columns_list), 'tipos_sql': tipos_de_dados_sql, 'dtypes': dtypes, 'schema_arrow': schema_arrow}
+
+def dtype_de_leitura(colunas_originais, plano):
+    """Traduz o plano (nomes normalizados) para os tipos de leitura do CSV (nomes como estão no arquivo)."""
+    dtype_leitura = {}
+    for col_original in colunas_originais:
+        col = normalize_col_name(col_original)
+        if col == 'NU_SEQUENCIAL': col = 'NU_INSCRICAO'
+        dtype_leitura[col_original] = plano['dtypes'].get(col, pd.ArrowDtype(pa.string()))
+    return dtype_leitura
+
+def estimar_bloco_de_leitura(arquivo, linhas_por_chunk):
+    """Estima quantos bytes correspondem a 'linhas_por_chunk' linhas, a partir do primeiro 1 MiB do arquivo."""
+    with open(arquivo, 'rb') as f: amostra = f.read(1 << 20)
+    bytes_por_linha = len(amostra) / max(1, amostra.count(b'\n'))
+    return max(1 << 20, int(bytes_por_linha * linhas_por_chunk))
+
+def ler_csv_em_chunks(arquivo, usecols_original, plano):
+    """
+    Lê o CSV em chunks já tipados pelo plano, com o leitor CSV do pyarrow em modo streaming
+    (tipos explícitos por coluna, DataFrames com dtypes Arrow), sem conversões posteriores via string.
+    Se um valor não couber no tipo do plano (ex.: letras em Q005 de 2014, antes da regra de negócio),
+    a coluna passa a ser lida como texto a partir daquele ponto e é convertida por processar_chunk.
+    """
+    ordem_no_arquivo = list(pd.read_csv(arquivo, encoding='latin1', sep=';', nrows=0).columns)
+    colunas_originais = usecols_original if usecols_original is not None else ordem_no_arquivo
+    tipos_leitura = {col: dtype.pyarrow_dtype for col, dtype in dtype_de_leitura(colunas_originais, plano).items()}
+    bloco = estimar_bloco_de_leitura(arquivo, chunk_size)
+    linhas_lidas = 0
+    while True:
+        try:
+            reader = pa_csv.open_csv( arquivo,
+                                      read_options=pa_csv.ReadOptions(encoding='latin1', block_size=bloco, skip_rows_after_names=linhas_lidas),
+                                      parse_options=pa_csv.ParseOptions(delimiter=';'),
+                                      convert_options=pa_csv.ConvertOptions(include_columns=colunas_originais, column_types=tipos_leitura, strings_can_be_null=True) )
+            for batch in reader:
+                chunk = batch.to_pandas(types_mapper=pd.ArrowDtype)
+                chunk.index = pd.RangeIndex(linhas_lidas, linhas_lidas + len(chunk))
+                linhas_lidas += len(chunk)
+                yield chunk
+            return
+        except pa.ArrowInvalid as e_tipo:
+            match = re.search(r'In CSV column #(\d+)', str(e_tipo))
+            coluna = ordem_no_arquivo[int(match.group(1))] if match and int(match.group(1)) < len(ordem_no_arquivo) else None
+            if coluna is None or tipos_leitura.get(coluna) == pa.string(): raise
+            print(f"\n   Aviso: valor fora do tipo em '{coluna}' ({os.path.basename(arquivo)}, após {linhas_lidas} linhas). Lendo a coluna como texto.")
+            tipos_leitura[coluna] = pa.string()
+
+def coagir_chunk_para_plano(df, plano):
+    """
+    Converte para o tipo do plano apenas as colunas que ainda não estão nele: as criadas ou
+    alteradas pelas regras de negócio, as ausentes no arquivo e as de arquivos lidos sem tipos.
+    """
+    for col, dtype_alvo in plano['dtypes'].items():
+        serie = df[col]
+        if serie.dtype == dtype_alvo: continue
+        if dtype_alvo.pyarrow_dtype == pa.string() and serie.dtype == object: continue # Texto das regras de negócio: o schema Arrow converte na serialização
+        try:
+            if dtype_alvo.pyarrow_dtype == pa.string():
+                df[col] = serie.astype('string').replace('', None).astype(dtype_alvo)
+            else:
+                df[col] = pd.to_numeric(serie, errors='coerce').astype(dtype_alvo)
+        except Exception as coerc_e:
+            print(f"\n   Alerta de Coerção inesperado na coluna '{col}': {coerc_e}. Forçando None.")
+            df[col] = pd.Series(None, index=df.index, dtype=dtype_alvo)
+    return df
+
+def processar_chunk(chunk, ano_arquivo, plano):
+    """
+    Normaliza nomes, aplica as regras de negócio, alinha ao schema mestre e converte os tipos
+    de um chunk lido do CSV. É a parte pesada de CPU da FASE 2, sem nenhum acesso ao banco.
+    """
+    master_columns_list = plano['colunas']
+    chunk.columns = [normalize_col_name(c) for c in chunk.columns]
+    if 'NU_SEQUENCIAL' in chunk.columns: chunk.rename(columns={'NU_SEQUENCIAL': 'NU_INSCRICAO'}, inplace=True)
+
+    # Aplica regras de negócio (usando cópia para segurança)
+    # Seleciona colunas *antes* de passar para a função
+    cols_present_in_chunk = [col for col in master_columns_list if col in chunk.columns]
+    chunk_processado = aplicar_regras_de_negocio(chunk[cols_present_in_chunk].copy(), ano_arquivo)
+
+    # Reindexa para o schema mestre e converte o que ainda não está no tipo do plano
+    chunk_alinhado = chunk_processado.reindex(columns=master_columns_list)
+    return coagir_chunk_para_plano(chunk_alinhado, plano)
+
+def serializar_chunk_csv(df, plano=None):
+    """
+    Serializa o chunk em texto CSV (sem cabeçalho) no formato esperado pelo COPY. Nulos viram campo vazio.
+    Com o plano de colunas, a conversão é feita pelo escritor CSV do pyarrow usando o schema compilado;
+    sem ele (ou se algum valor não couber no schema), usa o to_csv do pandas.
+    """
+    if plano is not None:
+        try:
+            tabela_arrow = pa.Table.from_pandas(df, schema=plano['schema_arrow'], preserve_index=False)
+            buffer_arrow = pa.BufferOutputStream()
+            pa_csv.write_csv(tabela_arrow, buffer_arrow, write_options=pa_csv.WriteOptions(include_header=False))
+            return buffer_arrow.getvalue().to_pybytes().decode('utf-8')
+        except (pa.ArrowInvalid, pa.ArrowTypeError) as e_arrow:
+            print(f"\n   Aviso: serialização via pyarrow falhou ({e_arrow}). Usando to_csv.")
+    buffer = StringIO()
+    df.to_csv(buffer, index=False, header=False, na_rep='')
+    return buffer.getvalue()
+
+def copiar_csv_para_tabela(driver_connection, csv_texto, nome_tabela_destino, colunas):
+    """
+    Transmite um bloco CSV já serializado para a tabela com COPY FROM STDIN,
+    sem montar listas de parâmetros por linha. Faz commit ao final do bloco.
+    """
+    colunas_sql = ", ".join(f'"{col}"' for col in colunas)
+    sql_copy = f'COPY "{nome_tabela_destino}" ({colunas_sql}) FROM STDIN WITH (FORMAT CSV)'
+    try:
+        with driver_connection.cursor() as cursor:
+            if hasattr(cursor, 'copy'): # psycopg 3
+                with cursor.copy(sql_copy) as copy:
+                    copy.write(csv_texto)
+            else: # psycopg2
+                cursor.copy_expert(sql_copy, StringIO(csv_texto))
+        driver_connection.commit()
+    except Exception:
+        driver_connection.rollback()
+        raise
+
+def copiar_chunk_para_tabela(driver_connection, df, nome_tabela_destino, plano=None):
+    """Envia um chunk já processado para a tabela usando COPY FROM STDIN (buffer CSV em memória)."""
+    copiar_csv_para_tabela(driver_connection, serializar_chunk_csv(df, plano), nome_tabela_destino, list(df.columns))
+
+# --- Tabela particionada por ano ---
+# A tabela de microdados é particionada por LIST ("NU_ANO"), com uma partição por ano
+# (dados_enem_consolidado_<ano>): as consultas filtradas por ano só leem as partições pedidas.
+# Cada ano é gravado numa tabela nova fora da tabela principal (<partição>__carga, com CHECK do
+# ano, que dispensa a validação no ATTACH) e trocado pela partição antiga numa única transação
+# (DETACH + DROP da antiga, ATTACH da nova): recarregar um ano não apaga nem bloqueia os outros,
+# e os leitores veem o ano antigo até a troca.
+
+def nome_particao(ano):
+    return f"{nome_tabela}_{int(ano)}"
+
+def nome_particao_carga(ano):
+    return f"{nome_particao(ano)}__carga"
+
+def _existe_relacao(connection, nome):
+    return connection.execute(text("SELECT to_regclass(:nome) IS NOT NULL"), {'nome': f'"{nome}"'}).scalar_one()
+
+def particoes_existentes(connection):
+    """{ano: nome da partição} das partições anexadas à tabela principal."""
+    nomes = connection.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = to_regclass(:tabela)"
+    ), {'tabela': f'"{nome_tabela}"'}).scalars()
+    particoes = {}
+    for nome in nomes:
+        match = re.fullmatch(rf"{re.escape(nome_tabela)}_(\d{{4}})", nome)
+        if match: particoes[int(match.group(1))] = nome
+    return particoes
+
+def preparar_tabela_particionada(engine, plano):
+    """
+    Garante a tabela principal particionada por NU_ANO com as colunas do plano. Uma tabela
+    particionada com as mesmas colunas é mantida (só os anos carregados serão trocados);
+    a tabela única das versões antigas do ETL, ou uma com outras colunas, é recriada (e o manifesto, esvaziado).
+    Nos dois casos a tabela fica com o índice (NU_ANO, NU_INSCRICAO) da paginação da Exploration, que
+    indexar_particao_de_carga leva a cada ano carregado.
+    """
+    with engine.begin() as connection:
+        connection.execute(text(SQL_CRIAR_MANIFESTO))
+        tipo = connection.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:tabela)"), {'tabela': f'"{nome_tabela}"'}).scalar()
+        if tipo == 'p':
+            colunas_atuais = set(connection.execute(text(
+                "SELECT column_name FROM information_schema.columns WHERE table_schema = current_schema() AND table_name = :tabela"
+            ), {'tabela': nome_tabela}).scalars())
+            if colunas_atuais == set(plano['colunas']):
+                # Tabelas de versões anteriores ganham o índice aqui (construído uma vez em todas as partições)
+                connection.execute(text(f'CREATE INDEX IF NOT EXISTS "{indice_paginacao}" ON "{nome_tabela}" ("NU_ANO", "NU_INSCRICAO");'))
+                print(f"Tabela particionada '{nome_tabela}' mantida: só as partições dos anos carregados serão trocadas.")
+                return
+            print(f"As colunas de '{nome_tabela}' mudaram. Recriando a tabela.")
+        elif tipo is not None:
+            print(f"Tabela '{nome_tabela}' não particionada (versão anterior do ETL). Recriando como particionada por NU_ANO.")
+        connection.execute(text(f'DROP TABLE IF EXISTS "{nome_tabela}" CASCADE;'))
+        connection.execute(text(f'DELETE FROM "{TABELA_MANIFESTO}";'))
+        metadata = MetaData()
+        Table(nome_tabela, metadata, *[Column(col, plano['tipos_sql'].get(col, types.VARCHAR)) for col in plano['colunas']],
+              postgresql_partition_by='LIST ("NU_ANO")')
+        metadata.create_all(connection)
+        connection.execute(text(f'CREATE INDEX "{indice_paginacao}" ON "{nome_tabela}" ("NU_ANO", "NU_INSCRICAO");'))
+    print(f"Tabela '{nome_tabela}' criada, particionada por NU_ANO.")
+
+def preparar_particao_de_carga(engine, ano):
+    """Cria (vazia) a tabela que vai receber o ano, com as colunas da tabela principal e o CHECK do ano."""
+    carga = nome_particao_carga(ano)
+    with engine.begin() as connection:
+        connection.execute(text(f'DROP TABLE IF EXISTS "{carga}";'))
+        connection.execute(text(f'CREATE TABLE "{carga}" (LIKE "{nome_tabela}" INCLUDING DEFAULTS);'))
+        connection.execute(text(f'ALTER TABLE "{carga}" ADD CONSTRAINT "ck_nu_ano" CHECK ("NU_ANO" IS NOT NULL AND "NU_ANO" = {int(ano)});'))
+
+def indices_da_tabela_principal(connection):
+    """[(nome, definição)] dos índices (particionados) da tabela principal (ex.: os do consultor de índices)."""
+    return connection.execute(text(
+        "SELECT c.relname, pg_get_indexdef(i.indexrelid) FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE i.indrelid = to_regclass(:tabela) ORDER BY c.relname"
+    ), {'tabela': f'"{nome_tabela}"'}).all()
+
+def indexar_particao_de_carga(engine, ano):
+    """
+    Cria na tabela de carga (já gravada) os índices da tabela principal, como <carga>_ix<n>. O ATTACH
+    reaproveita índices equivalentes; sem eles, construiria cada índice sobre o ano inteiro dentro da
+    transação da troca, com a tabela principal bloqueada. Retorna os nomes criados, na ordem dos índices.
+    """
+    carga, nomes = nome_particao_carga(ano), []
+    with engine.begin() as connection:
+        for i, (_, definicao) in enumerate(indices_da_tabela_principal(connection)):
+            match = re.match(r"CREATE (UNIQUE )?INDEX \S+ ON (?:ONLY )?\S+ (USING .*)$", definicao)
+            if not match: continue
+            nomes.append(f"{carga}_ix{i}")
+            connection.execute(text(f'CREATE {match.group(1) or ""}INDEX "{nomes[-1]}" ON "{carga}" {match.group(2)};'))
+    return nomes
+
+def trocar_particao(engine, ano, registros_manifesto=None):
+    """
+    Troca a partição do ano pela tabela de carga na mesma transação (DETACH + DROP da antiga, ATTACH da nova).
+    Os índices são criados antes, fora dessa transação (indexar_particao_de_carga), e só renomeados nela.
+    Com 'registros_manifesto', as linhas do ano no manifesto são substituídas na mesma transação.
+    """
+    particao, carga = nome_particao(ano), nome_particao_carga(ano)
+    indices = indexar_particao_de_carga(engine, ano)
+    with engine.begin() as connection:
+        if _existe_relacao(connection, particao):
+            if particao in particoes_existentes(connection).values():
+                connection.execute(text(f'ALTER TABLE "{nome_tabela}" DETACH PARTITION "{particao}";'))
+            connection.execute(text(f'DROP TABLE "{particao}";'))
+        connection.execute(text(f'ALTER TABLE "{carga}" RENAME TO "{particao}";'))
+        for nome in indices:
+            connection.execute(text(f'ALTER INDEX "{nome}" RENAME TO "{particao}{nome[len(carga):]}";'))
+        connection.execute(text(f'ALTER TABLE "{nome_tabela}" ATTACH PARTITION "{particao}" FOR VALUES IN ({int(ano)});'))
+        if registros_manifesto is not None: registrar_no_manifesto(connection, ano, registros_manifesto)
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text(f'ANALYZE "{particao}";'))
+
+def descartar_particao_de_carga(engine, ano):
+    with engine.begin() as connection: connection.execute(text(f'DROP TABLE IF EXISTS "{nome_particao_carga(ano)}";'))
+
+def descartar_particoes(engine, anos):
+    """Remove as partições dos anos indicados (DETACH + DROP) e as linhas deles no manifesto."""
+    with engine.begin() as connection:
+        particoes = particoes_existentes(connection)
+        for ano in anos:
+            registrar_no_manifesto(connection, ano, [])
+            if ano not in particoes: continue
+            connection.execute(text(f'ALTER TABLE "{nome_tabela}" DETACH PARTITION "{particoes[ano]}";'))
+            connection.execute(text(f'DROP TABLE "{particoes[ano]}";'))
+
+# --- Manifesto da carga (--incremental) ---
+# Cada arquivo carregado fica registrado em TABELA_MANIFESTO com a sua impressão digital
+# (tamanho, mtime e SHA-256 do conteúdo), as linhas gravadas e a versão do schema. A linha é
+# gravada na mesma transação da troca da partição do ano, então o manifesto descreve sempre o
+# que está na tabela. Com --incremental, só os anos com arquivo novo, alterado ou removido
+# (ou carregados com outro schema) são processados de novo; os demais nem são lidos.
+
+TABELA_MANIFESTO = 'manifesto_carga'
+VERSAO_REGRAS = 1 # Incrementar ao mudar aplicar_regras_de_negocio: o modo incremental passa a recarregar todos os anos
+
+SQL_CRIAR_MANIFESTO = f'''
+    CREATE TABLE IF NOT EXISTS "{TABELA_MANIFESTO}" (
+        "arquivo" VARCHAR PRIMARY KEY,
+        "NU_ANO" INTEGER NOT NULL,
+        "tamanho" BIGINT NOT NULL,
+        "mtime" DOUBLE PRECISION NOT NULL,
+        "hash_sha256" VARCHAR(64) NOT NULL,
+        "linhas" BIGINT NOT NULL,
+        "versao_schema" VARCHAR(16) NOT NULL,
+        "carregado_em" TIMESTAMP NOT NULL DEFAULT now()
+    );
+'''
+
+def versao_do_schema(plano):
+    """Resumo das colunas, dos tipos SQL e de VERSAO_REGRAS: muda quando os dados gravados mudariam para o mesmo CSV."""
+    tipos = [(col, str(tipo() if isinstance(tipo, type) else tipo)) for col, tipo in ((col, plano['tipos_sql'].get(col, types.VARCHAR)) for col in plano['colunas'])]
+    return hashlib.sha1(json.dumps([VERSAO_REGRAS, tipos]).encode('utf-8')).hexdigest()[:16]
+
+def hash_do_arquivo(arquivo, bloco=1 << 23):
+    sha = hashlib.sha256()
+    with open(arquivo, 'rb') as f:
+        for parte in iter(lambda: f.read(bloco), b''): sha.update(parte)
+    return sha.hexdigest()
+
+def ler_manifesto(engine):
+    """{nome do arquivo: registro} do manifesto."""
+    with engine.connect() as connection:
+        df = pd.read_sql_query(text(f'SELECT * FROM "{TABELA_MANIFESTO}";'), connection)
+    return {registro['arquivo']: registro for registro in df.to_dict('records')}
+
+def impressao_digital(arquivo, anterior=None):
+    """Tamanho, mtime e SHA-256 do arquivo. Se tamanho e mtime são os do manifesto, o hash registrado é reaproveitado."""
+    estado = os.stat(arquivo)
+    if anterior is not None and anterior['tamanho'] == estado.st_size and anterior['mtime'] == estado.st_mtime:
+        return {'tamanho': estado.st_size, 'mtime': estado.st_mtime, 'hash_sha256': anterior['hash_sha256']}
+    return {'tamanho': estado.st_size, 'mtime': estado.st_mtime, 'hash_sha256': hash_do_arquivo(arquivo)}
+
+def anos_a_recarregar(tarefas, impressoes, manifesto, versao_schema, particoes):
+    """{ano: motivo} dos anos que o modo incremental precisa recarregar."""
+    arquivos_por_ano = {}
+    for arquivo, ano_arquivo, _ in tarefas: arquivos_por_ano.setdefault(ano_arquivo, set()).add(os.path.basename(arquivo))
+    motivos = {}
+    for ano_arquivo, nomes in sorted(arquivos_por_ano.items()):
+        registrados = {nome for nome, registro in manifesto.items() if registro['NU_ANO'] == ano_arquivo}
+        if ano_arquivo not in particoes: motivos[ano_arquivo] = 'sem partição'
+        elif nomes != registrados: motivos[ano_arquivo] = f"arquivos novos ou removidos ({', '.join(sorted(nomes ^ registrados))})"
+        elif any(manifesto[nome]['versao_schema'] != versao_schema for nome in nomes): motivos[ano_arquivo] = 'versão do schema mudou'
+        else:
+            alterados = sorted(nome for nome in nomes if manifesto[nome]['hash_sha256'] != impressoes[nome]['hash_sha256'])
+            if alterados: motivos[ano_arquivo] = f"conteúdo alterado ({', '.join(alterados)})"
+    return motivos
+
+def registrar_no_manifesto(connection, ano, registros):
+    """Substitui as linhas do ano no manifesto. 'registros': dicionários com arquivo, linhas, versao_schema e a impressão digital."""
+    connection.execute(text(f'DELETE FROM "{TABELA_MANIFESTO}" WHERE "NU_ANO" = :ano;'), {'ano': int(ano)})
+    if registros:
+        connection.execute(text(f'''INSERT INTO "{TABELA_MANIFESTO}" ("arquivo", "NU_ANO", "tamanho", "mtime", "hash_sha256", "linhas", "versao_schema")
+                                   VALUES (:arquivo, :ano, :tamanho, :mtime, :hash_sha256, :linhas, :versao_schema);'''),
+                           [{'ano': int(ano), **registro} for registro in registros])
+
+def atualizar_mtimes_no_manifesto(engine, impressoes, manifesto):
+    """Arquivos com o mesmo conteúdo e outro mtime (ex.: copiados de novo): grava o mtime novo para não recalcular o hash."""
+    tocados = [{'arquivo': nome, 'mtime': impressao['mtime']} for nome, impressao in impressoes.items()
+               if nome in manifesto and manifesto[nome]['hash_sha256'] == impressao['hash_sha256'] and manifesto[nome]['mtime'] != impressao['mtime']]
+    if tocados:
+        with engine.begin() as connection: connection.execute(text(f'UPDATE "{TABELA_MANIFESTO}" SET "mtime" = :mtime WHERE "arquivo" = :arquivo;'), tocados)
+
+# --- Carga paralela (--workers N) ---
+# Cada processo do pool lê e transforma UM arquivo inteiro, chunk a chunk, e coloca o chunk
+# em uma fila limitada: o CSV já serializado ou, com o Parquet ligado, só o DataFrame (o escritor
+# serializa o CSV do COPY e grava o mesmo DataFrame no Parquet; nada vai duas vezes pela fila).
+# Threads escritoras no processo principal consomem a fila e executam o COPY, cada uma com a sua
+# própria conexão. A fila limitada impede que os workers acumulem na memória mais chunks do que
+# os escritores conseguem gravar.
+
+_fila_chunks = None
+
+def _inicializar_worker(fila):
+    global _fila_chunks
+    _fila_chunks = fila
+
+def processar_arquivo_worker(arquivo, ano_arquivo, usecols_original, plano, enviar_chunk=False):
+    """
+    Executado em um processo do pool. Com 'enviar_chunk', vai na fila o DataFrame em vez do CSV, para o
+    escritor serializá-lo para o COPY e gravá-lo no Parquet depois. Retorna (nome do arquivo, linhas enviadas à fila, tempo em segundos, chunks com falha).
+    """
+    start_time_file = time.time(); filename = os.path.basename(arquivo); rows_in_file = 0; chunks_com_falha = 0
+    for i, chunk in enumerate(ler_csv_em_chunks(arquivo, usecols_original, plano)):
+        try:
+            chunk_alinhado = processar_chunk(chunk, ano_arquivo, plano)
+            dados = chunk_alinhado if enviar_chunk else serializar_chunk_csv(chunk_alinhado, plano)
+            _fila_chunks.put((filename, ano_arquivo, i + 1, len(chunk_alinhado), dados))
+            rows_in_file += len(chunk_alinhado)
+        except Exception as e_chunk: print(f"\n  [{filename}] Falha no chunk {i+1}: {str(e_chunk)}. Pulando chunk {i+1}."); chunks_com_falha += 1
+    return filename, rows_in_file, time.time() - start_time_file, chunks_com_falha
+
+def escritor_copy(raw_connection, fila, destino_do_ano, plano, linhas_por_ano, anos_com_falha, lock, opcoes_parquet=None, indice=0):
+    """
+    Thread escritora: consome a fila até receber None, gravando cada bloco com COPY na tabela destino_do_ano(ano).
+    Blocos que chegam como DataFrame são serializados aqui; só os aceitos pelo COPY vão para o Parquet de
+    carga (arquivos com o sufixo .w<indice> do escritor).
+    """
+    escritores_parquet = {}
+    try:
+        while True:
+            item = fila.get()
+            if item is None: break
+            filename, ano_arquivo, n_chunk, n_linhas, dados = item
+            chunk = dados if isinstance(dados, pd.DataFrame) else None
+            try:
+                csv_texto = dados if chunk is None else serializar_chunk_csv(chunk, plano)
+                copiar_csv_para_tabela(raw_connection.driver_connection, csv_texto, destino_do_ano(ano_arquivo), plano['colunas'])
+                with lock: linhas_por_ano[ano_arquivo] = linhas_por_ano.get(ano_arquivo, 0) + n_linhas
+            except Exception as e_copy:
+                print(f"\n  Falha no COPY do chunk {n_chunk} de {filename}: {str(e_copy)}. Pulando chunk {n_chunk}.")
+                with lock: anos_com_falha.add(ano_arquivo)
+                continue
+            if chunk is not None and opcoes_parquet:
+                try: escrever_chunk_parquet(escritores_parquet, chunk, filename, plano, opcoes_parquet, sufixo=f".w{indice}")
+                except Exception as e_parquet:
+                    print(f"\n  Falha ao gravar o chunk {n_chunk} de {filename} no Parquet: {str(e_parquet)}.")
+                    with lock: anos_com_falha.add(ano_arquivo)
+    finally:
+        fechar_escritores_parquet(escritores_parquet)
+
+def carregar_arquivos_em_paralelo(engine, tarefas, plano, n_workers, n_writers, opcoes_parquet=None):
+    """
+    Processa os arquivos em paralelo (um arquivo por worker) e grava com 'n_writers' escritores COPY.
+    'tarefas' é uma lista de tuplas (arquivo, ano, usecols_original).
+    Retorna ({ano: linhas efetivamente gravadas}, {arquivo: linhas processadas}, {anos com algum chunk perdido}):
+    as linhas por ano são conferidas na FASE 3; as por arquivo e as falhas vão para o manifesto.
+    """
+    fila = multiprocessing.Queue(maxsize=max(2, n_workers * 2))
+    linhas_por_ano = {}; linhas_por_arquivo = {}; anos_com_falha = set(); lock = threading.Lock()
+    # As conexões são abertas antes do pool: se o banco estiver fora, falha aqui e não com workers bloqueados na fila
+    conexoes = [engine.raw_connection() for _ in range(n_writers)]
+    escritores = [threading.Thread(target=escritor_copy, args=(conn, fila, nome_particao_carga, plano, linhas_por_ano, anos_com_falha, lock, opcoes_parquet, indice), daemon=True)
+                  for indice, conn in enumerate(conexoes)]
+    for escritor in escritores: escritor.start()
+    try:
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_inicializar_worker, initargs=(fila,)) as executor:
+            futuros = {executor.submit(processar_arquivo_worker, arquivo, ano_arquivo, usecols_original, plano, bool(opcoes_parquet)): (arquivo, ano_arquivo)
+                       for arquivo, ano_arquivo, usecols_original in tarefas}
+            for futuro in as_completed(futuros):
+                arquivo, ano_arquivo = futuros[futuro]
+                try:
+                    filename, rows_in_file, tempo_arquivo, chunks_com_falha = futuro.result()
+                    linhas_por_arquivo[filename] = rows_in_file
+                    if chunks_com_falha:
+                        with lock: anos_com_falha.add(ano_arquivo)
+                    linhas_por_segundo = rows_in_file / tempo_arquivo if tempo_arquivo > 0 else 0.0
+                    print(f"  Arquivo {filename} ({rows_in_file} linhas) processado em {tempo_arquivo:.2f}s ({linhas_por_segundo:,.0f} linhas/s).")
+                except Exception as e_file:
+                    print(f"\n  Falha ao processar {os.path.basename(arquivo)}: {str(e_file)}"); traceback.print_exc()
+                    with lock: anos_com_falha.add(ano_arquivo)
+    finally:
+        for _ in escritores: fila.put(None)
+        for escritor in escritores: escritor.join()
+        for conn in conexoes: conn.close()
+    return linhas_por_ano, linhas_por_arquivo, anos_com_falha
+
+# --- Staging em Parquet (--parquet) ---
+# Além do banco, os chunks já processados (com as colunas derivadas) são gravados num dataset
+# Parquet particionado no estilo Hive: NU_ANO=<ano>/[SG_UF_PROVA=<uf>/]<arquivo de origem>.parquet,
+# comprimido com zstd. Cada arquivo de origem abre um ParquetWriter por partição e grava um
+# row group por chunk. As colunas de partição ficam só no caminho, não dentro dos arquivos.
+# Os chunks são gravados depois do COPY (um chunk recusado pelo banco não vai para o Parquet),
+# numa cópia de carga do dataset (<tabela>__carga). A pasta NU_ANO=<ano> da carga só substitui a
+# do dataset depois que a partição do ano é trocada no banco; se o ano não grava nenhuma linha,
+# a pasta anterior fica. Leitura: services/parquet_reader.py.
+
+VALOR_PARTICAO_NULA = '__HIVE_DEFAULT_PARTITION__'
+
+def diretorio_dataset_parquet(diretorio, carga=False):
+    return os.path.join(diretorio, f"{nome_tabela}__carga" if carga else nome_tabela)
+
+def promover_parquet_do_ano(diretorio, ano):
+    """Substitui a pasta NU_ANO=<ano> do dataset pela da carga."""
+    nova = os.path.join(diretorio_dataset_parquet(diretorio, carga=True), f"NU_ANO={ano}")
+    atual = os.path.join(diretorio_dataset_parquet(diretorio), f"NU_ANO={ano}")
+    antiga = os.path.join(diretorio_dataset_parquet(diretorio, carga=True), f"NU_ANO={ano}__antiga") # Fora do dataset: não aparece para os leitores
+    shutil.rmtree(antiga, ignore_errors=True)
+    if os.path.exists(atual): os.replace(atual, antiga)
+    if os.path.exists(nova):
+        os.makedirs(os.path.dirname(atual), exist_ok=True); os.replace(nova, atual)
+    shutil.rmtree(antiga, ignore_errors=True)
+
+def descartar_parquet_do_ano(diretorio, ano):
+    shutil.rmtree(os.path.join(diretorio_dataset_parquet(diretorio), f"NU_ANO={ano}"), ignore_errors=True)
+
+def anos_no_parquet(diretorio):
+    """Valores de NU_ANO das pastas do dataset (inclusive a de nulos)."""
+    caminho = diretorio_dataset_parquet(diretorio)
+    if not os.path.isdir(caminho): return []
+    return [nome.split('=', 1)[1] for nome in os.listdir(caminho) if nome.startswith('NU_ANO=')]
+
+def escrever_chunk_parquet(escritores, chunk, nome_arquivo_origem, plano, opcoes_parquet, sufixo=''):
+    """
+    Grava o chunk nas partições da cópia de carga do dataset. 'escritores' guarda os ParquetWriter abertos
+    ({caminho: writer}); 'sufixo' separa os arquivos de quem grava o mesmo arquivo de origem (escritores paralelos).
+    """
+    colunas_particao = ['NU_ANO', 'SG_UF_PROVA'] if opcoes_parquet['por_uf'] else ['NU_ANO']
+    schema_arquivo = plano['schema_arrow']
+    for col in colunas_particao: schema_arquivo = schema_arquivo.remove(schema_arquivo.get_field_index(col))
+    nome_base = os.path.splitext(nome_arquivo_origem)[0] + sufixo + '.parquet'
+    for chaves, grupo in chunk.groupby(colunas_particao, dropna=False, sort=False):
+        chaves = chaves if isinstance(chaves, tuple) else (chaves,)
+        segmentos = [f"{col}={VALOR_PARTICAO_NULA if pd.isna(valor) else valor}" for col, valor in zip(colunas_particao, chaves)]
+        caminho = os.path.join(diretorio_dataset_parquet(opcoes_parquet['diretorio'], carga=True), *segmentos, nome_base)
+        if caminho not in escritores:
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+            escritores[caminho] = pq.ParquetWriter(caminho, schema_arquivo, compression='zstd')
+        escritores[caminho].write_table(pa.Table.from_pandas(grupo.drop(columns=colunas_particao), schema=schema_arquivo, preserve_index=False))
+
+def fechar_escritores_parquet(escritores):
+    for escritor in escritores.values(): escritor.close()
+    escritores.clear()
+
+def exportar_tabela_para_parquet(engine, nome_tabela_origem, diretorio):
+    """Copia uma tabela auxiliar do banco para <diretorio>/<nome_tabela_origem>.parquet (usado pelo backend DuckDB)."""
+    try:
+        os.makedirs(diretorio, exist_ok=True)
+        with engine.connect() as connection: df = pd.read_sql_query(text(f'SELECT * FROM "{nome_tabela_origem}"'), connection)
+        caminho = os.path.join(diretorio, f"{nome_tabela_origem}.parquet")
+        df.to_parquet(caminho, index=False, compression='zstd')
+        print(f"Tabela '{nome_tabela_origem}' exportada para '{caminho}' ({len(df)} linhas).")
+        return True
+    except Exception as e:
+        print(f"Aviso: falha ao exportar '{nome_tabela_origem}' para Parquet: {e}")
+        return False
+
+# --- FIM: FUNÇÕES DA FASE 2 (PROCESSAMENTO E CARGA) ---
+
+
 # --- INÍCIO: FUNÇÕES DA FASE 4 ---
 
 # --- FUNÇÃO 'criar_tabela_municipios_do_ibge' MODIFICADA (FASE 4A) ---
@@ -442,16 +1047,32 @@ def criar_tabela_dicionario(engine):
 
 # --- SCRIPT PRINCIPAL ---
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ETL dos microdados do ENEM para o PostgreSQL.")
+    parser.add_argument('--loader', choices=['copy', 'insert'], default='copy',
+                        help="Modo de carga: 'copy' (COPY FROM STDIN, padrão) ou 'insert' (to_sql em lotes, legado).")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Número de processos que leem e transformam os arquivos em paralelo (um arquivo por processo). Padrão: 1 (sequencial).")
+    parser.add_argument('--writers', type=int, default=2,
+                        help="Número de escritores COPY que consomem a fila quando --workers > 1. Padrão: 2.")
+    parser.add_argument('--sem-parquet', action='store_true',
+                        help="Não gera o dataset Parquet (staging colunar) junto com a carga.")
+    parser.add_argument('--parquet-dir', default=diretorio_parquet,
+                        help="Diretório do dataset Parquet. Padrão: $ENEM_PARQUET_DIR ou ./parquet ao lado do script.")
+    parser.add_argument('--parquet-por-uf', action='store_true',
+                        help="Sub-particiona o dataset Parquet por SG_UF_PROVA dentro de cada NU_ANO.")
+    parser.add_argument('--anos', type=int, nargs='+', default=None,
+                        help="Recarrega só os CSVs destes anos, trocando apenas as partições deles. Padrão: todos os anos encontrados.")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Recarrega só os anos com CSV novo, alterado ou removido desde a última carga (manifesto 'manifesto_carga'). Não remove anos.")
+    parser.add_argument('--sem-pos-carga', action='store_true',
+                        help="Não executa a FASE 6 (tabelas derivadas: cubo do Dashboard). Pode ser feita depois com pos_carga.py.")
+    args = parser.parse_args()
+    if args.workers > 1 and args.loader != 'copy':
+        parser.error("--workers > 1 requer --loader copy.")
+
     start_time_total = time.time()
     
-    # Adicionado pool_pre_ping=True para verificar conexões antes de usar
-    engine = create_engine(
-        DATABASE_URL, 
-        pool_size=10, 
-        max_overflow=15, 
-        pool_timeout=60, 
-        pool_pre_ping=True 
-    )
+    engine = obter_engine_etl(args.writers if args.workers > 1 else 1)
     
     # Busca arquivos CSV de microdados
     arquivos_csv = glob.glob(os.path.join(diretorio_csv, '*.csv'))
@@ -463,133 +1084,134 @@ if __name__ == "__main__":
     arquivos_csv = [f for f in arquivos_csv if 'Campos Calculados' not in f and 'Dicionário' not in f]
 
 
+    tabela_alterada = False # Alguma partição trocada ou removida na FASE 2 (a FASE 6 só roda nesse caso)
+    anos_trocados = [] # Anos cuja partição foi trocada: a FASE 6 só recalcula esses (e apaga os removidos)
     if not arquivos_csv: 
         print(f"AVISO: Nenhum arquivo .csv de microdados (ENEM/PARTICIPANTES) encontrado em: {diretorio_csv}")
         # Não usamos exit() para permitir que a FASE 4 e 5 rodem mesmo assim
     else:
         print("--- FASE 1: Analisando cabeçalhos... ---")
-        master_columns = set(campos_desejados); all_file_headers = {}
-        for arquivo in arquivos_csv:
-            try:
-                filename = os.path.basename(arquivo); print(f"Lendo: {filename}")
-                raw_header = pd.read_csv(arquivo, encoding='latin1', sep=';', nrows=0, low_memory=False).columns
-                header = [normalize_col_name(h) for h in raw_header]
-                all_file_headers[filename] = header; master_columns.update(header)
-            except Exception as e: print(f" Aviso: Falha ao ler {filename}. Erro: {e}"); all_file_headers[filename] = []
-        if 'NU_SEQUENCIAL' in master_columns: master_columns.remove('NU_SEQUENCIAL'); master_columns.add('NU_INSCRICAO'); print(" Coluna 'NU_SEQUENCIAL' mapeada para 'NU_INSCRICAO'.")
-        extra_qs = [col for col in master_columns if col.startswith('Q') and len(col) > 1 and col[1:].isdigit() and int(col[1:]) > 25]
-        if extra_qs: print(f" Removendo Q>25: {extra_qs}"); master_columns -= set(extra_qs)
-        novos_campos = [ 'REGIAO_CANDIDATO', 'FLAG_CAPITAL', 'REGIAO_ESCOLA', 'TIPO_ESCOLA_AGRUPADO', 'MEDIA_OBJETIVAS', 'MEDIA_GERAL', 'INDICADOR_ABSENTEISMO', 'INDICADOR_REDACAO_ZERADA', 'RENDA_FAMILIAR', 'ESCOLARIDADE_PAIS_AGRUPADO', 'INDICE_ACESSO_TECNOLOGIA', 'TEMPO_FORA_ESCOLA', 'FLAG_CANDIDATO_ADULTO' ]
-        master_columns.update(novos_campos); master_columns_list = sorted(list(master_columns))
-        print(f"\nColunas finais ({len(master_columns_list)}): {master_columns_list}")
-
-        tipos_de_dados_sql = {}
-        for col in master_columns_list:
-            if col in ['NU_NOTA_CN', 'NU_NOTA_CH', 'NU_NOTA_LC', 'NU_NOTA_MT', 'NU_NOTA_COMP1', 'NU_NOTA_COMP2', 'NU_NOTA_COMP3', 'NU_NOTA_COMP4', 'NU_NOTA_COMP5', 'NU_NOTA_REDACAO', 'MEDIA_OBJETIVAS', 'MEDIA_GERAL']: tipos_de_dados_sql[col] = types.NUMERIC(10, 2)
-            elif col in ['NU_ANO', 'TEMPO_FORA_ESCOLA']: tipos_de_dados_sql[col] = types.INTEGER
-            elif col in ['NU_INSCRICAO']: tipos_de_dados_sql[col] = types.BIGINT
-            elif col.startswith('CO_') or col in ['TP_FAIXA_ETARIA', 'TP_COR_RACA', 'TP_NACIONALIDADE', 'TP_ST_CONCLUSAO', 'TP_ANO_CONCLUIU', 'TP_ESCOLA', 'TP_ENSINO', 'IN_TREINEIRO', 'TP_DEPENDENCIA_ADM_ESC', 'TP_LOCALIZACAO_ESC', 'TP_SIT_FUNC_ESC', 'TP_PRESENCA_CN', 'TP_PRESENCA_CH', 'TP_PRESENCA_LC', 'TP_PRESENCA_MT', 'TP_LINGUA', 'TP_STATUS_REDACAO', 'Q005', 'TP_ESTADO_CIVIL']: # Adicionado TP_ESTADO_CIVIL
-                 tipos_de_dados_sql[col] = types.INTEGER # Mantendo INTEGER para códigos e tipos
-            else: tipos_de_dados_sql[col] = types.VARCHAR
+        master_columns_list, tipos_de_dados_sql, all_file_headers = analisar_cabecalhos(arquivos_csv)
         print(f"\nTipos SQL definidos: {tipos_de_dados_sql}")
+        plano = compilar_plano_de_colunas(master_columns_list, tipos_de_dados_sql)
 
-        print("\n--- FASE 2: Processando e carregando arquivos ---")
-        is_first_upload = True; total_rows_processed = 0
-        try:
-            with engine.connect() as connection: connection.execute(text(f'DROP TABLE IF EXISTS "{nome_tabela}" CASCADE;')); connection.commit()
-            print(f"Tabela '{nome_tabela}' antiga removida.")
-        except Exception as e: print(f"Aviso: Falha ao dropar tabela. Erro: {e}")
-        try:
-            empty_df = pd.DataFrame(columns=master_columns_list).astype({col: 'float64' for col, dtype in tipos_de_dados_sql.items() if isinstance(dtype, (types.NUMERIC, types.FLOAT))} | {col: 'Int64' for col, dtype in tipos_de_dados_sql.items() if isinstance(dtype, (types.INTEGER, types.BIGINT))} | {col: 'object' for col, dtype in tipos_de_dados_sql.items() if isinstance(dtype, (types.VARCHAR, types.TEXT))})
-            print("Criando schema da tabela no banco..."); empty_df.to_sql( name=nome_tabela, con=engine, if_exists='replace', index=False, dtype=tipos_de_dados_sql ); print("Schema criado.")
-            is_first_upload = False
-        except Exception as e: print(f"\nERRO CRÍTICO ao criar schema '{nome_tabela}'. Abortando.\nErro: {e}"); traceback.print_exc(); engine.dispose(); exit()
+        print(f"\n--- FASE 2: Processando e carregando arquivos (loader: {args.loader}) ---")
+        total_rows_processed = 0
 
+        tarefas = []
         for arquivo in arquivos_csv:
-            start_time_file = time.time(); filename = os.path.basename(arquivo); print(f"\nProcessando: {filename}")
-            try:
-                match = re.search(r'(19|20)\d{2}', filename)
-                if match: ano_arquivo = int(match.group(0))
-                else: raise ValueError("Ano não encontrado")
-                print(f"  Ano: {ano_arquivo}")
+            filename = os.path.basename(arquivo)
+            try: ano_arquivo = extrair_ano_do_arquivo(filename)
             except ValueError as e: print(f"  Aviso: {e} em '{filename}'. Pulando."); continue
+            if args.anos and ano_arquivo not in args.anos: continue
+            tarefas.append((arquivo, ano_arquivo, mapear_colunas_de_leitura(arquivo, all_file_headers.get(filename, []), master_columns_list)))
 
-            rows_in_file = 0
+        try:
+            preparar_tabela_particionada(engine, plano)
+            manifesto = ler_manifesto(engine)
+            with engine.connect() as connection: particoes = particoes_existentes(connection)
+        except Exception as e: print(f"\nERRO CRÍTICO ao criar schema '{nome_tabela}'. Abortando.\nErro: {e}"); traceback.print_exc(); descartar_engines(); exit()
+
+        # Impressão digital dos arquivos (o SHA-256 só é calculado para arquivos novos ou com outro tamanho/mtime)
+        versao_schema = versao_do_schema(plano)
+        print("Calculando a impressão digital dos arquivos...")
+        impressoes = {os.path.basename(arquivo): impressao_digital(arquivo, manifesto.get(os.path.basename(arquivo))) for arquivo, _, _ in tarefas}
+        atualizar_mtimes_no_manifesto(engine, impressoes, manifesto)
+        if args.incremental:
+            motivos = anos_a_recarregar(tarefas, impressoes, manifesto, versao_schema, particoes)
+            for ano_arquivo, motivo in motivos.items(): print(f"  {ano_arquivo}: recarregar ({motivo}).")
+            anos_sem_alteracao = sorted({ano_arquivo for _, ano_arquivo, _ in tarefas} - set(motivos))
+            if anos_sem_alteracao: print(f"  Sem alteração (mantidos): {anos_sem_alteracao}")
+            tarefas = [tarefa for tarefa in tarefas if tarefa[1] in motivos]
+        anos_da_carga = sorted({ano_arquivo for _, ano_arquivo, _ in tarefas})
+        print(f"Anos a carregar: {anos_da_carga}" + (" (--anos)" if args.anos else "") + (" (--incremental)" if args.incremental else ""))
+
+        try:
+            for ano_arquivo in anos_da_carga: preparar_particao_de_carga(engine, ano_arquivo)
+        except Exception as e: print(f"\nERRO CRÍTICO ao criar as tabelas de carga. Abortando.\nErro: {e}"); traceback.print_exc(); descartar_engines(); exit()
+        carga_parcial = bool(args.anos or args.incremental)
+        opcoes_parquet = None if args.sem_parquet else {'diretorio': args.parquet_dir, 'por_uf': args.parquet_por_uf}
+        if opcoes_parquet:
+            # O dataset atual fica intacto durante a carga; só a cópia de carga de uma execução anterior é apagada
+            shutil.rmtree(diretorio_dataset_parquet(opcoes_parquet['diretorio'], carga=True), ignore_errors=True)
+            print(f"Dataset Parquet será gravado em '{os.path.join(opcoes_parquet['diretorio'], nome_tabela)}' (por UF: {'sim' if opcoes_parquet['por_uf'] else 'não'}).")
+
+        # Linhas efetivamente gravadas por ano (conferidas contra o banco na FASE 3), linhas por
+        # arquivo e anos com algum chunk perdido (para o manifesto)
+        linhas_carregadas_por_ano = {}; linhas_por_arquivo = {}; anos_com_falha = set()
+
+        if args.workers > 1:
+            print(f"Processando {len(tarefas)} arquivos com {args.workers} workers e {args.writers} escritores COPY...")
             try:
-                file_specific_header_normalized = all_file_headers.get(filename, [])
-                if not file_specific_header_normalized:
-                        print(f"  Aviso: Cabeçalho não lido na Fase 1 para {filename}. Lendo novamente.")
-                        raw_header = pd.read_csv(arquivo, encoding='latin1', sep=';', nrows=0, low_memory=False).columns
-                        file_specific_header_normalized = [normalize_col_name(h) for h in raw_header]
-                usecols_normalized = [col for col in file_specific_header_normalized if col in master_columns_list]
-                try: # Tenta mapear de volta, pode falhar se o cabeçalho mudou ou teve erro na Fase 1
-                    raw_header_map = {normalize_col_name(h): h for h in pd.read_csv(arquivo, encoding='latin1', sep=';', nrows=0, low_memory=False).columns}
-                    usecols_original = [raw_header_map[norm_col] for norm_col in usecols_normalized if norm_col in raw_header_map]
-                    if not usecols_original: # Se mapeamento falhar, lê todas as colunas como fallback
-                        print("   Aviso: Mapeamento de colunas falhou, lendo todas as colunas.")
-                        usecols_original = None
-                except Exception as map_err:
-                        print(f"   Aviso: Erro ao mapear colunas para leitura otimizada ({map_err}), lendo todas as colunas.")
-                        usecols_original = None
-
-                reader = pd.read_csv( arquivo, encoding='latin1', sep=';', chunksize=chunk_size, low_memory=False, usecols=usecols_original )
-                for i, chunk in enumerate(reader):
-                    start_time_chunk = time.time()
-                    try:
-                        chunk.columns = [normalize_col_name(c) for c in chunk.columns]
-                        if 'NU_SEQUENCIAL' in chunk.columns: chunk.rename(columns={'NU_SEQUENCIAL': 'NU_INSCRICAO'}, inplace=True)
-                        
-                        # Aplica regras de negócio (usando cópia para segurança)
-                        # Seleciona colunas *antes* de passar para a função
-                        cols_present_in_chunk = [col for col in master_columns_list if col in chunk.columns]
-                        chunk_processado = aplicar_regras_de_negocio(chunk[cols_present_in_chunk].copy(), ano_arquivo)
-                        
-                        # Reindexa para o schema mestre
-                        chunk_alinhado = chunk_processado.reindex(columns=master_columns_list)
-
-                        # --- INÍCIO DA LÓGICA DE COERÇÃO REFINADA ---
-                        for col, sql_type in tipos_de_dados_sql.items():
-                                if col in chunk_alinhado.columns:
-                                    try:
-                                        # Trata tipos numéricos (NUMERIC, FLOAT, INTEGER, BIGINT)
-                                        if isinstance(sql_type, (types.NUMERIC, types.FLOAT, types.INTEGER, types.BIGINT)):
-                                            # 1. Substitui strings vazias por NaN ANTES de coagir
-                                            chunk_alinhado.loc[chunk_alinhado[col] == '', col] = np.nan
-                                            
-                                            # 2. Coage para numérico, transformando outros erros em NaN
-                                            numeric_series = pd.to_numeric(chunk_alinhado[col], errors='coerce')
-
-                                            # 3. Atribui de volta baseado no tipo SQL específico
-                                            if isinstance(sql_type, (types.INTEGER, types.BIGINT)):
-                                                chunk_alinhado[col] = numeric_series.astype('Int64') # Usa Int64 que suporta nulos (NaN)
-                                            else: # NUMERIC, FLOAT
-                                                chunk_alinhado[col] = numeric_series # Deixa como float64
-                                        
-                                        # Trata tipos string (VARCHAR, TEXT)
-                                        elif isinstance(sql_type, (types.VARCHAR, types.TEXT)):
-                                            # Converte para string, substitui nulos/vazios por None
-                                            chunk_alinhado[col] = chunk_alinhado[col].astype(str).replace('<NA>', None).replace('nan', None).replace('', None)
-
-                                        # Adicione outros tipos se necessário
-                                        # else: pass
-
-                                    except Exception as coerc_e:
-                                        print(f"\n   Alerta de Coerção inesperado na coluna '{col}': {coerc_e}. Forçando None.")
-                                        chunk_alinhado[col] = None
-                        # --- FIM DA LÓGICA DE COERÇÃO REFINADA ---
-
-                        print(f"  Chunk {i+1}: {len(chunk_alinhado)} linhas. Processando e convertendo tipos...", end="", flush=True)
-
-                        chunk_alinhado.to_sql( name=nome_tabela, con=engine, if_exists='append', index=False, method='multi', chunksize=upload_chunksize )
-                        end_time_chunk = time.time(); rows_in_file += len(chunk_alinhado); total_rows_processed += len(chunk_alinhado)
-                        print(f" OK. ({end_time_chunk - start_time_chunk:.2f}s)")
-                    except Exception as e_chunk: print(f"\n  Falha no chunk {i+1} de {filename}: {str(e_chunk)}"); traceback.print_exc(); print(f"  Pulando chunk {i+1}.")
+                linhas_carregadas_por_ano, linhas_por_arquivo, anos_com_falha = carregar_arquivos_em_paralelo(engine, tarefas, plano, args.workers, args.writers, opcoes_parquet)
+            except Exception as e: print(f"\nERRO na carga paralela: {e}"); traceback.print_exc(); anos_com_falha = set(anos_da_carga)
+            total_rows_processed = sum(linhas_carregadas_por_ano.values())
+        else:
+            # No modo COPY uma única conexão do driver é reaproveitada para todos os chunks
+            raw_connection = engine.raw_connection() if args.loader == 'copy' else None
+
+            for arquivo, ano_arquivo, usecols_original in tarefas:
+                start_time_file = time.time(); filename = os.path.basename(arquivo); print(f"\nProcessando: {filename}")
+                print(f"  Ano: {ano_arquivo}")
+
+                rows_in_file = 0; escritores_parquet = {}
+                try:
+                    for i, chunk in enumerate(ler_csv_em_chunks(arquivo, usecols_original, plano)):
+                        start_time_chunk = time.time()
+                        try:
+                            chunk_alinhado = processar_chunk(chunk, ano_arquivo, plano)
+
+                            print(f"  Chunk {i+1}: {len(chunk_alinhado)} linhas. Processando e convertendo tipos...", end="", flush=True)
+
+                            if args.loader == 'copy':
+                                copiar_chunk_para_tabela(raw_connection.driver_connection, chunk_alinhado, nome_particao_carga(ano_arquivo), plano)
+                            else:
+                                chunk_alinhado.to_sql( name=nome_particao_carga(ano_arquivo), con=engine, if_exists='append', index=False, method='multi', chunksize=upload_chunksize )
+                            end_time_chunk = time.time(); rows_in_file += len(chunk_alinhado); total_rows_processed += len(chunk_alinhado)
+                            linhas_carregadas_por_ano[ano_arquivo] = linhas_carregadas_por_ano.get(ano_arquivo, 0) + len(chunk_alinhado)
+                            # Só depois do COPY: um chunk recusado pelo banco não vai para o Parquet
+                            if opcoes_parquet: escrever_chunk_parquet(escritores_parquet, chunk_alinhado, filename, plano, opcoes_parquet)
+                            print(f" OK. ({end_time_chunk - start_time_chunk:.2f}s)")
+                        except Exception as e_chunk: print(f"\n  Falha no chunk {i+1} de {filename}: {str(e_chunk)}"); traceback.print_exc(); print(f"  Pulando chunk {i+1}."); anos_com_falha.add(ano_arquivo)
+
+                    linhas_por_arquivo[filename] = rows_in_file
+                    end_time_file = time.time(); tempo_arquivo = end_time_file - start_time_file
+                    linhas_por_segundo = rows_in_file / tempo_arquivo if tempo_arquivo > 0 else 0.0
+                    print(f"  Arquivo {filename} ({rows_in_file} linhas) processado em {tempo_arquivo:.2f}s ({linhas_por_segundo:,.0f} linhas/s).")
                 
-                # --- ESTA É A LINHA CORRIGIDA ---
-                # Ela foi movida para dentro do bloco 'try' (indentada)
-                end_time_file = time.time(); print(f"  Arquivo {filename} ({rows_in_file} linhas) processado em {end_time_file - start_time_file:.2f}s.")
-            
-            except Exception as e_file: print(f"\n  Falha ao processar {filename}: {str(e_file)}"); traceback.print_exc(); print(f"  Pulando {filename}.")
+                except Exception as e_file: print(f"\n  Falha ao processar {filename}: {str(e_file)}"); traceback.print_exc(); print(f"  Pulando {filename}."); anos_com_falha.add(ano_arquivo)
+                finally: fechar_escritores_parquet(escritores_parquet)
+
+            if raw_connection is not None: raw_connection.close()
+
+        # Troca as partições e registra os arquivos no manifesto: um ano sem nenhuma linha gravada
+        # mantém a partição anterior; um ano com chunks perdidos fica fora do manifesto (o próximo
+        # --incremental o recarrega)
+        if anos_da_carga: print(f"\nTrocando as partições de '{nome_tabela}'...")
+        else: print("\nNenhum ano a recarregar.")
+        for ano_arquivo in anos_da_carga:
+            try:
+                if linhas_carregadas_por_ano.get(ano_arquivo, 0) > 0:
+                    registros = [] if ano_arquivo in anos_com_falha else [
+                        {'arquivo': os.path.basename(arquivo), 'linhas': linhas_por_arquivo.get(os.path.basename(arquivo), 0), 'versao_schema': versao_schema, **impressoes[os.path.basename(arquivo)]}
+                        for arquivo, ano_tarefa, _ in tarefas if ano_tarefa == ano_arquivo]
+                    trocar_particao(engine, ano_arquivo, registros); tabela_alterada = True; anos_trocados.append(ano_arquivo)
+                    if opcoes_parquet: promover_parquet_do_ano(opcoes_parquet['diretorio'], ano_arquivo)
+                    print(f"  {nome_particao(ano_arquivo)}: {linhas_carregadas_por_ano[ano_arquivo]} linhas.")
+                    if ano_arquivo in anos_com_falha: print(f"  Aviso: {ano_arquivo} carregado com falhas; fica fora do manifesto até uma carga sem falhas.")
+                else:
+                    descartar_particao_de_carga(engine, ano_arquivo); print(f"  Aviso: nenhuma linha gravada para {ano_arquivo}. Partição anterior mantida (se existir).")
+            except Exception as e: print(f"  ERRO ao trocar a partição de {ano_arquivo}: {e}"); traceback.print_exc()
+        if opcoes_parquet: shutil.rmtree(diretorio_dataset_parquet(opcoes_parquet['diretorio'], carga=True), ignore_errors=True) # Anos não trocados: descarta a carga
+        if not carga_parcial:
+            # Carga completa: os anos sem CSV no diretório saem da tabela, como na recriação completa
+            # (o modo incremental nunca remove anos)
+            try:
+                with engine.connect() as connection: anos_sem_csv = sorted(set(particoes_existentes(connection)) - set(anos_da_carga))
+                if anos_sem_csv: descartar_particoes(engine, anos_sem_csv); tabela_alterada = True; print(f"  Partições removidas (anos sem CSV): {anos_sem_csv}")
+            except Exception as e: print(f"  Aviso: falha ao remover partições antigas. Erro: {e}")
+            if opcoes_parquet:
+                for ano in set(anos_no_parquet(opcoes_parquet['diretorio'])) - {str(a) for a in anos_da_carga}: descartar_parquet_do_ano(opcoes_parquet['diretorio'], ano)
 
         end_time_total = time.time(); print(f"\nProcessamento concluído em {end_time_total - start_time_total:.2f}s.")
         print(f"Total de {total_rows_processed} linhas inseridas em '{nome_tabela}'.")
@@ -606,6 +1228,10 @@ if __name__ == "__main__":
                 if total_db_rows > 0:
                         print(f"Contagem total na tabela '{nome_tabela}': {total_db_rows}")
                         df_verificacao = pd.read_sql_query(text(f'SELECT "NU_ANO", COUNT(*) as total_registros FROM "{nome_tabela}" GROUP BY "NU_ANO" ORDER BY "NU_ANO";'), connection)
+                        # Confere a contagem do banco com as linhas que a FASE 2 efetivamente gravou por ano
+                        df_verificacao['linhas_carregadas'] = df_verificacao['NU_ANO'].map(lambda a: linhas_carregadas_por_ano.get(int(a)) if pd.notna(a) else None).astype('Int64')
+                        df_verificacao['status'] = np.where(df_verificacao['linhas_carregadas'].eq(df_verificacao['total_registros']).fillna(False), 'OK', 'DIVERGENTE')
+                        df_verificacao.loc[df_verificacao['linhas_carregadas'].isna(), 'status'] = 'NÃO RECARREGADO' # Partições mantidas (--anos/--incremental)
                         print("Contagem por ano:"); print(df_verificacao.to_string(index=False))
                 else: 
                         print(f"Tabela '{nome_tabela}' criada, mas vazia (0 registros). Verifique logs.")
@@ -620,6 +1246,7 @@ if __name__ == "__main__":
     # 4A: Tenta carregar a tabela principal do IBGE a partir do .XLS local
     # Esta função irá criar 'RELATORIO_MUNICIPIOS'
     sucesso_carga_ibge = criar_tabela_municipios_do_ibge(engine)
+    if sucesso_carga_ibge and not args.sem_parquet: exportar_tabela_para_parquet(engine, 'RELATORIO_MUNICIPIOS', args.parquet_dir)
     
     # 4B: Se a tabela foi criada E a tabela de microdados também existe, executa a análise
     if sucesso_carga_ibge and arquivos_csv:
@@ -638,6 +1265,27 @@ if __name__ == "__main__":
     criar_tabela_dicionario(engine)
     # --- FIM DA ADIÇÃO (FASE 5) ---
 
-    engine.dispose(); print("Pool de conexões liberado.")
+    # --- FASE 6: Tabelas derivadas (pos_carga.py) ---
+    # Só os anos trocados na FASE 2 são recalculados; os anos removidos saem das tabelas derivadas
+    if arquivos_csv and tabela_alterada and not args.sem_pos_carga:
+        print(f"\n--- FASE 6: Tabelas derivadas (pós-carga), anos {anos_trocados} ---")
+        if pos_carga.construir_cubo_dashboard(engine, nome_tabela, anos_trocados) and not args.sem_parquet:
+            for tabela_cubo in [pos_carga.TABELA_CUBO, pos_carga.TABELA_CUBO_CATEGORIAS]: exportar_tabela_para_parquet(engine, tabela_cubo, args.parquet_dir)
+        if pos_carga.atualizar_catalogo_filtros(engine, nome_tabela, anos_trocados) and not args.sem_parquet:
+            exportar_tabela_para_parquet(engine, pos_carga.TABELA_CATALOGO_FILTROS, args.parquet_dir)
+        if pos_carga.construir_estatisticas_itens(engine, nome_tabela, anos_trocados) and not args.sem_parquet:
+            exportar_tabela_para_parquet(engine, pos_carga.TABELA_ESTATISTICAS_ITENS, args.parquet_dir)
+        if pos_carga.construir_gabaritos_prova(engine, nome_tabela, anos_trocados) and not args.sem_parquet:
+            for tabela_prova in [pos_carga.TABELA_GABARITOS_PROVA, pos_carga.TABELA_MEDIAS_PROVA_UF, pos_carga.TABELA_COMBINACOES_PROVA]: exportar_tabela_para_parquet(engine, tabela_prova, args.parquet_dir)
+        if pos_carga.construir_distribuicao_notas(engine, nome_tabela, anos_trocados) and not args.sem_parquet:
+            exportar_tabela_para_parquet(engine, pos_carga.TABELA_DISTRIBUICAO_NOTAS, args.parquet_dir)
+        pos_carga.construir_dados_enriquecidos(engine, nome_tabela, anos_trocados)
+    else:
+        print("\nPula a FASE 6 (tabelas derivadas)." + (" Nenhum ano foi recarregado." if arquivos_csv and not tabela_alterada else ""))
+        if arquivos_csv and tabela_alterada:
+            # Os microdados foram recarregados: a cópia enriquecida ficaria desatualizada
+            pos_carga.descartar_dados_enriquecidos(engine)
+
+    descartar_engines(); print("Pool de conexões liberado.")
 
     # --- FIM DA SEÇÃO MODIFICADA ---
\ No newline at end of file
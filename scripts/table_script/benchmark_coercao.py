@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark da FASE 2 do SCRIPT.py: tempo de leitura + processamento + serialização
+para o COPY, por arquivo.
+ANTES: read_csv sem tipos + laço de coerção coluna a coluna + to_csv do pandas.
+DEPOIS: plano de colunas compilado + leitura tipada (pyarrow, dtypes Arrow) + escritor CSV do pyarrow.
+
+Não acessa o banco. Usa as amostras *_5k.csv desta pasta.
+
+Uso:
+    python benchmark_coercao.py [--repeticoes 5]
+"""
+
+import argparse
+import glob
+import os
+import time
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import types
+
+import SCRIPT
+
+
+def processar_chunk_legado(chunk, ano_arquivo, master_columns_list, tipos_de_dados_sql):
+    """
+    CÓPIA da versão anterior de processar_chunk (laço de coerção por coluna),
+    mantida aqui apenas como referência de comparação.
+    """
+    chunk.columns = [SCRIPT.normalize_col_name(c) for c in chunk.columns]
+    if 'NU_SEQUENCIAL' in chunk.columns: chunk.rename(columns={'NU_SEQUENCIAL': 'NU_INSCRICAO'}, inplace=True)
+    cols_present_in_chunk = [col for col in master_columns_list if col in chunk.columns]
+    chunk_processado = SCRIPT.aplicar_regras_de_negocio(chunk[cols_present_in_chunk].copy(), ano_arquivo)
+    chunk_alinhado = chunk_processado.reindex(columns=master_columns_list)
+    for col, sql_type in tipos_de_dados_sql.items():
+            if col in chunk_alinhado.columns:
+                try:
+                    if isinstance(sql_type, (types.NUMERIC, types.FLOAT, types.INTEGER, types.BIGINT)):
+                        chunk_alinhado.loc[chunk_alinhado[col] == '', col] = np.nan
+                        numeric_series = pd.to_numeric(chunk_alinhado[col], errors='coerce')
+                        if isinstance(sql_type, (types.INTEGER, types.BIGINT)):
+                            chunk_alinhado[col] = numeric_series.astype('Int64')
+                        else:
+                            chunk_alinhado[col] = numeric_series
+                    elif isinstance(sql_type, (types.VARCHAR, types.TEXT)):
+                        chunk_alinhado[col] = chunk_alinhado[col].astype(str).replace('<NA>', None).replace('nan', None).replace('', None)
+                except Exception as coerc_e:
+                    print(f"\n   Alerta de Coerção inesperado na coluna '{col}': {coerc_e}. Forçando None.")
+                    chunk_alinhado[col] = None
+    return chunk_alinhado
+
+
+def medir(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter(); resultado = funcao(); tempos.append(time.perf_counter() - inicio)
+    return min(tempos), resultado
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara o processamento de chunks antes/depois do plano de colunas.")
+    parser.add_argument('--repeticoes', type=int, default=5, help="Execuções por arquivo (vale o menor tempo). Padrão: 5.")
+    args = parser.parse_args()
+
+    arquivos_csv = sorted(f for f in glob.glob(os.path.join(SCRIPT.script_dir, '*_5k.csv')))
+    if not arquivos_csv: print(f"Nenhuma amostra *_5k.csv encontrada em {SCRIPT.script_dir}"); raise SystemExit(1)
+
+    master_columns_list, tipos_de_dados_sql, all_file_headers = SCRIPT.analisar_cabecalhos(arquivos_csv)
+    plano = SCRIPT.compilar_plano_de_colunas(master_columns_list, tipos_de_dados_sql)
+
+    print(f"{'Arquivo':<32} {'Linhas':>7} {'Antes (s)':>10} {'Depois (s)':>11} {'Ganho':>7}  CSV do COPY")
+    total_antes = total_depois = 0.0
+    for arquivo in arquivos_csv:
+        filename = os.path.basename(arquivo); ano = SCRIPT.extrair_ano_do_arquivo(filename)
+        usecols_original = SCRIPT.mapear_colunas_de_leitura(arquivo, all_file_headers[filename], master_columns_list)
+
+        def antes():
+            reader = pd.read_csv(arquivo, encoding='latin1', sep=';', chunksize=SCRIPT.chunk_size, low_memory=False, usecols=usecols_original)
+            return "".join(SCRIPT.serializar_chunk_csv(processar_chunk_legado(chunk, ano, master_columns_list, tipos_de_dados_sql)) for chunk in reader)
+
+        def depois():
+            return "".join(SCRIPT.serializar_chunk_csv(SCRIPT.processar_chunk(chunk, ano, plano), plano) for chunk in SCRIPT.ler_csv_em_chunks(arquivo, usecols_original, plano))
+
+        t_antes, csv_texto_antes = medir(antes, args.repeticoes)
+        t_depois, csv_texto_depois = medir(depois, args.repeticoes)
+        total_antes += t_antes; total_depois += t_depois
+
+        # Compara o que de fato chega ao banco: o CSV enviado ao COPY, relido coluna a coluna
+        # (por valor: '510.0' da versão anterior e '510' da nova são o mesmo código)
+        csv_antes = pd.read_csv(StringIO(csv_texto_antes), header=None, names=master_columns_list, low_memory=False)
+        csv_depois = pd.read_csv(StringIO(csv_texto_depois), header=None, names=master_columns_list, low_memory=False)
+        divergentes = []
+        for col in master_columns_list:
+            try: pd.testing.assert_series_equal(csv_antes[col], csv_depois[col], check_dtype=False)
+            except AssertionError: divergentes.append(col)
+        status = "idêntico" if not divergentes else f"difere em {divergentes}"
+        print(f"{filename:<32} {len(csv_depois):>7} {t_antes:>10.3f} {t_depois:>11.3f} {t_antes / t_depois:>6.1f}x  {status}")
+
+    print(f"{'TOTAL':<32} {'':>7} {total_antes:>10.3f} {total_depois:>11.3f} {total_antes / total_depois:>6.1f}x")
@@ -0,0 +1,762 @@
+# -*- coding: utf-8 -*-
+"""
+Etapas pós-carga do ETL (FASE 6 do SCRIPT.py): tabelas derivadas de 'dados_enem_consolidado'
+usadas pelas páginas do app.
+
+Também pode ser executado sozinho, para reconstruir as tabelas derivadas sem recarregar os CSVs:
+    python pos_carga.py [--sem-parquet] [--parquet-dir DIR] [--anos 2023]   # --anos: só as linhas desses anos
+    python pos_carga.py --catalogo-filtros [--anos 2023 2024]   # só o catálogo de filtros, por ano
+    python pos_carga.py --dados-enriquecidos [--anos 2023]      # só dados_enem_enriquecido (todos os anos, ou os de --anos)
+"""
+
+import os
+import re
+import sys
+import time
+import traceback
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import inspect, text, types
+
+# Configuração das colunas da página Exploration (rótulos e tipos de filtro)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from Exploration.column_config import COLUMN_MAPPING  # noqa: E402
+from Exploration.filter_config import TYPE_OVERRIDES  # noqa: E402
+
+# --- Cubo do Dashboard ---
+# Contagens, somas e somas de quadrados por célula NU_ANO x SG_UF_PROVA x TP_SEXO x TP_FAIXA_ETARIA x TP_ST_CONCLUSAO.
+# Qualquer combinação de filtros da sidebar (exceto município) é respondida somando células
+# (Dashboards/db/agregacoes.py). Os nomes das colunas abaixo são o contrato com essa camada.
+TABELA_CUBO = 'cubo_dashboard'
+TABELA_CUBO_CATEGORIAS = 'cubo_dashboard_categorias'
+DIMENSOES_CUBO = ['NU_ANO', 'SG_UF_PROVA', 'TP_SEXO', 'TP_FAIXA_ETARIA', 'TP_ST_CONCLUSAO']
+NOTAS_CUBO = ['NU_NOTA_CN', 'NU_NOTA_CH', 'NU_NOTA_LC', 'NU_NOTA_MT', 'NU_NOTA_REDACAO']
+# Colunas cuja distribuição (contagem por valor) vai para a tabela de categorias (formato longo)
+CATEGORIAS_CUBO = ['TP_COR_RACA', 'IN_TREINEIRO', 'Q001', 'Q002', 'Q006']
+LARGURA_FAIXA_REDACAO = 20
+AUSENTE = 'Ausente em um ou mais dias'
+
+# --- Estatísticas dos itens (página Análise de Questões) ---
+# Por (ano, área, CO_PROVA, posição na string de respostas), sobre toda a população da prova:
+# escolhas A..E, brancos/inválidos, acertos (gabarito do próprio participante, TX_GABARITO_*)
+# e a correlação ponto-bisserial entre acertar o item e a nota da área.
+# Lida por services/question_analyzer.py (mesma normalização de _normalizar_alternativa).
+TABELA_ESTATISTICAS_ITENS = 'estatisticas_itens'
+AREAS_ITENS = ['CN', 'CH', 'LC', 'MT']
+POSICOES_MAXIMAS = 50  # LC: 45 questões + 5 da língua estrangeira
+
+# --- Catálogo de filtros da Exploration ---
+# Por ano e coluna da visão enriquecida (microdados + nomes do RELATORIO_MUNICIPIOS):
+#   registro 'resumo': tipo, posição, linhas, nulos, mínimo e máximo;
+#   registro 'valor' : os primeiros LIMITE_VALORES_FILTRO valores distintos (ordenados) das
+#                      colunas que viram listas de opções (códigos, textos e TYPE_OVERRIDES categóricos).
+# Exploration/filter_utils.get_filter_metadata lê a tabela inteira numa consulta e junta os anos.
+TABELA_CATALOGO_FILTROS = 'filter_metadata'
+LIMITE_VALORES_FILTRO = 1000
+TIPOS_CATALOGO = {
+    'NU_ANO': types.INTEGER, 'coluna': types.VARCHAR, 'registro': types.VARCHAR, 'tipo': types.VARCHAR,
+    'posicao': types.INTEGER, 'n_linhas': types.BIGINT, 'n_nulos': types.BIGINT,
+    'minimo': types.FLOAT, 'maximo': types.FLOAT, 'minimo_txt': types.VARCHAR, 'maximo_txt': types.VARCHAR,
+    'valor_num': types.FLOAT, 'valor_txt': types.VARCHAR,
+}
+
+# --- Gabaritos e agregados por prova (página de Desempenho) ---
+# TABELA_GABARITOS_PROVA: dimensão das provas, uma linha por (CO_PROVA, NU_ANO), com área, cor
+# (de questoes_enem, quando já carregada), gabarito e as estatísticas da nota da área sobre toda a população.
+# TABELA_MEDIAS_PROVA_UF: as mesmas estatísticas por UF da prova.
+# Estatísticas: participantes, notas, somas (para combinar provas), média, desvio padrão e os percentis
+# de PERCENTIS_NOTA (exatos, por prova; não se combinam entre provas ou UFs).
+# TABELA_COMBINACOES_PROVA: combinações (CO_PROVA_CH, CN, LC, MT) que os participantes fizeram em cada ano,
+# para montar os gabaritos candidatos das quatro áreas a partir do código de uma delas.
+# Lidas por services/performance_analyzer.py.
+TABELA_GABARITOS_PROVA = 'gabaritos_prova'
+TABELA_MEDIAS_PROVA_UF = 'medias_prova_uf'
+TABELA_COMBINACOES_PROVA = 'combinacoes_prova'
+PERCENTIS_NOTA = [10, 25, 50, 75, 90]
+TIPOS_ESTATISTICAS_NOTA = {
+    'n_participantes': types.BIGINT, 'n_notas': types.BIGINT, 'soma_nota': types.FLOAT, 'soma_quad_nota': types.FLOAT,
+    'media_nota': types.FLOAT, 'desvio_nota': types.FLOAT,
+    **{f'p{p}_nota': types.FLOAT for p in PERCENTIS_NOTA},
+}
+TIPOS_MEDIAS_PROVA = {
+    'CO_PROVA': types.BIGINT, 'NU_ANO': types.INTEGER, 'sigla_area': types.VARCHAR, 'SG_UF_PROVA': types.VARCHAR,
+    **TIPOS_ESTATISTICAS_NOTA,
+}
+TIPOS_GABARITOS_PROVA = {
+    'CO_PROVA': types.BIGINT, 'NU_ANO': types.INTEGER, 'sigla_area': types.VARCHAR, 'cor': types.VARCHAR,
+    'TX_GABARITO': types.VARCHAR, **TIPOS_ESTATISTICAS_NOTA,
+}
+
+# --- Distribuição das notas por (ano, área, UF) (percentil na página de Desempenho) ---
+# CDF em FAIXAS_NOTA faixas de mesma largura em [0, NOTA_MAXIMA]: uma linha por faixa não vazia, com
+# a contagem e o acumulado até ela. Linhas nacionais têm SG_UF_PROVA nulo. O percentil de uma nota sai
+# de uma busca binária no acumulado (services/performance_analyzer.py, PerformanceAnalyzer.percentil).
+TABELA_DISTRIBUICAO_NOTAS = 'distribuicao_notas'
+FAIXAS_NOTA = 1000
+NOTA_MAXIMA = 1000
+TIPOS_DISTRIBUICAO_NOTAS = {
+    'NU_ANO': types.INTEGER, 'sigla_area': types.VARCHAR, 'SG_UF_PROVA': types.VARCHAR,
+    'faixa': types.SMALLINT, 'n': types.BIGINT, 'n_acumulado': types.BIGINT,
+}
+
+# --- Microdados enriquecidos (página Exploration) ---
+# Cópia de dados_enem_consolidado com os nomes dos municípios da prova e da escola (RELATORIO_MUNICIPIOS)
+# já resolvidos: as consultas da Exploration (BASE_QUERY em Exploration/db_utils.py) leem esta tabela em
+# vez de repetir os dois LEFT JOINs. Não vai para o Parquet: no DuckDB o JOIN continua sendo feito na consulta.
+# Particionada por LIST ("NU_ANO") como a tabela de origem: cada ano é materializado em <partição>__carga,
+# já com os índices, e trocado pela partição antiga numa transação, como no SCRIPT.py (trocar_particao).
+TABELA_DADOS_ENRIQUECIDOS = 'dados_enem_enriquecido'
+# (NU_ANO, NU_INSCRICAO) é a chave da paginação por seek da Exploration (CHAVE_PAGINACAO em Exploration/filter_utils.py)
+INDICES_DADOS_ENRIQUECIDOS = [('NU_ANO', 'SG_UF_PROVA'), ('NOME_MUNICIPIO_PROVA',), ('NOME_MUNICIPIO_ESC',), ('NU_ANO', 'NU_INSCRICAO')]
+
+
+def _filtro_anos(anos, coluna='"NU_ANO"'):
+    """Condição SQL dos anos de 'anos' (None = todos os anos)."""
+    if anos is None:
+        return 'TRUE'
+    return f'{coluna} IN ({", ".join(str(int(a)) for a in anos)})' if anos else 'FALSE'
+
+
+def _sql_cubo(tabela_origem, anos=None):
+    dims = ", ".join(f'"{d}"' for d in DIMENSOES_CUBO)
+    medidas = [
+        'COUNT(*) AS n',
+        f"""SUM(CASE WHEN "INDICADOR_ABSENTEISMO" IS DISTINCT FROM '{AUSENTE}' THEN 1 ELSE 0 END) AS confirmados""",
+        """SUM(CASE WHEN "INDICADOR_ABSENTEISMO" = 'Presente' THEN 1 ELSE 0 END) AS presentes""",
+        f"""SUM(CASE WHEN "INDICADOR_ABSENTEISMO" = '{AUSENTE}' THEN 1 ELSE 0 END) AS ausentes""",
+        'SUM(CASE WHEN "TP_LINGUA" = 0 THEN 1 ELSE 0 END) AS ingles',
+        'SUM(CASE WHEN "TP_LINGUA" = 1 THEN 1 ELSE 0 END) AS espanhol',
+    ]
+    for col in NOTAS_CUBO + ['MEDIA_GERAL']:
+        nome = col.lower()
+        medidas += [f'COUNT("{col}") AS n_{nome}', f'SUM("{col}") AS soma_{nome}', f'SUM("{col}" * "{col}") AS soma_quad_{nome}']
+    # Estatísticas da correlação entre as notas: só linhas com as 5 notas preenchidas
+    completas = " AND ".join(f'"{col}" IS NOT NULL' for col in NOTAS_CUBO)
+    medidas.append(f'SUM(CASE WHEN {completas} THEN 1 ELSE 0 END) AS n_completas')
+    for i, col in enumerate(NOTAS_CUBO):
+        medidas.append(f'SUM(CASE WHEN {completas} THEN "{col}" END) AS s_{i}')
+    for i in range(len(NOTAS_CUBO)):
+        for j in range(i, len(NOTAS_CUBO)):
+            medidas.append(f'SUM(CASE WHEN {completas} THEN "{NOTAS_CUBO[i]}" * "{NOTAS_CUBO[j]}" END) AS p_{i}_{j}')
+    return f'SELECT {dims}, {", ".join(medidas)} FROM "{tabela_origem}" WHERE {_filtro_anos(anos)} GROUP BY {dims}'
+
+
+def _sql_cubo_categorias(tabela_origem, anos=None):
+    dims = ", ".join(f'"{d}"' for d in DIMENSOES_CUBO)
+    expressoes = {col: f'CAST("{col}" AS VARCHAR)' for col in CATEGORIAS_CUBO}
+    # 'valor' é texto em todos os ramos do UNION ALL; Dashboards/db/agregacoes.py converte a faixa de volta para INTEGER
+    expressoes['FAIXA_REDACAO'] = f'CAST(CAST(FLOOR("NU_NOTA_REDACAO" / {LARGURA_FAIXA_REDACAO}) * {LARGURA_FAIXA_REDACAO} AS INTEGER) AS VARCHAR)'
+    partes = [
+        f'''SELECT {dims}, '{coluna}' AS coluna, {expressao} AS valor,
+            COUNT(*) AS n, COUNT("MEDIA_GERAL") AS n_media_geral, SUM("MEDIA_GERAL") AS soma_media_geral
+        FROM "{tabela_origem}" WHERE {_filtro_anos(anos)} GROUP BY {dims}, {expressao}'''
+        for coluna, expressao in expressoes.items()
+    ]
+    return "\nUNION ALL\n".join(partes)
+
+
+def _substituir_tabela(connection, nome_tabela, sql_select, sql_depois=()):
+    """
+    Cria <nome>__novo e troca pela tabela atual na mesma transação (leitores nunca veem a tabela vazia).
+    'sql_depois' roda após a troca (índices, ANALYZE), quando os nomes dos índices antigos já estão livres.
+    """
+    nova = f'{nome_tabela}__novo'
+    connection.execute(text(f'DROP TABLE IF EXISTS "{nova}";'))
+    connection.execute(text(f'CREATE TABLE "{nova}" AS {sql_select};'))
+    connection.execute(text(f'DROP TABLE IF EXISTS "{nome_tabela}";'))
+    connection.execute(text(f'ALTER TABLE "{nova}" RENAME TO "{nome_tabela}";'))
+    for sql in sql_depois:
+        connection.execute(text(sql))
+
+
+def _particoes_por_ano(connection, tabela):
+    """{ano: nome da partição} das partições <tabela>_<ano> anexadas a 'tabela' (Postgres)."""
+    nomes = connection.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = to_regclass(:tabela)"
+    ), {'tabela': f'"{tabela}"'}).scalars()
+    particoes = {}
+    for nome in nomes:
+        match = re.fullmatch(rf"{re.escape(tabela)}_(\d{{4}})", nome)
+        if match: particoes[int(match.group(1))] = nome
+    return particoes
+
+
+def _colunas_da_relacao(connection, nome):
+    """[(coluna, tipo)] de uma tabela (também temporária), na ordem das colunas."""
+    return [tuple(r) for r in connection.execute(text(
+        "SELECT attname, format_type(atttypid, atttypmod) FROM pg_attribute "
+        "WHERE attrelid = to_regclass(:nome) AND attnum > 0 AND NOT attisdropped ORDER BY attnum"
+    ), {'nome': f'"{nome}"'})]
+
+
+def _mesmo_formato(connection, nome_tabela, sql_select):
+    """True se 'nome_tabela' existe com as colunas (nomes, tipos e ordem) que 'sql_select' produz."""
+    if not inspect(connection).has_table(nome_tabela):
+        return False
+    modelo = f'{nome_tabela}__modelo'
+    connection.execute(text(f'CREATE TEMPORARY TABLE "{modelo}" AS {sql_select} WITH NO DATA;'))
+    mesmo = _colunas_da_relacao(connection, nome_tabela) == _colunas_da_relacao(connection, modelo)
+    connection.execute(text(f'DROP TABLE "{modelo}";'))
+    return mesmo
+
+
+def _anos_a_apagar(connection, nome_tabela, tabela_origem, anos, coluna_ano='"NU_ANO"'):
+    """Anos de 'nome_tabela' a apagar numa atualização parcial: os de 'anos' e os que saíram da origem."""
+    anos_origem = set(_particoes_por_ano(connection, tabela_origem))
+    anos_tabela = {int(a) for a in connection.execute(text(f'SELECT DISTINCT {coluna_ano} FROM "{nome_tabela}" WHERE {coluna_ano} IS NOT NULL;')).scalars()}
+    return sorted((anos_tabela - anos_origem) | set(anos))
+
+
+def _atualizar_tabela(connection, nome_tabela, sql_select, tabela_origem, anos=None, coluna_ano='"NU_ANO"', sql_depois=()):
+    """
+    Com 'anos' e a tabela já no formato do SELECT: troca só as linhas desses anos (DELETE + INSERT na
+    transação de 'connection', os leitores veem os valores antigos até o commit) e apaga os anos que
+    saíram da origem. Sem 'anos', ou se a tabela não existe ou mudou, recria a tabela (_substituir_tabela).
+    'sql_select(anos)' monta o SELECT dos anos (None = todos). Retorna os anos gravados (None = todos).
+    """
+    if anos is None or not _mesmo_formato(connection, nome_tabela, sql_select(None)):
+        _substituir_tabela(connection, nome_tabela, sql_select(None), sql_depois)
+        return None
+    anos = sorted(set(anos) & set(_particoes_por_ano(connection, tabela_origem)))
+    apagar = _anos_a_apagar(connection, nome_tabela, tabela_origem, anos, coluna_ano)
+    if apagar:
+        connection.execute(text(f'DELETE FROM "{nome_tabela}" WHERE {_filtro_anos(apagar, coluna_ano)};'))
+    if anos:
+        connection.execute(text(f'INSERT INTO "{nome_tabela}" {sql_select(anos)};'))
+    return anos
+
+
+def _descrever_anos(anos):
+    return "todos os anos" if anos is None else f"anos {anos}" if anos else "nenhum ano a recalcular"
+
+
+def construir_cubo_dashboard(engine, tabela_origem, anos=None):
+    """
+    Materializa o cubo do Dashboard (TABELA_CUBO) e a distribuição das categorias (TABELA_CUBO_CATEGORIAS).
+    Com 'anos', só as células desses anos são recalculadas (_atualizar_tabela).
+    Retorna True se as duas tabelas foram criadas.
+    """
+    print(f"\n--- FASE 6A: Cubo do Dashboard ('{TABELA_CUBO}') ---")
+    inicio = time.time()
+    try:
+        with engine.begin() as connection:
+            gravados = _atualizar_tabela(connection, TABELA_CUBO, lambda a: _sql_cubo(tabela_origem, a), tabela_origem, anos)
+            _atualizar_tabela(connection, TABELA_CUBO_CATEGORIAS, lambda a: _sql_cubo_categorias(tabela_origem, a), tabela_origem, anos)
+            celulas = connection.execute(text(f'SELECT COUNT(*) FROM "{TABELA_CUBO}";')).scalar_one()
+            linhas_categorias = connection.execute(text(f'SELECT COUNT(*) FROM "{TABELA_CUBO_CATEGORIAS}";')).scalar_one()
+        print(f"Cubo atualizado ({_descrever_anos(gravados)}): {celulas} células em '{TABELA_CUBO}', {linhas_categorias} linhas em '{TABELA_CUBO_CATEGORIAS}' ({time.time() - inicio:.1f}s).")
+        return True
+    except Exception as e:
+        print(f"ERRO na FASE 6A: Falha ao construir o cubo do Dashboard. {e}")
+        traceback.print_exc()
+        return False
+
+
+def _sql_normalizar_alternativa(expressao):
+    """'A'..'E' (ou '1'..'5') de um caractere, em maiúscula; qualquer outro valor vira NULL (branco/inválido)."""
+    casos = " ".join(f"WHEN '{numero}' THEN '{letra}'" for numero, letra in enumerate("ABCDE", start=1))
+    letras = " ".join(f"WHEN '{letra}' THEN '{letra}'" for letra in "ABCDE")
+    return f"(CASE UPPER({expressao}) {casos} {letras} END)"
+
+
+def _sql_estatisticas_itens_area(tabela_origem, area, anos=None):
+    respostas, gabarito, nota = f'"TX_RESPOSTAS_{area}"', f'"TX_GABARITO_{area}"', f'"NU_NOTA_{area}"'
+    escolhas = ",\n            ".join(f"SUM(CASE WHEN alt = '{letra}' THEN 1 ELSE 0 END) AS n_{letra.lower()}" for letra in "ABCDE")
+    return f'''
+        SELECT
+            ano, '{area}' AS sigla_area, co_prova, posicao,
+            COUNT(*) AS n_respostas,
+            {escolhas},
+            SUM(CASE WHEN alt IS NULL THEN 1 ELSE 0 END) AS n_brancos,
+            MAX(gab) AS gabarito,
+            SUM(CASE WHEN alt = gab THEN 1 ELSE 0 END) AS n_acertos,
+            COUNT(nota) AS n_nota,
+            SUM(nota) AS soma_nota,
+            SUM(nota * nota) AS soma_quad_nota,
+            SUM(CASE WHEN alt = gab AND nota IS NOT NULL THEN 1 ELSE 0 END) AS n_acertos_nota,
+            SUM(CASE WHEN alt = gab THEN nota END) AS soma_nota_acertos
+        FROM (
+            SELECT
+                t."NU_ANO" AS ano,
+                t."CO_PROVA_{area}" AS co_prova,
+                s.posicao,
+                {_sql_normalizar_alternativa(f"SUBSTR(TRIM(t.{respostas}), s.posicao, 1)")} AS alt,
+                {_sql_normalizar_alternativa(f"SUBSTR(TRIM(t.{gabarito}), s.posicao, 1)")} AS gab,
+                CAST(t.{nota} AS DOUBLE PRECISION) AS nota
+            FROM "{tabela_origem}" AS t
+            CROSS JOIN generate_series(1, {POSICOES_MAXIMAS}) AS s(posicao)
+            WHERE t.{respostas} IS NOT NULL
+              AND {_filtro_anos(anos, 't."NU_ANO"')}
+              AND s.posicao <= LENGTH(TRIM(t.{respostas}))
+        ) AS r
+        GROUP BY ano, co_prova, posicao'''
+
+
+def _sql_estatisticas_itens(tabela_origem, anos=None):
+    # Ponto-bisserial = correlação de Pearson entre acerto (0/1) e nota, a partir das somas
+    n, sx, sy, syy, sxy = 'n_nota', 'n_acertos_nota', 'soma_nota', 'soma_quad_nota', 'soma_nota_acertos'
+    denominador = f'({n} * {sx} - {sx} * {sx}) * ({n} * {syy} - {sy} * {sy})'
+    uniao = "\n        UNION ALL".join(_sql_estatisticas_itens_area(tabela_origem, area, anos) for area in AREAS_ITENS)
+    return f'''SELECT e.*,
+        CASE WHEN {denominador} > 0
+             THEN ({n} * {sxy} - {sx} * {sy}) / SQRT({denominador})
+        END AS ponto_bisserial
+    FROM ({uniao}
+    ) AS e'''
+
+
+def construir_estatisticas_itens(engine, tabela_origem, anos=None):
+    """Materializa TABELA_ESTATISTICAS_ITENS (com 'anos', só esses anos). Retorna True se a tabela foi criada."""
+    print(f"\n--- FASE 6C: Estatísticas dos itens ('{TABELA_ESTATISTICAS_ITENS}') ---")
+    inicio = time.time()
+    try:
+        with engine.begin() as connection:
+            gravados = _atualizar_tabela(connection, TABELA_ESTATISTICAS_ITENS, lambda a: _sql_estatisticas_itens(tabela_origem, a),
+                                         tabela_origem, anos, coluna_ano='ano')
+            linhas = connection.execute(text(f'SELECT COUNT(*) FROM "{TABELA_ESTATISTICAS_ITENS}";')).scalar_one()
+        print(f"Estatísticas de {linhas} itens (ano x prova x posição) atualizadas ({_descrever_anos(gravados)}, {time.time() - inicio:.1f}s).")
+        return True
+    except Exception as e:
+        print(f"ERRO na FASE 6C: Falha ao construir as estatísticas dos itens. {e}")
+        traceback.print_exc()
+        return False
+
+
+def _sql_agregados_prova(tabela_origem, anos=None):
+    """
+    Estatísticas da nota da área por (prova, UF) e por prova (nacional, nivel_nacional = 1), com
+    GROUPING SETS numa varredura por área. Inclui o gabarito da prova (todas as áreas, em UNION ALL).
+    """
+    partes = []
+    for area in AREAS_ITENS:
+        nota = f'CAST("NU_NOTA_{area}" AS DOUBLE PRECISION)'
+        percentis = ",\n            ".join(
+            f'PERCENTILE_CONT({p / 100}) WITHIN GROUP (ORDER BY {nota}) AS p{p}_nota' for p in PERCENTIS_NOTA
+        )
+        partes.append(f'''SELECT
+            CAST("CO_PROVA_{area}" AS BIGINT) AS "CO_PROVA", "NU_ANO", '{area}' AS sigla_area, "SG_UF_PROVA",
+            GROUPING("SG_UF_PROVA") AS nivel_nacional,
+            COUNT(*) AS n_participantes,
+            MAX(TRIM("TX_GABARITO_{area}")) AS "TX_GABARITO",
+            COUNT({nota}) AS n_notas,
+            SUM({nota}) AS soma_nota,
+            SUM({nota} * {nota}) AS soma_quad_nota,
+            {percentis}
+        FROM "{tabela_origem}"
+        WHERE "CO_PROVA_{area}" IS NOT NULL AND {_filtro_anos(anos)}
+        GROUP BY GROUPING SETS (("CO_PROVA_{area}", "NU_ANO", "SG_UF_PROVA"), ("CO_PROVA_{area}", "NU_ANO"))''')
+    return "\nUNION ALL\n".join(partes)
+
+
+def _media_e_desvio(df):
+    """media_nota e desvio_nota (populacional) a partir de n_notas, soma_nota e soma_quad_nota."""
+    n = df['n_notas'].where(df['n_notas'] > 0)
+    media = df['soma_nota'] / n
+    variancia = (df['soma_quad_nota'] / n - media * media).clip(lower=0)
+    return df.assign(media_nota=media, desvio_nota=np.sqrt(variancia))
+
+
+def _sql_combinacoes_prova(tabela_origem, anos=None):
+    codigos = ", ".join(f'"CO_PROVA_{area}"' for area in AREAS_ITENS)
+    algum = " OR ".join(f'"CO_PROVA_{area}" IS NOT NULL' for area in AREAS_ITENS)
+    return f'''SELECT "NU_ANO", {codigos}, COUNT(*) AS n_participantes
+        FROM "{tabela_origem}"
+        WHERE ({algum}) AND {_filtro_anos(anos)}
+        GROUP BY "NU_ANO", {codigos}'''
+
+
+def _cores_das_provas(connection):
+    """{(ano, CO_PROVA): cor} a partir da coluna 'provas' de questoes_enem (códigos separados por vírgula)."""
+    if not inspect(connection).has_table('questoes_enem'):
+        return {}
+    df = pd.read_sql_query(text('SELECT DISTINCT ano, cor, provas FROM questoes_enem WHERE provas IS NOT NULL AND cor IS NOT NULL;'), connection)
+    df = df.assign(codigo=df['provas'].astype(str).str.split(',')).explode('codigo')
+    df['codigo'] = df['codigo'].str.strip()
+    df = df[df['codigo'].str.isdigit()].sort_values('cor')
+    return {(int(ano), int(codigo)): cor for ano, codigo, cor in zip(df['ano'], df['codigo'], df['cor']) if pd.notnull(ano)}
+
+
+def _gravar_tabela(connection, nome_tabela, df, tipos, sql_depois=()):
+    """Como _substituir_tabela, para um DataFrame: grava em <nome>__novo e troca na mesma transação."""
+    nova = f'{nome_tabela}__novo'
+    connection.execute(text(f'DROP TABLE IF EXISTS "{nova}";'))
+    df.to_sql(nova, connection, index=False, dtype=tipos, chunksize=10000)
+    connection.execute(text(f'DROP TABLE IF EXISTS "{nome_tabela}";'))
+    connection.execute(text(f'ALTER TABLE "{nova}" RENAME TO "{nome_tabela}";'))
+    for sql in sql_depois:
+        connection.execute(text(sql))
+
+
+def _anos_para_gravar(connection, tabelas, tabela_origem, anos):
+    """
+    Anos a recalcular nas tabelas gravadas a partir de DataFrames ('tabelas': {nome: tipos}): None (recriar,
+    todos os anos) sem 'anos' ou se alguma tabela não existe ou tem outras colunas; senão, os anos pedidos
+    que existem na origem.
+    """
+    if anos is None:
+        return None
+    inspetor = inspect(connection)
+    for nome, tipos in tabelas.items():
+        if not inspetor.has_table(nome) or [c['name'] for c in inspetor.get_columns(nome)] != list(tipos):
+            return None
+    return sorted(set(anos) & set(_particoes_por_ano(connection, tabela_origem)))
+
+
+def _atualizar_tabela_df(connection, nome_tabela, df, tipos, tabela_origem, anos, sql_depois=()):
+    """
+    Como _atualizar_tabela, para um DataFrame já calculado só dos anos de 'anos' (_anos_para_gravar):
+    DELETE + INSERT desses anos (e dos que saíram da origem), ou _gravar_tabela com None.
+    """
+    if anos is None:
+        _gravar_tabela(connection, nome_tabela, df, tipos, sql_depois)
+        return
+    apagar = _anos_a_apagar(connection, nome_tabela, tabela_origem, anos)
+    if apagar:
+        connection.execute(text(f'DELETE FROM "{nome_tabela}" WHERE {_filtro_anos(apagar)};'))
+    if not df.empty:
+        df.to_sql(nome_tabela, connection, if_exists='append', index=False, dtype=tipos, chunksize=10000)
+
+
+def _separar_agregados_prova(df_agregados, cores):
+    """Resultado de _sql_agregados_prova -> (linhas de TABELA_GABARITOS_PROVA, linhas de TABELA_MEDIAS_PROVA_UF)."""
+    df_agregados = _media_e_desvio(df_agregados)
+    nacional = df_agregados['nivel_nacional'] == 1
+    df_uf = df_agregados[~nacional]
+    df_prova = df_agregados[nacional].reset_index(drop=True)
+    df_prova['cor'] = [cores.get((int(ano), int(codigo))) for ano, codigo in zip(df_prova['NU_ANO'], df_prova['CO_PROVA'])]
+    return df_prova[list(TIPOS_GABARITOS_PROVA)], df_uf[list(TIPOS_MEDIAS_PROVA)]
+
+
+def construir_gabaritos_prova(engine, tabela_origem, anos=None):
+    """
+    Materializa TABELA_GABARITOS_PROVA (chave primária CO_PROVA, NU_ANO) e TABELA_MEDIAS_PROVA_UF
+    numa leitura agregada por área dos microdados (GROUPING SETS), e TABELA_COMBINACOES_PROVA.
+    Com 'anos', só as linhas desses anos são recalculadas. Retorna True se as três tabelas foram criadas.
+    """
+    print(f"\n--- FASE 6D: Gabaritos, médias e combinações de provas ('{TABELA_GABARITOS_PROVA}', '{TABELA_MEDIAS_PROVA_UF}', '{TABELA_COMBINACOES_PROVA}') ---")
+    inicio = time.time()
+    try:
+        with engine.begin() as connection:
+            gravados = _anos_para_gravar(connection, {TABELA_GABARITOS_PROVA: TIPOS_GABARITOS_PROVA, TABELA_MEDIAS_PROVA_UF: TIPOS_MEDIAS_PROVA},
+                                         tabela_origem, anos)
+            df_agregados = pd.read_sql_query(text(_sql_agregados_prova(tabela_origem, gravados)), connection)
+            df_prova, df_uf = _separar_agregados_prova(df_agregados, _cores_das_provas(connection))
+
+            _atualizar_tabela_df(connection, TABELA_MEDIAS_PROVA_UF, df_uf, TIPOS_MEDIAS_PROVA, tabela_origem, gravados, [
+                f'CREATE INDEX "ix_{TABELA_MEDIAS_PROVA_UF}_prova" ON "{TABELA_MEDIAS_PROVA_UF}" ("CO_PROVA", "NU_ANO");',
+            ])
+            _atualizar_tabela_df(connection, TABELA_GABARITOS_PROVA, df_prova, TIPOS_GABARITOS_PROVA, tabela_origem, gravados, [
+                f'ALTER TABLE "{TABELA_GABARITOS_PROVA}" ADD PRIMARY KEY ("CO_PROVA", "NU_ANO");',
+            ])
+            _atualizar_tabela(connection, TABELA_COMBINACOES_PROVA, lambda a: _sql_combinacoes_prova(tabela_origem, a), tabela_origem, anos)
+            combinacoes = connection.execute(text(f'SELECT COUNT(*) FROM "{TABELA_COMBINACOES_PROVA}";')).scalar_one()
+        sem_cor = int(df_prova['cor'].isna().sum())
+        print(f"{_descrever_anos(gravados).capitalize()}: {len(df_prova)} provas em '{TABELA_GABARITOS_PROVA}' ({sem_cor} sem cor em questoes_enem), "
+              f"{len(df_uf)} linhas em '{TABELA_MEDIAS_PROVA_UF}', {combinacoes} em '{TABELA_COMBINACOES_PROVA}' ({time.time() - inicio:.1f}s).")
+        return True
+    except Exception as e:
+        print(f"ERRO na FASE 6D: Falha ao construir os gabaritos por prova. {e}")
+        traceback.print_exc()
+        return False
+
+
+def _sql_distribuicao_notas(tabela_origem, anos=None):
+    """Contagem por faixa de nota em (ano, área, UF) e (ano, área) (nivel_nacional = 1), com GROUPING SETS por área."""
+    partes = []
+    for area in AREAS_ITENS:
+        faixa = f'LEAST(GREATEST(CAST(FLOOR("NU_NOTA_{area}" * {FAIXAS_NOTA / NOTA_MAXIMA}) AS INTEGER), 0), {FAIXAS_NOTA - 1})'
+        partes.append(f'''SELECT "NU_ANO", '{area}' AS sigla_area, "SG_UF_PROVA", GROUPING("SG_UF_PROVA") AS nivel_nacional,
+            faixa, COUNT(*) AS n
+        FROM (
+            SELECT "NU_ANO", "SG_UF_PROVA", {faixa} AS faixa
+            FROM "{tabela_origem}"
+            WHERE "NU_NOTA_{area}" IS NOT NULL AND "NU_ANO" IS NOT NULL AND {_filtro_anos(anos)}
+        ) AS notas_{area.lower()}
+        GROUP BY GROUPING SETS (("NU_ANO", "SG_UF_PROVA", faixa), ("NU_ANO", faixa))''')
+    return "\nUNION ALL\n".join(partes)
+
+
+def _acumular_distribuicao(df):
+    """Resultado de _sql_distribuicao_notas -> linhas de TABELA_DISTRIBUICAO_NOTAS, com o acumulado por distribuição."""
+    nacional = df['nivel_nacional'] == 1
+    # UF nula nos microdados não pode se confundir com a linha nacional
+    df = df[nacional | df['SG_UF_PROVA'].notna()].copy()
+    df.loc[nacional, 'SG_UF_PROVA'] = None
+    df = df.sort_values(['NU_ANO', 'sigla_area', 'SG_UF_PROVA', 'faixa'], na_position='first')
+    df['n_acumulado'] = df.groupby(['NU_ANO', 'sigla_area', 'SG_UF_PROVA'], dropna=False)['n'].cumsum()
+    return df[list(TIPOS_DISTRIBUICAO_NOTAS)]
+
+
+def construir_distribuicao_notas(engine, tabela_origem, anos=None):
+    """
+    Materializa TABELA_DISTRIBUICAO_NOTAS: a CDF em faixas das notas de cada área por ano, nacional e por UF.
+    Com 'anos', só as distribuições desses anos são recalculadas. Retorna True se a tabela foi criada.
+    """
+    print(f"\n--- FASE 6E: Distribuição das notas ('{TABELA_DISTRIBUICAO_NOTAS}') ---")
+    inicio = time.time()
+    try:
+        with engine.begin() as connection:
+            gravados = _anos_para_gravar(connection, {TABELA_DISTRIBUICAO_NOTAS: TIPOS_DISTRIBUICAO_NOTAS}, tabela_origem, anos)
+            if gravados == []:  # nenhum ano a recalcular: só apaga os anos que saíram da origem
+                df = pd.DataFrame(columns=list(TIPOS_DISTRIBUICAO_NOTAS))
+            else:
+                df = _acumular_distribuicao(pd.read_sql_query(text(_sql_distribuicao_notas(tabela_origem, gravados)), connection))
+            _atualizar_tabela_df(connection, TABELA_DISTRIBUICAO_NOTAS, df, TIPOS_DISTRIBUICAO_NOTAS, tabela_origem, gravados, [
+                f'CREATE INDEX "ix_{TABELA_DISTRIBUICAO_NOTAS}_ano" ON "{TABELA_DISTRIBUICAO_NOTAS}" ("NU_ANO", sigla_area);',
+            ])
+        grupos = df.groupby(['NU_ANO', 'sigla_area', 'SG_UF_PROVA'], dropna=False).ngroups
+        print(f"{len(df)} faixas em '{TABELA_DISTRIBUICAO_NOTAS}' ({grupos} distribuições; {_descrever_anos(gravados)}, {time.time() - inicio:.1f}s).")
+        return True
+    except Exception as e:
+        print(f"ERRO na FASE 6E: Falha ao construir a distribuição das notas. {e}")
+        traceback.print_exc()
+        return False
+
+
+def _sql_visao_enriquecida(tabela_origem):
+    """Mesmo FROM enriquecido de Exploration/db_utils.py (BASE_SUBQUERY)."""
+    return f'''(
+        SELECT t1.*, mun_prova."NOME_MUNICIPIO" AS "NOME_MUNICIPIO_PROVA", mun_esc."NOME_MUNICIPIO" AS "NOME_MUNICIPIO_ESC"
+        FROM "{tabela_origem}" AS t1
+        LEFT JOIN "RELATORIO_MUNICIPIOS" AS mun_prova ON t1."CO_MUNICIPIO_PROVA" = mun_prova."CO_MUNICIPIO"
+        LEFT JOIN "RELATORIO_MUNICIPIOS" AS mun_esc ON t1."CO_MUNICIPIO_ESC" = mun_esc."CO_MUNICIPIO"
+    ) AS base_enem'''
+
+
+def _indices_dados_enriquecidos(tabela):
+    """CREATE INDEX de INDICES_DADOS_ENRIQUECIDOS em 'tabela' (a principal ou uma partição)."""
+    indices = []
+    for colunas in INDICES_DADOS_ENRIQUECIDOS:
+        sufixo = "_".join(c.lower() for c in colunas)
+        lista = ", ".join(f'"{c}"' for c in colunas)
+        indices.append((f'ix_{tabela}_{sufixo}', f'CREATE INDEX IF NOT EXISTS "ix_{tabela}_{sufixo}" ON "{tabela}" ({lista});'))
+    return indices
+
+
+def _preparar_dados_enriquecidos(connection, tabela_origem):
+    """
+    Garante TABELA_DADOS_ENRIQUECIDOS particionada por NU_ANO, com as colunas da visão enriquecida e
+    os índices (particionados; os que faltarem numa tabela mantida são criados). A cópia única das
+    versões anteriores, ou uma tabela com outras colunas, é recriada. Retorna True se a tabela foi (re)criada: todos os anos precisam ser materializados.
+    """
+    modelo = f'{TABELA_DADOS_ENRIQUECIDOS}__modelo'
+    connection.execute(text(f'CREATE TEMPORARY TABLE "{modelo}" ON COMMIT DROP AS SELECT * FROM {_sql_visao_enriquecida(tabela_origem)} WITH NO DATA;'))
+    tipo = connection.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:tabela)"), {'tabela': f'"{TABELA_DADOS_ENRIQUECIDOS}"'}).scalar()
+    if tipo == 'p' and _colunas_da_relacao(connection, TABELA_DADOS_ENRIQUECIDOS) == _colunas_da_relacao(connection, modelo):
+        # Índices acrescentados a INDICES_DADOS_ENRIQUECIDOS depois da criação da tabela
+        for _, sql in _indices_dados_enriquecidos(TABELA_DADOS_ENRIQUECIDOS):
+            connection.execute(text(sql))
+        return False
+    connection.execute(text(f'DROP TABLE IF EXISTS "{TABELA_DADOS_ENRIQUECIDOS}" CASCADE;'))
+    connection.execute(text(f'CREATE TABLE "{TABELA_DADOS_ENRIQUECIDOS}" (LIKE "{modelo}") PARTITION BY LIST ("NU_ANO");'))
+    for _, sql in _indices_dados_enriquecidos(TABELA_DADOS_ENRIQUECIDOS):
+        connection.execute(text(sql))
+    return True
+
+
+def _materializar_ano_enriquecido(connection, tabela_origem, ano):
+    """
+    Grava o ano em <partição>__carga (CHECK do ano e índices, que o ATTACH aproveita em vez de recriar)
+    e troca pela partição antiga: os leitores veem o ano anterior até o commit.
+    """
+    particao = f'{TABELA_DADOS_ENRIQUECIDOS}_{int(ano)}'
+    carga = f'{particao}__carga'
+    connection.execute(text(f'DROP TABLE IF EXISTS "{carga}";'))
+    connection.execute(text(f'CREATE TABLE "{carga}" AS SELECT * FROM {_sql_visao_enriquecida(tabela_origem)} WHERE "NU_ANO" = {int(ano)};'))
+    connection.execute(text(f'ALTER TABLE "{carga}" ADD CONSTRAINT "ck_nu_ano" CHECK ("NU_ANO" IS NOT NULL AND "NU_ANO" = {int(ano)});'))
+    indices_carga = _indices_dados_enriquecidos(carga)
+    for _, sql in indices_carga:
+        connection.execute(text(sql))
+    if particao in _particoes_por_ano(connection, TABELA_DADOS_ENRIQUECIDOS).values():
+        connection.execute(text(f'ALTER TABLE "{TABELA_DADOS_ENRIQUECIDOS}" DETACH PARTITION "{particao}";'))
+    connection.execute(text(f'DROP TABLE IF EXISTS "{particao}";'))
+    connection.execute(text(f'ALTER TABLE "{carga}" RENAME TO "{particao}";'))
+    for (nome_carga, _), (nome, _) in zip(indices_carga, _indices_dados_enriquecidos(particao)):
+        connection.execute(text(f'ALTER INDEX "{nome_carga}" RENAME TO "{nome}";'))
+    connection.execute(text(f'ALTER TABLE "{TABELA_DADOS_ENRIQUECIDOS}" ATTACH PARTITION "{particao}" FOR VALUES IN ({int(ano)});'))
+    return particao
+
+
+def construir_dados_enriquecidos(engine, tabela_origem, anos=None):
+    """
+    Materializa (ou atualiza) TABELA_DADOS_ENRIQUECIDOS a partir da tabela de origem e do RELATORIO_MUNICIPIOS,
+    uma partição por ano. Sem 'anos', refaz todos os anos da origem (ex.: RELATORIO_MUNICIPIOS recarregado);
+    com 'anos', só esses (os anos recarregados). Partições de anos que saíram da origem são removidas.
+    Retorna True se a tabela foi atualizada.
+    """
+    print(f"\n--- FASE 6F: Microdados enriquecidos da Exploration ('{TABELA_DADOS_ENRIQUECIDOS}') ---")
+    inicio = time.time()
+    try:
+        if not inspect(engine).has_table('RELATORIO_MUNICIPIOS'):
+            print("AVISO: 'RELATORIO_MUNICIPIOS' não existe; a Exploration continua fazendo o JOIN na consulta.")
+            return False
+        with engine.begin() as connection:
+            recriada = _preparar_dados_enriquecidos(connection, tabela_origem)
+            anos_origem = set(_particoes_por_ano(connection, tabela_origem))
+            anos_remover = sorted(set(_particoes_por_ano(connection, TABELA_DADOS_ENRIQUECIDOS)) - anos_origem)
+            for ano in anos_remover:
+                particao = f'{TABELA_DADOS_ENRIQUECIDOS}_{ano}'
+                connection.execute(text(f'ALTER TABLE "{TABELA_DADOS_ENRIQUECIDOS}" DETACH PARTITION "{particao}";'))
+                connection.execute(text(f'DROP TABLE "{particao}";'))
+        anos_processar = sorted(anos_origem) if anos is None or recriada else sorted(set(anos) & anos_origem)
+        linhas = 0
+        for ano in anos_processar:
+            # Uma transação por ano: a troca de um ano não espera a materialização dos outros
+            with engine.begin() as connection:
+                particao = _materializar_ano_enriquecido(connection, tabela_origem, ano)
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+                connection.execute(text(f'ANALYZE "{particao}";'))
+                linhas += connection.execute(text(f'SELECT COUNT(*) FROM "{particao}";')).scalar_one()
+        if recriada: print(f"'{TABELA_DADOS_ENRIQUECIDOS}' criada, particionada por NU_ANO.")
+        if anos_remover: print(f"Partições removidas (anos fora da origem): {anos_remover}")
+        print(f"Anos materializados: {anos_processar or 'nenhum'}; {linhas} linhas ({time.time() - inicio:.1f}s).")
+        return True
+    except Exception as e:
+        print(f"ERRO na FASE 6F: Falha ao materializar os microdados enriquecidos. {e}")
+        traceback.print_exc()
+        return False
+
+
+def descartar_dados_enriquecidos(engine):
+    """Remove TABELA_DADOS_ENRIQUECIDOS (desatualizada após recarregar os microdados sem a FASE 6): a Exploration volta ao JOIN."""
+    with engine.begin() as connection:
+        connection.execute(text(f'DROP TABLE IF EXISTS "{TABELA_DADOS_ENRIQUECIDOS}";'))
+
+
+def _tipo_catalogo(tipo_sql):
+    if isinstance(tipo_sql, types.Integer): return 'inteiro'
+    if isinstance(tipo_sql, (types.Numeric, types.Float)): return 'decimal'
+    if isinstance(tipo_sql, (types.Date, types.DateTime)): return 'data'
+    return 'texto'
+
+
+def _colunas_visao(engine, tabela_origem):
+    """(coluna, tipo do catálogo) na ordem da visão enriquecida: colunas da tabela + nomes dos municípios."""
+    colunas = [(c['name'], _tipo_catalogo(c['type'])) for c in inspect(engine).get_columns(tabela_origem)]
+    return colunas + [('NOME_MUNICIPIO_PROVA', 'texto'), ('NOME_MUNICIPIO_ESC', 'texto')]
+
+
+def _precisa_de_valores(coluna, tipo):
+    """Mesma regra da página: códigos ('Cód. ...'), textos e colunas forçadas a categóricas."""
+    rotulo = COLUMN_MAPPING.get(coluna)
+    if rotulo is None:
+        return False
+    return rotulo.upper().startswith("CÓD.") or tipo == 'texto' or TYPE_OVERRIDES.get(rotulo) == 'categorical'
+
+
+def _calcular_catalogo(connection, tabela_origem, colunas, anos):
+    """Linhas do catálogo para os anos informados: uma varredura para o resumo e uma (GROUPING SETS) para os valores."""
+    visao = _sql_visao_enriquecida(tabela_origem)
+    filtro_anos = f'WHERE "NU_ANO" IN ({", ".join(str(int(a)) for a in anos)})'
+
+    # 1) Resumo: contagem de nulos, mínimo e máximo de todas as colunas, por ano
+    medidas = ['COUNT(*) AS n_linhas']
+    for i, (coluna, tipo) in enumerate(colunas):
+        medidas.append(f'COUNT("{coluna}") AS c_{i}')
+        if tipo != 'texto':
+            medidas += [f'MIN("{coluna}") AS min_{i}', f'MAX("{coluna}") AS max_{i}']
+    df_resumo = pd.read_sql_query(text(f'SELECT "NU_ANO", {", ".join(medidas)} FROM {visao} {filtro_anos} GROUP BY "NU_ANO"'), connection)
+    linhas = []
+    for _, r in df_resumo.iterrows():
+        for i, (coluna, tipo) in enumerate(colunas):
+            linha = {'NU_ANO': int(r['NU_ANO']), 'coluna': coluna, 'registro': 'resumo', 'tipo': tipo, 'posicao': i,
+                     'n_linhas': int(r['n_linhas']), 'n_nulos': int(r['n_linhas'] - r[f'c_{i}'])}
+            if tipo in ('inteiro', 'decimal'):
+                linha['minimo'] = float(r[f'min_{i}']) if pd.notnull(r[f'min_{i}']) else None
+                linha['maximo'] = float(r[f'max_{i}']) if pd.notnull(r[f'max_{i}']) else None
+            elif tipo == 'data':
+                linha['minimo_txt'] = str(r[f'min_{i}']) if pd.notnull(r[f'min_{i}']) else None
+                linha['maximo_txt'] = str(r[f'max_{i}']) if pd.notnull(r[f'max_{i}']) else None
+            linhas.append(linha)
+
+    # 2) Valores distintos: um GROUPING SET (NU_ANO, coluna) por coluna de opções, numa só varredura
+    com_valores = [(i, coluna, tipo) for i, (coluna, tipo) in enumerate(colunas) if _precisa_de_valores(coluna, tipo)]
+    if com_valores:
+        conjuntos = ", ".join(f'("NU_ANO", "{coluna}")' for _, coluna, _ in com_valores)
+        selecao = ", ".join(f'"{coluna}" AS v_{i}, GROUPING("{coluna}") AS g_{i}' for i, coluna, _ in com_valores)
+        df_valores = pd.read_sql_query(text(f'SELECT "NU_ANO", {selecao} FROM {visao} {filtro_anos} GROUP BY GROUPING SETS ({conjuntos})'), connection)
+        for i, coluna, tipo in com_valores:
+            valores = df_valores.loc[(df_valores[f'g_{i}'] == 0) & df_valores[f'v_{i}'].notna(), ['NU_ANO', f'v_{i}']]
+            if tipo in ('inteiro', 'decimal'):
+                valores = valores.assign(**{f'v_{i}': valores[f'v_{i}'].astype('float64')})
+            # Mesmo recorte da varredura antiga (ORDER BY ... LIMIT), aplicado por ano
+            valores = valores.sort_values(['NU_ANO', f'v_{i}']).groupby('NU_ANO').head(LIMITE_VALORES_FILTRO)
+            campo = 'valor_num' if tipo in ('inteiro', 'decimal') else 'valor_txt'
+            linhas += [{'NU_ANO': int(ano), 'coluna': coluna, 'registro': 'valor', 'tipo': tipo, 'posicao': i, campo: valor}
+                       for ano, valor in zip(valores['NU_ANO'], valores[f'v_{i}'])]
+
+    return pd.DataFrame(linhas, columns=list(TIPOS_CATALOGO))
+
+
+def atualizar_catalogo_filtros(engine, tabela_origem, anos=None):
+    """
+    Atualiza o catálogo de filtros (TABELA_CATALOGO_FILTROS) só para os anos necessários: os anos da tabela
+    de origem que ainda não estão no catálogo (ano novo carregado, ou catálogo inexistente) e, com 'anos',
+    também esses. Remove os anos que não existem mais na origem. Retorna True em caso de sucesso.
+    """
+    print(f"\n--- FASE 6B: Catálogo de filtros da Exploration ('{TABELA_CATALOGO_FILTROS}') ---")
+    inicio = time.time()
+    try:
+        colunas = _colunas_visao(engine, tabela_origem)
+        with engine.begin() as connection:
+            anos_origem = {int(a) for a in connection.execute(text(f'SELECT DISTINCT "NU_ANO" FROM "{tabela_origem}" WHERE "NU_ANO" IS NOT NULL;')).scalars()}
+            existe = inspect(connection).has_table(TABELA_CATALOGO_FILTROS)
+            anos_catalogo = set()
+            if existe:
+                anos_catalogo = {int(a) for a in connection.execute(text(f'SELECT DISTINCT "NU_ANO" FROM "{TABELA_CATALOGO_FILTROS}";')).scalars()}
+            # Anos da origem fora do catálogo entram sempre: sem isso, um catálogo novo (ou incompleto) criado com
+            # 'anos' teria só esses anos, e a página, que confia no catálogo, perderia as opções dos outros
+            anos_processar = sorted((set(anos or ()) & anos_origem) | (anos_origem - anos_catalogo))
+            anos_remover = sorted((anos_catalogo - anos_origem) | set(anos_processar))
+
+            df_catalogo = _calcular_catalogo(connection, tabela_origem, colunas, anos_processar) if anos_processar else None
+            if existe and anos_remover:
+                connection.execute(text(f'DELETE FROM "{TABELA_CATALOGO_FILTROS}" WHERE "NU_ANO" IN ({", ".join(str(a) for a in anos_remover)});'))
+            if df_catalogo is not None:
+                df_catalogo.to_sql(TABELA_CATALOGO_FILTROS, connection, if_exists='append', index=False, dtype=TIPOS_CATALOGO, chunksize=10000)
+        if not anos_processar:
+            print("Catálogo de filtros já está atualizado (nenhum ano novo).")
+        else:
+            print(f"Catálogo de filtros atualizado para {anos_processar}: {len(df_catalogo)} linhas ({time.time() - inicio:.1f}s).")
+        return True
+    except Exception as e:
+        print(f"ERRO na FASE 6B: Falha ao atualizar o catálogo de filtros. {e}")
+        traceback.print_exc()
+        return False
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import SCRIPT
+
+    parser = argparse.ArgumentParser(description="Reconstrói as tabelas derivadas (pós-carga) a partir de 'dados_enem_consolidado'.")
+    parser.add_argument('--sem-parquet', action='store_true', help="Não exporta as tabelas derivadas para Parquet (backend DuckDB).")
+    parser.add_argument('--parquet-dir', default=SCRIPT.diretorio_parquet, help="Diretório dos arquivos Parquet.")
+    parser.add_argument('--catalogo-filtros', action='store_true',
+                        help="Só atualiza o catálogo de filtros (anos ainda não catalogados, ou os de --anos).")
+    parser.add_argument('--anos', type=int, nargs='+', default=None,
+                        help="Só recalcula estes anos em todas as tabelas derivadas (ex.: após recarregar um ano). Padrão: todos os anos.")
+    parser.add_argument('--dados-enriquecidos', action='store_true',
+                        help=f"Só atualiza '{TABELA_DADOS_ENRIQUECIDOS}' (ex.: após recarregar o RELATORIO_MUNICIPIOS).")
+    args = parser.parse_args()
+    completo = not (args.catalogo_filtros or args.dados_enriquecidos)
+
+    engine = SCRIPT.obter_engine_etl()
+    tabelas_parquet = []
+    if completo and construir_cubo_dashboard(engine, SCRIPT.nome_tabela, args.anos):
+        tabelas_parquet += [TABELA_CUBO, TABELA_CUBO_CATEGORIAS]
+    if (completo or args.catalogo_filtros) and atualizar_catalogo_filtros(engine, SCRIPT.nome_tabela, args.anos):
+        tabelas_parquet.append(TABELA_CATALOGO_FILTROS)
+    if completo and construir_estatisticas_itens(engine, SCRIPT.nome_tabela, args.anos):
+        tabelas_parquet.append(TABELA_ESTATISTICAS_ITENS)
+    if completo and construir_gabaritos_prova(engine, SCRIPT.nome_tabela, args.anos):
+        tabelas_parquet += [TABELA_GABARITOS_PROVA, TABELA_MEDIAS_PROVA_UF, TABELA_COMBINACOES_PROVA]
+    if completo and construir_distribuicao_notas(engine, SCRIPT.nome_tabela, args.anos):
+        tabelas_parquet.append(TABELA_DISTRIBUICAO_NOTAS)
+    if completo or args.dados_enriquecidos:
+        construir_dados_enriquecidos(engine, SCRIPT.nome_tabela, args.anos)
+    if not args.sem_parquet:
+        for tabela in tabelas_parquet: SCRIPT.exportar_tabela_para_parquet(engine, tabela, args.parquet_dir)
+    SCRIPT.descartar_engines()
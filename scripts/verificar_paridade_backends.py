@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Verifica a paridade entre os backends PostgreSQL e DuckDB (DB_BACKEND=duckdb).
+
+Executa as mesmas consultas usadas pelas páginas nos dois backends e compara os
+resultados (linhas ordenadas, tolerância para números de ponto flutuante).
+Pré-requisito: ETL executado com o dataset Parquet habilitado (padrão do SCRIPT.py).
+
+Uso (a partir da raiz do projeto):
+    python scripts/verificar_paridade_backends.py [--ano 2023] [--uf SP]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.conexao import obter_engine  # noqa: E402
+from Exploration.db_utils import BASE_FROM_JOIN, TABLE_NAME  # noqa: E402
+from services.duckdb_backend import DuckDBBackend  # noqa: E402
+
+
+TABELA = TABLE_NAME
+
+
+def montar_consultas(ano, uf):
+    """Consultas representativas das páginas: (nome, sql, parâmetros)."""
+    return [
+        ("Contagem total", f'SELECT COUNT(*) AS total FROM "{TABELA}"', None),
+        ("Contagem por ano", f'SELECT "NU_ANO", COUNT(*) AS total FROM "{TABELA}" GROUP BY "NU_ANO"', None),
+        ("Contagem por UF", f'SELECT "SG_UF_PROVA", COUNT(*) AS total FROM "{TABELA}" GROUP BY "SG_UF_PROVA"', None),
+        ("Valores distintos (filtros)", f'SELECT DISTINCT "TP_FAIXA_ETARIA" FROM "{TABELA}" WHERE "TP_FAIXA_ETARIA" IS NOT NULL', None),
+        ("Médias por ano", f'''SELECT "NU_ANO", AVG("NU_NOTA_CN") AS cn, AVG("NU_NOTA_CH") AS ch, AVG("NU_NOTA_LC") AS lc,
+            AVG("NU_NOTA_MT") AS mt, AVG("NU_NOTA_REDACAO") AS redacao FROM "{TABELA}" GROUP BY "NU_ANO"''', None),
+        # FROM da Exploration com o JOIN de municípios (o DuckDB não tem a tabela materializada dados_enem_enriquecido)
+        ("Contagem com JOIN de municípios (BASE_COUNT_QUERY)", f'SELECT COUNT(*) AS total {BASE_FROM_JOIN}', None),
+        ("Municípios por nome (JOIN)", f'''SELECT "NOME_MUNICIPIO_PROVA", COUNT(*) AS total {BASE_FROM_JOIN}
+            WHERE "NU_ANO" = %(ano)s AND "SG_UF_PROVA" = %(uf)s GROUP BY "NOME_MUNICIPIO_PROVA"''', {'ano': ano, 'uf': uf}),
+        ("Parâmetros :nome (DatabaseManager)", f'''SELECT "TP_SEXO", COUNT(*) AS total, AVG("MEDIA_GERAL") AS media
+            FROM "{TABELA}" WHERE "NU_ANO" = :ano AND "SG_UF_PROVA" = :uf GROUP BY "TP_SEXO"''', {'ano': ano, 'uf': uf}),
+    ]
+
+
+def normalizar(df):
+    """Nomes em minúsculas, tipos comparáveis e linhas em ordem determinística."""
+    df = df.copy()
+    df.columns = [str(c).lower() for c in df.columns]
+    for col in df.columns:
+        convertida = pd.to_numeric(df[col], errors='coerce')
+        if convertida.notna().sum() == df[col].notna().sum():
+            df[col] = convertida.astype('float64')
+        else:
+            df[col] = df[col].astype('string')
+    return df.sort_values(list(df.columns), na_position='last').reset_index(drop=True)
+
+
+def comparar(df_postgres, df_duckdb):
+    """Retorna None se os resultados forem equivalentes, ou a descrição da diferença."""
+    if len(df_postgres) != len(df_duckdb):
+        return f"{len(df_postgres)} linhas no PostgreSQL x {len(df_duckdb)} no DuckDB"
+    try:
+        pd.testing.assert_frame_equal(normalizar(df_postgres), normalizar(df_duckdb), check_dtype=False, rtol=1e-6)
+    except AssertionError as e:
+        return str(e).splitlines()[0]
+    return None
+
+
+def executor_postgres(engine):
+    """Executa (sql, params) no PostgreSQL com os dois estilos de parâmetro usados pelas páginas."""
+    def executar(sql, params):
+        with engine.connect() as connection:
+            # text() só aceita :nome; as consultas %(nome)s vão direto para o driver
+            consulta = sql if '%(' in sql else text(sql)
+            return pd.read_sql(consulta, connection, params=params)
+    return executar
+
+
+def verificar(consultas, executar_referencia, executar_duckdb):
+    """
+    Executa cada consulta (nome, sql, parâmetros) no backend de referência e no DuckDB.
+    Retorna uma lista de (nome, segundos na referência, segundos no DuckDB, diferença ou None).
+    """
+    resultados = []
+    for nome, sql, params in consultas:
+        try:
+            inicio = time.perf_counter()
+            df_referencia = executar_referencia(sql, params)
+            t_referencia = time.perf_counter() - inicio
+            inicio = time.perf_counter()
+            df_duck = executar_duckdb(sql, params)
+            t_duck = time.perf_counter() - inicio
+            diferenca = comparar(df_referencia, df_duck)
+        except Exception as e:
+            t_referencia = t_duck = float('nan'); diferenca = f"ERRO: {e}"
+        resultados.append((nome, t_referencia, t_duck, diferenca))
+    return resultados
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara os resultados das consultas no PostgreSQL e no DuckDB.")
+    parser.add_argument('--ano', type=int, default=2023, help="Ano usado nas consultas parametrizadas. Padrão: 2023.")
+    parser.add_argument('--uf', default='SP', help="UF usada nas consultas parametrizadas. Padrão: SP.")
+    parser.add_argument('--parquet-dir', default=None, help="Diretório do dataset Parquet (padrão: $ENEM_PARQUET_DIR).")
+    args = parser.parse_args()
+
+    # Mesmas variáveis de ambiente (DB_*) e mesmo pool das páginas
+    engine = obter_engine(rotulo='verificar-paridade')
+    duck = DuckDBBackend(diretorio_parquet=args.parquet_dir)
+    print(f"Views registradas no DuckDB: {duck.views}")
+
+    resultados = verificar(montar_consultas(args.ano, args.uf), executor_postgres(engine), duck.execute_query)
+    print(f"{'Consulta':<52} {'PostgreSQL (s)':>15} {'DuckDB (s)':>11}  Resultado")
+    for nome, t_pg, t_duck, diferenca in resultados:
+        print(f"{nome:<52} {t_pg:>15.3f} {t_duck:>11.3f}  {'OK' if not diferenca else diferenca}")
+
+    engine.dispose()
+    divergencias = sum(1 for *_, diferenca in resultados if diferenca)
+    print(f"\n{divergencias} consulta(s) divergente(s).")
+    sys.exit(1 if divergencias else 0)
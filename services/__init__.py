@@ -4,5 +4,6 @@ Módulo de serviços do projeto.
 from .database_manager import DatabaseManager
 from .question_analyzer import QuestionAnalyzer
 from .performance_analyzer import PerformanceAnalyzer
+from .correcao_lote import CorrecaoLote
 
-__all__ = ['DatabaseManager', 'QuestionAnalyzer', 'PerformanceAnalyzer']
+__all__ = ['DatabaseManager', 'QuestionAnalyzer', 'PerformanceAnalyzer', 'CorrecaoLote']
@@ -0,0 +1,263 @@
+"""
+Consultor de índices dos microdados.
+
+As páginas registram as consultas filtradas que chegam às tabelas de microdados
+(Exploration: build_query_and_params; Dashboard: agregações fora do cubo) num arquivo
+JSON Lines, com as colunas dos predicados normalizadas. A partir desse registro:
+
+- recomendar_indices: colunas mais filtradas sem índice, com o tipo de índice
+  (BRIN em NU_ANO, que cresce junto com a carga; B-tree nas demais);
+- criar_indices: cria os índices recomendados (CONCURRENTLY quando a tabela permite);
+- medir_consultas: tempo de EXPLAIN ANALYZE das consultas mais frequentes, para comparar
+  antes e depois dos índices.
+
+Linha de comando: scripts/consultor_indices.py.
+Registro em $ENEM_REGISTRO_PREDICADOS (padrão: logs/predicados.jsonl na raiz do projeto;
+vazio desliga o registro).
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+import pandas as pd
+from sqlalchemy import text
+
+_RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REGISTRO_PADRAO = os.path.join(_RAIZ, "logs", "predicados.jsonl")
+CAMINHO_REGISTRO = os.getenv("ENEM_REGISTRO_PREDICADOS", REGISTRO_PADRAO)
+
+# Tipo de índice por coluna; as demais colunas filtradas com frequência recebem B-tree
+INDICES_RECOMENDADOS = {
+    "NU_ANO": "brin",
+    "SG_UF_PROVA": "btree",
+    "CO_MUNICIPIO_PROVA": "btree",
+    "CO_PROVA_CN": "btree",
+    "CO_PROVA_CH": "btree",
+    "CO_PROVA_LC": "btree",
+    "CO_PROVA_MT": "btree",
+}
+USO_MINIMO = 0.05  # fração das consultas registradas em que a coluna aparece para recomendar B-tree
+JANELA_REPETICAO = 60  # segundos: a mesma consulta da mesma origem não é registrada de novo (reruns do Streamlit)
+TIMEOUT_EXPLAIN_MS = 120000
+
+ESTILO_PYFORMAT = "pyformat"  # %(nome)s (Exploration, pd.read_sql)
+ESTILO_NOMEADO = "nomeado"  # :nome (text() do SQLAlchemy)
+
+# "COLUNA" seguida de um operador de predicado
+_PREDICADO = re.compile(
+    r'"([A-Za-z_][A-Za-z0-9_]*)"\s*(?:=|<>|!=|>=|<=|>|<|\bIN\s*\(|\bBETWEEN\b|\bIS\b|\bLIKE\b|\bILIKE\b)',
+    re.IGNORECASE,
+)
+
+_lock_registro = threading.Lock()
+_registradas: "OrderedDict[str, float]" = OrderedDict()
+
+
+def colunas_dos_predicados(sql: str) -> List[str]:
+    """Colunas (em maiúsculas, sem repetição, na ordem) usadas em predicados do WHERE de 'sql'."""
+    posicao = re.search(r"\bWHERE\b", sql, re.IGNORECASE)
+    if posicao is None:
+        return []
+    return list(dict.fromkeys(c.upper() for c in _PREDICADO.findall(sql[posicao.end():])))
+
+
+def _assinatura(origem: str, sql: str, params: Optional[Dict[str, Any]]) -> str:
+    conteudo = json.dumps([origem, sql, params or {}], sort_keys=True, default=str)
+    return hashlib.sha1(conteudo.encode("utf-8")).hexdigest()
+
+
+def registrar_consulta(
+    origem: str,
+    tabela: str,
+    sql: str,
+    params: Optional[Dict[str, Any]] = None,
+    estilo: str = ESTILO_PYFORMAT,
+    caminho: Optional[str] = None,
+) -> None:
+    """
+    Acrescenta a consulta ao registro, se ela tiver predicados. Nunca levanta exceção:
+    o registro não pode derrubar a página.
+    """
+    caminho = CAMINHO_REGISTRO if caminho is None else caminho
+    if not caminho:
+        return
+    try:
+        colunas = colunas_dos_predicados(sql)
+        if not colunas:
+            return
+        assinatura = _assinatura(origem, sql, params)
+        agora = time.time()
+        with _lock_registro:
+            if agora - _registradas.get(assinatura, 0.0) < JANELA_REPETICAO:
+                return
+            _registradas[assinatura] = agora
+            _registradas.move_to_end(assinatura)
+            while len(_registradas) > 1000:
+                _registradas.popitem(last=False)
+            os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+            with open(caminho, "a", encoding="utf-8") as arquivo:
+                arquivo.write(json.dumps({
+                    "instante": round(agora, 3), "origem": origem, "tabela": tabela, "colunas": colunas,
+                    "assinatura": assinatura, "estilo": estilo, "sql": sql, "params": params or {},
+                }, default=str, ensure_ascii=False) + "\n")
+    except Exception:
+        pass
+
+
+def carregar_registro(caminho: Optional[str] = None) -> pd.DataFrame:
+    """Registro como DataFrame (uma linha por consulta registrada); vazio se o arquivo não existir."""
+    caminho = caminho or CAMINHO_REGISTRO
+    if not caminho or not os.path.exists(caminho):
+        return pd.DataFrame(columns=["instante", "origem", "tabela", "colunas", "assinatura", "estilo", "sql", "params"])
+    linhas = []
+    with open(caminho, encoding="utf-8") as arquivo:
+        for linha in arquivo:
+            try:
+                linhas.append(json.loads(linha))
+            except json.JSONDecodeError:
+                continue  # linha truncada (processo interrompido durante a escrita)
+    return pd.DataFrame(linhas)
+
+
+def uso_das_colunas(registro: pd.DataFrame) -> pd.DataFrame:
+    """Consultas e fração das consultas de cada tabela em que cada coluna aparece nos predicados."""
+    if registro.empty:
+        return pd.DataFrame(columns=["tabela", "coluna", "consultas", "fracao"])
+    explodido = registro[["tabela", "colunas"]].explode("colunas").rename(columns={"colunas": "coluna"})
+    uso = explodido.groupby(["tabela", "coluna"]).size().rename("consultas").reset_index()
+    total_por_tabela = registro.groupby("tabela").size()
+    uso["fracao"] = uso["consultas"] / uso["tabela"].map(total_por_tabela)
+    return uso.sort_values(["tabela", "consultas"], ascending=[True, False]).reset_index(drop=True)
+
+
+def indices_existentes(connection, tabelas: Iterable[str]) -> pd.DataFrame:
+    """
+    (tabela, coluna, tipo, indice) da primeira coluna de cada índice das tabelas. A chave de
+    partição (NU_ANO em dados_enem_consolidado) entra com tipo 'particao': a poda de partições
+    já faz o papel do índice.
+    """
+    return pd.read_sql_query(text('''
+        SELECT t.relname AS tabela, a.attname AS coluna, am.amname AS tipo, ic.relname AS indice
+        FROM pg_index i
+        JOIN pg_class t ON t.oid = i.indrelid
+        JOIN pg_class ic ON ic.oid = i.indexrelid
+        JOIN pg_am am ON am.oid = ic.relam
+        JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = i.indkey[0]
+        WHERE t.relname = ANY(:tabelas)
+        UNION ALL
+        SELECT t.relname, a.attname, 'particao', NULL
+        FROM pg_partitioned_table p
+        JOIN pg_class t ON t.oid = p.partrelid
+        JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = p.partattrs[0]
+        WHERE t.relname = ANY(:tabelas)
+    '''), connection, params={"tabelas": list(tabelas)})
+
+
+def _nome_indice(tabela: str, coluna: str, tipo: str) -> str:
+    return f"ix_{tabela}_{coluna.lower()}_{tipo}"[:63]
+
+
+def recomendar_indices(registro: pd.DataFrame, existentes: pd.DataFrame, uso_minimo: float = USO_MINIMO) -> pd.DataFrame:
+    """
+    Índices recomendados para as colunas filtradas: as de INDICES_RECOMENDADOS que aparecem no
+    registro e as demais usadas em pelo menos 'uso_minimo' das consultas da tabela. Colunas que já
+    são a primeira coluna de algum índice ficam de fora.
+    """
+    uso = uso_das_colunas(registro)
+    cobertas = set(zip(existentes["tabela"], existentes["coluna"].str.upper())) if not existentes.empty else set()
+    linhas = []
+    for item in uso.itertuples(index=False):
+        if (item.tabela, item.coluna) in cobertas:
+            continue
+        if item.coluna not in INDICES_RECOMENDADOS and item.fracao < uso_minimo:
+            continue
+        tipo = INDICES_RECOMENDADOS.get(item.coluna, "btree")
+        linhas.append({
+            "tabela": item.tabela, "coluna": item.coluna, "tipo": tipo,
+            "consultas": int(item.consultas), "fracao": float(item.fracao),
+            "indice": _nome_indice(item.tabela, item.coluna, tipo),
+        })
+    return pd.DataFrame(linhas, columns=["tabela", "coluna", "tipo", "consultas", "fracao", "indice"])
+
+
+def _particionada(connection, tabela: str) -> bool:
+    tipo = connection.execute(text("SELECT relkind FROM pg_class WHERE relname = :tabela"), {"tabela": tabela}).scalar()
+    return tipo == "p"
+
+
+def criar_indices(engine, recomendacoes: pd.DataFrame) -> List[str]:
+    """
+    Cria os índices recomendados (fora de transação, com CONCURRENTLY quando a tabela não é
+    particionada) e roda ANALYZE nas tabelas alteradas. Retorna os comandos executados.
+    """
+    executados = []
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        for item in recomendacoes.itertuples(index=False):
+            concorrente = "" if _particionada(connection, item.tabela) else "CONCURRENTLY "
+            sql = (f'CREATE INDEX {concorrente}IF NOT EXISTS "{item.indice}" '
+                   f'ON "{item.tabela}" USING {item.tipo} ("{item.coluna}")')
+            connection.execute(text(sql))
+            executados.append(sql)
+        for tabela in recomendacoes["tabela"].unique():
+            connection.execute(text(f'ANALYZE "{tabela}"'))
+    return executados
+
+
+def consultas_mais_frequentes(registro: pd.DataFrame, limite: int = 20) -> pd.DataFrame:
+    """As 'limite' consultas distintas mais registradas, com o número de ocorrências."""
+    if registro.empty:
+        return registro.assign(ocorrencias=pd.Series(dtype="int64"))
+    contagem = registro.groupby("assinatura").size().rename("ocorrencias")
+    distintas = registro.drop_duplicates("assinatura").set_index("assinatura").join(contagem)
+    return distintas.sort_values("ocorrencias", ascending=False).head(limite).reset_index()
+
+
+def _explain(connection, sql: str, params: Dict[str, Any], estilo: str) -> Dict[str, Any]:
+    explain = f"EXPLAIN (ANALYZE, FORMAT JSON) {sql.rstrip().rstrip(';')}"
+    if estilo == ESTILO_NOMEADO:
+        resultado = connection.execute(text(explain), params or {})
+    elif params:
+        resultado = connection.exec_driver_sql(explain, params)
+    else:
+        # cursor.execute(sql) sem parâmetros: o driver não interpreta '%' (um LIKE 'A%' literal não vira placeholder)
+        resultado = connection.exec_driver_sql(explain, execution_options={"no_parameters": True})
+    plano = resultado.scalar()
+    if isinstance(plano, str):
+        plano = json.loads(plano)
+    return plano[0]
+
+
+def _tipos_de_varredura(no: Dict[str, Any]) -> List[str]:
+    tipos = [no["Node Type"]] if "Scan" in no.get("Node Type", "") else []
+    for filho in no.get("Plans", []):
+        tipos += _tipos_de_varredura(filho)
+    return tipos
+
+
+def medir_consultas(engine, consultas: pd.DataFrame, timeout_ms: int = TIMEOUT_EXPLAIN_MS) -> pd.DataFrame:
+    """
+    EXPLAIN ANALYZE de cada consulta (executa de verdade, com statement_timeout de 'timeout_ms').
+    Retorna assinatura, origem, colunas, tempo em ms (None se falhou) e as varreduras do plano.
+    """
+    linhas = []
+    for consulta in consultas.itertuples(index=False):
+        tempo, varreduras, erro = None, "", None
+        try:
+            with engine.begin() as connection:
+                connection.execute(text(f"SET LOCAL statement_timeout = {int(timeout_ms)}"))
+                plano = _explain(connection, consulta.sql, consulta.params, consulta.estilo)
+            tempo = float(plano["Execution Time"])
+            varreduras = ", ".join(dict.fromkeys(_tipos_de_varredura(plano["Plan"])))
+        except Exception as e:
+            erro = str(e).splitlines()[0]
+        linhas.append({
+            "assinatura": consulta.assinatura, "origem": consulta.origem, "tabela": consulta.tabela,
+            "colunas": ", ".join(consulta.colunas), "ocorrencias": int(consulta.ocorrencias),
+            "tempo_ms": tempo, "varreduras": varreduras, "erro": erro,
+        })
+    return pd.DataFrame(linhas)
@@ -0,0 +1,270 @@
+"""
+Correção em lote de folhas de respostas do ENEM.
+
+Cada folha é uma sequência no mesmo formato do "Preenchimento Rápido" da página de
+Desempenho (A/B/C/D/E ou '-' para em branco, questão 1 em diante). Gabaritos candidatos,
+parâmetros TRI e médias nacional/UF são carregados uma única vez por (ano, cor, língua);
+as folhas são corrigidas em blocos, com a identificação do gabarito, a contagem de acertos
+e a estimação TRI (3PL) vetorizadas, e os resultados são gravados bloco a bloco (CSV ou Parquet).
+
+Uso pela linha de comando: scripts/corrigir_lote.py.
+"""
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .performance_analyzer import PerformanceAnalyzer
+from .question_analyzer import decodificar_respostas
+
+AREAS = ["CH", "CN", "LC", "MT"]
+TAMANHO_BLOCO = 5000
+COLUNA_RESPOSTAS = "respostas"
+# Limite de comparações (folhas x candidatos x questões) por passo da identificação do gabarito
+LIMITE_COMPARACOES = 50_000_000
+
+
+def normalizar_sequencia(texto: str, qtd_questoes: int) -> str:
+    """Mantém só A/B/C/D/E/- (em maiúsculas) e completa com '-' ou corta em qtd_questoes."""
+    filtrados = [c for c in str(texto).upper() if c in "ABCDE-"]
+    if len(filtrados) < qtd_questoes:
+        filtrados += ["-"] * (qtd_questoes - len(filtrados))
+    return "".join(filtrados[:qtd_questoes])
+
+
+def codificar_sequencias(sequencias: pd.Series, qtd_questoes: int) -> np.ndarray:
+    """
+    Sequências -> matriz uint8 (folhas x qtd_questoes), 1..5 = A..E e 0 = branco,
+    com a mesma normalização de normalizar_sequencia.
+    """
+    textos = (
+        sequencias.fillna("").astype(str).str.upper()
+        .str.replace(r"[^ABCDE-]", "", regex=True)
+        .str.slice(0, qtd_questoes)
+        .str.pad(qtd_questoes, side="right", fillchar="-")
+    )
+    if textos.empty or qtd_questoes == 0:
+        return np.zeros((len(textos), qtd_questoes), dtype=np.uint8)
+    return decodificar_respostas(textos.reset_index(drop=True))
+
+
+def _arredondar(valores) -> np.ndarray:
+    """round(x, 1) do Python elemento a elemento (np.round difere nos empates), como em analisar_desempenho."""
+    return np.array([round(float(v), 1) for v in np.atleast_1d(valores)], dtype=float)
+
+
+def _media(valor) -> float:
+    return np.nan if valor is None else float(valor)
+
+
+class CorrecaoLote:
+    """Contexto de correção de uma prova (ano, cor, língua), carregado uma vez e reutilizado por bloco."""
+
+    def __init__(self, analyzer: PerformanceAnalyzer, ano: int, cor_prova: str,
+                 lingua: str = "INGLES", metodo: str = "mle"):
+        self.analyzer = analyzer
+        self.ano = int(ano)
+        self.cor_prova = cor_prova
+        self.lingua = analyzer.normalizar_lingua(lingua)
+        self.metodo = metodo
+        self.erro: Optional[str] = None
+
+        self.mapa_areas = analyzer.obter_mapeamento_areas(ano, cor_prova, lingua)
+        self.qtd_questoes = analyzer.get_qtd_questoes(ano, cor_prova, lingua)
+        self.medias: Dict[str, Dict] = {}
+        self.parametros: Dict[str, Dict[str, np.ndarray]] = {}
+        self.df_gabs = pd.DataFrame()
+
+        df_provas = analyzer.buscar_provas_com_lingua(ano, cor_prova, lingua)
+        codigos_list = analyzer.extrair_codigos_provas(df_provas) if not df_provas.empty else []
+        if not codigos_list:
+            self.erro = f"Nenhuma prova encontrada para {ano}, cor {cor_prova}, língua {self.lingua}."
+            return
+
+        self.df_gabs = analyzer.buscar_gabaritos_por_provas(codigos_list, ano).reset_index(drop=True)
+        if self.df_gabs.empty:
+            self.erro = f"Nenhum gabarito encontrado para os códigos de prova: {codigos_list}"
+            return
+
+        self.gabaritos = analyzer.codificar_gabaritos(self.df_gabs, self.mapa_areas)
+        # Áreas com gabarito em cada candidato (construir_gabarito_oficial devolve lista vazia nas demais)
+        self.tem_gabarito = {
+            area: self.df_gabs.get(f"TX_GABARITO_{area}", pd.Series(index=self.df_gabs.index, dtype=object))
+            .map(lambda g: isinstance(g, str) and bool(g.strip())).to_numpy()
+            for area in self.mapa_areas
+        }
+        self.medias = analyzer.carregar_medias_db(analyzer.codigos_das_combinacoes(self.df_gabs, codigos_list), ano)
+        self.parametros = analyzer.obter_parametros_itens(
+            ano, analyzer.normalizar_cor_prova(cor_prova), self.lingua
+        )
+
+    def _melhores_candidatos(self, respostas: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Índice e acertos do melhor gabarito candidato de cada folha (empate: o primeiro)."""
+        n_candidatos = len(self.gabaritos)
+        passo = max(1, LIMITE_COMPARACOES // max(1, n_candidatos * self.gabaritos.shape[1]))
+        melhores = np.zeros(len(respostas), dtype=np.int64)
+        for inicio in range(0, len(respostas), passo):
+            scores = self.analyzer.pontuar_gabaritos(respostas[inicio:inicio + passo], self.gabaritos)
+            melhores[inicio:inicio + passo] = scores.argmax(axis=1)
+        acertos = ((respostas == self.gabaritos[melhores]) & (respostas > 0)).sum(axis=1)
+        return melhores, acertos
+
+    def _notas_area(self, area: str, respostas: np.ndarray, gabaritos: np.ndarray, acertos: np.ndarray) -> np.ndarray:
+        """Mesma regra de estimar_nota_tri_parametrizada, para todas as folhas de uma vez."""
+        inicio, fim = self.mapa_areas[area]
+        total = fim - inicio + 1
+        parametros = self.parametros.get(area)
+        if parametros is not None:
+            no_intervalo = (parametros["numero_questao"] >= inicio) & (parametros["numero_questao"] <= fim)
+            if no_intervalo.any():
+                colunas = parametros["numero_questao"][no_intervalo] - 1
+                return self.analyzer.estimar_notas_tri_em_lote(
+                    respostas[:, colunas],
+                    gabaritos[:, colunas],
+                    parametros["a"][no_intervalo],
+                    parametros["b"][no_intervalo],
+                    parametros["c"][no_intervalo],
+                    metodo=self.metodo,
+                    total_questoes=total,
+                )
+        # Sem parâmetros TRI: proporção de acertos (estimar_nota_tri sem média)
+        return 300 + acertos / total * 500
+
+    def corrigir(self, sequencias: pd.Series, ufs: Optional[pd.Series] = None) -> pd.DataFrame:
+        """
+        Corrige um bloco de folhas.
+
+        Args:
+            sequencias: Uma sequência A/B/C/D/E/- por folha.
+            ufs: UF de comparação de cada folha (opcional), para as médias estaduais.
+
+        Returns:
+            DataFrame (uma linha por folha) com o gabarito identificado, acertos, respondidas,
+            percentual, nota estimada e médias de cada área, e os totais gerais.
+        """
+        if self.erro:
+            raise ValueError(self.erro)
+
+        respostas = codificar_sequencias(sequencias, self.qtd_questoes)
+        largura = self.gabaritos.shape[1]
+        respostas = np.pad(respostas[:, :largura], ((0, 0), (0, max(0, largura - respostas.shape[1]))))
+        melhores, match_score = self._melhores_candidatos(respostas)
+        gabaritos = self.gabaritos[melhores]
+
+        resultado = {}
+        for area in AREAS:
+            coluna = f"CO_PROVA_{area}"
+            codigos = self.df_gabs[coluna] if coluna in self.df_gabs.columns else pd.Series(index=self.df_gabs.index, dtype=float)
+            resultado[coluna] = pd.array(pd.to_numeric(codigos, errors="coerce").to_numpy()[melhores], dtype="Int64")
+        resultado["match_score"] = match_score
+
+        medias_nac = self.medias.get("nacional", {})
+        medias_estados = self.medias.get("por_estado", {})
+        notas_areas = []
+        total_acertos = np.zeros(len(respostas), dtype=np.int64)
+        total_questoes = np.zeros(len(respostas), dtype=np.int64)
+        for area in AREAS:
+            if area not in self.mapa_areas:
+                continue
+            inicio, fim = self.mapa_areas[area]
+            tem = self.tem_gabarito[area][melhores]
+            r_area, g_area = respostas[:, inicio - 1:fim], gabaritos[:, inicio - 1:fim]
+
+            acertos = np.where(tem, ((r_area == g_area) & (r_area > 0)).sum(axis=1), 0)
+            respondidas = np.where(tem, (r_area > 0).sum(axis=1), 0)
+            total = np.where(tem, fim - inicio + 1, 0)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                percentual = np.where(total > 0, acertos / np.maximum(total, 1) * 100, 0.0)
+            notas = np.where(tem, self._notas_area(area, respostas, gabaritos, acertos), 0.0)
+
+            resultado[f"acertos_{area}"] = acertos
+            resultado[f"respondidas_{area}"] = respondidas
+            resultado[f"percentual_{area}"] = _arredondar(percentual)
+            resultado[f"nota_{area}"] = _arredondar(notas)
+            resultado[f"media_nacional_{area}"] = _media(medias_nac.get(area))
+            if ufs is not None:
+                resultado[f"media_uf_{area}"] = np.array([_media(medias_estados.get(uf, {}).get(area)) for uf in ufs])
+            notas_areas.append(resultado[f"nota_{area}"])
+            total_acertos += acertos
+            total_questoes += total
+
+        resultado["total_acertos"] = total_acertos
+        resultado["total_questoes"] = total_questoes
+        with np.errstate(invalid="ignore", divide="ignore"):
+            resultado["percentual_geral"] = _arredondar(
+                np.where(total_questoes > 0, total_acertos / np.maximum(total_questoes, 1) * 100, 0.0)
+            )
+        resultado["nota_geral"] = _arredondar(np.mean(notas_areas, axis=0)) if notas_areas else 0.0
+
+        df = pd.DataFrame(resultado, index=sequencias.index)
+        if ufs is not None:
+            df.insert(0, "uf", list(ufs))
+        return df
+
+    def corrigir_blocos(
+        self,
+        blocos: Iterable[pd.DataFrame],
+        coluna_respostas: str = COLUNA_RESPOSTAS,
+        coluna_id: Optional[str] = None,
+        coluna_uf: Optional[str] = None,
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Corrige cada bloco de folhas (DataFrames com a coluna de respostas) e devolve os resultados.
+        Sem coluna_id/coluna_uf, usa as colunas 'id' e 'uf' quando existirem.
+        """
+        for bloco in blocos:
+            coluna_id = coluna_id or ("id" if "id" in bloco.columns else None)
+            coluna_uf = coluna_uf or ("uf" if "uf" in bloco.columns else None)
+            if coluna_respostas not in bloco.columns:
+                raise ValueError(f"Coluna '{coluna_respostas}' não encontrada. Colunas: {list(bloco.columns)}")
+            ufs = bloco[coluna_uf].str.strip().str.upper() if coluna_uf else None
+            df = self.corrigir(bloco[coluna_respostas], ufs)
+            if coluna_id:
+                df.insert(0, coluna_id, bloco[coluna_id].to_numpy())
+            yield df
+
+
+def ler_folhas_csv(entrada, tamanho_bloco: int = TAMANHO_BLOCO, **kwargs) -> Iterator[pd.DataFrame]:
+    """Lê o CSV de folhas em blocos, tudo como texto (sequências, identificadores e UFs)."""
+    return pd.read_csv(entrada, dtype=str, keep_default_na=False, chunksize=tamanho_bloco, **kwargs)
+
+
+def gravar_resultados(blocos: Iterable[pd.DataFrame], saida, formato: str = "csv") -> int:
+    """
+    Grava os blocos de resultado à medida que ficam prontos (CSV com cabeçalho só no primeiro
+    bloco, ou Parquet com um row group por bloco). 'saida' pode ser um caminho ou um buffer binário.
+
+    Returns:
+        Número de folhas gravadas.
+    """
+    total = 0
+    if formato == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        escritor = None
+        try:
+            for bloco in blocos:
+                tabela = pa.Table.from_pandas(bloco, preserve_index=False)
+                if escritor is None:
+                    escritor = pq.ParquetWriter(saida, tabela.schema, compression="zstd")
+                escritor.write_table(tabela.cast(escritor.schema))
+                total += len(bloco)
+        finally:
+            if escritor is not None:
+                escritor.close()
+        return total
+
+    for bloco in blocos:
+        texto = bloco.to_csv(index=False, header=(total == 0))
+        if isinstance(saida, str):
+            with open(saida, "w" if total == 0 else "a", encoding="utf-8", newline="") as arquivo:
+                arquivo.write(texto)
+        else:
+            saida.write(texto.encode("utf-8"))
+        total += len(bloco)
+    return total
+
+
+def formato_do_arquivo(caminho: str) -> str:
+    return "parquet" if str(caminho).lower().endswith(".parquet") else "csv"
@@ -2,28 +2,39 @@
 Gerenciador de conexões com o banco de dados.
 """
 import pandas as pd
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 from sqlalchemy.engine import Engine
 from typing import Optional, Dict, Any
 import streamlit as st
 
+from config.conexao import obter_engine
+
 
 class DatabaseManager:
     """Classe responsável por gerenciar conexões e operações com o banco de dados."""
 
-    def __init__(self, config):
+    def __init__(self, config, rotulo: Optional[str] = None):
         """
         Inicializa o gerenciador de banco de dados.
 
         Args:
             config: Instância de DatabaseConfig com as configurações de conexão.
+            rotulo: Nome da página, usado no application_name das conexões (ex.: 'questions-analysis').
         """
         self.config = config
-        self.engine: Engine = self._get_sqlalchemy_engine()
+        self.rotulo = rotulo
+        self.backend = getattr(config, 'backend', 'postgres')
+        if self.backend == 'duckdb':
+            from .duckdb_backend import obter_backend_duckdb
+            self.engine: Optional[Engine] = None
+            self.duckdb = obter_backend_duckdb()
+        else:
+            self.engine: Optional[Engine] = self._get_sqlalchemy_engine()
+            self.duckdb = None
 
     def _get_sqlalchemy_engine(self) -> Engine:
-        """Cria engine do SQLAlchemy a partir da connection string da config."""
-        return create_engine(self.config.get_connection_string())
+        """Engine do pool compartilhado pelo processo (config/conexao.py), com o rótulo da página."""
+        return obter_engine(self.config, self.rotulo)
 
     def test_connection(self) -> bool:
         """
@@ -33,6 +44,8 @@ class DatabaseManager:
             bool: True se a conexão foi bem-sucedida, False caso contrário.
         """
         try:
+            if self.duckdb is not None:
+                return self.duckdb.test_connection()
             with self.engine.connect() as conn:
                 conn.execute(text("SELECT 1"))
             return True
@@ -57,6 +70,8 @@ class DatabaseManager:
             DataFrame com os resultados da query.
         """
         try:
+            if self.duckdb is not None:
+                return self.duckdb.execute_query(query, params)
             with self.engine.connect() as conn:
                 if params is not None:
                     df = pd.read_sql_query(text(query), conn, params=params)
@@ -77,6 +92,9 @@ class DatabaseManager:
         usando SQLAlchemy.
         """
         try:
+            if self.duckdb is not None:
+                self.duckdb.execute_non_query(query, params)
+                return
             with self.engine.begin() as conn:  
                 if params:
                     conn.execute(text(query), params)
@@ -0,0 +1,142 @@
+"""
+Backend analítico embarcado (DuckDB) como alternativa ao PostgreSQL.
+
+Selecionado por configuração (DB_BACKEND=duckdb). Expõe as mesmas tabelas que o
+PostgreSQL, como views sobre os arquivos gerados pelo ETL:
+
+- dados_enem_consolidado: dataset Parquet particionado (<ENEM_PARQUET_DIR>/dados_enem_consolidado/);
+- demais tabelas: um arquivo <ENEM_PARQUET_DIR>/<NOME_DA_TABELA>.parquet cada (ex.: RELATORIO_MUNICIPIOS).
+
+Opcionalmente abre um arquivo nativo do DuckDB (DUCKDB_PATH); tabelas que já existem nele
+têm prioridade sobre os arquivos Parquet.
+"""
+import glob
+import os
+import re
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import duckdb
+import pandas as pd
+
+from .parquet_reader import DIRETORIO_PARQUET_PADRAO, NOME_DATASET, caminho_dataset, dataset_disponivel, particionado_por_uf
+
+DUCKDB_PATH = os.getenv("DUCKDB_PATH", ":memory:")
+
+# :nome (estilo SQLAlchemy text()) e %(nome)s (estilo pyformat/psycopg2) -> $nome (DuckDB).
+# O lookbehind evita casts do PostgreSQL (::INTEGER), que o DuckDB também aceita.
+_PARAM_DOIS_PONTOS = re.compile(r"(?<![:\w]):([A-Za-z_]\w*)")
+_PARAM_PYFORMAT = re.compile(r"%\(([A-Za-z_]\w*)\)s")
+
+
+def traduzir_parametros(query: str, params: Optional[Dict[str, Any]] = None) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """
+    Converte os parâmetros nomeados usados no projeto para a sintaxe do DuckDB.
+
+    Args:
+        query: SQL com parâmetros :nome ou %(nome)s.
+        params: Dicionário de parâmetros.
+
+    Returns:
+        Tupla (query com $nome, parâmetros realmente usados na query).
+    """
+    if not params:
+        return query, None
+    if _PARAM_PYFORMAT.search(query):
+        query = _PARAM_PYFORMAT.sub(r"$\1", query).replace("%%", "%")
+    query = _PARAM_DOIS_PONTOS.sub(lambda m: f"${m.group(1)}" if m.group(1) in params else m.group(0), query)
+    usados = set(re.findall(r"\$([A-Za-z_]\w*)", query))
+    return query, {nome: valor for nome, valor in params.items() if nome in usados}
+
+
+class DuckDBBackend:
+    """Conexão DuckDB com as views dos dados do ENEM e a mesma interface de consulta do DatabaseManager."""
+
+    def __init__(self, caminho_db: Optional[str] = None, diretorio_parquet: Optional[str] = None):
+        """
+        Args:
+            caminho_db: Arquivo nativo do DuckDB (padrão: $DUCKDB_PATH ou banco em memória).
+            diretorio_parquet: Diretório dos arquivos Parquet (padrão: $ENEM_PARQUET_DIR).
+        """
+        self.caminho_db = caminho_db or DUCKDB_PATH
+        self.diretorio_parquet = diretorio_parquet or DIRETORIO_PARQUET_PADRAO
+        self.conexao = duckdb.connect(self.caminho_db)
+        self.views = self._registrar_views()
+
+    def _tabelas_nativas(self) -> set:
+        df = self.conexao.execute("SELECT table_name FROM information_schema.tables WHERE table_type = 'BASE TABLE'").df()
+        return set(df["table_name"])
+
+    def _registrar_views(self) -> list:
+        """Cria as views sobre os arquivos Parquet que não existem como tabela nativa."""
+        existentes = self._tabelas_nativas()
+        views = []
+        if NOME_DATASET not in existentes and dataset_disponivel(self.diretorio_parquet):
+            caminho = caminho_dataset(self.diretorio_parquet)
+            tipos_particao = "{'NU_ANO': BIGINT, 'SG_UF_PROVA': VARCHAR}" if particionado_por_uf(caminho) else "{'NU_ANO': BIGINT}"
+            padrao = os.path.join(caminho, "**", "*.parquet").replace("'", "''")
+            self.conexao.execute(
+                f"CREATE OR REPLACE VIEW \"{NOME_DATASET}\" AS "
+                f"SELECT * FROM read_parquet('{padrao}', hive_partitioning = true, hive_types = {tipos_particao}, union_by_name = true)"
+            )
+            views.append(NOME_DATASET)
+        for arquivo in sorted(glob.glob(os.path.join(self.diretorio_parquet, "*.parquet"))):
+            nome = os.path.splitext(os.path.basename(arquivo))[0]
+            if nome in existentes or nome == NOME_DATASET:
+                continue
+            self.conexao.execute(f"CREATE OR REPLACE VIEW \"{nome}\" AS SELECT * FROM read_parquet('{arquivo.replace(chr(39), chr(39) * 2)}')")
+            views.append(nome)
+        return views
+
+    def test_connection(self) -> bool:
+        """Retorna True se a view dos microdados está disponível."""
+        try:
+            self.conexao.cursor().execute(f'SELECT 1 FROM "{NOME_DATASET}" LIMIT 1')
+            return True
+        except duckdb.Error:
+            return False
+
+    def execute_query(self, query: str, params: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+        """
+        Executa uma consulta e retorna um DataFrame.
+
+        Cada chamada usa um cursor próprio (conexão duplicada), o que permite
+        consultas simultâneas de várias sessões do Streamlit.
+
+        Args:
+            query: SQL com parâmetros :nome ou %(nome)s.
+            params: Dicionário de parâmetros.
+
+        Returns:
+            DataFrame com os resultados.
+        """
+        query_duckdb, params_duckdb = traduzir_parametros(query, params)
+        cursor = self.conexao.cursor()
+        try:
+            if params_duckdb:
+                return cursor.execute(query_duckdb, params_duckdb).df()
+            return cursor.execute(query_duckdb).df()
+        finally:
+            cursor.close()
+
+    def execute_non_query(self, query: str, params: Optional[Dict[str, Any]] = None) -> None:
+        """Executa comandos sem retorno (DDL/DML) no arquivo DuckDB."""
+        query_duckdb, params_duckdb = traduzir_parametros(query, params)
+        cursor = self.conexao.cursor()
+        try:
+            cursor.execute(query_duckdb, params_duckdb) if params_duckdb else cursor.execute(query_duckdb)
+        finally:
+            cursor.close()
+
+
+_backend_compartilhado: Optional[DuckDBBackend] = None
+_lock_backend = threading.Lock()
+
+
+def obter_backend_duckdb() -> DuckDBBackend:
+    """Retorna a instância do backend DuckDB compartilhada pelo processo (criada na primeira chamada)."""
+    global _backend_compartilhado
+    with _lock_backend:
+        if _backend_compartilhado is None:
+            _backend_compartilhado = DuckDBBackend()
+        return _backend_compartilhado
@@ -0,0 +1,113 @@
+"""
+Leitura do dataset Parquet dos microdados gerado pelo ETL (scripts/table_script/SCRIPT.py).
+
+Layout esperado (particionamento Hive, zstd):
+    <ENEM_PARQUET_DIR>/dados_enem_consolidado/NU_ANO=2019/[SG_UF_PROVA=SP/]<arquivo>.parquet
+"""
+import os
+from typing import Iterable, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+DIRETORIO_PARQUET_PADRAO = os.getenv(
+    "ENEM_PARQUET_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts", "table_script", "parquet"),
+)
+NOME_DATASET = "dados_enem_consolidado"
+
+
+def caminho_dataset(base_dir: Optional[str] = None) -> str:
+    """Retorna o diretório do dataset de microdados."""
+    return os.path.join(base_dir or DIRETORIO_PARQUET_PADRAO, NOME_DATASET)
+
+
+def dataset_disponivel(base_dir: Optional[str] = None) -> bool:
+    """Indica se o ETL já gerou o dataset (existe ao menos uma partição NU_ANO=...)."""
+    caminho = caminho_dataset(base_dir)
+    return os.path.isdir(caminho) and any(nome.startswith("NU_ANO=") for nome in os.listdir(caminho))
+
+
+def particionado_por_uf(caminho: str) -> bool:
+    """Verifica se o dataset foi gravado com sub-partições SG_UF_PROVA=... (opção --parquet-por-uf)."""
+    for nome_ano in os.listdir(caminho):
+        dir_ano = os.path.join(caminho, nome_ano)
+        if nome_ano.startswith("NU_ANO=") and os.path.isdir(dir_ano):
+            return any(nome.startswith("SG_UF_PROVA=") for nome in os.listdir(dir_ano))
+    return False
+
+
+def abrir_dataset(base_dir: Optional[str] = None) -> ds.Dataset:
+    """
+    Abre o dataset com as colunas de partição tipadas (NU_ANO int64, SG_UF_PROVA string).
+
+    Args:
+        base_dir: Diretório base (padrão: $ENEM_PARQUET_DIR ou scripts/table_script/parquet).
+
+    Returns:
+        pyarrow.dataset.Dataset pronto para projeção de colunas e filtros.
+    """
+    caminho = caminho_dataset(base_dir)
+    if not dataset_disponivel(base_dir):
+        raise FileNotFoundError(f"Dataset Parquet não encontrado em '{caminho}'. Execute o ETL (SCRIPT.py) sem --sem-parquet.")
+    campos_particao = [("NU_ANO", pa.int64())]
+    if particionado_por_uf(caminho):
+        campos_particao.append(("SG_UF_PROVA", pa.string()))
+    particionamento = ds.partitioning(pa.schema(campos_particao), flavor="hive")
+    return ds.dataset(caminho, format="parquet", partitioning=particionamento)
+
+
+def montar_filtro(
+    anos: Optional[Iterable[int]] = None,
+    ufs: Optional[Iterable[str]] = None,
+    filtro_extra: Optional[ds.Expression] = None,
+) -> Optional[ds.Expression]:
+    """Monta a expressão de filtro (ano/UF + filtro adicional opcional) usada no pushdown."""
+    filtro = None
+    if anos:
+        filtro = ds.field("NU_ANO").isin([int(ano) for ano in anos])
+    if ufs:
+        filtro_uf = ds.field("SG_UF_PROVA").isin([str(uf) for uf in ufs])
+        filtro = filtro_uf if filtro is None else filtro & filtro_uf
+    if filtro_extra is not None:
+        filtro = filtro_extra if filtro is None else filtro & filtro_extra
+    return filtro
+
+
+def ler_microdados(
+    colunas: Optional[List[str]] = None,
+    anos: Optional[Iterable[int]] = None,
+    ufs: Optional[Iterable[str]] = None,
+    filtro_extra: Optional[ds.Expression] = None,
+    base_dir: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    Lê os microdados do dataset Parquet com projeção de colunas e filtros empurrados para a leitura.
+
+    Filtros por ano (e por UF, quando o dataset é sub-particionado) descartam diretórios inteiros;
+    nos demais casos usam as estatísticas dos row groups.
+
+    Args:
+        colunas: Colunas a ler (None = todas).
+        anos: Anos (NU_ANO) desejados (None = todos).
+        ufs: Siglas de UF (SG_UF_PROVA) desejadas (None = todas).
+        filtro_extra: Expressão pyarrow adicional, ex.: ds.field("TP_SEXO") == "F".
+        base_dir: Diretório base do dataset.
+
+    Returns:
+        DataFrame com as linhas e colunas selecionadas.
+    """
+    dataset = abrir_dataset(base_dir)
+    tabela = dataset.to_table(columns=colunas, filter=montar_filtro(anos, ufs, filtro_extra))
+    return tabela.to_pandas()
+
+
+def contar_linhas(
+    anos: Optional[Iterable[int]] = None,
+    ufs: Optional[Iterable[str]] = None,
+    filtro_extra: Optional[ds.Expression] = None,
+    base_dir: Optional[str] = None,
+) -> int:
+    """Conta as linhas que atendem aos filtros sem materializar colunas."""
+    return abrir_dataset(base_dir).count_rows(filter=montar_filtro(anos, ufs, filtro_extra))
@@ -1,9 +1,100 @@
+import threading
+import time
+from collections import OrderedDict
 from typing import Dict, Tuple, Optional, List
 
 import numpy as np
 import pandas as pd
 import streamlit as st
 
+from .question_analyzer import QuestionAnalyzer, decodificar_respostas
+from .tri import estimar_theta_eap, estimar_theta_mle, theta_para_nota
+
+
+# Tabelas derivadas criadas pelo ETL (scripts/table_script/pos_carga.py, FASE 6D)
+TABELA_GABARITOS_PROVA = "gabaritos_prova"
+TABELA_MEDIAS_PROVA_UF = "medias_prova_uf"
+TABELA_COMBINACOES_PROVA = "combinacoes_prova"
+PERCENTIS_NOTA = [10, 25, 50, 75, 90]  # mesmos de pos_carga.PERCENTIS_NOTA
+# Distribuição das notas em faixas (FASE 6E); FAIXAS_NOTA e NOTA_MAXIMA iguais às de pos_carga
+TABELA_DISTRIBUICAO_NOTAS = "distribuicao_notas"
+FAIXAS_NOTA = 1000
+NOTA_MAXIMA = 1000.0
+
+TAMANHO_CACHE_PARAMETROS = 32
+TAMANHO_CACHE_ESTATISTICAS = 16  # anos
+INTERVALO_VERIFICACAO_VERSAO = 60  # segundos entre as conferências da versão de questoes_enem
+
+
+class CacheVersionado:
+    """
+    Cache LRU (limitado a 'tamanho_maximo' chaves) compartilhado por todas as sessões do processo.
+    É esvaziado quando a versão da tabela de origem muda (conferida no máximo a cada
+    'intervalo_verificacao' segundos). Usado para os parâmetros TRI por (ano, cor, língua)
+    e para as estatísticas das provas por ano.
+    """
+
+    def __init__(self, tamanho_maximo: int = TAMANHO_CACHE_PARAMETROS,
+                 intervalo_verificacao: float = INTERVALO_VERIFICACAO_VERSAO):
+        self.tamanho_maximo = tamanho_maximo
+        self.intervalo_verificacao = intervalo_verificacao
+        self._itens: "OrderedDict[Tuple, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._versao = None
+        self._verificado_em = 0.0
+
+    def obter(self, chave: Tuple) -> Optional[Dict]:
+        with self._lock:
+            if chave not in self._itens:
+                return None
+            self._itens.move_to_end(chave)
+            return self._itens[chave]
+
+    def guardar(self, chave: Tuple, valor: Dict) -> None:
+        with self._lock:
+            self._itens[chave] = valor
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.tamanho_maximo:
+                self._itens.popitem(last=False)
+
+    def invalidar(self) -> None:
+        with self._lock:
+            self._itens.clear()
+            self._verificado_em = 0.0
+
+    def verificar_versao(self, obter_versao) -> None:
+        """Confere a versão da tabela (se o intervalo passou) e esvazia o cache se ela mudou."""
+        agora = time.monotonic()
+        with self._lock:
+            if agora - self._verificado_em < self.intervalo_verificacao:
+                return
+            self._verificado_em = agora
+        versao = obter_versao()
+        with self._lock:
+            if versao != self._versao:
+                self._itens.clear()
+                self._versao = versao
+
+
+_cache_parametros = CacheVersionado()
+_cache_estatisticas_provas = CacheVersionado(tamanho_maximo=TAMANHO_CACHE_ESTATISTICAS)
+_cache_distribuicao_notas = CacheVersionado(tamanho_maximo=TAMANHO_CACHE_ESTATISTICAS)
+
+
+def invalidar_cache_parametros() -> None:
+    """Esvazia o cache de parâmetros TRI (ex.: logo após recarregar questoes_enem)."""
+    _cache_parametros.invalidar()
+
+
+def invalidar_cache_estatisticas_provas() -> None:
+    """Esvazia o cache das estatísticas por prova (ex.: logo após rodar a FASE 6D do ETL)."""
+    _cache_estatisticas_provas.invalidar()
+
+
+def invalidar_cache_distribuicao_notas() -> None:
+    """Esvazia o cache das distribuições de notas (ex.: logo após rodar a FASE 6E do ETL)."""
+    _cache_distribuicao_notas.invalidar()
+
 
 class PerformanceAnalyzer:
     def __init__(self, db_manager):
@@ -202,45 +293,279 @@ class PerformanceAnalyzer:
             st.error(f"Erro ao buscar provas na tabela questoes_enem: {e}")
             return pd.DataFrame()
 
-    def buscar_gabaritos_por_provas(self, codigos_list: List[str]) -> pd.DataFrame:
+    @st.cache_data(ttl=600, show_spinner=False)
+    def tabela_disponivel(_self, nome_tabela: str) -> bool:
+        """Indica se o ETL já criou a tabela derivada (revalidado a cada 10 minutos)."""
+        df = _self.db_manager.execute_query(
+            "SELECT table_name FROM information_schema.tables WHERE table_name = :nome",
+            {"nome": nome_tabela},
+        )
+        return not df.empty
+
+    @staticmethod
+    def extrair_codigos_provas(df_provas: pd.DataFrame) -> List[str]:
+        """Códigos de prova (coluna 'provas' de questoes_enem, separados por vírgula), sem repetição."""
+        todos_codigos = set()
+        for provas_str in df_provas["provas"].dropna():
+            if provas_str:
+                codigos = [
+                    codigo.strip()
+                    for codigo in str(provas_str).split(",")
+                    if codigo.strip().isdigit()
+                ]
+                todos_codigos.update(codigos)
+        return list(todos_codigos)
+
+    @staticmethod
+    def codigos_das_combinacoes(df_gabs: pd.DataFrame, codigos_list: List[str]) -> List[str]:
+        """
+        Códigos das quatro áreas presentes nas combinações candidatas, além dos informados
+        (questoes_enem costuma listar só as provas de LC para a língua escolhida).
+        """
+        codigos = {str(c) for c in codigos_list}
+        for area in ["CH", "CN", "LC", "MT"]:
+            coluna = f"CO_PROVA_{area}"
+            if coluna in df_gabs.columns:
+                codigos.update(str(int(c)) for c in pd.to_numeric(df_gabs[coluna], errors="coerce").dropna())
+        return sorted(codigos)
+
+    @staticmethod
+    def _marcadores_codigos(codigos: List[int]) -> Tuple[str, Dict[str, int]]:
+        marcadores = [f":codigo_{i}" for i in range(len(codigos))]
+        return ", ".join(marcadores), {f"codigo_{i}": int(c) for i, c in enumerate(codigos)}
+
+    def buscar_gabaritos_por_provas(self, codigos_list: List[str], ano: Optional[int] = None) -> pd.DataFrame:
+        """
+        Combinações candidatas de gabarito (CO_PROVA_<área>, TX_GABARITO_<área>) para os códigos de prova.
+
+        Com as tabelas do ETL (pos_carga.py), as combinações de provas feitas pelos participantes vêm
+        de combinacoes_prova e cada gabarito é lido de gabaritos_prova pela chave primária, sem varrer
+        os microdados. Sem elas, retorna um DataFrame vazio (não há índice por CO_PROVA_* nos microdados).
+        """
         if not codigos_list:
             return pd.DataFrame()
 
-        codigos_limpos = [c for c in codigos_list if str(c).isdigit()]
+        codigos_limpos = [int(c) for c in codigos_list if str(c).isdigit()]
         if not codigos_limpos:
             return pd.DataFrame()
 
-        condicoes_codigos = []
-        for codigo in codigos_limpos:
-            condicoes_codigos.append(
-                f'"CO_PROVA_CH" = {codigo} OR '
-                f'"CO_PROVA_CN" = {codigo} OR '
-                f'"CO_PROVA_LC" = {codigo} OR '
-                f'"CO_PROVA_MT" = {codigo}'
+        if not (self.tabela_disponivel(TABELA_COMBINACOES_PROVA) and self.tabela_disponivel(TABELA_GABARITOS_PROVA)):
+            st.warning(
+                f"As tabelas '{TABELA_COMBINACOES_PROVA}' e '{TABELA_GABARITOS_PROVA}' ainda não foram criadas. "
+                "Execute a etapa pós-carga do ETL: python scripts/table_script/pos_carga.py"
             )
+            return pd.DataFrame()
 
-        where_clause = " OR ".join(condicoes_codigos)
-
+        marcadores, params = self._marcadores_codigos(codigos_limpos)
+        areas = ["CH", "CN", "LC", "MT"]
+        gabaritos = ",\n                    ".join(f'g_{a.lower()}."TX_GABARITO" AS "TX_GABARITO_{a}"' for a in areas)
+        juncoes = "\n                ".join(
+            f'LEFT JOIN {TABELA_GABARITOS_PROVA} AS g_{a.lower()} '
+            f'ON g_{a.lower()}."CO_PROVA" = c."CO_PROVA_{a}" AND g_{a.lower()}."NU_ANO" = c."NU_ANO"'
+            for a in areas
+        )
+        algum_codigo = " OR ".join(f'c."CO_PROVA_{a}" IN ({marcadores})' for a in areas)
         query = f"""
-            SELECT DISTINCT
-                "CO_PROVA_CH",
-                "CO_PROVA_CN",
-                "CO_PROVA_LC",
-                "CO_PROVA_MT",
-                "TX_GABARITO_CH",
-                "TX_GABARITO_CN",
-                "TX_GABARITO_LC",
-                "TX_GABARITO_MT"
-            FROM dados_enem_consolidado
-            WHERE {where_clause}
+            SELECT
+                c."CO_PROVA_CH", c."CO_PROVA_CN", c."CO_PROVA_LC", c."CO_PROVA_MT",
+                {gabaritos}
+            FROM {TABELA_COMBINACOES_PROVA} AS c
+            {juncoes}
+            WHERE ({algum_codigo})
         """
+        if ano is not None:
+            query += ' AND c."NU_ANO" = :ano'
+            params["ano"] = int(ano)
+        # Combinações mais frequentes primeiro (desempate de identificar_melhor_prova)
+        query += " ORDER BY c.n_participantes DESC"
+        return self.db_manager.execute_query(query, params)
+
+    def _versao_estatisticas_provas(self) -> Optional[Tuple]:
+        """Impressão digital de gabaritos_prova: muda quando o ETL reconstrói as estatísticas."""
+        df = self.db_manager.execute_query(
+            f"SELECT COUNT(*) AS n, SUM(n_participantes) AS participantes, SUM(soma_nota) AS soma FROM {TABELA_GABARITOS_PROVA}"
+        )
+        if df.empty:
+            return None
+        return tuple(None if pd.isna(v) else round(float(v), 6) for v in df.iloc[0])
 
-        try:
-            df = self.db_manager.execute_query(query)
-            return df
-        except Exception as e:
-            st.error(f"❌ Erro ao buscar gabaritos em dados_enem_consolidado: {e}")
-            return pd.DataFrame()
+    def obter_estatisticas_provas(self, ano: int) -> Optional[Tuple[pd.DataFrame, pd.DataFrame]]:
+        """
+        Estatísticas materializadas pelo ETL (gabaritos_prova e medias_prova_uf) de todas as provas
+        do ano, guardadas no cache do processo: as comparações não consultam os microdados.
+
+        Returns:
+            (df_nacional, df_uf), uma linha por prova e por (prova, UF), ou None se as tabelas
+            não existirem ou não tiverem o ano.
+        """
+        if not (self.tabela_disponivel(TABELA_GABARITOS_PROVA) and self.tabela_disponivel(TABELA_MEDIAS_PROVA_UF)):
+            return None
+
+        _cache_estatisticas_provas.verificar_versao(self._versao_estatisticas_provas)
+        chave = (int(ano),)
+        estatisticas = _cache_estatisticas_provas.obter(chave)
+        if estatisticas is not None:
+            return estatisticas
+
+        colunas = "n_notas, soma_nota, soma_quad_nota, media_nota, desvio_nota, " + ", ".join(
+            f"p{p}_nota" for p in PERCENTIS_NOTA
+        )
+        df_nac = self.db_manager.execute_query(
+            f'SELECT "CO_PROVA", sigla_area, {colunas} FROM {TABELA_GABARITOS_PROVA} WHERE "NU_ANO" = :ano',
+            {"ano": int(ano)},
+        )
+        df_uf = self.db_manager.execute_query(
+            f'SELECT "CO_PROVA", sigla_area, "SG_UF_PROVA" AS uf, {colunas} FROM {TABELA_MEDIAS_PROVA_UF} WHERE "NU_ANO" = :ano',
+            {"ano": int(ano)},
+        )
+        # Resultado vazio pode ser erro de consulta: não guarda
+        if df_nac.empty or df_uf.empty:
+            return None
+        estatisticas = (df_nac, df_uf)
+        _cache_estatisticas_provas.guardar(chave, estatisticas)
+        return estatisticas
+
+    @staticmethod
+    def _estatisticas_por_area(df: pd.DataFrame) -> Dict[str, Dict[str, Optional[float]]]:
+        """
+        {área: {"n", "media", "desvio_padrao"}} das provas em df, combinadas de forma exata
+        pelas somas (n_notas, soma_nota, soma_quad_nota).
+        """
+        estatisticas = {}
+        for area in ["CH", "CN", "LC", "MT"]:
+            df_area = df[df["sigla_area"] == area]
+            n_notas = pd.to_numeric(df_area["n_notas"], errors="coerce").sum()
+            soma = pd.to_numeric(df_area["soma_nota"], errors="coerce").sum()
+            soma_quad = pd.to_numeric(df_area["soma_quad_nota"], errors="coerce").sum()
+            if n_notas > 0:
+                media = soma / n_notas
+                desvio = float(np.sqrt(max(soma_quad / n_notas - media * media, 0.0)))
+                estatisticas[area] = {"n": int(n_notas), "media": float(media), "desvio_padrao": desvio}
+            else:
+                estatisticas[area] = {"n": 0, "media": None, "desvio_padrao": None}
+        return estatisticas
+
+    def _carregar_medias_dimensao(self, codigos_validos: List[int], ano: int) -> Optional[Dict[str, Dict]]:
+        """
+        Médias nacional e por UF a partir das estatísticas por prova em cache (obter_estatisticas_provas):
+        a média de cada área é a dos participantes que fizeram uma das provas da área.
+        Também devolve, em "estatisticas", participantes e desvio padrão nas mesmas bases.
+        Retorna None se as tabelas não existirem (ou não tiverem as provas).
+        """
+        estatisticas_ano = self.obter_estatisticas_provas(ano)
+        if estatisticas_ano is None:
+            return None
+        df_nac, df_uf = estatisticas_ano
+        df_nac = df_nac[df_nac["CO_PROVA"].isin(codigos_validos)]
+        if df_nac.empty:
+            return None
+        df_uf = df_uf[df_uf["CO_PROVA"].isin(codigos_validos)]
+
+        nacional = self._estatisticas_por_area(df_nac)
+        por_estado = {uf: self._estatisticas_por_area(grupo) for uf, grupo in df_uf.dropna(subset=["uf"]).groupby("uf")}
+        return {
+            "nacional": {area: e["media"] for area, e in nacional.items()},
+            "por_estado": {uf: {area: e["media"] for area, e in areas.items()} for uf, areas in por_estado.items()},
+            "estatisticas": {"nacional": nacional, "por_estado": por_estado},
+        }
+
+    def estatisticas_prova(self, ano: int, codigo_prova, uf: Optional[str] = None) -> Optional[Dict]:
+        """
+        Estatísticas da nota de uma prova (nacional ou da UF), do cache: n, média, desvio padrão
+        e os percentis de PERCENTIS_NOTA (p10, p25, ...). None se não houver.
+        """
+        if codigo_prova is None or pd.isna(codigo_prova):
+            return None
+        estatisticas_ano = self.obter_estatisticas_provas(ano)
+        if estatisticas_ano is None:
+            return None
+        df_nac, df_uf = estatisticas_ano
+        if uf:
+            df = df_uf[(df_uf["CO_PROVA"] == int(codigo_prova)) & (df_uf["uf"] == uf)]
+        else:
+            df = df_nac[df_nac["CO_PROVA"] == int(codigo_prova)]
+        if df.empty:
+            return None
+        linha = df.iloc[0]
+
+        def valor(v):
+            return None if pd.isna(v) else float(v)
+
+        return {
+            "n": int(linha["n_notas"]),
+            "media": valor(linha["media_nota"]),
+            "desvio_padrao": valor(linha["desvio_nota"]),
+            **{f"p{p}": valor(linha[f"p{p}_nota"]) for p in PERCENTIS_NOTA},
+        }
+
+    def _versao_distribuicao_notas(self) -> Optional[Tuple]:
+        """Impressão digital de distribuicao_notas: muda quando o ETL reconstrói a tabela."""
+        df = self.db_manager.execute_query(
+            f"SELECT COUNT(*) AS n, SUM(n) AS notas FROM {TABELA_DISTRIBUICAO_NOTAS}"
+        )
+        if df.empty:
+            return None
+        return tuple(None if pd.isna(v) else int(v) for v in df.iloc[0])
+
+    def obter_distribuicao_notas(self, ano: int) -> Optional[Dict[Tuple[str, Optional[str]], Tuple[np.ndarray, np.ndarray]]]:
+        """
+        CDFs em faixas das notas do ano (tabela distribuicao_notas), guardadas no cache do processo.
+
+        Returns:
+            {(área, UF ou None para o Brasil): (faixas, acumulado)}, com as faixas não vazias em
+            ordem crescente e o número de notas até cada uma; None se a tabela não existir ou não
+            tiver o ano.
+        """
+        if not self.tabela_disponivel(TABELA_DISTRIBUICAO_NOTAS):
+            return None
+
+        _cache_distribuicao_notas.verificar_versao(self._versao_distribuicao_notas)
+        chave = (int(ano),)
+        distribuicoes = _cache_distribuicao_notas.obter(chave)
+        if distribuicoes is not None:
+            return distribuicoes
+
+        df = self.db_manager.execute_query(
+            f'SELECT sigla_area, "SG_UF_PROVA" AS uf, faixa, n_acumulado FROM {TABELA_DISTRIBUICAO_NOTAS} '
+            'WHERE "NU_ANO" = :ano ORDER BY sigla_area, "SG_UF_PROVA", faixa',
+            {"ano": int(ano)},
+        )
+        if df.empty:
+            return None
+        distribuicoes = {
+            (area, None if pd.isna(uf) else uf): (
+                grupo["faixa"].to_numpy(dtype=np.int64),
+                grupo["n_acumulado"].to_numpy(dtype=np.int64),
+            )
+            for (area, uf), grupo in df.groupby(["sigla_area", "uf"], dropna=False, sort=False)
+        }
+        _cache_distribuicao_notas.guardar(chave, distribuicoes)
+        return distribuicoes
+
+    def percentil(self, nota: float, ano: int, area: str, uf: Optional[str] = None) -> Optional[float]:
+        """
+        Percentual (0 a 100) dos participantes do ano com nota da área abaixo de 'nota', no Brasil
+        ou na UF. Busca binária na CDF em faixas, com interpolação linear dentro da faixa.
+        None se não houver distribuição para (ano, área, UF).
+        """
+        if nota is None or pd.isna(nota):
+            return None
+        distribuicoes = self.obter_distribuicao_notas(ano)
+        if not distribuicoes or (area, uf or None) not in distribuicoes:
+            return None
+        faixas, acumulado = distribuicoes[(area, uf or None)]
+        total = acumulado[-1]
+        if total <= 0:
+            return None
+
+        posicao = min(max(float(nota), 0.0), NOTA_MAXIMA) * FAIXAS_NOTA / NOTA_MAXIMA
+        faixa = min(int(posicao), FAIXAS_NOTA - 1)
+        fracao = posicao - faixa
+        i = int(np.searchsorted(faixas, faixa))
+        abaixo = float(acumulado[i - 1]) if i > 0 else 0.0
+        if i < len(faixas) and faixas[i] == faixa:
+            abaixo += fracao * (acumulado[i] - abaixo)
+        return 100.0 * abaixo / total
 
     def carregar_medias_db(
         self,
@@ -254,6 +579,10 @@ class PerformanceAnalyzer:
         if not codigos_validos:
             return {}
 
+        medias = self._carregar_medias_dimensao(codigos_validos, ano)
+        if medias is not None:
+            return medias
+
         codigos_str = ", ".join(str(c) for c in codigos_validos)
         where_exam = (
             f'"CO_PROVA_CH" IN ({codigos_str}) OR '
@@ -369,6 +698,49 @@ class PerformanceAnalyzer:
 
         return nota_base
 
+    @staticmethod
+    def codificar_respostas_usuario(respostas_dict: Dict[int, str], n_questoes: int) -> np.ndarray:
+        """Respostas {numero_questao: letra} -> vetor uint8 (n_questoes,): 1..5 = A..E, 0 = branco/inválido."""
+        codigos = {letra: i for i, letra in enumerate("ABCDE", start=1)}
+        vetor = np.zeros(n_questoes, dtype=np.uint8)
+        for q_num, resposta in respostas_dict.items():
+            if 1 <= q_num <= n_questoes:
+                vetor[q_num - 1] = codigos.get(resposta, 0)
+        return vetor
+
+    @staticmethod
+    def codificar_gabaritos(df_gabs: pd.DataFrame, mapa_areas: Dict[str, Tuple[int, int]]) -> np.ndarray:
+        """
+        Gabaritos candidatos (TX_GABARITO_<área> de cada linha) -> matriz uint8 (candidatos x questões),
+        com a coluna q - 1 para a questão q do mapa de áreas. 0 = sem gabarito (string ausente ou curta).
+        """
+        n_questoes = max((fim for _, fim in mapa_areas.values()), default=0)
+        matriz = np.zeros((len(df_gabs), n_questoes), dtype=np.uint8)
+        for area, (inicio, fim) in mapa_areas.items():
+            coluna = f"TX_GABARITO_{area}"
+            if coluna not in df_gabs.columns:
+                continue
+            textos = df_gabs[coluna].where(df_gabs[coluna].map(lambda g: isinstance(g, str)), "")
+            codigos = decodificar_respostas(textos.reset_index(drop=True))[:, : fim - inicio + 1]
+            matriz[:, inicio - 1 : inicio - 1 + codigos.shape[1]] = codigos
+        return matriz
+
+    @staticmethod
+    def pontuar_gabaritos(respostas: np.ndarray, gabaritos: np.ndarray) -> np.ndarray:
+        """
+        Acertos de cada folha de respostas contra cada gabarito candidato, numa única redução.
+
+        Args:
+            respostas: (questões,) ou (folhas x questões), codificadas como em codificar_respostas_usuario.
+            gabaritos: (candidatos x questões), de codificar_gabaritos.
+
+        Returns:
+            (candidatos,) para uma folha ou (folhas x candidatos).
+        """
+        respostas = np.asarray(respostas)
+        acertos = (respostas[..., np.newaxis, :] == gabaritos) & (respostas[..., np.newaxis, :] > 0)
+        return acertos.sum(axis=-1)
+
     def identificar_melhor_prova(
         self,
         df_gabs: pd.DataFrame,
@@ -378,43 +750,13 @@ class PerformanceAnalyzer:
         if df_gabs.empty:
             return None, 0
 
-        melhor_row = None
-        melhor_score = -1
-
-        for _, row in df_gabs.iterrows():
-            score = 0
-
-            for area, (inicio, fim) in mapa_areas.items():
-                if area == "CH":
-                    gab_str = row.get("TX_GABARITO_CH")
-                elif area == "CN":
-                    gab_str = row.get("TX_GABARITO_CN")
-                elif area == "LC":
-                    gab_str = row.get("TX_GABARITO_LC")
-                elif area == "MT":
-                    gab_str = row.get("TX_GABARITO_MT")
-                else:
-                    gab_str = None
-
-                if not isinstance(gab_str, str) or not gab_str:
-                    continue
-
-                gab_str = gab_str.strip()
-                for q_num in range(inicio, fim + 1):
-                    idx_local = q_num - inicio
-                    if idx_local < 0 or idx_local >= len(gab_str):
-                        continue
+        gabaritos = self.codificar_gabaritos(df_gabs, mapa_areas)
+        respostas = self.codificar_respostas_usuario(respostas_dict, gabaritos.shape[1])
+        scores = self.pontuar_gabaritos(respostas, gabaritos)
 
-                    resposta_aluno = respostas_dict.get(q_num, "-")
-                    if resposta_aluno in ["A", "B", "C", "D", "E"]:
-                        if resposta_aluno.upper() == gab_str[idx_local].upper():
-                            score += 1
-
-            if score > melhor_score:
-                melhor_score = score
-                melhor_row = row
-
-        return melhor_row, melhor_score
+        # Empate: fica o primeiro candidato, como na busca linear
+        melhor = int(np.argmax(scores))
+        return df_gabs.iloc[melhor], int(scores[melhor])
 
     def construir_gabarito_oficial(
         self, melhor_row: pd.Series, mapa_areas: Dict[str, Tuple[int, int]]
@@ -526,6 +868,72 @@ class PerformanceAnalyzer:
 
         return analise
 
+    def _versao_questoes(self) -> Optional[Tuple]:
+        """
+        Impressão digital de questoes_enem (linhas e somas dos parâmetros): muda quando a
+        tabela é recarregada com outro conteúdo, invalidando o cache de parâmetros.
+        """
+        df = self.db_manager.execute_query(
+            """
+                SELECT COUNT(*) AS n, MIN(ano) AS ano_min, MAX(ano) AS ano_max,
+                       SUM(parametro_a) AS soma_a, SUM(parametro_b) AS soma_b, SUM(parametro_c) AS soma_c
+                FROM questoes_enem
+            """
+        )
+        if df.empty:
+            return None
+        return tuple(None if pd.isna(v) else round(float(v), 6) for v in df.iloc[0])
+
+    def obter_parametros_itens(self, ano: int, cor: str, lingua: str) -> Dict[str, Dict[str, np.ndarray]]:
+        """
+        Parâmetros TRI (a, b, c) das quatro áreas de uma prova (ano, cor, língua já normalizadas),
+        carregados numa única consulta e guardados no cache LRU do processo.
+
+        Returns:
+            {sigla_area: {"numero_questao", "a", "b", "c"}} com arrays NumPy contíguos,
+            ordenados por numero_questao.
+        """
+        _cache_parametros.verificar_versao(self._versao_questoes)
+        chave = (int(ano), cor, lingua)
+        parametros = _cache_parametros.obter(chave)
+        if parametros is not None:
+            return parametros
+
+        df = self.db_manager.execute_query(
+            """
+                SELECT
+                    sigla_area,
+                    numero_questao,
+                    AVG(parametro_a) AS a,
+                    AVG(parametro_b) AS b,
+                    AVG(parametro_c) AS c
+                FROM questoes_enem
+                WHERE ano = :ano
+                  AND cor = :cor
+                  AND lingua = :lingua
+                  AND parametro_a IS NOT NULL
+                  AND parametro_b IS NOT NULL
+                  AND parametro_c IS NOT NULL
+                GROUP BY sigla_area, numero_questao
+                ORDER BY sigla_area, numero_questao
+            """,
+            {"ano": int(ano), "cor": cor, "lingua": lingua},
+        )
+        parametros = {
+            str(area): {
+                "numero_questao": np.ascontiguousarray(grupo["numero_questao"].to_numpy(dtype=np.int64)),
+                "a": np.ascontiguousarray(grupo["a"].to_numpy(dtype=np.float64)),
+                "b": np.ascontiguousarray(grupo["b"].to_numpy(dtype=np.float64)),
+                "c": np.ascontiguousarray(grupo["c"].to_numpy(dtype=np.float64)),
+            }
+            for area, grupo in df.groupby("sigla_area")
+        } if not df.empty else {}
+
+        # Resultado vazio pode ser erro de consulta (execute_query devolve DataFrame vazio): não guarda
+        if parametros:
+            _cache_parametros.guardar(chave, parametros)
+        return parametros
+
     def estimar_nota_tri_parametrizada(
         self,
         respostas_area: List[str],
@@ -536,41 +944,17 @@ class PerformanceAnalyzer:
         lingua: str,
         sigla_area: str,
     ) -> float:
-        from math import isfinite
-
         inicio, fim = intervalo
         cor_norm = self.normalizar_cor_prova(cor_prova)
         lingua_norm = self.normalizar_lingua(lingua)
 
-        query = """
-            SELECT 
-                numero_questao,
-                AVG(parametro_a) AS a,
-                AVG(parametro_b) AS b,
-                AVG(parametro_c) AS c
-            FROM questoes_enem
-            WHERE ano = :ano
-              AND cor = :cor
-              AND lingua = :lingua
-              AND sigla_area = :sigla_area
-              AND numero_questao BETWEEN :inicio AND :fim
-              AND parametro_a IS NOT NULL
-              AND parametro_b IS NOT NULL
-              AND parametro_c IS NOT NULL
-            GROUP BY numero_questao
-            ORDER BY numero_questao
-        """
-        params = {
-            "ano": int(ano),
-            "cor": cor_norm,
-            "lingua": lingua_norm,
-            "sigla_area": sigla_area,
-            "inicio": int(inicio),
-            "fim": int(fim),
-        }
-
         try:
-            df_par = self.db_manager.execute_query(query, params)
+            parametros = self.obter_parametros_itens(ano, cor_norm, lingua_norm).get(sigla_area)
+            if parametros is None:
+                df_par = pd.DataFrame()
+            else:
+                no_intervalo = (parametros["numero_questao"] >= inicio) & (parametros["numero_questao"] <= fim)
+                df_par = pd.DataFrame({chave: valores[no_intervalo] for chave, valores in parametros.items()})
         except Exception as e:
             st.error(f"Erro ao buscar parâmetros TRI para {sigla_area}: {e}")
             acertos = sum(
@@ -588,73 +972,140 @@ class PerformanceAnalyzer:
             )
             return self.estimar_nota_tri(acertos, len(gabarito_area), None)
 
-        itens = []
-        for _, row in df_par.iterrows():
-            qnum = int(row["numero_questao"])
+        posicoes, respostas, gabaritos = [], [], []
+        for qnum in df_par["numero_questao"].astype(int):
             idx = qnum - inicio
+            if 0 <= idx < len(gabarito_area):
+                posicoes.append(True)
+                respostas.append(respostas_area[idx])
+                gabaritos.append(gabarito_area[idx])
+            else:
+                posicoes.append(False)
+        df_par = df_par[posicoes]
+
+        codigos = {letra: i for i, letra in enumerate("ABCDE", start=1)}
+        matriz_respostas = np.array([[codigos.get(r, 0) for r in respostas]], dtype=np.uint8)
+        vetor_gabarito = np.array([codigos.get(g, 0) for g in gabaritos], dtype=np.uint8)
+
+        nota = self.estimar_notas_tri_em_lote(
+            matriz_respostas,
+            vetor_gabarito,
+            pd.to_numeric(df_par["a"], errors="coerce").to_numpy(),
+            pd.to_numeric(df_par["b"], errors="coerce").to_numpy(),
+            pd.to_numeric(df_par["c"], errors="coerce").to_numpy(),
+            total_questoes=len(gabarito_area),
+        )[0]
+        return float(nota)
+
+    def estimar_notas_tri_em_lote(
+        self,
+        respostas: np.ndarray,
+        gabarito: np.ndarray,
+        a: np.ndarray,
+        b: np.ndarray,
+        c: np.ndarray,
+        metodo: str = "mle",
+        total_questoes: Optional[int] = None,
+    ) -> np.ndarray:
+        """
+        Nota TRI (3PL) de vários respondentes de uma vez.
+
+        Args:
+            respostas: Matriz (respondentes x itens) com as alternativas codificadas
+                0 = branco/inválido, 1..5 = A..E (ver question_analyzer.decodificar_respostas).
+            gabarito: Gabarito codificado da mesma forma, vetor (itens,) ou matriz do mesmo formato.
+            a, b, c: Parâmetros dos itens (NaN = item sem parâmetros).
+            metodo: "mle" (máxima verossimilhança, o mesmo da estimação individual) ou "eap".
+            total_questoes: Questões da área para a nota de fallback (padrão: número de itens).
+
+        Returns:
+            Vetor de notas (escala 0..1000). Respondentes com menos de 3 itens válidos
+            recebem a nota de estimar_nota_tri (proporção de acertos).
+        """
+        respostas = np.atleast_2d(np.asarray(respostas))
+        gabarito = np.broadcast_to(np.asarray(gabarito), respostas.shape)
+        parametros_ok = np.isfinite(a) & np.isfinite(b) & np.isfinite(c)
 
-            if idx < 0 or idx >= len(gabarito_area):
-                continue
-
-            resp = respostas_area[idx]
-            gab = gabarito_area[idx]
-
-            if resp not in ["A", "B", "C", "D", "E"] or gab not in ["A", "B", "C", "D", "E"]:
-                continue
-
-            u = 1 if resp == gab else 0
-
-            try:
-                a = float(row["a"])
-                b = float(row["b"])
-                c = float(row["c"])
-            except Exception:
-                continue
-
-            if not (isfinite(a) and isfinite(b) and isfinite(c)):
-                continue
-
-            itens.append({"a": a, "b": b, "c": c, "u": u})
-
-        if len(itens) < 3:
-            acertos = sum(i["u"] for i in itens)
-            return self.estimar_nota_tri(acertos, len(gabarito_area), None)
-
-        theta = 0.0
-        for _ in range(10):
-            num = 0.0
-            den = 0.0
+        validos = (respostas > 0) & (gabarito > 0) & parametros_ok
+        U = np.where(validos, respostas == gabarito, np.nan)
 
-            for item in itens:
-                a = item["a"]
-                b = item["b"]
-                c = item["c"]
-                u = item["u"]
+        if metodo == "eap":
+            theta, _ = estimar_theta_eap(U, a, b, c)
+        else:
+            theta = estimar_theta_mle(U, a, b, c)
+        notas = theta_para_nota(theta)
 
-                exp_term = np.exp(-a * (theta - b))
-                P = c + (1.0 - c) / (1.0 + exp_term)
-                P = float(np.clip(P, 1e-6, 1.0 - 1e-6))
+        # Poucos itens para estimar theta: mesma regra da versão escalar
+        n_itens = validos.sum(axis=1)
+        acertos = np.where(validos, U, 0.0).sum(axis=1)
+        total = total_questoes if total_questoes is not None else respostas.shape[1]
+        fallback = 300 + (acertos / total) * 500 if total > 0 else np.zeros_like(acertos)
+        return np.where(n_itens < 3, fallback, notas)
 
-                dP = (1.0 - c) * a * exp_term / (1.0 + exp_term) ** 2
+    def estimar_notas_prova(
+        self,
+        ano: int,
+        sigla_area: str,
+        codigo_prova: int,
+        metodo: str = "mle",
+        limite: Optional[int] = None,
+    ) -> pd.DataFrame:
+        """
+        Estima a nota TRI de todos os participantes de uma prova (CO_PROVA_<área>), para
+        calibrar a estimação contra a nota oficial NU_NOTA_<área>.
 
-                w = dP / (P * (1.0 - P))
-                num += (u - P) * w
+        Os itens são ligados às posições de TX_RESPOSTAS_<área> pela ordem de numero_questao
+        das questões da prova em questoes_enem (coluna 'provas'). O gabarito é o TX_GABARITO_<área>
+        de cada participante.
 
-                den += (dP ** 2) / (P * (1.0 - P))
+        Returns:
+            DataFrame com NU_NOTA_<área> e nota_estimada (vazio se faltarem dados).
+        """
+        col_nota = f"NU_NOTA_{sigla_area}"
+        df_itens = self.db_manager.execute_query(
+            """
+                SELECT numero_questao, provas, parametro_a AS a, parametro_b AS b, parametro_c AS c
+                FROM questoes_enem
+                WHERE ano = :ano AND sigla_area = :sigla_area
+                ORDER BY numero_questao
+            """,
+            {"ano": int(ano), "sigla_area": sigla_area},
+        )
+        if df_itens.empty:
+            return pd.DataFrame()
+        df_itens = df_itens[df_itens["provas"].map(QuestionAnalyzer._extrair_codigo_prova) == int(codigo_prova)]
+        if df_itens.empty:
+            return pd.DataFrame()
 
-            if den <= 1e-8:
-                break
+        query = f"""
+            SELECT "TX_RESPOSTAS_{sigla_area}" AS respostas, "TX_GABARITO_{sigla_area}" AS gabarito, "{col_nota}"
+            FROM dados_enem_consolidado
+            WHERE "NU_ANO" = :ano AND "CO_PROVA_{sigla_area}" = :codigo_prova
+              AND "TX_RESPOSTAS_{sigla_area}" IS NOT NULL
+        """
+        params = {"ano": int(ano), "codigo_prova": int(codigo_prova)}
+        if limite:
+            query += " LIMIT :limite"
+            params["limite"] = int(limite)
+        df = self.db_manager.execute_query(query, params)
+        if df.empty:
+            return pd.DataFrame()
 
-            delta = num / den
-            theta += float(delta)
-            theta = float(np.clip(theta, -4.0, 4.0))
+        n_itens = len(df_itens)
 
-            if abs(delta) < 1e-3:
-                break
+        def _matriz(serie):
+            matriz = decodificar_respostas(serie.fillna(""))[:, :n_itens]
+            return np.pad(matriz, ((0, 0), (0, n_itens - matriz.shape[1])))
 
-        nota = 500.0 + 100.0 * theta
-        nota = float(np.clip(nota, 0.0, 1000.0))
-        return nota
+        df["nota_estimada"] = self.estimar_notas_tri_em_lote(
+            _matriz(df["respostas"]),
+            _matriz(df["gabarito"]),
+            pd.to_numeric(df_itens["a"], errors="coerce").to_numpy(),
+            pd.to_numeric(df_itens["b"], errors="coerce").to_numpy(),
+            pd.to_numeric(df_itens["c"], errors="coerce").to_numpy(),
+            metodo=metodo,
+        )
+        return df[[col_nota, "nota_estimada"]]
 
     def calcular_desempenho_areas(
         self,
@@ -753,22 +1204,11 @@ class PerformanceAnalyzer:
                 "erro": f"Nenhuma prova encontrada para {ano}, cor {cor_prova}, língua {lingua_normalizada} na tabela questoes_enem."
             }
 
-        todos_codigos = set()
-        for provas_str in df_provas["provas"].dropna():
-            if provas_str:
-                codigos = [
-                    codigo.strip()
-                    for codigo in str(provas_str).split(",")
-                    if codigo.strip().isdigit()
-                ]
-                todos_codigos.update(codigos)
-
-        if not todos_codigos:
+        codigos_list = self.extrair_codigos_provas(df_provas)
+        if not codigos_list:
             return {"erro": "Nenhum código de prova válido encontrado."}
 
-        codigos_list = list(todos_codigos)
-
-        df_gabs = self.buscar_gabaritos_por_provas(codigos_list)
+        df_gabs = self.buscar_gabaritos_por_provas(codigos_list, ano)
         if df_gabs.empty:
             return {
                 "erro": f"Nenhum gabarito encontrado para os códigos de prova: {codigos_list}"
@@ -792,7 +1232,7 @@ class PerformanceAnalyzer:
             respostas_por_area, gabarito_oficial, mapa_areas
         )
 
-        medias = self.carregar_medias_db(codigos_list, ano)
+        medias = self.carregar_medias_db(self.codigos_das_combinacoes(df_gabs, codigos_list), ano)
 
         resultados_areas = self.calcular_desempenho_areas(
             respostas_por_area,
@@ -805,6 +1245,19 @@ class PerformanceAnalyzer:
             estado=estado,
         )
 
+        # Distribuição das notas da prova identificada (nacional e da UF), do cache materializado
+        for area, resultado in resultados_areas.items():
+            codigo_area = melhor_row.get(f"CO_PROVA_{area}")
+            resultado["estatisticas_nacional"] = self.estatisticas_prova(ano, codigo_area)
+            resultado["estatisticas_regional"] = (
+                self.estatisticas_prova(ano, codigo_area, estado) if estado else None
+            )
+            nota_area = resultado["nota_estimada"] if resultado["total_questoes"] else None
+            resultado["percentil_nacional"] = self.percentil(nota_area, ano, area)
+            resultado["percentil_regional"] = (
+                self.percentil(nota_area, ano, area, estado) if estado else None
+            )
+
         total_acertos = sum(r["acertos"] for r in resultados_areas.values())
         total_questoes_geral = sum(
             r["total_questoes"] for r in resultados_areas.values()
@@ -1,11 +1,47 @@
 """
 Analisador de questões do ENEM com cálculo de taxas de acerto reais.
 """
+import re
+
+import numpy as np
 import pandas as pd
 import streamlit as st
 from typing import Tuple, Optional
 
 
+# Tabela pré-calculada pelo ETL (scripts/table_script/pos_carga.py, FASE 6C)
+TABELA_ESTATISTICAS_ITENS = "estatisticas_itens"
+
+# Maior número de posições em TX_RESPOSTAS_* (LC tem 50: 45 questões + 5 da língua estrangeira)
+POSICOES_MAXIMAS = 50
+
+# Tabela de tradução byte -> alternativa (0 = branco/inválido, 1..5 = A..E), mesma regra
+# de QuestionAnalyzer._normalizar_alternativa aplicada a um único caractere.
+TABELA_ALTERNATIVAS = np.zeros(256, dtype=np.uint8)
+for _i, _letra in enumerate("ABCDE", start=1):
+    TABELA_ALTERNATIVAS[ord(_letra)] = _i
+    TABELA_ALTERNATIVAS[ord(_letra.lower())] = _i
+    TABELA_ALTERNATIVAS[ord(str(_i))] = _i
+
+
+def decodificar_respostas(respostas: pd.Series) -> np.ndarray:
+    """
+    Converte as strings TX_RESPOSTAS_* em uma matriz uint8 (participantes x posições)
+    com as alternativas já normalizadas (0 = branco/inválido/ausente, 1..5 = A..E).
+
+    Cada caractere vira um byte (latin-1); strings menores são completadas com 0.
+    """
+    textos = respostas.dropna().astype(str).str.strip()
+    if textos.empty:
+        return np.zeros((0, 0), dtype=np.uint8)
+    brutos = textos.str.encode('latin-1', errors='replace')
+    largura = int(brutos.str.len().max())
+    if largura == 0:
+        return np.zeros((len(brutos), 0), dtype=np.uint8)
+    matriz = np.frombuffer(np.array(brutos.tolist(), dtype=f'S{largura}').tobytes(), dtype=np.uint8)
+    return TABELA_ALTERNATIVAS[matriz.reshape(len(brutos), largura)]
+
+
 class QuestionAnalyzer:
     """Classe responsável por análises de questões do ENEM com dados reais de participantes."""
 
@@ -53,6 +89,32 @@ class QuestionAnalyzer:
 
         return None
 
+    @staticmethod
+    def _extrair_codigo_prova(valor) -> Optional[int]:
+        """Código CO_PROVA_* da coluna 'provas' de questoes_enem (ex.: '196' ou '196, 197' -> 196)."""
+        if pd.isna(valor):
+            return None
+        texto = str(valor).strip()
+        try:
+            return int(float(texto))
+        except ValueError:
+            nums = re.findall(r"\d+", texto)
+            return int(nums[0]) if nums else None
+
+    @staticmethod
+    def _adicionar_posicao_area(df_q: pd.DataFrame) -> pd.DataFrame:
+        """Posição sequencial da questão na string de respostas: 1..N por ano, área e (se existir) cor."""
+        group_cols = []
+        if 'ano' in df_q.columns:
+            group_cols.append('ano')
+        group_cols.append('sigla_area')
+        if 'cor' in df_q.columns:
+            group_cols.append('cor')
+
+        df_q = df_q.sort_values(group_cols + ['numero_questao'])
+        df_q['posicao_area'] = df_q.groupby(group_cols).cumcount() + 1
+        return df_q
+
     @st.cache_data
     def load_questions(_self) -> pd.DataFrame:
         """
@@ -183,83 +245,201 @@ class QuestionAnalyzer:
             df_q['participantes_amostra'] = 0
             return df_q
 
-        group_cols = []
-        if 'ano' in df_q.columns:
-            group_cols.append('ano')
-        group_cols.append('sigla_area')
-        if 'cor' in df_q.columns:
-            group_cols.append('cor')
-
-        df_q = df_q.sort_values(group_cols + ['numero_questao'])
-        df_q['posicao_area'] = df_q.groupby(group_cols).cumcount() + 1
+        df_q = self._adicionar_posicao_area(df_q)
 
+        # Uma matriz de alternativas (participantes x posições) por área, decodificada uma única vez
         respostas_por_area = {}
         for area_sigla, col in area_to_respostas_col.items():
             if col in df_participants.columns:
-                serie = df_participants[col].dropna()
-                respostas_por_area[area_sigla] = serie.astype(str).str.strip().tolist()
-            else:
-                respostas_por_area[area_sigla] = []
-
-        success_rates = []
-        sample_sizes = []
-
-        for _, questao in df_q.iterrows():
-            area_sigla = questao.get('sigla_area')
-
-            if area_sigla not in respostas_por_area:
-                success_rates.append(0.0)
-                sample_sizes.append(0)
+                respostas_por_area[area_sigla] = decodificar_respostas(df_participants[col])
+
+        gabaritos = np.array(
+            [self._normalizar_alternativa(g) or '' for g in df_q['gabarito']], dtype=object
+        ) if 'gabarito' in df_q.columns else np.full(len(df_q), '', dtype=object)
+        codigos_gabarito = np.array(["ABCDE".find(g) + 1 if g else 0 for g in gabaritos], dtype=np.uint8)
+        posicoes = pd.to_numeric(df_q['posicao_area'], errors='coerce').fillna(0).to_numpy(dtype=np.int64)
+        areas = df_q['sigla_area'].to_numpy()
+
+        success_rates = np.zeros(len(df_q), dtype=float)
+        sample_sizes = np.zeros(len(df_q), dtype=np.int64)
+
+        for area_sigla, matriz in respostas_por_area.items():
+            largura = matriz.shape[1]
+            # Questões da área com posição dentro das strings e gabarito válido
+            linhas = np.flatnonzero((areas == area_sigla) & (posicoes >= 1) & (posicoes <= largura) & (codigos_gabarito > 0))
+            if linhas.size == 0 or matriz.shape[0] == 0:
                 continue
+            colunas = posicoes[linhas] - 1
+            validos = (matriz != 0).sum(axis=0)[colunas]
+            # Uma comparação com broadcast: (participantes x questões) == gabarito de cada questão
+            acertos = (matriz[:, colunas] == codigos_gabarito[linhas][np.newaxis, :]).sum(axis=0)
+            sample_sizes[linhas] = validos
+            success_rates[linhas] = np.where(validos > 0, acertos / np.maximum(validos, 1) * 100, 0.0)
 
-            posicao_area = questao.get('posicao_area')
-            try:
-                posicao = int(posicao_area)
-            except Exception:
-                success_rates.append(0.0)
-                sample_sizes.append(0)
-                continue
-
-            if posicao < 1:
-                success_rates.append(0.0)
-                sample_sizes.append(0)
-                continue
-
-            gabarito_oficial = self._normalizar_alternativa(questao.get('gabarito'))
+        df_q['taxa_acerto_real'] = success_rates
+        df_q['taxa_acerto_pct'] = df_q['taxa_acerto_real']
+        df_q['participantes_amostra'] = sample_sizes
 
-            if gabarito_oficial is None:
-                success_rates.append(0.0)
-                sample_sizes.append(0)
-                continue
+        return df_q
 
-            respostas_lista = respostas_por_area.get(area_sigla, [])
-            if not respostas_lista:
-                success_rates.append(0.0)
-                sample_sizes.append(0)
-                continue
+    @st.cache_data(ttl=600, show_spinner=False)
+    def estatisticas_itens_disponivel(_self) -> bool:
+        """Indica se o ETL já criou a tabela estatisticas_itens (revalidado a cada 10 minutos)."""
+        df = _self.db_manager.execute_query(
+            "SELECT table_name FROM information_schema.tables WHERE table_name = :nome",
+            {"nome": TABELA_ESTATISTICAS_ITENS},
+        )
+        return not df.empty
+
+    @st.cache_data(show_spinner=False)
+    def contar_respostas_por_posicao(
+        _self,
+        ano: int,
+        sigla_area: str,
+        codigos_prova: Tuple[int, ...]
+    ) -> pd.DataFrame:
+        """
+        Conta, no próprio banco, as respostas por posição da string TX_RESPOSTAS_<área>
+        para cada prova (CO_PROVA_<área>): só ~45 linhas por prova trafegam.
 
-            acertos = 0
-            total_validos = 0
+        Lê a tabela pré-calculada estatisticas_itens (ETL, pos_carga.py) quando ela existe;
+        senão, conta sobre os microdados com generate_series + SUBSTR.
+        Mesma normalização de _normalizar_alternativa para um caractere:
+        'A'..'E' (maiúsculas ou minúsculas) e '1'..'5'; o resto conta como branco/inválido.
 
-            for respostas in respostas_lista:
-                if posicao <= len(respostas):
-                    resposta_bruta = respostas[posicao - 1]
-                    resposta_aluno = self._normalizar_alternativa(resposta_bruta)
+        Returns:
+            DataFrame com codigo_prova, posicao, n_respostas, n_a..n_e e n_validos
+            (e, vindo de estatisticas_itens, n_brancos, n_acertos e ponto_bisserial).
+        """
+        col_respostas = _self.area_to_respostas.get(sigla_area)
+        if col_respostas is None or not codigos_prova:
+            return pd.DataFrame()
+        col_prova = f"CO_PROVA_{sigla_area}"
+
+        params = {"ano": int(ano)}
+        marcadores = []
+        for i, codigo in enumerate(codigos_prova):
+            params[f"codigo_{i}"] = int(codigo)
+            marcadores.append(f":codigo_{i}")
+        colunas_alt = [f"n_{letra}" for letra in "abcde"]
+
+        if _self.estatisticas_itens_disponivel():
+            df = _self.db_manager.execute_query(
+                f"""
+                SELECT co_prova AS codigo_prova, posicao, n_respostas, {", ".join(colunas_alt)},
+                       n_brancos, n_acertos, ponto_bisserial
+                FROM {TABELA_ESTATISTICAS_ITENS}
+                WHERE ano = :ano AND sigla_area = :sigla_area AND co_prova IN ({", ".join(marcadores)})
+                ORDER BY co_prova, posicao
+                """,
+                {**params, "sigla_area": sigla_area},
+            )
+            if not df.empty:
+                df[["codigo_prova", "posicao", "n_respostas", "n_brancos", "n_acertos"] + colunas_alt] = (
+                    df[["codigo_prova", "posicao", "n_respostas", "n_brancos", "n_acertos"] + colunas_alt].astype("int64")
+                )
+                df["ponto_bisserial"] = df["ponto_bisserial"].astype("float64")
+                df["n_validos"] = df[colunas_alt].sum(axis=1)
+                return df
+
+        contagens = ",\n                ".join(
+            f"SUM(CASE WHEN alt IN ('{letra}', '{numero}') THEN 1 ELSE 0 END) AS n_{letra.lower()}"
+            for numero, letra in enumerate("ABCDE", start=1)
+        )
+        query = f"""
+            SELECT
+                codigo_prova,
+                posicao,
+                COUNT(*) AS n_respostas,
+                {contagens}
+            FROM (
+                SELECT
+                    t."{col_prova}" AS codigo_prova,
+                    s.posicao,
+                    SUBSTR(UPPER(TRIM(t."{col_respostas}")), s.posicao, 1) AS alt
+                FROM dados_enem_consolidado AS t
+                CROSS JOIN generate_series(1, {POSICOES_MAXIMAS}) AS s(posicao)
+                WHERE t."NU_ANO" = :ano
+                  AND t."{col_prova}" IN ({", ".join(marcadores)})
+                  AND t."{col_respostas}" IS NOT NULL
+            ) AS r
+            GROUP BY codigo_prova, posicao
+            ORDER BY codigo_prova, posicao
+        """
+        df = _self.db_manager.execute_query(query, params)
+        if df.empty:
+            return df
+        df[["codigo_prova", "posicao", "n_respostas"] + colunas_alt] = (
+            df[["codigo_prova", "posicao", "n_respostas"] + colunas_alt].astype("int64")
+        )
+        df["n_validos"] = df[colunas_alt].sum(axis=1)
+        return df
 
-                    if resposta_aluno is not None:
-                        if resposta_aluno == gabarito_oficial:
-                            acertos += 1
-                        total_validos += 1
+    def calculate_success_rates_in_db(
+        self,
+        df_questions: pd.DataFrame
+    ) -> Tuple[Optional[pd.DataFrame], int]:
+        """
+        Modo SQL de calculate_real_success_rates: taxas de acerto sobre toda a população
+        de cada prova, com as contagens por posição feitas no banco.
 
-            taxa_acerto = (acertos / total_validos * 100) if total_validos > 0 else 0.0
-            success_rates.append(taxa_acerto)
-            sample_sizes.append(total_validos)
+        As questões são ligadas às contagens por (área, código da prova em 'provas', posicao_area).
 
-        df_q['taxa_acerto_real'] = success_rates
+        Returns:
+            (DataFrame com taxa_acerto_real, taxa_acerto_pct e participantes_amostra,
+             total de participantes). (None, 0) quando não foi possível usar o modo SQL
+            (sem ano/código de prova nas questões ou sem respostas no banco).
+        """
+        if df_questions.empty or not {'ano', 'sigla_area', 'provas', 'gabarito'} <= set(df_questions.columns):
+            return None, 0
+
+        df_q = self._adicionar_posicao_area(df_questions.copy())
+        df_q['codigo_prova'] = df_q['provas'].map(self._extrair_codigo_prova)
+
+        contagens = []
+        chaves = df_q.dropna(subset=['ano', 'codigo_prova']).groupby(['ano', 'sigla_area'])['codigo_prova']
+        for (ano, sigla_area), codigos in chaves:
+            df_contagem = self.contar_respostas_por_posicao(
+                int(ano), str(sigla_area), tuple(sorted({int(c) for c in codigos}))
+            )
+            if not df_contagem.empty:
+                contagens.append(df_contagem.assign(ano=int(ano), sigla_area=sigla_area))
+        if not contagens:
+            return None, 0
+        df_contagens = pd.concat(contagens, ignore_index=True)
+
+        # Participantes: respostas não nulas na 1ª posição de cada prova
+        total_participantes = int(df_contagens.loc[df_contagens['posicao'] == 1, 'n_respostas'].sum())
+
+        df_q['codigo_prova'] = df_q['codigo_prova'].astype('Int64')
+        df_q = df_q.merge(
+            df_contagens.rename(columns={'posicao': 'posicao_area'}).astype({'codigo_prova': 'Int64'}),
+            on=['ano', 'sigla_area', 'codigo_prova', 'posicao_area'], how='left'
+        ).set_index(df_q.index)
+
+        gabaritos = df_q['gabarito'].map(self._normalizar_alternativa)
+        acertos = np.zeros(len(df_q))
+        for letra in "ABCDE":
+            acertos = np.where(gabaritos == letra, df_q[f"n_{letra.lower()}"].fillna(0), acertos)
+        validos = df_q['n_validos'].fillna(0).to_numpy()
+        validos = np.where(gabaritos.notna(), validos, 0)
+
+        df_q['taxa_acerto_real'] = np.where(validos > 0, acertos / np.maximum(validos, 1) * 100, 0.0)
         df_q['taxa_acerto_pct'] = df_q['taxa_acerto_real']
-        df_q['participantes_amostra'] = sample_sizes
+        df_q['participantes_amostra'] = validos.astype('int64')
+
+        # Distribuição das escolhas (% entre as respostas válidas) e brancos (% de quem respondeu a prova)
+        for letra in "abcde":
+            df_q[f'pct_{letra}'] = np.where(validos > 0, df_q[f'n_{letra}'].fillna(0) / np.maximum(validos, 1) * 100, np.nan)
+        if 'n_brancos' in df_q.columns:
+            n_respostas = df_q['n_respostas'].fillna(0)
+            df_q['taxa_branco'] = np.where(n_respostas > 0, df_q['n_brancos'].fillna(0) / n_respostas.clip(lower=1) * 100, np.nan)
+        else:
+            df_q = df_q.drop(columns=['ponto_bisserial'], errors='ignore')
 
-        return df_q
+        df_q = df_q.drop(columns=['n_respostas', 'n_a', 'n_b', 'n_c', 'n_d', 'n_e', 'n_validos', 'codigo_prova',
+                                  'n_brancos', 'n_acertos'], errors='ignore')
+        return df_q, total_participantes
 
     def filter_by_year(self, df: pd.DataFrame, year: int) -> pd.DataFrame:
         """Filtra questões por ano."""
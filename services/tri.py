@@ -0,0 +1,105 @@
+"""
+Estimação de proficiência pela TRI (modelo logístico de 3 parâmetros) em lote, com NumPy.
+
+Todas as funções recebem a matriz de respostas de vários respondentes de uma vez:
+    U: (respondentes x itens), 1 = acerto, 0 = erro, NaN = item não considerado
+       (em branco, sem gabarito ou sem parâmetros);
+    a, b, c: parâmetros dos itens (vetores de tamanho 'itens').
+e devolvem um theta por respondente (escala padronizada; nota = 500 + 100 * theta).
+"""
+from typing import Tuple
+
+import numpy as np
+
+LIMITE_THETA = 4.0
+P_MINIMO = 1e-6
+
+
+def probabilidade_3pl(theta: np.ndarray, a: np.ndarray, b: np.ndarray, c: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    P(acerto) e dP/dtheta do modelo 3PL para cada par (theta, item), por broadcasting.
+
+    Returns:
+        (P, dP): P já limitado a [P_MINIMO, 1 - P_MINIMO]; dP calculado sem o limite.
+    """
+    with np.errstate(over="ignore", invalid="ignore"):
+        exp_term = np.exp(-a * (theta - b))
+        P = np.clip(c + (1.0 - c) / (1.0 + exp_term), P_MINIMO, 1.0 - P_MINIMO)
+        dP = (1.0 - c) * a * exp_term / (1.0 + exp_term) ** 2
+    return P, dP
+
+
+def _preparar(U, a, b, c):
+    U = np.atleast_2d(np.asarray(U, dtype=float))
+    a, b, c = (np.asarray(p, dtype=float).reshape(1, -1) for p in (a, b, c))
+    # Itens sem parâmetros finitos não entram na estimação de ninguém
+    parametros_ok = np.isfinite(a) & np.isfinite(b) & np.isfinite(c)
+    validos = np.isfinite(U) & parametros_ok
+    # Parâmetros neutros nos itens descartados, para não propagar NaN nos produtos de matrizes
+    a, b, c = (np.where(parametros_ok, p, 0.0) for p in (a, b, c))
+    return np.where(validos, U, 0.0), validos, a, b, c
+
+
+def estimar_theta_mle(U, a, b, c, max_iter: int = 10, tolerancia: float = 1e-3) -> np.ndarray:
+    """
+    Máxima verossimilhança por Fisher scoring (Newton–Raphson com a informação esperada),
+    todos os respondentes a cada iteração. Mesmo algoritmo da versão escalar:
+    theta inicial 0, passo limitado a [-LIMITE_THETA, LIMITE_THETA] e parada por respondente
+    quando |delta| < tolerancia ou quando a informação se anula.
+    """
+    U, validos, a, b, c = _preparar(U, a, b, c)
+    theta = np.zeros(U.shape[0])
+    ativos = np.ones(U.shape[0], dtype=bool)
+
+    for _ in range(max_iter):
+        if not ativos.any():
+            break
+        linhas = np.flatnonzero(ativos)
+        P, dP = probabilidade_3pl(theta[linhas, np.newaxis], a, b, c)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            w = dP / (P * (1.0 - P))
+            num = np.where(validos[linhas], (U[linhas] - P) * w, 0.0).sum(axis=1)
+            den = np.where(validos[linhas], dP * w, 0.0).sum(axis=1)
+
+        # Informação nula (ou inválida): para sem atualizar, como o 'break' da versão escalar
+        sem_informacao = ~(den > 1e-8)
+        ativos[linhas[sem_informacao]] = False
+        linhas, num, den = linhas[~sem_informacao], num[~sem_informacao], den[~sem_informacao]
+
+        delta = num / den
+        theta[linhas] = np.clip(theta[linhas] + delta, -LIMITE_THETA, LIMITE_THETA)
+        ativos[linhas[np.abs(delta) < tolerancia]] = False
+
+    return theta
+
+
+def estimar_theta_eap(
+    U, a, b, c, n_pontos: int = 61, media_priori: float = 0.0, dp_priori: float = 1.0
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Esperança a posteriori (EAP) com priori normal, por quadratura em n_pontos de
+    [-LIMITE_THETA, LIMITE_THETA]. A log-verossimilhança de todos os respondentes em todos
+    os pontos sai de dois produtos de matrizes.
+
+    Returns:
+        (theta, erro_padrao): média e desvio padrão a posteriori de cada respondente.
+    """
+    U, validos, a, b, c = _preparar(U, a, b, c)
+    pontos = np.linspace(-LIMITE_THETA, LIMITE_THETA, n_pontos)
+    P, _ = probabilidade_3pl(pontos[:, np.newaxis], a, b, c)  # (pontos x itens)
+
+    acertos = np.where(validos, U, 0.0)
+    erros = np.where(validos, 1.0 - U, 0.0)
+    log_veross = acertos @ np.log(P).T + erros @ np.log(1.0 - P).T  # (respondentes x pontos)
+    log_post = log_veross - 0.5 * ((pontos - media_priori) / dp_priori) ** 2
+    pesos = np.exp(log_post - log_post.max(axis=1, keepdims=True))
+    pesos /= pesos.sum(axis=1, keepdims=True)
+
+    theta = pesos @ pontos
+    erro_padrao = np.sqrt(np.maximum(pesos @ pontos ** 2 - theta ** 2, 0.0))
+    return theta, erro_padrao
+
+
+def theta_para_nota(theta) -> np.ndarray:
+    """Escala do ENEM usada no app: 500 + 100 * theta, limitada a [0, 1000]."""
+    return np.clip(500.0 + 100.0 * np.asarray(theta, dtype=float), 0.0, 1000.0)
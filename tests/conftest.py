@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+Fixtures compartilhadas pelos testes.
+
+As amostras *_5k.csv de scripts/table_script/ passam pela FASE 2 do SCRIPT.py (leitura tipada,
+regras de negócio, plano de colunas) e viram o mesmo dataset Parquet que o ETL grava, sem banco.
+"""
+import os
+import sys
+import uuid
+
+import pandas as pd
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DIRETORIO_ETL = os.path.join(RAIZ, 'scripts', 'table_script')
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, DIRETORIO_ETL)
+
+# Anos das amostras usadas pelos testes (dois anos bastam para as partições e os filtros por ano)
+ANOS_AMOSTRA = (2022, 2023)
+
+
+def _arquivo_da_amostra(ano):
+    import SCRIPT
+    for nome in os.listdir(DIRETORIO_ETL):
+        if nome.lower().endswith('_5k.csv') and SCRIPT.extrair_ano_do_arquivo(nome) == ano:
+            return os.path.join(DIRETORIO_ETL, nome)
+    raise FileNotFoundError(f"Amostra de {ano} não encontrada em {DIRETORIO_ETL}")
+
+
+@pytest.fixture(scope='session')
+def amostras_enem(tmp_path_factory):
+    """
+    Dataset Parquet das amostras, no layout do ETL (<dir>/dados_enem_consolidado/NU_ANO=.../ e
+    <dir>/RELATORIO_MUNICIPIOS.parquet). Retorna (diretório, DataFrame com as mesmas linhas).
+    """
+    import SCRIPT
+
+    diretorio = str(tmp_path_factory.mktemp('parquet'))
+    arquivos = [_arquivo_da_amostra(ano) for ano in ANOS_AMOSTRA]
+    master_columns_list, tipos_de_dados_sql, all_file_headers = SCRIPT.analisar_cabecalhos(arquivos)
+    plano = SCRIPT.compilar_plano_de_colunas(master_columns_list, tipos_de_dados_sql)
+    opcoes_parquet = {'diretorio': diretorio, 'por_uf': False}
+
+    chunks = []
+    for arquivo in arquivos:
+        filename = os.path.basename(arquivo); ano = SCRIPT.extrair_ano_do_arquivo(filename)
+        usecols_original = SCRIPT.mapear_colunas_de_leitura(arquivo, all_file_headers[filename], master_columns_list)
+        escritores = {}
+        for chunk in SCRIPT.ler_csv_em_chunks(arquivo, usecols_original, plano):
+            chunk = SCRIPT.processar_chunk(chunk, ano, plano)
+            SCRIPT.escrever_chunk_parquet(escritores, chunk, filename, plano, opcoes_parquet)
+            chunks.append(chunk)
+        SCRIPT.fechar_escritores_parquet(escritores)
+        SCRIPT.promover_parquet_do_ano(diretorio, ano)
+
+    dados = pd.concat(chunks, ignore_index=True)
+    # Sem o .xls do IBGE (xlrd): os nomes vêm dos próprios microdados
+    municipios = pd.concat([
+        dados[['CO_MUNICIPIO_PROVA', 'NO_MUNICIPIO_PROVA']].set_axis(['CO_MUNICIPIO', 'NOME_MUNICIPIO'], axis=1),
+        dados[['CO_MUNICIPIO_ESC', 'NO_MUNICIPIO_ESC']].set_axis(['CO_MUNICIPIO', 'NOME_MUNICIPIO'], axis=1),
+    ]).dropna().drop_duplicates('CO_MUNICIPIO')
+    municipios.astype({'CO_MUNICIPIO': 'int64', 'NOME_MUNICIPIO': 'string'}).to_parquet(
+        os.path.join(diretorio, 'RELATORIO_MUNICIPIOS.parquet'), index=False)
+    return diretorio, dados
+
+
+@pytest.fixture(scope='session')
+def duckdb_amostras(amostras_enem):
+    """DuckDBBackend sobre o dataset das amostras."""
+    from services.duckdb_backend import DuckDBBackend
+    diretorio, _ = amostras_enem
+    backend = DuckDBBackend(caminho_db=':memory:', diretorio_parquet=diretorio)
+    yield backend
+    backend.conexao.close()
+
+
+class BancoDuckDB:
+    """Mesma interface de DatabaseManager.execute_query (erro de consulta -> DataFrame vazio), sobre o DuckDB das amostras."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.consultas = []
+
+    def execute_query(self, query, params=None):
+        self.consultas.append(query)
+        try:
+            return self.backend.execute_query(query, params)
+        except Exception:
+            return pd.DataFrame()
+
+
+def _limpar_caches_do_analisador():
+    from services import performance_analyzer
+    performance_analyzer.PerformanceAnalyzer.tabela_disponivel.clear()  # cache_data por nome de tabela
+    performance_analyzer.invalidar_cache_parametros()
+    performance_analyzer.invalidar_cache_estatisticas_provas()
+    performance_analyzer._cache_distribuicao_notas.invalidar()
+
+
+@pytest.fixture
+def banco_duckdb(duckdb_amostras):
+    """DuckDB das amostras só com os microdados (sem as tabelas da FASE 6)."""
+    _limpar_caches_do_analisador()
+    yield BancoDuckDB(duckdb_amostras)
+    _limpar_caches_do_analisador()
+
+
+@pytest.fixture
+def banco_amostras(duckdb_amostras):
+    """DuckDB das amostras com as tabelas de provas da FASE 6D, montadas pelo SQL e pelas regras de pos_carga."""
+    import pos_carga
+    conexao = duckdb_amostras.conexao
+    origem = 'dados_enem_consolidado'
+    df_prova, df_uf = pos_carga._separar_agregados_prova(duckdb_amostras.execute_query(pos_carga._sql_agregados_prova(origem)), {})
+    tabelas = {pos_carga.TABELA_GABARITOS_PROVA: df_prova, pos_carga.TABELA_MEDIAS_PROVA_UF: df_uf}
+    for nome, df in tabelas.items():
+        conexao.register('df_temporario', df)
+        conexao.execute(f'CREATE OR REPLACE TABLE "{nome}" AS SELECT * FROM df_temporario')
+        conexao.unregister('df_temporario')
+    conexao.execute(f'CREATE OR REPLACE TABLE "{pos_carga.TABELA_COMBINACOES_PROVA}" AS {pos_carga._sql_combinacoes_prova(origem)}')
+    _limpar_caches_do_analisador()
+    yield BancoDuckDB(duckdb_amostras)
+    _limpar_caches_do_analisador()
+    for nome in [*tabelas, pos_carga.TABELA_COMBINACOES_PROVA]:
+        conexao.execute(f'DROP TABLE IF EXISTS "{nome}"')
+
+
+@pytest.fixture
+def postgres_schema():
+    """
+    Engine de um PostgreSQL (variáveis DB_*) com search_path num schema descartável, removido no fim
+    do teste. Sem PostgreSQL, o teste é pulado.
+    """
+    from sqlalchemy import create_engine, text
+    from config.db_config import DatabaseConfig
+    url = DatabaseConfig().get_connection_string()
+    schema = f'teste_{uuid.uuid4().hex[:12]}'
+    try:
+        admin = create_engine(url)
+        with admin.begin() as connection:
+            connection.execute(text(f'CREATE SCHEMA "{schema}"'))
+    except Exception as e:
+        pytest.skip(f"PostgreSQL indisponível: {e}")
+    engine = create_engine(url, connect_args={'options': f'-c search_path={schema}'})
+    try:
+        yield engine
+    finally:
+        engine.dispose()
+        with admin.begin() as connection:
+            connection.execute(text(f'DROP SCHEMA "{schema}" CASCADE'))
+        admin.dispose()
+
+
+@pytest.fixture
+def postgres_amostras(postgres_schema, amostras_enem):
+    """
+    postgres_schema com as amostras em 'dados_enem_consolidado', particionada por ano como no ETL,
+    e o RELATORIO_MUNICIPIOS. Retorna (engine, DataFrame das amostras).
+    """
+    from sqlalchemy import text
+    diretorio, dados = amostras_enem
+    engine = postgres_schema
+    with engine.begin() as connection:
+        dados.head(0).to_sql('modelo', connection, index=False)
+        connection.execute(text('CREATE TABLE "dados_enem_consolidado" (LIKE "modelo") PARTITION BY LIST ("NU_ANO")'))
+        connection.execute(text('DROP TABLE "modelo"'))
+        for ano in ANOS_AMOSTRA:
+            connection.execute(text(f'CREATE TABLE "dados_enem_consolidado_{ano}" PARTITION OF "dados_enem_consolidado" FOR VALUES IN ({ano})'))
+        dados.to_sql('dados_enem_consolidado', connection, index=False, if_exists='append', chunksize=1000)
+        pd.read_parquet(os.path.join(diretorio, 'RELATORIO_MUNICIPIOS.parquet')).to_sql('RELATORIO_MUNICIPIOS', connection, index=False)
+    return engine, dados
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""Fila da carga paralela do SCRIPT.py (processar_arquivo_worker -> escritor_copy), sem banco."""
+import os
+import queue
+import threading
+
+import pandas as pd
+import pytest
+
+import SCRIPT
+
+ANO = 2023
+
+
+@pytest.fixture(scope='module')
+def tarefa():
+    """(arquivo, ano, usecols_original, plano) da amostra *_5k.csv de ANO."""
+    arquivo = next(os.path.join(SCRIPT.script_dir, nome) for nome in sorted(os.listdir(SCRIPT.script_dir))
+                   if nome.lower().endswith('_5k.csv') and SCRIPT.extrair_ano_do_arquivo(nome) == ANO)
+    master_columns_list, tipos_de_dados_sql, all_file_headers = SCRIPT.analisar_cabecalhos([arquivo])
+    plano = SCRIPT.compilar_plano_de_colunas(master_columns_list, tipos_de_dados_sql)
+    usecols_original = SCRIPT.mapear_colunas_de_leitura(arquivo, all_file_headers[os.path.basename(arquivo)], master_columns_list)
+    return arquivo, ANO, usecols_original, plano
+
+
+def _itens_do_worker(monkeypatch, tarefa, enviar_chunk):
+    fila = queue.Queue()
+    monkeypatch.setattr(SCRIPT, '_fila_chunks', fila)
+    arquivo, ano, usecols_original, plano = tarefa
+    _, linhas, _, falhas = SCRIPT.processar_arquivo_worker(arquivo, ano, usecols_original, plano, enviar_chunk)
+    itens = [fila.get_nowait() for _ in range(fila.qsize())]
+    assert falhas == 0 and linhas == sum(item[3] for item in itens)
+    return itens
+
+
+def test_worker_envia_uma_representacao_por_chunk(monkeypatch, tarefa):
+    # Sem Parquet, só o CSV do COPY; com Parquet, só o DataFrame
+    assert all(len(item) == 5 and isinstance(item[4], str) for item in _itens_do_worker(monkeypatch, tarefa, False))
+    assert all(len(item) == 5 and isinstance(item[4], pd.DataFrame) for item in _itens_do_worker(monkeypatch, tarefa, True))
+
+
+def test_escritor_serializa_o_dataframe_e_grava_o_parquet(monkeypatch, tarefa, tmp_path):
+    _, ano, _, plano = tarefa
+    itens = _itens_do_worker(monkeypatch, tarefa, True)
+    copiados = []
+    monkeypatch.setattr(SCRIPT, 'copiar_csv_para_tabela', lambda conexao, csv_texto, destino, colunas: copiados.append((destino, csv_texto)))
+    fila = queue.Queue()
+    for item in itens + [None]: fila.put(item)
+    linhas_por_ano, anos_com_falha = {}, set()
+    opcoes_parquet = {'diretorio': str(tmp_path), 'por_uf': False}
+    conexao = type('ConexaoBruta', (), {'driver_connection': None})()
+
+    SCRIPT.escritor_copy(conexao, fila, SCRIPT.nome_particao_carga, plano, linhas_por_ano, anos_com_falha, threading.Lock(), opcoes_parquet)
+    assert not anos_com_falha and linhas_por_ano == {ano: sum(item[3] for item in itens)}
+    # O COPY recebe o mesmo CSV que o worker serializaria, e o Parquet de carga tem as mesmas linhas
+    assert copiados == [(SCRIPT.nome_particao_carga(ano), SCRIPT.serializar_chunk_csv(item[4], plano)) for item in itens]
+    SCRIPT.promover_parquet_do_ano(str(tmp_path), ano)
+    gravado = pd.read_parquet(os.path.join(SCRIPT.diretorio_dataset_parquet(str(tmp_path)), f'NU_ANO={ano}'))
+    assert sorted(gravado['NU_INSCRICAO']) == sorted(pd.concat([item[4] for item in itens])['NU_INSCRICAO'])
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""Extração das colunas dos predicados e EXPLAIN do consultor de índices (services/consultor_indices.py)."""
+import json
+
+import pandas as pd
+import pytest
+
+from services import consultor_indices
+
+
+@pytest.mark.parametrize('sql, esperado', [
+    ('SELECT * FROM "t"', []),
+    ('SELECT "NU_ANO", COUNT(*) FROM "t" GROUP BY "NU_ANO"', []),
+    ('SELECT * FROM "t" WHERE "NU_ANO" = %(ano)s', ['NU_ANO']),
+    ('SELECT * FROM "t" WHERE "NU_ANO" IN (%(a0)s, %(a1)s) AND "SG_UF_PROVA" = :uf', ['NU_ANO', 'SG_UF_PROVA']),
+    ('SELECT * FROM "t" WHERE "NU_NOTA_MT" BETWEEN 400 AND 600 OR "NU_NOTA_CN" >= 500', ['NU_NOTA_MT', 'NU_NOTA_CN']),
+    ('SELECT * FROM "t" WHERE "TP_SEXO" IS NOT NULL AND "NO_MUNICIPIO_PROVA" ILIKE %(m)s', ['TP_SEXO', 'NO_MUNICIPIO_PROVA']),
+    ('SELECT * FROM "t" WHERE "tp_sexo" <> \'M\' AND "NU_ANO" != 2020', ['TP_SEXO', 'NU_ANO']),
+])
+def test_colunas_dos_predicados(sql, esperado):
+    assert consultor_indices.colunas_dos_predicados(sql) == esperado
+
+
+def test_colunas_dos_predicados_ignora_o_select_e_repeticoes():
+    # Colunas do SELECT e de funções antes do WHERE não contam; cada coluna aparece uma vez, na ordem
+    sql = '''SELECT "SG_UF_PROVA", AVG("NU_NOTA_MT") FROM "t"
+             where "NU_ANO" = :ano AND ("SG_UF_PROVA" = :uf OR "SG_UF_PROVA" IS NULL) AND "NU_ANO" > 2019
+             GROUP BY "SG_UF_PROVA"'''
+    assert consultor_indices.colunas_dos_predicados(sql) == ['NU_ANO', 'SG_UF_PROVA']
+
+
+class _ConexaoFalsa:
+    """Guarda as chamadas de exec_driver_sql / execute e devolve um plano mínimo."""
+
+    def __init__(self):
+        self.chamadas = []
+
+    def _resultado(self):
+        plano = json.dumps([{"Plan": {"Node Type": "Seq Scan"}, "Execution Time": 1.5}])
+        return type('Resultado', (), {'scalar': lambda _self: plano})()
+
+    def exec_driver_sql(self, *args, **kwargs):
+        self.chamadas.append(('driver', args, kwargs))
+        return self._resultado()
+
+    def execute(self, *args, **kwargs):
+        self.chamadas.append(('text', args, kwargs))
+        return self._resultado()
+
+
+def test_explain_sem_parametros_nao_passa_parametros_ao_driver():
+    # Com um dicionário (mesmo vazio) o driver trata '%' como placeholder: LIKE 'A%' quebraria
+    conexao = _ConexaoFalsa()
+    plano = consultor_indices._explain(conexao, "SELECT 1 FROM t WHERE x LIKE 'A%';", {}, consultor_indices.ESTILO_PYFORMAT)
+    assert plano['Execution Time'] == 1.5
+    [(tipo, args, kwargs)] = conexao.chamadas
+    assert tipo == 'driver' and args == ("EXPLAIN (ANALYZE, FORMAT JSON) SELECT 1 FROM t WHERE x LIKE 'A%'",)
+    assert kwargs == {'execution_options': {'no_parameters': True}}
+
+    conexao = _ConexaoFalsa()
+    consultor_indices._explain(conexao, 'SELECT 1 FROM t WHERE x = %(x)s', {'x': 1}, consultor_indices.ESTILO_PYFORMAT)
+    assert conexao.chamadas[0][1][1] == {'x': 1}
+
+
+def test_medir_consultas_com_porcentagem_literal(postgres_amostras):
+    engine, dados = postgres_amostras
+    sql = 'SELECT COUNT(*) FROM "dados_enem_consolidado" WHERE "NO_MUNICIPIO_PROVA" LIKE \'S%\''
+    consultas = pd.DataFrame([
+        {'assinatura': 'a', 'origem': 'teste', 'tabela': 'dados_enem_consolidado', 'colunas': ['NO_MUNICIPIO_PROVA'],
+         'ocorrencias': 1, 'sql': sql, 'params': {}, 'estilo': consultor_indices.ESTILO_PYFORMAT},
+        {'assinatura': 'b', 'origem': 'teste', 'tabela': 'dados_enem_consolidado', 'colunas': ['NU_ANO'], 'ocorrencias': 1,
+         'sql': 'SELECT COUNT(*) FROM "dados_enem_consolidado" WHERE "NU_ANO" = %(ano)s', 'params': {'ano': 2023},
+         'estilo': consultor_indices.ESTILO_PYFORMAT},
+    ])
+    medidas = consultor_indices.medir_consultas(engine, consultas)
+    assert medidas['erro'].isna().all(), medidas['erro'].tolist()
+    assert (medidas['tempo_ms'] >= 0).all()
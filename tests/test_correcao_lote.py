@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""Correção em lote (services/correcao_lote.py) contra a análise individual de PerformanceAnalyzer."""
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.correcao_lote import (
+    CorrecaoLote, codificar_sequencias, formato_do_arquivo, gravar_resultados, ler_folhas_csv, normalizar_sequencia,
+)
+from services.performance_analyzer import PerformanceAnalyzer
+
+ANO = 2023
+AREAS = ['CH', 'CN', 'LC', 'MT']
+MAPA_PADRAO = {"LC": (1, 45), "CH": (46, 90), "CN": (91, 135), "MT": (136, 180)}
+
+
+def _combinacao_mais_comum(dados):
+    do_ano = dados[(dados['NU_ANO'] == ANO) & (dados['TP_LINGUA'] == 0)]
+    colunas = [f'CO_PROVA_{a}' for a in AREAS]
+    return dict(zip(AREAS, do_ano[colunas].dropna().value_counts().index[0]))
+
+
+@pytest.fixture
+def banco_com_questoes(banco_amostras, amostras_enem, duckdb_amostras):
+    """questoes_enem sintética (caderno AZUL, inglês) ligada à combinação de provas mais comum das amostras."""
+    _, dados = amostras_enem
+    combinacao = _combinacao_mais_comum(dados)
+    gerador = np.random.default_rng(18)
+    linhas = []
+    for area, (inicio, fim) in MAPA_PADRAO.items():
+        for numero in range(inicio, fim + 1):
+            sem_parametros = numero % 17 == 0  # alguns itens sem calibração
+            linhas.append({
+                'ano': ANO, 'cor': 'AZUL', 'lingua': 'Inglês', 'sigla_area': area, 'numero_questao': numero,
+                'provas': str(int(combinacao[area])), 'gabarito': None,
+                'parametro_a': None if sem_parametros else gerador.uniform(0.8, 3.0),
+                'parametro_b': None if sem_parametros else gerador.normal(0.8, 0.8),
+                'parametro_c': None if sem_parametros else gerador.uniform(0.05, 0.25),
+            })
+    conexao = duckdb_amostras.conexao
+    conexao.register('df_questoes', pd.DataFrame(linhas))
+    conexao.execute('CREATE OR REPLACE TABLE questoes_enem AS SELECT * FROM df_questoes')
+    conexao.unregister('df_questoes')
+    yield banco_amostras, combinacao
+    conexao.execute('DROP TABLE IF EXISTS questoes_enem')
+
+
+def _folhas_das_amostras(dados, n):
+    """Sequências do 'Preenchimento Rápido' montadas com as respostas reais (LC, CH, CN, MT) e a UF da prova."""
+    do_ano = dados[dados['NU_ANO'] == ANO].dropna(subset=[f'TX_RESPOSTAS_{a}' for a in AREAS]).head(n)
+    sequencias = []
+    for _, participante in do_ano.iterrows():
+        texto = "".join(str(participante[f'TX_RESPOSTAS_{area}'])[: fim - inicio + 1].ljust(fim - inicio + 1, '.')
+                        for area, (inicio, fim) in MAPA_PADRAO.items())
+        sequencias.append("".join(c if c in "ABCDE" else "-" for c in texto))
+    return pd.DataFrame({'id': [f'aluno{i}' for i in range(len(sequencias))], 'uf': list(do_ano['SG_UF_PROVA']),
+                         'respostas': sequencias})
+
+
+def test_correcao_lote_igual_a_analise_individual(banco_com_questoes, amostras_enem):
+    banco, combinacao = banco_com_questoes
+    _, dados = amostras_enem
+    folhas = _folhas_das_amostras(dados, 40)
+    folhas.loc[0, 'respostas'] = '-' * 180  # folha em branco
+
+    analisador = PerformanceAnalyzer(banco)
+    correcao = CorrecaoLote(analisador, ANO, 'AZUL', 'INGLES')
+    assert correcao.erro is None
+    resultado = correcao.corrigir(folhas['respostas'], folhas['uf'])
+
+    for i, folha in folhas.iterrows():
+        respostas_dict = {q: r for q, r in enumerate(normalizar_sequencia(folha['respostas'], 180), start=1)}
+        individual = analisador.analisar_desempenho(respostas_dict, ANO, 'AZUL', estado=folha['uf'], lingua='INGLES')
+        linha = resultado.loc[i]
+        assert linha['match_score'] == individual['info_prova']['match_score']
+        for area in AREAS:
+            assert linha[f'CO_PROVA_{area}'] == individual['info_prova'][f'CO_PROVA_{area}']
+            esperado = individual['resultados_areas'][area]
+            assert linha[f'acertos_{area}'] == esperado['acertos']
+            assert linha[f'respondidas_{area}'] == esperado['respondidas']
+            assert linha[f'percentual_{area}'] == esperado['percentual']
+            assert linha[f'nota_{area}'] == pytest.approx(esperado['nota_estimada'], abs=1e-9)
+            assert linha[f'media_nacional_{area}'] == pytest.approx(esperado['media_nacional'])
+            if esperado['media_regional'] is None:
+                assert np.isnan(linha[f'media_uf_{area}'])
+            else:
+                assert linha[f'media_uf_{area}'] == pytest.approx(esperado['media_regional'])
+        assert linha['total_acertos'] == individual['total_acertos']
+        assert linha['total_questoes'] == individual['total_questoes']
+        assert linha['percentual_geral'] == individual['percentual_geral']
+        assert linha['nota_geral'] == pytest.approx(individual['nota_geral'], abs=1e-9)
+
+    # Folha em branco: nenhum acerto, fica o primeiro candidato (o mais frequente)
+    assert resultado.loc[0, 'match_score'] == 0 and resultado.loc[0, 'total_acertos'] == 0
+    assert resultado.loc[0, 'CO_PROVA_LC'] == correcao.df_gabs.loc[0, 'CO_PROVA_LC'] == combinacao['LC']
+
+
+def test_corrigir_blocos_grava_csv_e_parquet(banco_com_questoes, amostras_enem, tmp_path):
+    banco, _ = banco_com_questoes
+    _, dados = amostras_enem
+    folhas = _folhas_das_amostras(dados, 25)
+    entrada = tmp_path / 'folhas.csv'
+    folhas.to_csv(entrada, index=False)
+
+    correcao = CorrecaoLote(PerformanceAnalyzer(banco), ANO, 'AZUL', 'INGLES')
+    esperado = correcao.corrigir(folhas['respostas'], folhas['uf'])
+
+    for nome in ('resultados.csv', 'resultados.parquet'):
+        saida = tmp_path / nome
+        blocos = correcao.corrigir_blocos(ler_folhas_csv(str(entrada), tamanho_bloco=10))
+        assert gravar_resultados(blocos, str(saida), formato_do_arquivo(str(saida))) == len(folhas)
+        lido = pd.read_parquet(saida) if nome.endswith('.parquet') else pd.read_csv(saida, dtype={'id': str, 'uf': str})
+        assert list(lido.columns[:2]) == ['id', 'uf']
+        assert list(lido['id']) == list(folhas['id'])
+        pd.testing.assert_series_equal(lido['nota_geral'], esperado['nota_geral'].reset_index(drop=True), check_names=False)
+        pd.testing.assert_series_equal(lido['total_acertos'], esperado['total_acertos'].reset_index(drop=True),
+                                       check_names=False, check_dtype=False)
+
+    buffer = io.BytesIO()
+    assert gravar_resultados(correcao.corrigir_blocos(ler_folhas_csv(str(entrada), tamanho_bloco=7)), buffer) == len(folhas)
+    assert buffer.getvalue().decode('utf-8').count('\n') == len(folhas) + 1
+
+    with pytest.raises(ValueError):
+        next(correcao.corrigir_blocos([folhas.rename(columns={'respostas': 'seq'})]))
+
+
+def test_correcao_sem_provas_registra_erro(banco_amostras):
+    correcao = CorrecaoLote(PerformanceAnalyzer(banco_amostras), 1990, 'AZUL')
+    assert correcao.erro
+    with pytest.raises(ValueError):
+        correcao.corrigir(pd.Series(['ABCDE']))
+
+
+def test_codificar_sequencias_igual_a_normalizar_sequencia():
+    sequencias = pd.Series(['abc-e', 'A B*C9D', None, 'EEEEEEEEEE', ''])
+    matriz = codificar_sequencias(sequencias, 6)
+    for linha, texto in zip(matriz, sequencias):
+        esperado = [0 if c == '-' else "ABCDE".index(c) + 1 for c in normalizar_sequencia('' if texto is None else texto, 6)]
+        assert linha.tolist() == esperado
+
+
+@pytest.mark.parametrize('caminho, formato', [
+    ('saida.parquet', 'parquet'), ('SAIDA.PARQUET', 'parquet'), ('dir/saida.csv', 'csv'),
+    ('saida', 'csv'), ('saida.parquet.csv', 'csv'), ('saida.txt', 'csv'),
+])
+def test_formato_do_arquivo(caminho, formato):
+    assert formato_do_arquivo(caminho) == formato
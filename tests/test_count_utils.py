@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""ServicoContagem (Exploration/count_utils.py): memorização, falhas e limite de assinaturas."""
+import pytest
+from sqlalchemy import create_engine, text
+
+from Exploration import count_utils
+from Exploration.count_utils import ServicoContagem, assinatura_filtro
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'contagem.db'}")  # Arquivo: a contagem roda em outra thread
+    with engine.begin() as connection:
+        connection.execute(text('CREATE TABLE t (x INTEGER)'))
+        connection.execute(text('INSERT INTO t VALUES (1), (2), (3)'))
+    yield engine
+    engine.dispose()
+
+
+def test_assinatura_ignora_ordem_dos_valores_in_e_espacos():
+    a = assinatura_filtro('SELECT COUNT(*)  FROM t', {'p_val_UF_0': 'SP', 'p_val_UF_1': 'RJ', 'ano': 2023})
+    b = assinatura_filtro('SELECT COUNT(*) FROM t', {'p_val_UF_0': 'RJ', 'p_val_UF_1': 'SP', 'ano': 2023})
+    assert a == b
+    assert a != assinatura_filtro('SELECT COUNT(*) FROM t', {'p_val_UF_0': 'RJ', 'ano': 2023})
+
+
+def test_contagem_exata_memorizada(engine):
+    servico = ServicoContagem()
+    assert servico.iniciar('a', 'SELECT COUNT(*) FROM t', None, engine).result(timeout=10) == 3
+    assert servico.exata('a') == 3
+    assert servico.falha('a') is None
+    assert not servico.em_andamento('a')
+
+
+def test_falha_memorizada_com_ttl(engine, monkeypatch):
+    servico = ServicoContagem()
+    with pytest.raises(Exception):
+        servico.iniciar('a', 'SELECT COUNT(*) FROM inexistente', None, engine).result(timeout=10)
+    assert servico.exata('a') is None
+    assert 'inexistente' in servico.falha('a')
+    assert not servico.em_andamento('a')
+
+    monkeypatch.setattr(count_utils, 'TTL_FALHA_CONTAGEM', 0)
+    assert servico.falha('a') is None
+
+
+def test_assinaturas_limitadas_em_lru(engine):
+    servico = ServicoContagem(tamanho_maximo=2)
+    for assinatura in ('a', 'b'):
+        servico.iniciar(assinatura, 'SELECT COUNT(*) FROM t', None, engine).result(timeout=10)
+    assert servico.exata('a') == 3  # 'a' passa a ser a mais recente
+    servico.iniciar('c', 'SELECT COUNT(*) FROM t', None, engine).result(timeout=10)
+    assert servico.exata('b') is None
+    assert servico.exata('a') == 3 and servico.exata('c') == 3
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""Leitura da visão enriquecida da Exploration (Exploration/db_utils.py) quando o ETL remove a tabela materializada."""
+import pytest
+from sqlalchemy.exc import DBAPIError
+
+import pos_carga
+from Exploration import db_utils
+
+
+@pytest.fixture
+def exploration_postgres(postgres_amostras, monkeypatch):
+    engine, dados = postgres_amostras
+    monkeypatch.setattr(db_utils, 'DB_BACKEND', 'postgres')
+    monkeypatch.setattr(db_utils, 'get_engine', lambda: engine)
+    db_utils.tabela_enriquecida_disponivel.clear()
+    yield engine, dados
+    db_utils.tabela_enriquecida_disponivel.clear()
+
+
+def test_tabela_enriquecida_removida_volta_ao_join(exploration_postgres):
+    engine, dados = exploration_postgres
+    assert pos_carga.construir_dados_enriquecidos(engine, db_utils.TABLE_NAME)
+    assert db_utils.tabela_enriquecida_disponivel()
+    consulta = db_utils.obter_base_count_query()
+    assert db_utils.BASE_FROM_VIEW in consulta
+
+    # O ETL descarta a tabela (--sem-pos-carga) enquanto o cache ainda diz que ela existe
+    pos_carga.descartar_dados_enriquecidos(engine)
+    assert db_utils.tabela_enriquecida_disponivel()
+    assert int(db_utils.ler_sql(consulta).iloc[0, 0]) == len(dados)
+    assert not db_utils.tabela_enriquecida_disponivel()  # cache revalidado
+    assert db_utils.BASE_FROM_JOIN in db_utils.obter_base_count_query()
+
+
+def test_outras_tabelas_inexistentes_continuam_com_erro(exploration_postgres):
+    with pytest.raises(DBAPIError):
+        db_utils.ler_sql('SELECT * FROM "tabela_que_nao_existe"')
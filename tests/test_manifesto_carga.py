@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""Manifesto da carga e escolha dos anos do modo incremental (SCRIPT.py --incremental)."""
+import hashlib
+import os
+
+import pytest
+from sqlalchemy import text, types
+
+import SCRIPT
+
+VERSAO = 'v1'
+
+
+def _tarefas(*arquivos):
+    return [(os.path.join('csv', nome), ano, None) for nome, ano in arquivos]
+
+
+def _registro(ano, hash_sha256='h', versao_schema=VERSAO):
+    return {'NU_ANO': ano, 'hash_sha256': hash_sha256, 'versao_schema': versao_schema, 'tamanho': 1, 'mtime': 1.0}
+
+
+@pytest.fixture
+def carga_anterior():
+    """Dois anos já carregados (2022 com dois arquivos), com partição e manifesto em dia."""
+    tarefas = _tarefas(('A_2022.csv', 2022), ('B_2022.csv', 2022), ('C_2023.csv', 2023))
+    manifesto = {'A_2022.csv': _registro(2022, 'a'), 'B_2022.csv': _registro(2022, 'b'), 'C_2023.csv': _registro(2023, 'c')}
+    impressoes = {nome: {'tamanho': 1, 'mtime': 1.0, 'hash_sha256': registro['hash_sha256']} for nome, registro in manifesto.items()}
+    particoes = {2022: 'dados_enem_consolidado_2022', 2023: 'dados_enem_consolidado_2023'}
+    return tarefas, impressoes, manifesto, particoes
+
+
+def test_nada_a_recarregar(carga_anterior):
+    tarefas, impressoes, manifesto, particoes = carga_anterior
+    assert SCRIPT.anos_a_recarregar(tarefas, impressoes, manifesto, VERSAO, particoes) == {}
+
+
+def test_ano_sem_particao(carga_anterior):
+    tarefas, impressoes, manifesto, particoes = carga_anterior
+    del particoes[2023]
+    assert SCRIPT.anos_a_recarregar(tarefas, impressoes, manifesto, VERSAO, particoes) == {2023: 'sem partição'}
+
+
+def test_arquivo_novo_ou_removido(carga_anterior):
+    tarefas, impressoes, manifesto, particoes = carga_anterior
+    novo = tarefas + _tarefas(('D_2023.csv', 2023))
+    impressoes_novo = {**impressoes, 'D_2023.csv': {'tamanho': 1, 'mtime': 1.0, 'hash_sha256': 'd'}}
+    assert SCRIPT.anos_a_recarregar(novo, impressoes_novo, manifesto, VERSAO, particoes) == {2023: 'arquivos novos ou removidos (D_2023.csv)'}
+
+    sem_b = [tarefa for tarefa in tarefas if not tarefa[0].endswith('B_2022.csv')]
+    assert SCRIPT.anos_a_recarregar(sem_b, impressoes, manifesto, VERSAO, particoes) == {2022: 'arquivos novos ou removidos (B_2022.csv)'}
+
+
+def test_versao_do_schema_diferente(carga_anterior):
+    tarefas, impressoes, manifesto, particoes = carga_anterior
+    manifesto['C_2023.csv']['versao_schema'] = 'v0'
+    assert SCRIPT.anos_a_recarregar(tarefas, impressoes, manifesto, VERSAO, particoes) == {2023: 'versão do schema mudou'}
+    assert set(SCRIPT.anos_a_recarregar(tarefas, impressoes, manifesto, 'v2', particoes)) == {2022, 2023}
+
+
+def test_conteudo_alterado_pelo_hash(carga_anterior):
+    tarefas, impressoes, manifesto, particoes = carga_anterior
+    impressoes['B_2022.csv'] = {'tamanho': 1, 'mtime': 2.0, 'hash_sha256': 'b2'}
+    assert SCRIPT.anos_a_recarregar(tarefas, impressoes, manifesto, VERSAO, particoes) == {2022: 'conteúdo alterado (B_2022.csv)'}
+    # Só o mtime mudou (arquivo copiado de novo): o hash é o mesmo, nada a recarregar
+    impressoes['B_2022.csv'] = {'tamanho': 1, 'mtime': 3.0, 'hash_sha256': 'b'}
+    assert SCRIPT.anos_a_recarregar(tarefas, impressoes, manifesto, VERSAO, particoes) == {}
+
+
+def test_ano_so_no_manifesto_nao_e_recarregado(carga_anterior):
+    # O modo incremental nunca remove anos: um ano sem CSV não aparece nos motivos
+    tarefas, impressoes, manifesto, particoes = carga_anterior
+    sem_2023 = [tarefa for tarefa in tarefas if tarefa[1] != 2023]
+    assert SCRIPT.anos_a_recarregar(sem_2023, impressoes, manifesto, VERSAO, particoes) == {}
+
+
+def test_impressao_digital_reaproveita_o_hash(tmp_path):
+    arquivo = tmp_path / 'MICRODADOS_ENEM_2023.csv'
+    arquivo.write_bytes(b'NU_ANO;TP_SEXO\n2023;F\n')
+    estado = os.stat(arquivo)
+    esperado = hashlib.sha256(arquivo.read_bytes()).hexdigest()
+
+    assert SCRIPT.impressao_digital(str(arquivo)) == {'tamanho': estado.st_size, 'mtime': estado.st_mtime, 'hash_sha256': esperado}
+    # Mesmo tamanho e mtime do manifesto: o hash registrado é reaproveitado sem ler o arquivo
+    anterior = {'tamanho': estado.st_size, 'mtime': estado.st_mtime, 'hash_sha256': 'registrado'}
+    assert SCRIPT.impressao_digital(str(arquivo), anterior)['hash_sha256'] == 'registrado'
+    # Outro mtime: recalcula
+    os.utime(arquivo, (estado.st_atime, estado.st_mtime + 10))
+    assert SCRIPT.impressao_digital(str(arquivo), anterior)['hash_sha256'] == esperado
+
+
+def test_versao_do_schema(monkeypatch):
+    plano = {'colunas': ['NU_ANO', 'TP_SEXO'], 'tipos_sql': {'NU_ANO': types.INTEGER, 'TP_SEXO': types.VARCHAR(1)}}
+    versao = SCRIPT.versao_do_schema(plano)
+    assert versao == SCRIPT.versao_do_schema({'colunas': list(plano['colunas']), 'tipos_sql': dict(plano['tipos_sql'])})
+    assert SCRIPT.versao_do_schema({**plano, 'tipos_sql': {**plano['tipos_sql'], 'TP_SEXO': types.VARCHAR(2)}}) != versao
+    assert SCRIPT.versao_do_schema({**plano, 'colunas': ['NU_ANO']}) != versao
+    monkeypatch.setattr(SCRIPT, 'VERSAO_REGRAS', SCRIPT.VERSAO_REGRAS + 1)
+    assert SCRIPT.versao_do_schema(plano) != versao
+
+
+def test_manifesto_no_banco(postgres_schema, tmp_path):
+    engine = postgres_schema
+    arquivos = {}
+    for nome, conteudo in [('MICRODADOS_ENEM_2022.csv', b'2022;F\n'), ('MICRODADOS_ENEM_2023.csv', b'2023;M\n')]:
+        (tmp_path / nome).write_bytes(conteudo)
+        arquivos[nome] = str(tmp_path / nome)
+    tarefas = [(caminho, SCRIPT.extrair_ano_do_arquivo(nome), None) for nome, caminho in arquivos.items()]
+    particoes = {2022: 'p2022', 2023: 'p2023'}
+    with engine.begin() as connection:
+        connection.execute(text(SCRIPT.SQL_CRIAR_MANIFESTO))
+
+    # Primeira carga: manifesto vazio, todos os anos
+    impressoes = {nome: SCRIPT.impressao_digital(caminho) for nome, caminho in arquivos.items()}
+    assert set(SCRIPT.anos_a_recarregar(tarefas, impressoes, SCRIPT.ler_manifesto(engine), VERSAO, particoes)) == {2022, 2023}
+    with engine.begin() as connection:
+        for caminho, ano, _ in tarefas:
+            nome = os.path.basename(caminho)
+            SCRIPT.registrar_no_manifesto(connection, ano, [{'arquivo': nome, 'linhas': 1, 'versao_schema': VERSAO, **impressoes[nome]}])
+    manifesto = SCRIPT.ler_manifesto(engine)
+    assert {nome: int(registro['NU_ANO']) for nome, registro in manifesto.items()} == {'MICRODADOS_ENEM_2022.csv': 2022, 'MICRODADOS_ENEM_2023.csv': 2023}
+    assert SCRIPT.anos_a_recarregar(tarefas, impressoes, manifesto, VERSAO, particoes) == {}
+
+    # 2022 só tocado (novo mtime, mesmo conteúdo); 2023 reescrito com outro conteúdo
+    estado = os.stat(arquivos['MICRODADOS_ENEM_2022.csv'])
+    os.utime(arquivos['MICRODADOS_ENEM_2022.csv'], (estado.st_atime, estado.st_mtime + 10))
+    (tmp_path / 'MICRODADOS_ENEM_2023.csv').write_bytes(b'2023;F\n')
+    impressoes = {nome: SCRIPT.impressao_digital(caminho, manifesto.get(nome)) for nome, caminho in arquivos.items()}
+    assert SCRIPT.anos_a_recarregar(tarefas, impressoes, manifesto, VERSAO, particoes) == {2023: 'conteúdo alterado (MICRODADOS_ENEM_2023.csv)'}
+
+    # O mtime novo de 2022 é gravado: na próxima execução o hash não é recalculado
+    SCRIPT.atualizar_mtimes_no_manifesto(engine, impressoes, manifesto)
+    manifesto = SCRIPT.ler_manifesto(engine)
+    assert manifesto['MICRODADOS_ENEM_2022.csv']['mtime'] == impressoes['MICRODADOS_ENEM_2022.csv']['mtime']
+    assert manifesto['MICRODADOS_ENEM_2023.csv']['mtime'] != impressoes['MICRODADOS_ENEM_2023.csv']['mtime']
+
+    # Registrar o ano de novo substitui as linhas dele; lista vazia tira o ano do manifesto
+    with engine.begin() as connection:
+        SCRIPT.registrar_no_manifesto(connection, 2023, [])
+    assert set(SCRIPT.ler_manifesto(engine)) == {'MICRODADOS_ENEM_2022.csv'}
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""Paginação por seek da Exploration (montar_consulta_paginada e índice esparso em Exploration/filter_utils.py), no DuckDB das amostras."""
+import pytest
+import streamlit as st
+
+from Exploration import db_utils, filter_utils
+
+PREFIXO = 'teste'
+BASE = 'SELECT * FROM "dados_enem_consolidado"'
+BASE_FILTRADA = BASE + ' WHERE "SG_UF_PROVA" <> %(uf)s'
+
+
+@pytest.fixture
+def paginacao(duckdb_amostras, amostras_enem, monkeypatch):
+    """Exploration lendo o DuckDB das amostras; retorna as chaves de todas as linhas na ordem da paginação."""
+    _, dados = amostras_enem
+    monkeypatch.setattr(db_utils, 'DB_BACKEND', 'duckdb')
+    monkeypatch.setattr(db_utils, 'get_engine', lambda: duckdb_amostras)
+    filter_utils.carregar_marcos_paginacao.clear()
+    st.session_state.pop(f'{PREFIXO}_paginacao', None)
+    yield dados.sort_values(list(filter_utils.CHAVE_PAGINACAO))
+    filter_utils.carregar_marcos_paginacao.clear()
+    st.session_state.pop(f'{PREFIXO}_paginacao', None)
+
+
+def _chaves(df):
+    return [tuple(int(v) for v in linha) for linha in df[list(filter_utils.CHAVE_PAGINACAO)].itertuples(index=False)]
+
+
+def _carregar(base, params, page, page_size):
+    """Monta a query da página como build_query_and_params, executa e registra a página. Retorna (query, chaves)."""
+    query, params_pagina = filter_utils.montar_consulta_paginada(base, 'WHERE' in base, params, page, page_size, PREFIXO)
+    df = db_utils.ler_sql(query, {**params, **params_pagina})
+    filter_utils.registrar_pagina_carregada(PREFIXO, page, df)
+    return query, _chaves(df)
+
+
+def test_marcos_a_cada_passo(paginacao):
+    esperado = _chaves(paginacao)
+    assert filter_utils.carregar_marcos_paginacao(BASE, (), passo=1000) == esperado[999::1000]
+    marcos = filter_utils.carregar_marcos_paginacao(BASE, ())
+    assert marcos == esperado[filter_utils.PASSO_MARCOS - 1::filter_utils.PASSO_MARCOS] and len(marcos) == 2
+
+    filtrada = _chaves(paginacao[paginacao['SG_UF_PROVA'] != 'SP'])
+    assert filter_utils.carregar_marcos_paginacao(BASE_FILTRADA, (('uf', 'SP'),), passo=1000) == filtrada[999::1000]
+
+
+def test_paginas_seguidas_comecam_na_ultima_chave(paginacao):
+    params = {'uf': 'SP'}
+    esperado = _chaves(paginacao[paginacao['SG_UF_PROVA'] != 'SP'])
+    lidas, page = [], 1
+    while len(lidas) < len(esperado):
+        query, chaves = _carregar(BASE_FILTRADA, params, page, 1500)
+        # Só a primeira página começa do início; nenhuma usa OFFSET
+        assert ('cursor_ano' in query) == (page > 1) and 'OFFSET' not in query
+        lidas += chaves
+        page += 1
+    assert lidas == esperado
+
+
+def test_salto_e_pagina_anterior(paginacao):
+    esperado = _chaves(paginacao)
+    marcos = filter_utils.carregar_marcos_paginacao(BASE, ())
+
+    # Salto para a página 5 (linha 6000): parte do primeiro marco com OFFSET menor que um passo
+    query, params_pagina = filter_utils.montar_consulta_paginada(BASE, False, {}, 5, 1500, PREFIXO)
+    assert (params_pagina['cursor_ano'], params_pagina['cursor_inscricao']) == marcos[0]
+    assert params_pagina['offset'] == 6000 - filter_utils.PASSO_MARCOS
+    _, chaves = _carregar(BASE, {}, 5, 1500)
+    assert chaves == esperado[6000:7500]
+
+    # Página 4, antes da 5 já carregada: lida para trás a partir da primeira chave da 5
+    query, chaves = _carregar(BASE, {}, 4, 1500)
+    assert 'DESC' in query and 'OFFSET' not in query
+    assert chaves == esperado[4500:6000]
+
+    # Página 6, depois da 5: seek a partir da última chave dela
+    query, chaves = _carregar(BASE, {}, 6, 1500)
+    assert 'DESC' not in query and 'OFFSET' not in query
+    assert chaves == esperado[7500:9000]
+
+
+def test_ponto_de_partida(paginacao):
+    esperado = _chaves(paginacao)
+    estado = {'primeira': {}, 'ultima': {2: esperado[199]}}
+
+    # Perto de uma página visitada: cursor na última chave dela e OFFSET das páginas puladas
+    assert filter_utils._ponto_de_partida(estado, BASE, {}, 4, 100) == (esperado[199], 100)
+    # Páginas antes da primeira visitada: OFFSET desde o início (menor que um passo, sem marcos)
+    assert filter_utils._ponto_de_partida(estado, BASE, {}, 2, 100) == (None, 100)
+    # Longe da página visitada: o marco mais próximo dá um OFFSET menor
+    assert filter_utils._ponto_de_partida(estado, BASE, {}, 60, 100) == (esperado[filter_utils.PASSO_MARCOS - 1], 900)
+    # Depois do último marco, usa-o
+    assert filter_utils._ponto_de_partida({'primeira': {}, 'ultima': {}}, BASE, {}, 11, 1000) == (esperado[9999], 0)
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""Paridade das consultas das páginas entre o DuckDB e um backend de referência (scripts/verificar_paridade_backends.py)."""
+import os
+import re
+import sqlite3
+import sys
+
+import pandas as pd
+import pytest
+
+from services.duckdb_backend import traduzir_parametros
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+import verificar_paridade_backends as paridade  # noqa: E402
+
+
+def test_traduzir_parametros_dois_pontos():
+    sql, params = traduzir_parametros('SELECT * FROM t WHERE "NU_ANO" = :ano AND "SG_UF_PROVA" = :uf', {'ano': 2023, 'uf': 'SP', 'extra': 1})
+    assert sql == 'SELECT * FROM t WHERE "NU_ANO" = $ano AND "SG_UF_PROVA" = $uf'
+    assert params == {'ano': 2023, 'uf': 'SP'}
+
+
+def test_traduzir_parametros_pyformat_e_percentual_escapado():
+    sql, params = traduzir_parametros("SELECT * FROM t WHERE a = %(ano)s AND b LIKE 'SP%%'", {'ano': 2023})
+    assert sql == "SELECT * FROM t WHERE a = $ano AND b LIKE 'SP%'"
+    assert params == {'ano': 2023}
+
+
+def test_traduzir_parametros_preserva_casts_e_nomes_desconhecidos():
+    sql, params = traduzir_parametros('SELECT "NU_ANO"::INTEGER, :ano, :hora FROM t', {'ano': 2023})
+    assert sql == 'SELECT "NU_ANO"::INTEGER, $ano, :hora FROM t'
+    assert params == {'ano': 2023}
+
+
+def test_traduzir_parametros_sem_parametros():
+    assert traduzir_parametros("SELECT 1 WHERE x LIKE 'a%%'", None) == ("SELECT 1 WHERE x LIKE 'a%%'", None)
+
+
+def _executor_sqlite(amostras_enem):
+    """Referência em SQLite com as mesmas linhas do dataset Parquet."""
+    diretorio, dados = amostras_enem
+    conexao = sqlite3.connect(':memory:')
+    # Tipos Arrow -> tipos do NumPy/objetos Python, que o sqlite3 aceita
+    dados.astype(object).where(dados.notna(), None).to_sql(paridade.TABELA, conexao, index=False)
+    pd.read_parquet(os.path.join(diretorio, 'RELATORIO_MUNICIPIOS.parquet')).astype(object).to_sql('RELATORIO_MUNICIPIOS', conexao, index=False)
+
+    def executar(sql, params):
+        return pd.read_sql_query(re.sub(r'%\((\w+)\)s', r':\1', sql), conexao, params=params)
+    return executar
+
+
+def test_paridade_duckdb_com_referencia(amostras_enem, duckdb_amostras):
+    _, dados = amostras_enem
+    uf = dados.loc[dados['NU_ANO'] == 2023, 'SG_UF_PROVA'].mode().iloc[0]
+    consultas = paridade.montar_consultas(2023, uf)
+    resultados = paridade.verificar(consultas, _executor_sqlite(amostras_enem), duckdb_amostras.execute_query)
+
+    assert len(resultados) == len(consultas)
+    divergencias = {nome: diferenca for nome, _, _, diferenca in resultados if diferenca}
+    assert not divergencias
+
+
+def test_paridade_detecta_divergencia(duckdb_amostras):
+    consultas = [("Contagem", f'SELECT COUNT(*) AS total FROM "{paridade.TABELA}"', None)]
+    def referencia_errada(sql, params): return pd.DataFrame({'total': [-1]})
+    [(_, _, _, diferenca)] = paridade.verificar(consultas, referencia_errada, duckdb_amostras.execute_query)
+    assert diferenca
+
+
+def test_paridade_com_postgres(duckdb_amostras):
+    """Só roda com um PostgreSQL carregado com os mesmos dados (ex.: ETL das amostras); senão é pulado."""
+    sqlalchemy = pytest.importorskip('sqlalchemy')
+    from config.conexao import obter_engine
+    try:
+        engine = obter_engine(rotulo='testes-paridade')
+        with engine.connect() as connection:
+            connection.execute(sqlalchemy.text(f'SELECT 1 FROM "{paridade.TABELA}" LIMIT 1'))
+    except Exception as e:
+        pytest.skip(f"PostgreSQL indisponível: {e}")
+    resultados = paridade.verificar(paridade.montar_consultas(2023, 'SP'), paridade.executor_postgres(engine), duckdb_amostras.execute_query)
+    assert not {nome: diferenca for nome, _, _, diferenca in resultados if diferenca}
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""Leitura do dataset Parquet do ETL (services/parquet_reader.py) sobre as amostras."""
+import os
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pytest
+
+from services import parquet_reader
+
+
+@pytest.fixture(scope='module')
+def dataset_por_uf(amostras_enem, tmp_path_factory):
+    """As mesmas amostras sub-particionadas por SG_UF_PROVA (layout do --parquet-por-uf)."""
+    _, dados = amostras_enem
+    diretorio = str(tmp_path_factory.mktemp('parquet_por_uf'))
+    particionamento = ds.partitioning(pa.schema([('NU_ANO', pa.int64()), ('SG_UF_PROVA', pa.string())]), flavor='hive')
+    ds.write_dataset(pa.Table.from_pandas(dados, preserve_index=False), parquet_reader.caminho_dataset(diretorio),
+                     format='parquet', partitioning=particionamento)
+    return diretorio
+
+
+def _pastas_lidas(base_dir, anos=None, ufs=None):
+    """Pastas de partição dos arquivos que a leitura com o filtro abre."""
+    caminho = parquet_reader.caminho_dataset(base_dir)
+    fragmentos = parquet_reader.abrir_dataset(base_dir).get_fragments(filter=parquet_reader.montar_filtro(anos, ufs))
+    return {os.path.relpath(os.path.dirname(f.path), caminho) for f in fragmentos}
+
+
+def test_ler_microdados_com_projecao_e_filtros(amostras_enem):
+    diretorio, dados = amostras_enem
+    df = parquet_reader.ler_microdados(['NU_INSCRICAO', 'TP_SEXO'], anos=[2023], base_dir=diretorio)
+    assert list(df.columns) == ['NU_INSCRICAO', 'TP_SEXO']
+    assert sorted(df['NU_INSCRICAO']) == sorted(dados.loc[dados['NU_ANO'] == 2023, 'NU_INSCRICAO'])
+
+    # UF num dataset só por ano e filtro adicional: aplicados linha a linha
+    df = parquet_reader.ler_microdados(['NU_ANO', 'SG_UF_PROVA'], ufs=['SP'], filtro_extra=ds.field('TP_SEXO') == 'F', base_dir=diretorio)
+    esperado = dados[(dados['SG_UF_PROVA'] == 'SP') & (dados['TP_SEXO'] == 'F')]
+    assert 0 < len(df) == len(esperado) and set(df['SG_UF_PROVA']) == {'SP'}
+    assert df['NU_ANO'].value_counts().to_dict() == esperado['NU_ANO'].value_counts().to_dict()
+
+
+def test_contar_linhas(amostras_enem, dataset_por_uf):
+    diretorio, dados = amostras_enem
+    for base_dir in (diretorio, dataset_por_uf):
+        assert parquet_reader.contar_linhas(base_dir=base_dir) == len(dados)
+        assert parquet_reader.contar_linhas(anos=[2022], base_dir=base_dir) == int((dados['NU_ANO'] == 2022).sum())
+        assert parquet_reader.contar_linhas(anos=[2023], ufs=['SP', 'RJ'], base_dir=base_dir) == int(
+            ((dados['NU_ANO'] == 2023) & dados['SG_UF_PROVA'].isin(['SP', 'RJ'])).sum())
+        assert parquet_reader.contar_linhas(anos=[2019], base_dir=base_dir) == 0
+
+
+def test_filtros_de_particao_nao_abrem_outras_pastas(amostras_enem, dataset_por_uf):
+    diretorio, _ = amostras_enem
+    assert _pastas_lidas(diretorio) == {'NU_ANO=2022', 'NU_ANO=2023'}
+    assert _pastas_lidas(diretorio, anos=[2022]) == {'NU_ANO=2022'}
+    # Sem sub-partição, a UF não poda pastas (fica para as estatísticas dos row groups)
+    assert _pastas_lidas(diretorio, anos=[2023], ufs=['SP']) == {'NU_ANO=2023'}
+
+    assert not parquet_reader.particionado_por_uf(parquet_reader.caminho_dataset(diretorio))
+    assert parquet_reader.particionado_por_uf(parquet_reader.caminho_dataset(dataset_por_uf))
+    assert _pastas_lidas(dataset_por_uf, anos=[2023], ufs=['SP', 'RJ']) == {
+        os.path.join('NU_ANO=2023', 'SG_UF_PROVA=SP'), os.path.join('NU_ANO=2023', 'SG_UF_PROVA=RJ')}
+    df = parquet_reader.ler_microdados(['SG_UF_PROVA'], anos=[2023], ufs=['SP'], base_dir=dataset_por_uf)
+    assert set(df['SG_UF_PROVA']) == {'SP'}
+
+
+def test_dataset_inexistente(tmp_path):
+    assert not parquet_reader.dataset_disponivel(str(tmp_path))
+    with pytest.raises(FileNotFoundError):
+        parquet_reader.ler_microdados(base_dir=str(tmp_path))
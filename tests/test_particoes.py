@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""Troca de partições por ano do SCRIPT.py (preparar_particao_de_carga / trocar_particao) no PostgreSQL."""
+from sqlalchemy import text
+
+import SCRIPT
+
+
+def _indices_da_particao(connection, particao):
+    """{nome do índice: nome do índice pai} dos índices da partição."""
+    return dict(connection.execute(text(
+        """SELECT c.relname, pai.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+           LEFT JOIN pg_inherits h ON h.inhrelid = i.indexrelid LEFT JOIN pg_class pai ON pai.oid = h.inhparent
+           WHERE i.indrelid = to_regclass(:particao)"""
+    ), {'particao': f'"{particao}"'}).all())
+
+
+def _recarregar(engine, ano):
+    SCRIPT.preparar_particao_de_carga(engine, ano)
+    with engine.begin() as connection:
+        connection.execute(text(f'INSERT INTO "{SCRIPT.nome_particao_carga(ano)}" SELECT * FROM "{SCRIPT.nome_particao(ano)}"'))
+    SCRIPT.trocar_particao(engine, ano)
+
+
+def test_troca_leva_os_indices_da_tabela_principal(postgres_amostras):
+    engine, dados = postgres_amostras
+    ano = int(dados['NU_ANO'].max())
+    particao = SCRIPT.nome_particao(ano)
+    with engine.begin() as connection:
+        # Índices criados na tabela principal depois da carga (ex.: pelo consultor de índices)
+        connection.execute(text(f'CREATE INDEX "ix_teste_uf" ON "{SCRIPT.nome_tabela}" ("SG_UF_PROVA")'))
+        connection.execute(text(f'CREATE INDEX "ix_teste_ano" ON "{SCRIPT.nome_tabela}" USING brin ("NU_ANO")'))
+        linhas = connection.execute(text(f'SELECT COUNT(*) FROM "{particao}"')).scalar_one()
+
+    # Duas recargas seguidas: os nomes dos índices da carga não colidem com os da partição anterior
+    for _ in range(2):
+        _recarregar(engine, ano)
+        with engine.connect() as connection:
+            indices = _indices_da_particao(connection, particao)
+            assert connection.execute(text(f'SELECT COUNT(*) FROM "{particao}"')).scalar_one() == linhas
+        # Os índices criados antes da troca foram anexados aos da tabela principal (o ATTACH não criou outros)
+        assert indices == {f'{particao}_ix0': 'ix_teste_ano', f'{particao}_ix1': 'ix_teste_uf'}
+
+
+def test_tabela_mantida_ganha_o_indice_da_paginacao(postgres_amostras):
+    engine, dados = postgres_amostras
+    ano = int(dados['NU_ANO'].max())
+    particao = SCRIPT.nome_particao(ano)
+    with engine.connect() as connection:
+        assert SCRIPT.indices_da_tabela_principal(connection) == []
+    plano = {'colunas': list(dados.columns), 'tipos_sql': {}}
+
+    # Tabela particionada de uma carga anterior, com as mesmas colunas: mantida, com o índice criado em todas as partições
+    SCRIPT.preparar_tabela_particionada(engine, plano)
+    with engine.connect() as connection:
+        [(nome, definicao)] = SCRIPT.indices_da_tabela_principal(connection)
+        assert nome == SCRIPT.indice_paginacao and definicao.endswith('("NU_ANO", "NU_INSCRICAO")')
+        assert list(_indices_da_particao(connection, particao).values()) == [SCRIPT.indice_paginacao]
+
+    # Uma segunda execução não duplica o índice; o ano recarregado o recebe pronto
+    SCRIPT.preparar_tabela_particionada(engine, plano)
+    _recarregar(engine, ano)
+    with engine.connect() as connection:
+        assert len(SCRIPT.indices_da_tabela_principal(connection)) == 1
+        assert _indices_da_particao(connection, particao) == {f'{particao}_ix0': SCRIPT.indice_paginacao}
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""PerformanceAnalyzer (services/performance_analyzer.py) sobre as tabelas derivadas do ETL, no DuckDB das amostras."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.performance_analyzer import PerformanceAnalyzer
+
+AREAS = ['CH', 'CN', 'LC', 'MT']
+MAPA_PADRAO = {"LC": (1, 45), "CH": (46, 90), "CN": (91, 135), "MT": (136, 180)}
+
+
+@pytest.fixture
+def analisador(banco_amostras):
+    return PerformanceAnalyzer(banco_amostras)
+
+
+def test_gabaritos_por_provas_iguais_aos_dos_microdados(analisador, amostras_enem):
+    _, dados = amostras_enem
+    ano = 2023
+    do_ano = dados[dados['NU_ANO'] == ano]
+    codigo = str(int(do_ano['CO_PROVA_MT'].dropna().mode().iloc[0]))
+
+    df = analisador.buscar_gabaritos_por_provas([codigo], ano)
+
+    # Combinações distintas que a varredura dos microdados encontraria (participantes com a prova)
+    colunas = [f'CO_PROVA_{a}' for a in AREAS]
+    com_codigo = do_ano[do_ano[colunas].eq(int(codigo)).any(axis=1)]
+    esperado = com_codigo[colunas].drop_duplicates()
+    assert len(df) == len(esperado)
+    assert (df['CO_PROVA_MT'] == int(codigo)).all()
+    gabaritos_mt = do_ano.loc[do_ano['CO_PROVA_MT'] == int(codigo), 'TX_GABARITO_MT'].dropna().str.strip().unique()
+    assert set(df['TX_GABARITO_MT'].dropna()) == set(gabaritos_mt)
+    # Mais frequente primeiro
+    contagens = com_codigo.groupby(colunas, dropna=False).size().sort_values(ascending=False)
+    assert contagens[tuple(df.loc[0, colunas])] == contagens.max()
+
+
+def test_gabaritos_sem_tabelas_derivadas_nao_varrem_os_microdados(banco_duckdb):
+    analisador = PerformanceAnalyzer(banco_duckdb)
+    assert analisador.buscar_gabaritos_por_provas(['1234'], 2023).empty
+    assert not any('dados_enem_consolidado' in q for q in banco_duckdb.consultas)
+
+
+def _melhor_prova_linha_a_linha(df_gabs, respostas_dict, mapa_areas):
+    """Versão anterior de identificar_melhor_prova (iterrows + comparação caractere a caractere)."""
+    melhor_indice, melhor_score, scores = None, -1, []
+    for indice, (_, row) in enumerate(df_gabs.iterrows()):
+        score = 0
+        for area, (inicio, fim) in mapa_areas.items():
+            gab_str = row.get(f"TX_GABARITO_{area}")
+            if not isinstance(gab_str, str) or not gab_str:
+                continue
+            gab_str = gab_str.strip()
+            for q_num in range(inicio, fim + 1):
+                idx_local = q_num - inicio
+                if idx_local >= len(gab_str):
+                    continue
+                resposta_aluno = respostas_dict.get(q_num, "-")
+                if resposta_aluno in ["A", "B", "C", "D", "E"] and resposta_aluno.upper() == gab_str[idx_local].upper():
+                    score += 1
+        scores.append(score)
+        if score > melhor_score:
+            melhor_indice, melhor_score = indice, score
+    return melhor_indice, melhor_score, scores
+
+
+def _conferir_contra_linha_a_linha(df_gabs, folhas, mapa_areas=MAPA_PADRAO):
+    analisador = PerformanceAnalyzer(db_manager=None)
+    gabaritos = analisador.codificar_gabaritos(df_gabs, mapa_areas)
+    respostas = np.stack([analisador.codificar_respostas_usuario(f, gabaritos.shape[1]) for f in folhas])
+    em_lote = analisador.pontuar_gabaritos(respostas, gabaritos)
+    for i, folha in enumerate(folhas):
+        melhor, score, scores = _melhor_prova_linha_a_linha(df_gabs, folha, mapa_areas)
+        assert em_lote[i].tolist() == scores
+        assert analisador.pontuar_gabaritos(respostas[i], gabaritos).tolist() == scores  # uma folha só
+        linha, score_lote = analisador.identificar_melhor_prova(df_gabs, folha, mapa_areas)
+        assert score_lote == score
+        assert linha.name == df_gabs.index[melhor]
+
+
+def test_pontuar_gabaritos_igual_a_linha_a_linha_com_brancos_e_lingua():
+    gerador = np.random.default_rng(7)
+    letras = np.array(list("ABCDE"))
+
+    def gabarito(n):
+        return "".join(gerador.choice(letras, n))
+
+    comum = {area: gabarito(45) for area in ("CH", "CN", "MT")}
+    lc_comum = gabarito(40)
+    linhas = []
+    for ingles, espanhol in [(gabarito(5), gabarito(5)) for _ in range(3)]:
+        # TX_GABARITO_LC tem 50 posições: 5 de inglês, 5 de espanhol e as 40 comuns; a área LC usa só as 45 primeiras
+        linhas.append({"TX_GABARITO_LC": ingles + espanhol + lc_comum, **{f"TX_GABARITO_{a}": g for a, g in comum.items()}})
+        linhas.append({"TX_GABARITO_LC": espanhol + ingles + lc_comum, **{f"TX_GABARITO_{a}": g for a, g in comum.items()}})
+    linhas.append({"TX_GABARITO_LC": None, "TX_GABARITO_CH": comum["CH"][:30], "TX_GABARITO_CN": " " + comum["CN"] + " ", "TX_GABARITO_MT": ""})
+    df_gabs = pd.DataFrame(linhas, index=np.arange(100, 100 + len(linhas)))  # índice não sequencial, como após filtros
+
+    folhas = []
+    for i in range(60):
+        base = df_gabs.iloc[i % len(df_gabs)]
+        folha = {}
+        for area, (inicio, fim) in MAPA_PADRAO.items():
+            texto = base[f"TX_GABARITO_{area}"] if isinstance(base[f"TX_GABARITO_{area}"], str) else ""
+            texto = texto.strip()
+            for q in range(inicio, fim + 1):
+                sorteio = gerador.random()
+                if sorteio < 0.1:
+                    continue                      # questão ausente do dicionário
+                if sorteio < 0.2:
+                    folha[q] = "-"                # em branco
+                elif sorteio < 0.25:
+                    folha[q] = "x"                # inválida
+                elif sorteio < 0.7 and q - inicio < len(texto):
+                    folha[q] = texto[q - inicio]  # acerto
+                else:
+                    folha[q] = str(gerador.choice(letras))
+        folhas.append(folha)
+    folhas += [{}, {q: "-" for q in range(1, 181)}]  # folhas totalmente em branco: empate, fica o primeiro
+
+    _conferir_contra_linha_a_linha(df_gabs, folhas)
+
+
+def test_pontuar_gabaritos_com_os_microdados(amostras_enem):
+    _, dados = amostras_enem
+    do_ano = dados[dados['NU_ANO'] == 2023]
+    colunas = [f'CO_PROVA_{a}' for a in AREAS] + [f'TX_GABARITO_{a}' for a in AREAS]
+    df_gabs = do_ano[colunas].astype(object).where(do_ano[colunas].notna(), None).drop_duplicates().reset_index(drop=True)
+
+    folhas = []
+    for _, participante in do_ano.dropna(subset=[f'TX_RESPOSTAS_{a}' for a in AREAS]).head(40).iterrows():
+        folha = {}
+        for area, (inicio, fim) in MAPA_PADRAO.items():
+            for i, caractere in enumerate(str(participante[f'TX_RESPOSTAS_{area}'])[: fim - inicio + 1]):
+                folha[inicio + i] = caractere  # '.', '*' e '9' ficam como estão: contam como branco
+        folhas.append(folha)
+
+    _conferir_contra_linha_a_linha(df_gabs, folhas)
+
+
+# Distribuição artificial de 1999 (MT, Brasil): faixas 300, 500 e 800 com 1, 2 e 1 notas
+DISTRIBUICAO_ARTIFICIAL = pd.DataFrame({
+    'NU_ANO': 1999, 'sigla_area': 'MT', 'SG_UF_PROVA': None, 'faixa': [300, 500, 800], 'n': [1, 2, 1], 'n_acumulado': [1, 3, 4],
+})
+
+
+@pytest.fixture
+def analisador_distribuicao(banco_duckdb, duckdb_amostras):
+    """distribuicao_notas das amostras (regras de pos_carga) mais a distribuição artificial de 1999."""
+    import pos_carga
+    df = pos_carga._acumular_distribuicao(duckdb_amostras.execute_query(pos_carga._sql_distribuicao_notas('dados_enem_consolidado')))
+    conexao = duckdb_amostras.conexao
+    conexao.register('df_distribuicao', pd.concat([df, DISTRIBUICAO_ARTIFICIAL], ignore_index=True))
+    conexao.execute(f'CREATE OR REPLACE TABLE "{pos_carga.TABELA_DISTRIBUICAO_NOTAS}" AS SELECT * FROM df_distribuicao')
+    conexao.unregister('df_distribuicao')
+    yield PerformanceAnalyzer(banco_duckdb)
+    conexao.execute(f'DROP TABLE IF EXISTS "{pos_carga.TABELA_DISTRIBUICAO_NOTAS}"')
+
+
+@pytest.mark.parametrize('nota, esperado', [
+    (-10.0, 0.0),    # abaixo do mínimo da escala
+    (0.0, 0.0),
+    (300.0, 0.0),    # início da menor faixa: ninguém abaixo
+    (300.5, 12.5),   # metade da faixa 300 (1 nota)
+    (400.0, 25.0),   # entre faixas: tudo o que está abaixo da faixa vazia
+    (500.25, 37.5),  # um quarto da faixa 500 (2 notas)
+    (799.0, 75.0),
+    (801.0, 100.0),  # depois da maior faixa
+    (1000.0, 100.0), # máximo da escala
+    (1200.0, 100.0),
+])
+def test_percentil_nos_limites(analisador_distribuicao, nota, esperado):
+    assert analisador_distribuicao.percentil(nota, 1999, 'MT') == pytest.approx(esperado)
+
+
+def test_percentil_sem_distribuicao(analisador_distribuicao):
+    assert analisador_distribuicao.percentil(500.0, 1998, 'MT') is None       # ano sem linhas
+    assert analisador_distribuicao.percentil(500.0, 1999, 'CN') is None       # área sem linhas
+    assert analisador_distribuicao.percentil(500.0, 1999, 'MT', 'SP') is None  # UF sem linhas
+    assert analisador_distribuicao.percentil(None, 1999, 'MT') is None
+    assert analisador_distribuicao.percentil(float('nan'), 1999, 'MT') is None
+
+
+def test_percentil_sem_tabela(banco_duckdb):
+    assert PerformanceAnalyzer(banco_duckdb).percentil(500.0, 2023, 'MT') is None
+
+
+def test_percentil_igual_a_proporcao_das_amostras(analisador_distribuicao, amostras_enem):
+    _, dados = amostras_enem
+    do_ano = dados[dados['NU_ANO'] == 2023]
+    uf = do_ano['SG_UF_PROVA'].mode().iloc[0]
+    for area in ['CN', 'MT']:
+        for recorte, filtro in ((None, do_ano), (uf, do_ano[do_ano['SG_UF_PROVA'] == uf])):
+            notas = filtro[f'NU_NOTA_{area}'].dropna().astype('float64').to_numpy()
+            for nota in np.percentile(notas, [0, 10, 50, 90, 100]):
+                obtido = analisador_distribuicao.percentil(nota, 2023, area, recorte)
+                # Faixas de 1 ponto: a interpolação só erra dentro da faixa da própria nota
+                abaixo, ate = (notas < np.floor(nota)).mean() * 100, (notas < np.floor(nota) + 1).mean() * 100
+                assert abaixo - 1e-9 <= obtido <= ate + 1e-9
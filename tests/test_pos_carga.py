@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""SQL das tabelas derivadas (scripts/table_script/pos_carga.py) executado no DuckDB sobre as amostras."""
+import pandas as pd
+from sqlalchemy import text
+
+import pos_carga
+
+
+def test_cubo_dashboard_soma_as_linhas(amostras_enem, duckdb_amostras):
+    _, dados = amostras_enem
+    cubo = duckdb_amostras.execute_query(pos_carga._sql_cubo('dados_enem_consolidado'))
+    assert cubo['n'].sum() == len(dados)
+    assert cubo['n_nu_nota_mt'].sum() == dados['NU_NOTA_MT'].notna().sum()
+    assert abs(cubo['soma_nu_nota_mt'].sum() - dados['NU_NOTA_MT'].astype('float64').sum()) < 1e-6 * len(dados)
+
+
+def test_cubo_categorias_tem_valor_textual_em_todos_os_ramos(amostras_enem, duckdb_amostras):
+    _, dados = amostras_enem
+    categorias = duckdb_amostras.execute_query(pos_carga._sql_cubo_categorias('dados_enem_consolidado'))
+
+    assert set(categorias['coluna']) == set(pos_carga.CATEGORIAS_CUBO) | {'FAIXA_REDACAO'}
+    assert (categorias.groupby('coluna')['n'].sum() == len(dados)).all()
+    assert categorias['valor'].dropna().map(type).eq(str).all()
+
+    faixas = categorias.loc[categorias['coluna'] == 'FAIXA_REDACAO'].dropna(subset=['valor'])
+    inicio = faixas['valor'].astype(int)
+    assert (inicio % pos_carga.LARGURA_FAIXA_REDACAO == 0).all()
+    esperado = (dados['NU_NOTA_REDACAO'].dropna().astype('float64') // pos_carga.LARGURA_FAIXA_REDACAO * pos_carga.LARGURA_FAIXA_REDACAO).astype(int)
+    pd.testing.assert_series_equal(faixas.groupby(inicio)['n'].sum().sort_index(), esperado.value_counts().sort_index(),
+                                   check_names=False, check_dtype=False)
+
+
+def test_cubo_categorias_ramos_com_o_mesmo_tipo(duckdb_amostras):
+    # O DuckDB converte tipos diferentes no UNION ALL; o PostgreSQL recusa. Cada ramo precisa produzir texto.
+    ramos = pos_carga._sql_cubo_categorias('dados_enem_consolidado').split("\nUNION ALL\n")
+    tipos = {duckdb_amostras.execute_query(f'SELECT DISTINCT typeof(valor) AS tipo FROM ({ramo}) AS r WHERE valor IS NOT NULL')['tipo'].iloc[0]
+             for ramo in ramos}
+    assert tipos == {'VARCHAR'}
+
+
+def _oids_das_particoes(engine, tabela):
+    with engine.connect() as connection:
+        particoes = pos_carga._particoes_por_ano(connection, tabela)
+        return {ano: connection.execute(text("SELECT to_regclass(:nome)::oid"), {'nome': f'"{nome}"'}).scalar_one()
+                for ano, nome in particoes.items()}
+
+
+def test_dados_enriquecidos_particionados_e_atualizados_por_ano(postgres_amostras):
+    engine, dados = postgres_amostras
+    tabela = pos_carga.TABELA_DADOS_ENRIQUECIDOS
+    assert pos_carga.construir_dados_enriquecidos(engine, 'dados_enem_consolidado')
+
+    oids = _oids_das_particoes(engine, tabela)
+    assert set(oids) == set(dados['NU_ANO'].astype(int))
+    with engine.connect() as connection:
+        contagens = dict(connection.execute(text(f'SELECT "NU_ANO", COUNT(*) FROM "{tabela}" GROUP BY "NU_ANO"')).all())
+        com_nome = connection.execute(text(f'SELECT COUNT("NOME_MUNICIPIO_PROVA") FROM "{tabela}"')).scalar_one()
+        indices = connection.execute(text("SELECT COUNT(*) FROM pg_indexes WHERE schemaname = current_schema() AND tablename LIKE :padrao"), {'padrao': f'{tabela}\\_____'}).scalar_one()
+    assert contagens == dados['NU_ANO'].astype(int).value_counts().to_dict()
+    assert com_nome == dados['CO_MUNICIPIO_PROVA'].notna().sum()
+    assert indices == len(oids) * len(pos_carga.INDICES_DADOS_ENRIQUECIDOS)
+
+    # Só o ano recarregado é trocado; a partição do outro ano continua a mesma
+    ano_recarregado, ano_mantido = max(oids), min(oids)
+    with engine.begin() as connection:
+        connection.execute(text(f'DELETE FROM "dados_enem_consolidado" WHERE "NU_ANO" = {ano_recarregado} AND "SG_UF_PROVA" = \'SP\''))
+        restantes = connection.execute(text(f'SELECT COUNT(*) FROM "dados_enem_consolidado" WHERE "NU_ANO" = {ano_recarregado}')).scalar_one()
+    assert pos_carga.construir_dados_enriquecidos(engine, 'dados_enem_consolidado', anos=[ano_recarregado])
+
+    novos_oids = _oids_das_particoes(engine, tabela)
+    assert novos_oids[ano_mantido] == oids[ano_mantido]
+    assert novos_oids[ano_recarregado] != oids[ano_recarregado]
+    with engine.connect() as connection:
+        assert connection.execute(text(f'SELECT COUNT(*) FROM "{tabela}" WHERE "NU_ANO" = {ano_recarregado}')).scalar_one() == restantes
+
+
+# Tabelas derivadas -> coluna do ano
+TABELAS_POR_ANO = {
+    pos_carga.TABELA_CUBO: 'NU_ANO', pos_carga.TABELA_CUBO_CATEGORIAS: 'NU_ANO', pos_carga.TABELA_ESTATISTICAS_ITENS: 'ano',
+    pos_carga.TABELA_GABARITOS_PROVA: 'NU_ANO', pos_carga.TABELA_MEDIAS_PROVA_UF: 'NU_ANO',
+    pos_carga.TABELA_COMBINACOES_PROVA: 'NU_ANO', pos_carga.TABELA_DISTRIBUICAO_NOTAS: 'NU_ANO',
+}
+CONSTRUTORES_POR_ANO = [pos_carga.construir_cubo_dashboard, pos_carga.construir_estatisticas_itens,
+                        pos_carga.construir_gabaritos_prova, pos_carga.construir_distribuicao_notas]
+
+
+def _ler_tabelas_derivadas(engine):
+    with engine.connect() as connection:
+        tabelas = {nome: pd.read_sql_query(text(f'SELECT * FROM "{nome}"'), connection) for nome in TABELAS_POR_ANO}
+    return {nome: df.sort_values(list(df.columns)).reset_index(drop=True) for nome, df in tabelas.items()}
+
+
+def test_tabelas_derivadas_atualizadas_so_nos_anos_pedidos(postgres_amostras):
+    engine, dados = postgres_amostras
+    origem = 'dados_enem_consolidado'
+    anos = sorted(dados['NU_ANO'].astype(int).unique())
+    ano_recarregado, ano_removido = anos[-1], anos[0]
+    for construir in CONSTRUTORES_POR_ANO:
+        assert construir(engine, origem)
+
+    # Ano "recarregado" com menos linhas: a atualização parcial tem de chegar ao mesmo resultado da completa
+    with engine.begin() as connection:
+        connection.execute(text(f'DELETE FROM "{origem}" WHERE "NU_ANO" = {ano_recarregado} AND "SG_UF_PROVA" = \'SP\''))
+    for construir in CONSTRUTORES_POR_ANO:
+        assert construir(engine, origem, anos=[ano_recarregado])
+    parcial = _ler_tabelas_derivadas(engine)
+    for construir in CONSTRUTORES_POR_ANO:
+        assert construir(engine, origem)
+    completo = _ler_tabelas_derivadas(engine)
+    for nome in TABELAS_POR_ANO:
+        assert set(parcial[nome][TABELAS_POR_ANO[nome]]) == set(anos), nome
+        pd.testing.assert_frame_equal(parcial[nome], completo[nome], check_dtype=False, obj=nome)
+
+    # Ano que saiu da origem (carga completa sem o CSV dele): some das tabelas, sem recalcular os outros
+    with engine.begin() as connection:
+        connection.execute(text(f'DROP TABLE "{origem}_{ano_removido}"'))
+    for construir in CONSTRUTORES_POR_ANO:
+        assert construir(engine, origem, anos=[])
+    for nome, df in _ler_tabelas_derivadas(engine).items():
+        assert set(df[TABELAS_POR_ANO[nome]]) == {ano_recarregado}, nome
+
+
+def _anos_do_catalogo(engine):
+    with engine.connect() as connection:
+        return {int(a) for a in connection.execute(text(f'SELECT DISTINCT "NU_ANO" FROM "{pos_carga.TABELA_CATALOGO_FILTROS}"')).scalars()}
+
+
+def test_catalogo_com_anos_inclui_os_anos_que_faltam(postgres_amostras):
+    engine, dados = postgres_amostras
+    anos = sorted(dados['NU_ANO'].astype(int).unique())
+
+    # Catálogo inexistente (primeira carga --incremental após a atualização): todos os anos, não só os pedidos
+    assert pos_carga.atualizar_catalogo_filtros(engine, 'dados_enem_consolidado', anos=[anos[-1]])
+    assert _anos_do_catalogo(engine) == set(anos)
+
+    # Catálogo sem um ano: o ano que falta volta junto com os pedidos
+    with engine.begin() as connection:
+        connection.execute(text(f'DELETE FROM "{pos_carga.TABELA_CATALOGO_FILTROS}" WHERE "NU_ANO" = {anos[0]}'))
+    assert pos_carga.atualizar_catalogo_filtros(engine, 'dados_enem_consolidado', anos=[anos[-1]])
+    assert _anos_do_catalogo(engine) == set(anos)
+    with engine.connect() as connection:
+        resumos = connection.execute(text(f'''SELECT COUNT(*) FROM "{pos_carga.TABELA_CATALOGO_FILTROS}"
+                                              WHERE registro = 'resumo' AND coluna = 'NU_ANO' ''')).scalar_one()
+    assert resumos == len(anos)  # sem linhas duplicadas do ano reprocessado
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""decodificar_respostas / TABELA_ALTERNATIVAS (services/question_analyzer.py) contra a normalização caractere a caractere."""
+import numpy as np
+import pandas as pd
+
+from services.question_analyzer import TABELA_ALTERNATIVAS, QuestionAnalyzer, decodificar_respostas
+
+
+def _referencia(respostas):
+    """Mesma matriz, montada com QuestionAnalyzer._normalizar_alternativa em cada caractere."""
+    textos = [str(r).strip() for r in respostas if pd.notna(r)]
+    largura = max((len(t) for t in textos), default=0)
+    matriz = np.zeros((len(textos), largura), dtype=np.uint8)
+    for i, texto in enumerate(textos):
+        for j, caractere in enumerate(texto):
+            alternativa = QuestionAnalyzer._normalizar_alternativa(caractere)
+            matriz[i, j] = 0 if alternativa is None else "ABCDE".index(alternativa) + 1
+    return matriz
+
+
+def test_tabela_alternativas_cobre_todos_os_bytes():
+    for byte in range(256):
+        alternativa = QuestionAnalyzer._normalizar_alternativa(chr(byte))
+        esperado = 0 if alternativa is None else "ABCDE".index(alternativa) + 1
+        assert TABELA_ALTERNATIVAS[byte] == esperado, repr(chr(byte))
+
+
+def test_marcadores_de_dupla_marcacao_e_branco():
+    matriz = decodificar_respostas(pd.Series(['AB*.E', 'a2.c*', '.....', None, 'E']))
+    assert matriz.tolist() == [
+        [1, 2, 0, 0, 5],
+        [1, 2, 0, 3, 0],
+        [0, 0, 0, 0, 0],
+        [5, 0, 0, 0, 0],  # linha nula descartada; strings menores completadas com 0
+    ]
+
+
+def test_casos_vazios():
+    assert decodificar_respostas(pd.Series([], dtype=object)).shape == (0, 0)
+    assert decodificar_respostas(pd.Series([None, np.nan])).shape == (0, 0)
+    assert decodificar_respostas(pd.Series(['', '  '])).shape == (2, 0)
+
+
+def test_ida_e_volta_com_as_strings_dos_microdados(amostras_enem):
+    _, dados = amostras_enem
+    for area in ('CN', 'CH', 'LC', 'MT'):
+        respostas = dados[f'TX_RESPOSTAS_{area}'].astype(object)
+        brutos = ''.join(respostas.dropna())
+        assert '*' in brutos or '.' in brutos  # as amostras têm os marcadores que o teste quer cobrir
+        np.testing.assert_array_equal(decodificar_respostas(respostas), _referencia(respostas))
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""Estimação 3PL em lote (services/tri.py) e o fallback de poucos itens do PerformanceAnalyzer."""
+import numpy as np
+import pytest
+
+from services.performance_analyzer import PerformanceAnalyzer
+from services.tri import LIMITE_THETA, estimar_theta_eap, estimar_theta_mle, theta_para_nota
+
+
+def _theta_escalar(u, a, b, c):
+    """Fisher scoring da versão anterior (PerformanceAnalyzer.estimar_nota_tri_parametrizada), item a item."""
+    theta = 0.0
+    for _ in range(10):
+        num = den = 0.0
+        for ui, ai, bi, ci in zip(u, a, b, c):
+            exp_term = np.exp(-ai * (theta - bi))
+            P = float(np.clip(ci + (1.0 - ci) / (1.0 + exp_term), 1e-6, 1.0 - 1e-6))
+            dP = (1.0 - ci) * ai * exp_term / (1.0 + exp_term) ** 2
+            num += (ui - P) * dP / (P * (1.0 - P))
+            den += dP ** 2 / (P * (1.0 - P))
+        if den <= 1e-8:
+            break
+        delta = num / den
+        theta = float(np.clip(theta + delta, -4.0, 4.0))
+        if abs(delta) < 1e-3:
+            break
+    return theta
+
+
+def _itens(gerador, n):
+    return gerador.uniform(0.5, 2.5, n), gerador.normal(0.5, 1.0, n), gerador.uniform(0.05, 0.3, n)
+
+
+@pytest.fixture
+def dados_3pl():
+    gerador = np.random.default_rng(2024)
+    a, b, c = _itens(gerador, 45)
+    theta_real = gerador.normal(0.0, 1.0, 300)
+    P = c + (1 - c) / (1 + np.exp(-a * (theta_real[:, None] - b)))
+    U = (gerador.random(P.shape) < P).astype(float)
+    U[gerador.random(U.shape) < 0.05] = np.nan  # brancos
+    return U, a, b, c, theta_real
+
+
+def test_mle_igual_a_versao_escalar(dados_3pl):
+    U, a, b, c, _ = dados_3pl
+    theta = estimar_theta_mle(U, a, b, c)
+    for i in range(U.shape[0]):
+        validos = np.isfinite(U[i])
+        assert theta[i] == pytest.approx(_theta_escalar(U[i, validos], a[validos], b[validos], c[validos]), abs=1e-9)
+
+
+def test_eap_acompanha_o_theta_real(dados_3pl):
+    U, a, b, c, theta_real = dados_3pl
+    theta, erro_padrao = estimar_theta_eap(U, a, b, c)
+    assert np.corrcoef(theta, theta_real)[0, 1] > 0.85
+    assert np.all((erro_padrao > 0) & (erro_padrao < 1))
+
+
+@pytest.mark.parametrize('resposta', [1.0, 0.0])
+def test_padroes_extremos(dados_3pl, resposta):
+    _, a, b, c, _ = dados_3pl
+    U = np.full((1, len(a)), resposta)
+    theta_mle = estimar_theta_mle(U, a, b, c)
+    theta_eap, erro_padrao = estimar_theta_eap(U, a, b, c)
+
+    assert theta_mle[0] == pytest.approx(_theta_escalar(U[0], a, b, c), abs=1e-9)
+    assert np.all(np.abs(theta_mle) <= LIMITE_THETA) and np.isfinite(theta_eap).all() and np.isfinite(erro_padrao).all()
+    if resposta:
+        assert theta_mle[0] > 1.5 and theta_eap[0] > 1.0
+    else:
+        assert theta_mle[0] < -1.5 and theta_eap[0] < -1.0
+    assert 0.0 <= theta_para_nota(theta_mle)[0] <= 1000.0
+
+
+def test_itens_nan_e_parametros_nao_finitos_sao_ignorados(dados_3pl):
+    U, a, b, c, _ = dados_3pl
+    descartados = np.zeros(len(a), dtype=bool)
+    descartados[[0, 7, 20]] = True
+    a_ruim, b_ruim, c_ruim = a.copy(), b.copy(), c.copy()
+    a_ruim[0], b_ruim[7], c_ruim[20] = np.nan, np.inf, -np.inf
+
+    U_sem, a_sem, b_sem, c_sem = U[:, ~descartados], a[~descartados], b[~descartados], c[~descartados]
+    np.testing.assert_allclose(estimar_theta_mle(U, a_ruim, b_ruim, c_ruim), estimar_theta_mle(U_sem, a_sem, b_sem, c_sem))
+    for obtido, esperado in zip(estimar_theta_eap(U, a_ruim, b_ruim, c_ruim), estimar_theta_eap(U_sem, a_sem, b_sem, c_sem)):
+        np.testing.assert_allclose(obtido, esperado)
+
+    # Linha só com NaN: sem informação, fica no theta inicial
+    assert estimar_theta_mle(np.full((1, len(a)), np.nan), a, b, c)[0] == 0.0
+
+
+def test_lote_usa_proporcao_de_acertos_com_menos_de_3_itens(dados_3pl):
+    _, a, b, c, _ = dados_3pl
+    analisador = PerformanceAnalyzer(db_manager=None)
+    gabarito = np.tile(np.arange(1, 6, dtype=np.uint8), 9)  # 45 itens
+    respostas = np.zeros((3, 45), dtype=np.uint8)
+    respostas[0, :2] = gabarito[:2]                       # 2 itens, 2 acertos
+    respostas[1, :2] = [gabarito[0], gabarito[1] % 5 + 1]  # 2 itens, 1 acerto
+    respostas[2] = gabarito                               # prova inteira: estimação TRI
+
+    notas = analisador.estimar_notas_tri_em_lote(respostas, gabarito, a, b, c)
+    assert notas[0] == pytest.approx(analisador.estimar_nota_tri(2, 45, None))
+    assert notas[1] == pytest.approx(analisador.estimar_nota_tri(1, 45, None))
+    U = np.ones((1, 45))
+    assert notas[2] == pytest.approx(theta_para_nota(estimar_theta_mle(U, a, b, c))[0])
+
+    # Itens sem parâmetros também não contam para o mínimo de 3
+    a_sem = a.copy(); a_sem[2:] = np.nan
+    assert analisador.estimar_notas_tri_em_lote(respostas[2:], gabarito, a_sem, b, c, total_questoes=45)[0] == pytest.approx(
+        analisador.estimar_nota_tri(2, 45, None))